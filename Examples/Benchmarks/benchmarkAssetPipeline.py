@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkAssetPipeline.py
+#
+#     Compare a second build of a site with 200 assets and 1000 imports of CSS
+#     files, copying all assets and reading the files every time, with the
+#     asset pipeline, that only publishes new content, and the cached imports.
+#
+import os
+import shutil
+import codecs
+import tempfile
+from time import time
+
+from pagebot.contexts.platform import getRootPath
+from pagebot.contexts.builders.htmlbuilder import HtmlBuilder
+from pagebot.contexts.builders.assetpipeline import AssetPipeline
+
+ASSETS = 200
+IMPORTS = 1000
+
+rootPath = getRootPath()
+sources = [rootPath + '/Examples/Magazines/Fashion/images/IMG_8914.jpg',
+    rootPath + '/Docs/gallery/SierpinskiSquare.gif',
+    rootPath + '/Docs/gallery/AlignElements.png']
+folder = tempfile.mkdtemp()
+paths = []
+for index in range(ASSETS):
+    source = sources[index % len(sources)]
+    path = '%s/image%d%s' % (folder, index, os.path.splitext(source)[1])
+    shutil.copy(source, path)
+    paths.append(path)
+cssPath = folder + '/site.css'
+f = open(cssPath, 'w')
+f.write(HtmlBuilder.RESET_CSS)
+f.close()
+
+def importCss(b, path): # Previous HtmlBuilder.importCss
+    f = codecs.open(path, 'r', 'utf-8')
+    b.addCss(f.read())
+    f.close()
+
+def buildBefore(sitePath):
+    b = HtmlBuilder()
+    if not os.path.exists(sitePath + 'images'):
+        os.makedirs(sitePath + 'images')
+    for path in paths:
+        shutil.copy(path, sitePath + 'images/' + os.path.basename(path))
+    for index in range(IMPORTS):
+        importCss(b, cssPath)
+
+def buildAfter(sitePath):
+    b = HtmlBuilder()
+    b.assets = AssetPipeline(sitePath)
+    for path in paths:
+        b.copyPath(path)
+    for index in range(IMPORTS):
+        b.importCss(cssPath)
+    return b.assets
+
+sitePath = folder + '/siteBefore/'
+buildBefore(sitePath)
+t = time()
+buildBefore(sitePath)
+print 'Before (copy all assets, read imports): %0.3f seconds' % (time() - t)
+
+sitePath = folder + '/siteAfter/'
+buildAfter(sitePath)
+t = time()
+assets = buildAfter(sitePath)
+print 'After (asset pipeline, cached imports): %0.3f seconds, %s' % (time() - t, assets)
+shutil.rmtree(folder)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkCssCache.py
+#
+#     Time the construction of the elements and Document.solve( ) with the cached cascading
+#     Element.css( ). To compare with the original implementation, run the script again with
+#     the path of the Lib folder of a PageBot checkout before the cache was added, e.g.
+#
+#         git worktree add /tmp/pagebot-baseline <baseline commit>
+#         python benchmarkCssCache.py /tmp/pagebot-baseline/Lib
+#
+import sys
+from time import time
+
+if len(sys.argv) > 1:
+    sys.path.insert(0, sys.argv[1]) # Import pagebot from the other checkout.
+
+import pagebot
+from pagebot.document import Document
+from pagebot.elements import Element, newRect
+from pagebot.conditions import Left2Left, Top2Top, Fit2Right, Center2Center
+
+ELEMENTS = 5000 # Amount of elements on the page.
+W, H = 1000, 1000
+
+def makeDocument():
+    doc = Document(w=W, h=H, autoPages=1, padding=40, originTop=False)
+    page = doc[0]
+    # Nest the elements in a group, making the parent chain one level deeper.
+    group = Element(parent=page, w=W, h=H, padding=10)
+    for n in range(ELEMENTS):
+        newRect(parent=group, x=n % W, y=n % H, w=20, h=20, fill=0.5, 
+            conditions=[Left2Left(), Top2Top(), Fit2Right(), Center2Center()])
+    return doc
+
+print 'PageBot from %s' % pagebot.__file__
+t = time()
+doc = makeDocument()
+print 'Construction: %0.3f seconds for %d elements' % (time() - t, ELEMENTS)
+t = time()
+doc.solve()
+print 'Solve: %0.3f seconds for %d elements' % (time() - t, ELEMENTS)
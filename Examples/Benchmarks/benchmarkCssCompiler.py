@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkCssCompiler.py
+#
+#     Compare the size of the CSS of a site with 100 pages of 50 elements, as it
+#     is generated by the elements, with the compiled stylesheet, where repeated
+#     rules are merged and overridden declarations are removed.
+#
+from time import time
+
+from pagebot.contexts.builders.htmlbuilder import HtmlBuilder
+from pagebot.contexts.builders.csscompiler import CssCompiler
+
+PAGES = 100
+ELEMENTS = 50
+
+CLASSES = ('textBox', 'image', 'caption', 'rect', 'column')
+
+def buildCss(b):
+    b.headerCss('Benchmark')
+    b.resetCss()
+    b.css('body', dict(font='Verdana', fontSize=12))
+    for pageIndex in range(PAGES):
+        b.css('.page', dict(fill=(1, 1, 1)))
+        for index in range(ELEMENTS):
+            className = CLASSES[index % len(CLASSES)]
+            b.css('.' + className, dict(fontSize=12, fill=(index % 3 * 0.5, 0, 0)))
+
+b = HtmlBuilder()
+t = time()
+buildCss(b)
+css = ''.join(b._cssOut)
+print 'Before (generated CSS): %0.3f seconds, %d bytes' % (time() - t, len(css))
+
+b = HtmlBuilder()
+compiler = CssCompiler()
+t = time()
+b.openCss(compiler)
+buildCss(b)
+b.closeCss()
+compiled = compiler.compile()
+print 'After (compiled CSS): %0.3f seconds, %d bytes, %s' % (time() - t, len(compiled), compiler)
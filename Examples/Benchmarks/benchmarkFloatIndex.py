@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkFloatIndex.py
+#
+#     Compare the time of Document.solve( ) on a catalog page with floating tiles, 
+#     using the FloatIndex of the page against the original linear scan of all siblings.
+#
+from time import time
+
+from pagebot.document import Document
+from pagebot.elements import Element, newRect
+from pagebot.elements.floatindex import getFloatBox
+from pagebot.conditions import Float2Top, Float2Left
+
+TILES = 1000 # Amount of product tiles on the page.
+W, H = 2000, 2000
+
+def linearFloatBoxes(self, previousOnly, tolerance, vertical):
+    u"""Original behavior: the float queries scan all elements of the parent."""
+    boxes = []
+    for e in self.parent.elements:
+        if previousOnly and e is self:
+            break
+        boxes.append(getFloatBox(e))
+    return boxes
+
+def makeDocument():
+    doc = Document(w=W, h=H, autoPages=1, originTop=True)
+    page = doc[0]
+    for n in range(TILES):
+        newRect(parent=page, x=n % W, y=n % H, w=40 + n % 3 * 10, h=40, fill=0.5, 
+            conditions=[Float2Top(), Float2Left()])
+    return doc
+
+def benchmark(label):
+    doc = makeDocument()
+    t = time()
+    doc.solve()
+    print '%s: %0.3f seconds for %d tiles' % (label, time() - t, TILES)
+
+floatBoxes = Element._getFloatBoxes
+Element._getFloatBoxes = linearFloatBoxes
+benchmark('Before (linear scan)')
+Element._getFloatBoxes = floatBoxes
+benchmark('After (float index)')
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkGridCache.py
+#
+#     Compare the time of grid queries, as done by the column conditions and by
+#     drawing the grid, with and without the cached grid of elements. Then compare
+#     snapping many elements to the grid one by one against Element.snapToGrid.
+#
+import random
+from time import time
+
+from pagebot import x2cx, cx2x
+from pagebot.elements import Page, Element
+from pagebot.elements.element import Element as ElementClass
+from pagebot.style import LEFT, TOP
+
+ELEMENTS = 2000
+QUERIES = 20 # Amount of grid queries per element.
+W, H = 2000, 2000
+
+def makePage():
+    random.seed(1)
+    page = Page(w=W, h=H, padding=40, cw=40, gw=8, ch=40, gh=8, isLeftPage=True, originTop=True)
+    for n in range(ELEMENTS):
+        Element(parent=page, x=random.uniform(0, W), y=random.uniform(0, H), w=60, h=60,
+            padding=4, xAlign=LEFT, yAlign=TOP)
+    return page
+
+def benchmarkQueries(label):
+    page = makePage()
+    t = time()
+    for e in page.elements:
+        for n in range(QUERIES):
+            e.getGridColumns()
+            e.getGridRows()
+            cx2x(x2cx(e.x, e), e)
+        page.getGridColumns()
+    print '%s: %0.3f seconds for %d grid queries' % (label, time() - t, ELEMENTS * QUERIES * 3)
+
+def snapOneByOne(page):
+    xs = [page.pl + cx for cx, _ in page.getGridColumns()]
+    ys = [page.pb + cy for cy, _ in page.getGridRows()]
+    for e in page.elements:
+        e.left = min(xs, key=lambda x: abs(x - e.left))
+        e.top = min(ys, key=lambda y: abs(y - e.top))
+
+def benchmarkSnap(label, snap):
+    page = makePage()
+    t = time()
+    snap(page)
+    duration = time() - t
+    positions = [(e.left, e.top) for e in page.elements]
+    print '%s: %0.3f seconds to snap %d elements' % (label, duration, ELEMENTS)
+    return positions
+
+getGridColumns = ElementClass.getGridColumns.im_func
+getGridRows = ElementClass.getGridRows.im_func
+getGridUnits = ElementClass.getGridUnits.im_func
+ElementClass.getGridColumns = lambda self: self._makeGridColumns()
+ElementClass.getGridRows = lambda self: self._makeGridRows()
+ElementClass.getGridUnits = lambda self: (self.cw, self.gw, self.ch, self.gh, self.cd, self.gd)
+benchmarkQueries('Before (grid computed on every query)')
+ElementClass.getGridColumns = getGridColumns
+ElementClass.getGridRows = getGridRows
+ElementClass.getGridUnits = getGridUnits
+benchmarkQueries('After (cached grid)')
+
+positions1 = benchmarkSnap('Before (snap one by one)', snapOneByOne)
+positions2 = benchmarkSnap('After (snapToGrid)', lambda page: page.snapToGrid())
+print 'Same positions:', positions1 == positions2
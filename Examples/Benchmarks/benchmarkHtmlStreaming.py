@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkHtmlStreaming.py
+#
+#     Compare writing the html of 200 large pages by collecting all chunks of a
+#     page in memory and joining them in writeHtml, with streaming the chunks to
+#     the page file while it is built, in compact mode without indenting. Time is
+#     about the same, as it is spent in writing the tag attributes, but the html
+#     that is kept in memory is limited to the buffer size of the builder.
+#
+import os
+import shutil
+import tempfile
+from time import time
+
+from pagebot.contexts.builders.htmlbuilder import HtmlBuilder
+
+PAGES = 200
+PARAGRAPHS = 500
+
+def buildPage(b):
+    b.docType('html')
+    b.html()
+    b.body()
+    for index in range(PARAGRAPHS):
+        b.div(class_='column')
+        b.p(class_='body')
+        b.write(u'Paragraph %d of the body text of the page, with some words.' % index)
+        b._p()
+        b.img(src='images/image%d.png' % index)
+        b._div()
+    b._body()
+    b._html()
+
+def buildInMemory(folder):
+    b = HtmlBuilder()
+    maxChars = 0
+    for pageIndex in range(PAGES):
+        b.resetHtml()
+        buildPage(b)
+        maxChars = max(maxChars, len(b.getHtml()))
+        b.writeHtml('%s/page%d.html' % (folder, pageIndex))
+    return maxChars
+
+def buildStreaming(folder):
+    b = HtmlBuilder(compact=True)
+    maxChars = 0
+    for pageIndex in range(PAGES):
+        b.openHtml('%s/page%d.html' % (folder, pageIndex))
+        buildPage(b)
+        maxChars = max(maxChars, len(b.getHtml()))
+        b.closeHtml()
+    return maxChars
+
+folder = tempfile.mkdtemp()
+t = time()
+maxChars = buildInMemory(folder)
+print 'Before (chunks in memory): %0.3f seconds for %d pages, up to %d characters in memory' % (time() - t, PAGES, maxChars)
+t = time()
+maxChars = buildStreaming(folder)
+print 'After (streaming, compact): %0.3f seconds for %d pages, up to %d characters in memory' % (time() - t, PAGES, maxChars)
+shutil.rmtree(folder)
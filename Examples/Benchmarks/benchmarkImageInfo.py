@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkImageInfo.py
+#
+#     Compare the time to get the size of the images of a magazine layout with
+#     200 image elements, when reading the whole image file (a lower bound of
+#     decoding the image, as Flat did), when reading only the file header and
+#     when answering from the persistent image info cache of the previous run.
+#
+import os
+import tempfile
+from time import time
+
+from pagebot.contexts.platform import getRootPath
+from pagebot.toolbox.imagesize import ImageInfoCache, readImageInfo
+
+IMAGES = 200
+
+def readFile(path):
+    f = open(path, 'rb')
+    data = f.read()
+    f.close()
+    return len(data)
+
+rootPath = getRootPath()
+paths = [rootPath + '/Examples/Magazines/Fashion/images/IMG_8914.jpg',
+    rootPath + '/Docs/gallery/SierpinskiSquare.gif',
+    rootPath + '/Docs/gallery/AlignElements.png']
+paths = [paths[index % len(paths)] for index in range(IMAGES)]
+
+t = time()
+for path in paths:
+    readFile(path)
+print 'Before (reading the image files): %0.3f seconds for %d images' % (time() - t, len(paths))
+
+t = time()
+infos1 = [readImageInfo(path) for path in paths]
+print 'After (reading the headers): %0.3f seconds for %d images' % (time() - t, len(paths))
+
+cachePath = tempfile.mktemp(suffix='.json')
+cache = ImageInfoCache(cachePath)
+for path in paths:
+    cache.get(path)
+cache.save()
+t = time()
+cache = ImageInfoCache(cachePath) # Next run of the script
+infos2 = [cache.get(path) for path in paths]
+print 'After (persistent cache): %0.3f seconds for %d images, %s' % (time() - t, len(paths), cache)
+print 'Same info:', infos1 == infos2
+os.remove(cachePath)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkLightElements.py
+#
+#     Compare the memory and the time of making a page with 100k standard Rect
+#     elements against 100k LightRect elements. Each run is done in its own process,
+#     so the growth of its maximum resident memory only counts its own elements.
+#
+import resource
+from multiprocessing import Process, Queue
+from time import time
+
+from pagebot.elements import Rect, Page
+from pagebot.elements.lightelement import LightRect, newLightStyle
+
+ELEMENTS = 100000
+W, H = 1000, 1000
+
+def makeElements(elementClass, queue):
+    page = Page(w=W, h=H)
+    style = newLightStyle(fill=0.5) if elementClass is LightRect else dict(fill=0.5)
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # Kilobytes on Linux.
+    t = time()
+    for n in range(ELEMENTS):
+        elementClass(parent=page, x=n % W, y=n // W, w=10, h=10, style=style)
+    duration = time() - t
+    score = page.solve()
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - maxRss
+    queue.put((duration, memory, len(page)))
+
+def benchmark(label, elementClass):
+    queue = Queue()
+    process = Process(target=makeElements, args=(elementClass, queue))
+    process.start()
+    duration, memory, count = queue.get()
+    process.join()
+    print '%s: %d elements, %0.2f seconds, %0.1f MB, %d bytes per element' % (label,
+        count, duration, memory/1024.0, memory*1024/count)
+
+benchmark('Before (Rect)', Rect)
+benchmark('After (LightRect)', LightRect)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkLineBreaking.py
+#
+#     Compare the time to solve the same text boxes 3 times, as conditions do when
+#     a document is solved again, with the hyphenated total-fit line breaking done
+#     each time and with the line layouts cached by paragraph and width.
+#
+from time import time
+
+from pagebot.contexts.platform import getFontPaths
+from pagebot.contexts.strings.measurestring import MeasureString
+from pagebot.toolbox import linebreaking
+from pagebot.style import TOTAL_FIT
+
+SOLVES = 3
+W = 300 # Width of the text column
+
+TEXT = u"""Typography is the art and technique of arranging type to make written language legible,
+readable and appealing when displayed. The arrangement of type involves selecting typefaces,
+point sizes, line lengths, line spacing, and letter spacing, and adjusting the space between
+pairs of letters. The term typography is also applied to the style, arrangement, and appearance
+of the letters, numbers, and symbols created by the process."""
+
+def benchmarkSolve(label, paragraphs, fontPath):
+    paragraph = (0, 0, 0, 'en', TOTAL_FIT)
+    t = time()
+    for _ in range(SOLVES):
+        sizes = []
+        for text in paragraphs: # Strings are made again for every solve.
+            bs = MeasureString([(text, fontPath, 10, 12, 0, paragraph)], None)
+            sizes.append(bs.textSize(w=W))
+    print '%s: %0.3f seconds to solve %d paragraphs %d times' % (label, time() - t, len(paragraphs), SOLVES)
+    return sizes
+
+paragraphs = [u'%d. %s' % (index, TEXT.replace(u'\n', u' ')) for index in range(500)]
+fontPath = getFontPaths()['Roboto-Regular.ttf']
+
+getLayout = linebreaking.getLayout
+import pagebot.contexts.strings.measurestring as measurestring
+measurestring.getLayout = lambda key, breakLines, *args, **kwargs: breakLines(*args, **kwargs)
+sizes1 = benchmarkSolve('Before (breaking every solve)', paragraphs, fontPath)
+measurestring.getLayout = getLayout
+sizes2 = benchmarkSolve('After (cached line layouts)', paragraphs, fontPath)
+print 'Same sizes:', sizes1 == sizes2
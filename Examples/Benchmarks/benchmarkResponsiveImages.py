@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkResponsiveImages.py
+#
+#     Compare the time to make the srcset derivatives of the images of a site in
+#     two builds, when each derivative is decoded and resized from the source
+#     image, and by the AssetPipeline, which decodes each image once, encodes
+#     the images in a pool of processes and reuses the derivatives of the
+#     previous build. Needs Flat to be installed.
+#
+import os
+import shutil
+import tempfile
+from time import time
+
+from pagebot.contexts.platform import getRootPath
+from pagebot.contexts.builders.flatbuilder import flatBuilder
+from pagebot.contexts.builders.assetpipeline import AssetPipeline, getSrcsetWidths
+from pagebot.toolbox.imagesize import getImageInfo
+
+BUILDS = 2
+WIDTHS = (80, 160, 240, 320, 480)
+
+rootPath = getRootPath()
+paths = [rootPath + '/Docs/gallery/AlignElements.png',
+    rootPath + '/Docs/gallery/DrawQuadraticGlyph.png',
+    rootPath + '/Docs/gallery/DrawRedRectCenterPage.png']
+
+if flatBuilder is None:
+    print 'Flat is not installed, the derivatives cannot be encoded.'
+else:
+    sitePath = tempfile.mkdtemp() + '/'
+    t = time()
+    for build in range(BUILDS):
+        for index, path in enumerate(paths):
+            iw, ih = getImageInfo(path)[:2]
+            for w in getSrcsetWidths(iw, WIDTHS):
+                image = flatBuilder.image.open(path)
+                image.resize(w, max(1, int(round(ih * w / float(iw)))))
+                image.png('%s%d-%d.png' % (sitePath, index, w))
+    print 'Before (resizing each derivative from the source): %0.3f seconds for %d builds of %d images' % (
+        time() - t, BUILDS, len(paths))
+    shutil.rmtree(sitePath)
+
+    sitePath = tempfile.mkdtemp() + '/'
+    t = time()
+    for build in range(BUILDS):
+        assets = AssetPipeline(sitePath)
+        for path in paths:
+            assets.addImage(path, WIDTHS)
+        assets.encodeImages()
+        print 'Build %d: %d derivatives encoded' % (build + 1, assets.encoded)
+    print 'After (pool and cached derivatives): %0.3f seconds for %d builds of %d images' % (
+        time() - t, BUILDS, len(paths))
+    shutil.rmtree(sitePath)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkSiteBuild.py
+#
+#     Compare building a site of 1000 pages from scratch, as every build did,
+#     with building it again after an edit of one page, where only the changed
+#     page is built again, and written only if its html changed, and with a
+#     parallel build from scratch.
+#
+import os
+import shutil
+import tempfile
+from time import time
+
+from pagebot.document import Document
+from pagebot.contexts.htmlcontext import HtmlContext
+from pagebot.elements import newRect
+
+PAGES = 1000
+ELEMENTS = 10
+
+def makeDocument():
+    doc = Document(w=300, h=400, autoPages=PAGES, context=HtmlContext(), viewId='Git')
+    for pn, pages in doc.pages.items():
+        page = pages[0]
+        page.name = 'page%d' % pn
+        for index in range(ELEMENTS):
+            newRect(parent=page, x=index*10, y=index*10, w=20, h=20, class_='rect%d' % index, fill=(1, 0, 0))
+    return doc
+
+folder = tempfile.mkdtemp()
+os.chdir(folder)
+os.makedirs('docs/css')
+
+doc = makeDocument()
+t = time()
+doc.view.build()
+print 'Before (build all pages): %0.3f seconds, (built, written, deleted) %s' % (time() - t, doc.view.siteStats)
+
+doc.pages[PAGES//2][0].elements[0].x += 5 # Edit one page.
+t = time()
+doc.view.build(incremental=True)
+print 'After (incremental build after one edit): %0.3f seconds, (built, written, deleted) %s' % (time() - t, doc.view.siteStats)
+
+shutil.rmtree('docs')
+os.makedirs('docs/css')
+t = time()
+doc.view.build(parallel=True)
+print 'After (parallel build of all pages): %0.3f seconds, (built, written, deleted) %s' % (time() - t, doc.view.siteStats)
+shutil.rmtree(folder)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkTemplateStyles.py
+#
+#     Compare the time and the amount of stored style values of making pages
+#     from a template with many styled elements, using the copy-on-write
+#     LayeredStyle against full copies of the style of every element.
+#
+import copy
+from time import time
+
+import pagebot.elements.element
+from pagebot.document import Document
+from pagebot.elements import Element, Template, newRect
+from pagebot.style import Style, getRootStyle
+
+PAGES = 200
+ELEMENTS = 200 # Amount of elements on the template.
+W, H = 1000, 1000
+
+def fullCopyStyle(style=None, **kwargs):
+    u"""Original makeStyle, as called by Element.copy( ) on a deep copy of the style."""
+    style = copy.deepcopy(dict((style or {}).items()))
+    style.update(kwargs)
+    return style
+
+def fullCopyLayeredStyle(owner, base, style=None):
+    u"""Full copy of the template style, as the original template application did."""
+    return Style(owner, dict(base, **(style or {})))
+
+def makeTemplate():
+    template = Template(w=W, h=H, padding=40)
+    style = getRootStyle() # Rich style, as typically used for text and image elements.
+    for n in range(ELEMENTS):
+        newRect(parent=template, x=n, y=n, w=20, h=20, style=style, fill=0.5)
+    return template
+
+def benchmark(label):
+    template = makeTemplate()
+    t = time()
+    doc = Document(w=W, h=H, autoPages=PAGES, template=template)
+    duration = time() - t
+    values = 0
+    for pn, pnPages in doc.pages.items():
+        for page in pnPages:
+            for e in [page] + page.elements:
+                values += len(getattr(e.style, 'local', e.style)) # Values that are stored by the element itself.
+    print '%s: %0.3f seconds, %d stored style values for %d pages' % (label, duration, values, PAGES)
+
+makeStyle = pagebot.elements.element.makeStyle
+LayeredStyle = pagebot.elements.element.LayeredStyle
+pagebot.elements.element.makeStyle = fullCopyStyle
+pagebot.elements.element.LayeredStyle = fullCopyLayeredStyle
+benchmark('Before (full style copies)')
+pagebot.elements.element.makeStyle = makeStyle
+pagebot.elements.element.LayeredStyle = LayeredStyle
+benchmark('After (layered styles)')
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     benchmarkTextMeasure.py
+#
+#     Compare the time to measure 10000 paragraphs, as done for the elastic height
+#     and overflow of text boxes, with the advance widths looked up glyph by glyph
+#     and with the cached advance width arrays of FontMetrics. Then compare the
+#     width of all paragraphs measured one by one against FontMetrics.getWidths,
+#     and the sizes against getTextSizes, that measures all paragraphs together.
+#
+import random
+from time import time
+
+from pagebot.contexts.platform import getFontPaths
+from pagebot.contexts.strings.measurestring import MeasureString, getTextSizes
+from pagebot.fonttoolbox.fontmetrics import FontMetrics, getFontMetrics
+
+PARAGRAPHS = 10000
+WORDS = 60 # Words per paragraph
+W = 300 # Width of the text column
+
+def makeParagraphs():
+    random.seed(1)
+    words = [u''.join([random.choice(u'abcdefghijklmnopqrstuvwxyzAVTW') for _ in range(random.randint(1, 10))])
+        for _ in range(1000)]
+    return [u' '.join([random.choice(words) for _ in range(WORDS)]) for _ in range(PARAGRAPHS)]
+
+def benchmarkTextSize(label, paragraphs, fontPath):
+    t = time()
+    sizes = []
+    for paragraph in paragraphs:
+        bs = MeasureString([(paragraph, fontPath, 10, 12, 0)], None)
+        sizes.append((bs.textSize(), bs.textSize(w=W)))
+    print '%s: %0.3f seconds to measure %d paragraphs, unwrapped and wrapped' % (label, time() - t, len(paragraphs))
+    return sizes
+
+def getGlyphWidths(self, s, kerning=True):
+    widths = [self.getCharWidth(c) for c in s]
+    if kerning:
+        for index in range(len(s) - 1):
+            widths[index] += self.getKerning(s[index], s[index+1])
+    return widths
+
+paragraphs = makeParagraphs()
+fontPath = getFontPaths()['Roboto-Regular.ttf']
+metrics = getFontMetrics(fontPath)
+metrics.getCharWidths(u'Warm up the cached tables')
+
+getCharWidths = FontMetrics.getCharWidths.im_func
+import pagebot.contexts.strings.measurestring as measurestring
+numpy = measurestring.numpy
+measurestring.numpy = None
+FontMetrics.getCharWidths = getGlyphWidths
+sizes1 = benchmarkTextSize('Before (glyph by glyph)', paragraphs, fontPath)
+measurestring.numpy = numpy
+FontMetrics.getCharWidths = getCharWidths
+sizes2 = benchmarkTextSize('After (cached advance width arrays)', paragraphs, fontPath)
+print 'Same sizes:', all([abs(w1 - w2) < 0.001 and h1 == h2
+    for size1, size2 in zip(sizes1, sizes2) for (w1, h1), (w2, h2) in zip(size1, size2)])
+
+t = time()
+widths1 = [metrics.getWidth(paragraph) for paragraph in paragraphs]
+print 'Before (one by one): %0.3f seconds for the width of %d paragraphs' % (time() - t, len(paragraphs))
+t = time()
+widths2 = metrics.getWidths(paragraphs)
+print 'After (getWidths): %0.3f seconds for the width of %d paragraphs' % (time() - t, len(paragraphs))
+print 'Same widths:', widths1 == widths2
+
+t = time()
+sizes3 = zip(getTextSizes(paragraphs, fontPath, 10, 12), getTextSizes(paragraphs, fontPath, 10, 12, w=W))
+print 'After (getTextSizes): %0.3f seconds to measure %d paragraphs, unwrapped and wrapped' % (time() - t, len(paragraphs))
+print 'Same sizes:', all([abs(w1 - w2) < 0.001 and h1 == h2
+    for size1, size3 in zip(sizes1, sizes3) for (w1, h1), (w2, h2) in zip(size1, size3)])
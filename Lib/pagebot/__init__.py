@@ -58,9 +58,16 @@ def getGlobals(scriptId):
 
 def x2cx(x, e):
     u"""Transform from *x* value to column *x* index value, using the *e.css('cw')* (column width)
-    as column measure."""
-    gw = e.gw # Gutter
-    cw = e.css('cw', 0)
+    as column measure.
+
+    >>> from pagebot.elements import Element
+    >>> parent = Element(pl=10)
+    >>> e = Element(parent=parent, cw=50, gw=10)
+    >>> x2cx(130, e), cx2x(2, e)
+    (2.0, 130)
+    """
+    cw, gw = e.getGridUnits()[:2] # Cached column width and gutter
+    cw = cw or 0
     if cw + gw: # Check on division by 0
         return (x - e.parent.pl) / (cw + gw)
     return 0
@@ -71,14 +78,15 @@ def cx2x(cx, e):
     if cx is None:
         x = 0
     else:
-        x = e.parent.pl + cx * (e.css('cw', 0) + e.gw)
+        cw, gw = e.getGridUnits()[:2]
+        x = e.parent.pl + cx * ((cw or 0) + gw)
     return x
 
 def y2cy(y, e):
     u"""Transform from *y* value to column *y* index value, using the *e.css('ch')* (column height)
     as column measure."""
-    gh = e.gh # Gutter
-    ch = e.css('ch', 0)
+    _, _, ch, gh = e.getGridUnits()[:4]
+    ch = ch or 0
     cy = 0
     if ch + gh: # Check on division by 0
         if e.originTop:
@@ -98,16 +106,18 @@ def cy2y(cy, e):
             paddingY = e.pt
         else:
             paddingY = e.pb
-        y = paddingY + cy * (e.css('ch', 0) + e.gh)
+        _, _, ch, gh = e.getGridUnits()[:4]
+        y = paddingY + cy * ((ch or 0) + gh)
     return y
 
 def z2cz(z, e):
     u"""Transform from *z* value to column *z* index value, using the *e.css('cd')* (column depth) 
     as column measure."""
-    cd = e.css('cd', 0) # Column width
+    cd, gd = e.getGridUnits()[4:]
+    cd = cd or 0 # Column depth
     cz = 0
-    if cd + e.gd: # Check on division by 0
-        cz = (z - e.parent.pzf) / (cd + e.gd)
+    if cd + gd: # Check on division by 0
+        cz = (z - e.parent.pzf) / (cd + gd)
     return cz
 
 def cz2z(cz, e):
@@ -116,56 +126,57 @@ def cz2z(cz, e):
     if cz is None:
         z = 0
     else:
-        z = e.parent.pzf + cz * (e.css('cd', 0) + e.gd)
+        cd, gd = e.getGridUnits()[4:]
+        z = e.parent.pzf + cz * ((cd or 0) + gd)
     return z
 
-# Number of cols, rows, lanes
-# TODO Make this work
-"""
-def w2cols(w, e): # Answer the rounded amount of columns that fit in the given width.
-    gw = e.gw
-    cw = e.css('cw', 0)
-    if cw + gw:
-        return int((e.w - e.pl - e.pr + gw) / (cw + gw))
-
-def cols2w(w, e): # Answer the col width for the give amount of colums
-    gw = e.gw
-    cw = e.css('cw', 0)
-    if cw + gw:
-        return int((e.w - e.pl - e.pr + gw) / (cw + gw))
-    
-def w2rows(w, e): # Answer the rounded amount of rows that fit in the given width.
-    gh = e.gh
-    ch = e.css('ch', 0)
-    if ch + gh:
-        return int((e.h - e.pt - e.pb + gh) / (ch + gh))
-
-def rows2w(w, e): # Answer the row width for the give amount of colums
-    gh = e.gh
-    ch = e.css('ch', 0)
-    if ch + gh:
-        return int((e.h - e.pt - e.pr + e.gw) / (cw + gw))
-    
-def w2cols(w, e): # Answer the rounded amount of columns that fit in the given width.
-    gw = e.gw
-    cw = e.css('cw', 0)
-    if cw + gw:
-        return int((e.w - e.pl - e.pr + e.gw) / (cw + gw))
-
-def cols2w(w, e): # Answer the col with for the give amount of colums
-    gw = e.gw
-    cw = e.css('cw', 0)
-    if cw + gw:
-        return int((e.w - e.pl - e.pr + e.gw) / (cw + gw))
-"""    
+# Number of cols, rows
+
+def w2cols(w, e):
+    u"""Answer the amount of whole columns that fit in width w, using the column width and gutter of e.
+
+    >>> from pagebot.elements import Element
+    >>> e = Element(cw=50, gw=10)
+    >>> w2cols(300, e), cols2w(5, e)
+    (5, 290)
+    """
+    cw, gw = e.getGridUnits()[:2]
+    cw = cw or 0
+    if cw + gw: # Check on division by 0
+        return int((w + gw) / (cw + gw))
+    return 0
+
+def cols2w(cols, e):
+    u"""Answer the width of the amount of columns, including the gutters between them."""
+    cw, gw = e.getGridUnits()[:2]
+    return cols * ((cw or 0) + gw) - gw
+
+def h2rows(h, e):
+    u"""Answer the amount of whole rows that fit in height h, using the row height and gutter of e.
+
+    >>> from pagebot.elements import Element
+    >>> e = Element(ch=40, gh=10)
+    >>> h2rows(200, e), rows2h(4, e)
+    (4, 190)
+    """
+    _, _, ch, gh = e.getGridUnits()[:4]
+    ch = ch or 0
+    if ch + gh: # Check on division by 0
+        return int((h + gh) / (ch + gh))
+    return 0
+
+def rows2h(rows, e):
+    u"""Answer the height of the amount of rows, including the gutters between them."""
+    _, _, ch, gh = e.getGridUnits()[:4]
+    return rows * ((ch or 0) + gh) - gh
 
 # Size
 
 def w2cw(w, e):
     u"""Transform from *w* value to column *w* count value, using the *e.css('cw')* (column width) 
     as column measure."""
-    gw = e.gw
-    cw = e.css('cw', 0)
+    cw, gw = e.getGridUnits()[:2]
+    cw = cw or 0
     if cw + gw: # Test for division by 0
         return (w + gw) / (cw + gw)
     return 0 # Undefined, not info about column width and gutter or zero division
@@ -176,15 +187,15 @@ def cw2w(cw, e):
     if cw is None:
         w = 0
     else:
-        gw = e.gw
-        w = cw * (e.css('cw', 0) + gw) - gw  # Overwrite style from here.
+        columnWidth, gw = e.getGridUnits()[:2]
+        w = cw * ((columnWidth or 0) + gw) - gw  # Overwrite style from here.
     return w
 
 def h2ch(h, e):
     u"""Transform from *h* value to column *w* count value, using the *e.css('ch')* (column height) 
     as column measure."""
-    gh = e.gh
-    ch = e.css('ch', 0)
+    _, _, ch, gh = e.getGridUnits()[:4]
+    ch = ch or 0
     if ch + gh: # Test for division by 0
         return (h + gh) / (ch + gh)
     return 0 # Undefined, no info about column height and gutter or zero division
@@ -195,8 +206,8 @@ def ch2h(ch, e):
     if ch is None:
         h = 0
     else:
-        gh = e.gh
-        h = ch * (e.css('ch', 0) + gh) - gh  # Overwrite style from here.
+        _, _, rowHeight, gh = e.getGridUnits()[:4]
+        h = ch * ((rowHeight or 0) + gh) - gh  # Overwrite style from here.
     return h
 
 def d2cd(d, e):
@@ -276,10 +287,17 @@ class Shadow(object):
 
 def deepFind(elements, name=None, pattern=None, result=None):
     u"""Perform a dynamic deep find for all elements with the *name*. Don't include self.
-    Either *name* or *pattern* should be defined, otherwise an error is raised."""
+    Either *name* or *pattern* should be defined, otherwise an error is raised.
+    If the elements are in a document, then its element index answers the result,
+    in the same depth-first order."""
     assert name or pattern
     if result is None:
         result = []
+    if elements:
+        doc = elements[0].doc
+        if doc is not None:
+            result += doc.getElementIndex().findElements(elements, name=name, pattern=pattern)
+            return result
     for e in elements:
         if pattern is not None and pattern in e.name: # Simple pattern match
             result.append(e)
@@ -18,6 +18,8 @@ from pagebot.conditions.condition import Condition
 
 class SolveBlock(Condition):
 	u"""Used as a condition in the sequence of conditions, to fix the block of child elements first."""
+	isIncremental = False # Solves the child elements, that did not solve yet.
+
 	def evaluate(self, e, score):
 		for child in e.elements:
 			child.evaluate(score)
@@ -48,6 +50,9 @@ class Fit(Condition):
 	def _getConditions(self):
 		return [Left2Left, Top2Top, Fit2Right, Fit2Bottom]
 
+	def test(self, e):
+		return self.testAll(e, self._getConditions())
+
 	def evaluate(self, e, score):
 		u"""Fit the element on all paddings of the parent. First align left and top,
 		then fit right and bottom. This order to avoid that element temporary
@@ -74,6 +79,9 @@ class Fit2Sides(Condition):
 	def _getConditions(self):
 		return [Left2LeftSide, Top2TopSide, Fit2RightSide, Fit2BottomSide]
 
+	def test(self, e):
+		return self.testAll(e, self._getConditions())
+
 	def evaluate(self, e, score):
 		self.evaluateAll(e, self._getConditions(), score)
 
@@ -273,6 +281,9 @@ class Shrink(Condition):
 	def _getConditions(self):
 		return [Left2Left, Top2Top, Fit2Right, Fit2Bottom]
 
+	def test(self, e):
+		return self.testAll(e, self._getConditions())
+
 	def evaluate(self, e, score):
 		u"""Fit the element on all margins of the parent. First align left and top,
 		then fit right and bottom. This order to avoid that element temporary
@@ -289,6 +300,9 @@ class Shrink2BlockSides(Condition):
 	def _getConditions(self):
 		return [Shrink2BlockLeftSide, Shrink2BlockTopSide, Shrink2BlockRightSide, Shrink2BlockBottomSide]
 
+	def test(self, e):
+		return self.testAll(e, self._getConditions())
+
 	def evaluate(self, e, score):
 		self.evaluateAll(e, self._getConditions(), score)
 
@@ -14,12 +14,22 @@
 #     condition.py
 #       
 class Condition(object):
+    # Set to False by conditions that read more than the element, its parent and its siblings.
+    # Elements with such a condition are solved again by every Element.solve( ).
+    isIncremental = True
+
     def __init__(self, value=1, tolerance=1, error=-10, verbose=False):
     	self.value = value # Value to answer if the condition is valid
         self.tolerance = tolerance
         self.error = error
         self.verbose = verbose
 
+    def test(self, e):
+        u"""Answer the boolean flag if the condition is valid for element e. Inheriting
+        classes redefine this method. Conditions that cannot be tested, should set
+        isIncremental to False, so their elements are solved again by every Element.solve( )."""
+        return False
+
     def evaluate(self, e, score):
         u"""Answer the value between 0 and 1 to the level where the element
         is left aligned with the left margin of the parent."""
@@ -38,6 +48,12 @@ class Condition(object):
     	for conditionClass in conditions:
     		conditionClass(self.value, self.tolerance, self.error, self.verbose).evaluate(e, score)
 
+    def testAll(self, e, conditions):
+        for conditionClass in conditions:
+            if not conditionClass(self.value, self.tolerance, self.error, self.verbose).test(e):
+                return False
+        return True
+
     def solveAll(self, e, conditions, score):
     	result = 0
     	for conditionClass in conditions:
@@ -33,6 +33,8 @@ class Overflow2Next(Condition):
 	>>> #e1.isOverflow()
 	#True
 	"""
+	isIncremental = False # Overflow is placed in elements on other pages.
+
 	def test(self, e):
 		return e.isOverflow(self.tolerance)
 
@@ -14,9 +14,70 @@
 #     score.py
 #       
 class Score(object):
-    def __init__(self):
+    u"""Total result of solving the conditions of elements. Skipped is the amount of elements
+    that did not need to be solved again, as nothing changed since their last solve.
+    Iterations is the amount of solving passes. Converged is None for a single pass, otherwise
+    True if the last pass did not move any element more than the tolerance. Oscillating is True
+    if iterating stopped because the layout returned to a previous state. If profile is True,
+    the amount of calls and the cumulative time in seconds are kept for every condition class.
+
+    >>> score = Score(profile=True)
+    >>> score
+    Score: 0 Fails: 0
+    >>> score.skipped = 2
+    >>> score
+    Score: 0 Fails: 0 Skipped: 2
+    >>> score.iterations = 3
+    >>> score.converged = True
+    >>> score
+    Score: 0 Fails: 0 Skipped: 2 Iterations: 3 Converged
+    >>> from pagebot.conditions import Left2Left
+    >>> score.addConditionCall(Left2Left(), 0.25)
+    >>> score.addConditionCall(Left2Left(), 0.5)
+    >>> score.conditionCalls['Left2Left'], score.conditionTimes['Left2Left']
+    (2, 0.75)
+    >>> score.getConditionReport()
+    ['Left2Left calls: 2 time: 0.7500']
+    """
+    def __init__(self, profile=False):
         self.result = 0
         self.fails = []
+        self.skipped = 0
+        self.iterations = 0
+        self.converged = None # None if not iterating to a fixed point.
+        self.oscillating = False
+        self.maxMove = None # Largest move of an element in the last iteration.
+        self.time = 0 # Cumulative solving time in seconds.
+        self.profile = profile # If True, the solve calls of conditions are counted and timed.
+        self.conditionCalls = {} # Condition class name --> amount of solve calls
+        self.conditionTimes = {} # Condition class name --> cumulative seconds
 
     def __repr__(self):
-        return 'Score: %s Fails: %d' % (self.result, len(self.fails))
+        s = 'Score: %s Fails: %d' % (self.result, len(self.fails))
+        if self.skipped:
+            s += ' Skipped: %d' % self.skipped
+        if self.converged is not None:
+            s += ' Iterations: %d' % self.iterations
+            if self.converged:
+                s += ' Converged'
+            elif self.oscillating:
+                s += ' Oscillating'
+        return s
+
+    def addConditionCall(self, condition, t):
+        u"""Count the solve call of condition, that took t seconds."""
+        name = condition.__class__.__name__
+        self.conditionCalls[name] = self.conditionCalls.get(name, 0) + 1
+        self.conditionTimes[name] = self.conditionTimes.get(name, 0) + t
+
+    def getConditionReport(self):
+        u"""Answer the list of lines with calls and time for each condition class, slowest first."""
+        report = []
+        for name, t in sorted(self.conditionTimes.items(), key=lambda item: (-item[1], item[0])):
+            report.append('%s calls: %d time: %0.4f' % (name, self.conditionCalls[name], t))
+        return report
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -0,0 +1,300 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     solver.py
+#
+#     Repeat solving passes over element trees, until the layout does not move
+#     anymore, the maximum amount of iterations is reached or the layout
+#     oscillates between states that were seen before.
+#     Pages without cross-page flows can be solved in parallel by forked
+#     worker processes, that send the changed positions and sizes back.
+#
+from __future__ import division
+from time import time
+import multiprocessing
+
+from pagebot.style import XXXL
+from pagebot.conditions.score import Score
+
+DEFAULT_SOLVE_TOLERANCE = 1 # Same default as the tolerance of conditions.
+
+def getSolveState(roots):
+    u"""Answer the list with (x, y, w, h) style values of all elements in the trees of roots,
+    in depth-first order. These are the values that conditions change.
+
+    >>> from pagebot.elements import Element
+    >>> e = Element(x=10, y=20, w=30, h=40, elements=[Element(x=1, y=2, w=3, h=4)])
+    >>> getSolveState([e])
+    [(10, 20, 30, 40), (1, 2, 3, 4)]
+    """
+    state = []
+    for root in roots:
+        _addSolveState(root, state)
+    return state
+
+def _addSolveState(e, state):
+    style = e.style
+    state.append((style.get('x'), style.get('y'), style.get('w'), style.get('h')))
+    for child in e.elements:
+        _addSolveState(child, state)
+
+def getMaxMove(state0, state1):
+    u"""Answer the largest difference between the values of two solve states. Answer XXXL
+    if the states cannot be compared, e.g. when elements were added or removed.
+
+    >>> getMaxMove([(0, 0, 10, 10)], [(2, 0, 7, 10)])
+    3
+    >>> getMaxMove([(0, 0, 10, None)], [(0, 0, 10, None)])
+    0
+    >>> getMaxMove([(0, 0, 10, 10)], []) == XXXL
+    True
+    """
+    if len(state0) != len(state1):
+        return XXXL
+    maxMove = 0
+    for values0, values1 in zip(state0, state1):
+        if values0 == values1:
+            continue
+        for v0, v1 in zip(values0, values1):
+            if v0 != v1:
+                if not isinstance(v0, (int, long, float)) or not isinstance(v1, (int, long, float)):
+                    return XXXL
+                maxMove = max(maxMove, abs(v1 - v0))
+    return maxMove
+
+def getStateKey(state, tolerance):
+    u"""Answer a hashable key of the state, with values rounded to the tolerance, so states
+    that only differ within the tolerance get the same key.
+
+    >>> getStateKey([(10, 20, None, 40)], 2) == getStateKey([(10.4, 20.6, None, 40)], 2)
+    True
+    """
+    if not tolerance:
+        return hash(tuple(state))
+    key = []
+    for values in state:
+        for v in values:
+            if isinstance(v, (int, long, float)):
+                v = int(round(v/tolerance))
+            key.append(v)
+    return hash(tuple(key))
+
+def solveIterative(roots, solvePass, score, maxIterations=1, tolerance=DEFAULT_SOLVE_TOLERANCE, profile=False):
+    u"""Call solvePass(score) until no element of the trees in roots moves more than tolerance,
+    with a maximum of maxIterations passes. If the layout comes back to a state that was seen
+    before, it will not converge, and solving stops with score.oscillating set to True.
+    The single pass (maxIterations == 1) does not compare states. Each pass gets its own Score,
+    the result, fails and skipped of the last pass are added to score, as that is the layout
+    that remains. If profile is True (or score.profile already is), the calls and times of the
+    conditions are collected and added for all passes. Answer the score.
+
+    >>> from pagebot.conditions.score import Score
+    >>> from pagebot.elements import Element
+    >>> e = Element(x=0)
+    >>> def moveHalfway(score): # Move e halfway to 100, converges slowly.
+    ...     e.x += (100 - e.x) / 2
+    >>> score = solveIterative([e], moveHalfway, Score(), maxIterations=20, tolerance=1)
+    >>> score.iterations, score.converged, int(e.x)
+    (7, True, 99)
+    >>> def flipFlop(score): # Oscillates between 0 and 100
+    ...     e.x = 100 - e.x
+    >>> score = solveIterative([e], flipFlop, Score(), maxIterations=20)
+    >>> score.iterations, score.converged, score.oscillating
+    (2, False, True)
+    >>> def flipFlopFail(score): # Fails in every pass
+    ...     e.x = 100 - e.x
+    ...     score.result -= 10
+    ...     score.fails.append(('Condition', e))
+    >>> solveIterative([e], flipFlopFail, Score(), maxIterations=10)
+    Score: -10 Fails: 1 Iterations: 2 Oscillating
+    """
+    t = time()
+    if profile:
+        score.profile = True
+    if maxIterations <= 1:
+        solvePass(score)
+        score.iterations += 1
+        score.time += time() - t
+        return score
+    state = getSolveState(roots)
+    seen = set([getStateKey(state, tolerance)])
+    score.converged = False
+    result, fails, skipped = score.result, score.fails, score.skipped
+    for _ in range(maxIterations):
+        passScore = Score(score.profile)
+        solvePass(passScore)
+        score.result = result + passScore.result
+        score.fails = fails + passScore.fails
+        score.skipped = skipped + passScore.skipped
+        for name, calls in passScore.conditionCalls.items():
+            score.conditionCalls[name] = score.conditionCalls.get(name, 0) + calls
+            score.conditionTimes[name] = score.conditionTimes.get(name, 0) + passScore.conditionTimes[name]
+        score.iterations += 1
+        newState = getSolveState(roots)
+        score.maxMove = getMaxMove(state, newState)
+        if score.maxMove <= tolerance:
+            score.converged = True
+            break
+        key = getStateKey(newState, tolerance)
+        if key in seen: # Been here before, solving will loop.
+            score.oscillating = True
+            break
+        seen.add(key)
+        state = newState
+    score.time += time() - t
+    return score
+
+#   P A R A L L E L  P A G E S
+
+SOLVE_KEYS = ('x', 'y', 'w', 'h')
+
+# Pages to solve by the worker processes. Set before the pool is created, so forked workers
+# inherit the pages in memory, instead of pickling the element trees.
+_parallelPages = []
+_parallelProfile = False # Set to score.profile, so the workers collect the condition calls and times.
+
+def getPageElements(page):
+    u"""Answer the depth-first list of page and all its descendants, in the same order as
+    getSolveState."""
+    elements = []
+    _addPageElements(page, elements)
+    return elements
+
+def _addPageElements(e, elements):
+    elements.append(e)
+    for child in e.elements:
+        _addPageElements(child, elements)
+
+def isPageLocal(page):
+    u"""Answer True if no element on the page flows to or from another page, so solving
+    the page only reads and changes the page itself.
+
+    >>> from pagebot.elements import Element
+    >>> page = Element(elements=[Element(), Element()])
+    >>> isPageLocal(page)
+    True
+    >>> page.elements[1].nextPage = 'page2'
+    >>> isPageLocal(page)
+    False
+    """
+    for e in getPageElements(page):
+        if e.nextPage is not None or e.prevPage is not None:
+            return False
+    return True
+
+def _solvePageWorker(pageIndex):
+    u"""Solve the page in the worker process. Answer the changed solve state values as
+    (elementIndex, values) tuples and the partial score, or None if the element tree of the
+    page changed, so the main process has to solve the page itself. The fails of the score
+    are (elementIndex, conditionIndex, condition) tuples, where conditionIndex is the index
+    in e.conditions, or None if the condition is a sub-condition of a condition in the list,
+    that is sent along as copy.
+
+    >>> from pagebot.conditions.condition import Condition
+    >>> from pagebot.elements import Element
+    >>> class Never(Condition):
+    ...     def test(self, e):
+    ...         return False
+    ...     def solve(self, e, score):
+    ...         self.addScore(False, e, score)
+    >>> class AllNever(Condition):
+    ...     def test(self, e):
+    ...         return False
+    ...     def solve(self, e, score):
+    ...         self.solveAll(e, [Never], score)
+    >>> _parallelPages[:] = [Element(w=100, h=100, elements=[Element(conditions=[Never(), AllNever()])])]
+    >>> _, _, fails, _, _, _ = _solvePageWorker(0)
+    >>> [(elementIndex, conditionIndex, condition.__class__.__name__) for elementIndex, conditionIndex, condition in fails]
+    [(1, 0, 'NoneType'), (1, None, 'Never')]
+    >>> del _parallelPages[:]
+    """
+    page = _parallelPages[pageIndex]
+    elements = getPageElements(page)
+    state = getSolveState([page])
+    score = Score(_parallelProfile)
+    page._solvePass(score)
+    if getPageElements(page) != elements:
+        return None
+    changes = []
+    for index, (values0, values1) in enumerate(zip(state, getSolveState([page]))):
+        if values0 != values1:
+            changes.append((index, values1))
+    indices = dict([(id(e), index) for index, e in enumerate(elements)])
+    fails = []
+    for condition, e in score.fails:
+        if id(e) not in indices: # Not an element of the page, cannot be found by the main process.
+            continue
+        conditionIndices = [id(c) for c in e.conditions or ()]
+        if id(condition) in conditionIndices:
+            fails.append((indices[id(e)], conditionIndices.index(id(condition)), None))
+        else: # Sub-condition, e.g. of Fit, made while solving.
+            fails.append((indices[id(e)], None, condition))
+    return (changes, score.result, fails, score.skipped, score.conditionCalls, score.conditionTimes)
+
+def solvePagesParallel(pages, score, processes=None):
+    u"""Solve the list of pages in a pool of processes (default is the amount of CPUs).
+    Pages that are not isPageLocal are solved first in the main process, in page order,
+    as their flows can change other pages. The other pages are distributed over the workers
+    in chunks. The changed x, y, w and h of their elements are set in the main process.
+    Solved pages are not remembered as settled, so they are solved again on the next
+    incremental solve. Answer the score.
+    """
+    global _parallelPages, _parallelProfile
+    localPages = []
+    for page in pages:
+        if isPageLocal(page):
+            localPages.append(page)
+        else:
+            page._solvePass(score)
+    if len(localPages) < 2 or processes == 1:
+        for page in localPages:
+            page._solvePass(score)
+        return score
+    _parallelPages = localPages
+    _parallelProfile = score.profile
+    pool = multiprocessing.Pool(processes)
+    try:
+        chunkSize = max(1, len(localPages) // (4 * (processes or multiprocessing.cpu_count())))
+        results = pool.map(_solvePageWorker, range(len(localPages)), chunkSize)
+    finally:
+        pool.close()
+        pool.join()
+        _parallelPages = []
+        _parallelProfile = False
+    for page, result in zip(localPages, results):
+        if result is None: # Element tree changed in the worker, solve it here instead.
+            page._solvePass(score)
+            continue
+        changes, scoreResult, fails, skipped, conditionCalls, conditionTimes = result
+        elements = getPageElements(page)
+        for index, values in changes:
+            style = elements[index].style
+            for key, value in zip(SOLVE_KEYS, values):
+                if style.get(key) != value:
+                    style[key] = value
+        score.result += scoreResult
+        for index, conditionIndex, condition in fails:
+            e = elements[index]
+            if conditionIndex is not None:
+                condition = e.conditions[conditionIndex]
+            score.fails.append((condition, e))
+        score.skipped += skipped
+        for name, calls in conditionCalls.items():
+            score.conditionCalls[name] = score.conditionCalls.get(name, 0) + calls
+            score.conditionTimes[name] = score.conditionTimes.get(name, 0) + conditionTimes[name]
+    return score
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -24,6 +24,8 @@ from pagebot.conditions.condition import Condition
 
 class Overflow2Next(Condition):
 	u"""If there is overflow in the element, then try to solve it."""
+	isIncremental = False # Overflow is placed in elements on other pages.
+
 	def test(self, e):
 		return e.isOverflow(self.tolerance)
 
@@ -15,6 +15,7 @@
 #
 import os
 from htmlcontext import HtmlContext
+from measurecontext import MeasureContext
 
 try:
     #import ForceImportError # Uncomment for simulate testing of other contexts/platforms
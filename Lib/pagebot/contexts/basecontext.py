@@ -24,6 +24,7 @@ class BaseContext(object):
     # In case of specific builder addressing, callers can check here.
     isDrawBot = False
     isFlat = False
+    isMeasure = False
 
     # To be redefined by inheriting context classes.
     STRING_CLASS = None
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     assetpipeline.py
+#
+#     Publish the asset files of a website (images, fonts, scripts) under names
+#     with the hash of their content, so browsers can cache them forever. An
+#     asset is only linked or copied into the site folder if there is no file
+#     with the same content yet, so building the site again does not copy the
+#     unchanged assets. The content of imported CSS, JS and HTML files is kept
+#     in memory until the modification time of the file changes.
+#     Images can be published as responsive derivatives, resized copies for a
+#     set of widths, for the srcset of img tags. Derivatives are named by the
+#     hash of the source image, so they are encoded once, by a pool of worker
+#     processes, and reused by the next builds of the site.
+#
+import os
+import re
+import codecs
+import shutil
+import tempfile
+import multiprocessing
+
+from pagebot.contexts.builders.flatbuilder import flatBuilder
+from pagebot.toolbox.imagecache import getSourceHash
+from pagebot.toolbox.imagesize import getImageInfo
+
+# Default folder of the published assets in the site folder.
+ASSET_FOLDER = 'assets/'
+
+# Default widths in pixels and JPEG quality of the responsive image derivatives.
+SRCSET_WIDTHS = (320, 640, 960, 1280, 1920)
+SRCSET_QUALITY = 80
+
+# Image formats that can be decoded and encoded as derivatives, with the extension of the derivatives.
+SRCSET_EXTENSIONS = {'.jpg': '.jpg', '.jpeg': '.jpg', '.png': '.png'}
+
+# url(...) references in CSS.
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+# Content of imported files by absolute path, as (mtime, size, content).
+FILE_CONTENTS = {}
+
+def readCachedFile(path):
+    u"""Answer the UTF-8 content of the file at path. The content is read once and kept until
+    the modification time or size of the file changes.
+
+    >>> readCachedFile(__file__) is readCachedFile(__file__)
+    True
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    cached = FILE_CONTENTS.get(path)
+    if cached is None or cached[:2] != (stat.st_mtime, stat.st_size):
+        f = codecs.open(path, 'r', 'utf-8')
+        cached = FILE_CONTENTS[path] = stat.st_mtime, stat.st_size, f.read()
+        f.close()
+    return cached[2]
+
+def isLocalReference(url):
+    u"""Answer the boolean flag if the url refers to a local file, not to a website, an absolute
+    path on the server or inline data.
+
+    >>> isLocalReference('images/logo.png'), isLocalReference('https://pagebot.io/logo.png')
+    (True, False)
+    >>> isLocalReference('data:image/png;base64,AAAA'), isLocalReference('/logo.png')
+    (False, False)
+    """
+    return not (url.startswith('/') or url.startswith('#') or url.startswith('data:') or '://' in url)
+
+def syncFolder(srcPath, dstPath):
+    u"""Make the folder dstPath a copy of the folder srcPath, only copying the files that are new
+    or changed by size or modification time, and removing the files that are not in srcPath.
+    Answer the (copied, removed) amounts of files.
+
+    >>> src = tempfile.mkdtemp()
+    >>> dst = tempfile.mkdtemp() + '/site'
+    >>> f = open(src + '/index.html', 'w'); f.write('<html/>'); f.close()
+    >>> syncFolder(src, dst)
+    (1, 0)
+    >>> syncFolder(src, dst)
+    (0, 0)
+    >>> os.remove(src + '/index.html')
+    >>> syncFolder(src, dst)
+    (0, 1)
+    """
+    copied = removed = 0
+    for folderPath, folderNames, fileNames in os.walk(srcPath):
+        dstFolderPath = os.path.join(dstPath, os.path.relpath(folderPath, srcPath))
+        if not os.path.exists(dstFolderPath):
+            os.makedirs(dstFolderPath)
+        for fileName in fileNames:
+            src = os.path.join(folderPath, fileName)
+            dst = os.path.join(dstFolderPath, fileName)
+            if os.path.exists(dst):
+                srcStat = os.stat(src)
+                dstStat = os.stat(dst)
+                if srcStat.st_size == dstStat.st_size and int(srcStat.st_mtime) == int(dstStat.st_mtime):
+                    continue
+            shutil.copy2(src, dst)
+            copied += 1
+    for folderPath, folderNames, fileNames in os.walk(dstPath, topdown=False):
+        srcFolderPath = os.path.join(srcPath, os.path.relpath(folderPath, dstPath))
+        for fileName in fileNames:
+            if not os.path.exists(os.path.join(srcFolderPath, fileName)):
+                os.remove(os.path.join(folderPath, fileName))
+                removed += 1
+        if not os.path.exists(srcFolderPath) and not os.listdir(folderPath):
+            os.rmdir(folderPath)
+    return copied, removed
+
+def getSrcsetWidths(iw, widths=SRCSET_WIDTHS):
+    u"""Answer the sorted list of derivative widths of an image that is iw pixels wide. Images are
+    never enlarged: widths larger than the image are replaced by the width of the image.
+
+    >>> getSrcsetWidths(1000, (320, 640, 960, 1280, 1920))
+    [320, 640, 960, 1000]
+    >>> getSrcsetWidths(300, (320, 640))
+    [300]
+    """
+    srcsetWidths = set()
+    for w in widths:
+        srcsetWidths.add(min(w, iw))
+    return sorted(srcsetWidths)
+
+def encodeImageDerivatives(job):
+    u"""Encode the derivatives of the (path, derivatives, quality) job, where derivatives is the
+    list of (w, targetPath) from large to small. The image is decoded once and resized down
+    for each next width. Derivatives are written through a temporary file, so a published
+    derivative is never incomplete. Answer the amount of written derivatives."""
+    path, derivatives, quality = job
+    image = flatBuilder.image.open(path).decompress() # Rotated by the orientation of the JPEG.
+    iw, ih = image.width, image.height
+    for w, targetPath in derivatives:
+        image.resize(w, max(1, int(round(ih * w / float(iw)))))
+        folder = os.path.dirname(targetPath)
+        if not os.path.exists(folder):
+            try:
+                os.makedirs(folder)
+            except OSError: # Created by another process.
+                pass
+        fd, tmpPath = tempfile.mkstemp(dir=folder)
+        os.close(fd)
+        if targetPath.endswith('.png'):
+            image.png(tmpPath)
+        else:
+            image.jpeg(tmpPath, quality)
+        os.chmod(tmpPath, 0644)
+        os.rename(tmpPath, targetPath)
+    return len(derivatives)
+
+class AssetPipeline(object):
+    u"""Publishes asset files into the folder of a website, named by the hash of their content.
+    Adding the path of a file answers the url of the published file, relative to the site folder.
+    References to added files in html attributes and imported CSS are changed to the published
+    names by the HtmlBuilder that uses the pipeline. The cssPrefix is the path from the folder of
+    the stylesheet to the site folder, for the url(...) references in CSS. The optional sources
+    are the (path, mtime, size) sources of the urls of a previous build (see getSources), so
+    unchanged files are not read again to get their hash.
+
+    >>> site = tempfile.mkdtemp() + '/'
+    >>> assets = AssetPipeline(site)
+    >>> url = assets.add(__file__)
+    >>> url.startswith('assets/assetpipeline.') and os.path.exists(site + url)
+    True
+    >>> assets.add(__file__) == url, assets.published, assets.skipped
+    (True, 1, 0)
+    >>> assets = AssetPipeline(site) # Next build of the site.
+    >>> assets.add(__file__) == url, assets.published, assets.skipped
+    (True, 0, 1)
+    >>> assets.getUrl(__file__) == url, assets.getUrl('index.html')
+    (True, 'index.html')
+    >>> assets = AssetPipeline(site, sources=assets.getSources())
+    >>> assets.add(__file__) == url, assets.hashed
+    (True, 0)
+    """
+    def __init__(self, sitePath, folder=ASSET_FOLDER, cssPrefix='../', sources=None):
+        if not sitePath.endswith('/'):
+            sitePath += '/'
+        self.sitePath = sitePath
+        self.folder = folder
+        self.cssPrefix = cssPrefix
+        self.urls = {} # Added path --> published url.
+        self.publishedUrls = set() # Urls of the files that are linked or copied into the site.
+        self.sources = {} # Published url --> (path, mtime, size) of the source file.
+        self.known = {} # (path, mtime, size) --> url of previous builds.
+        for url, source in (sources or {}).items():
+            if len(source) == 3: # Derivatives have (path, mtime, size, w) sources.
+                self.known[tuple(source)] = url
+        self.hashed = 0 # Amount of files that were read to get their hash.
+        self.used = set() # Urls of the added assets, cleared by the site build for each page.
+        self.published = 0 # Amount of files that were linked or copied.
+        self.skipped = 0 # Amount of files that were already published by a previous build.
+        self.srcsets = {} # (path, widths, quality) --> [(url, w), ...] of the image derivatives.
+        self.pending = [] # (path, derivatives, quality) jobs of derivatives to encode.
+        self.encoded = 0 # Amount of image derivatives that were encoded.
+
+    def __repr__(self):
+        return '[%s %s assets:%d published:%d skipped:%d]' % (self.__class__.__name__,
+            self.sitePath, len(self.urls), self.published, self.skipped)
+
+    def add(self, path, publish=True):
+        u"""Publish the file at path, if there is no file with the same content in the site yet.
+        Answer the url of the published file, relative to the site folder. If publish is False,
+        only answer the url, as name for the derivatives of the file."""
+        url = self.urls.get(path)
+        if url is None:
+            stat = os.stat(path)
+            source = os.path.abspath(path), stat.st_mtime, stat.st_size
+            url = self.known.get(source)
+            if url is None:
+                name, extension = os.path.splitext(os.path.basename(path))
+                url = '%s%s.%s%s' % (self.folder, name, getSourceHash(path)[:8], extension)
+                self.hashed += 1
+            self.urls[path] = url
+            self.sources[url] = source
+        if publish:
+            if not url in self.publishedUrls:
+                self._publish(path, self.sitePath + url)
+                self.publishedUrls.add(url)
+            self.used.add(url)
+        return url
+
+    def addImage(self, path, widths=SRCSET_WIDTHS, quality=SRCSET_QUALITY):
+        u"""Answer the list of (url, w) of the responsive derivatives of the image at path, for the
+        widths in pixels, from small to large. The derivatives are named after the hash of the
+        image, so derivatives of previous builds are reused. The missing ones are added to
+        self.pending, to be written by self.encodeImages( ). Answer None if the image cannot be
+        resized, as Flat is not installed or the format is not JPEG or PNG. Then use add(path)
+        to publish the original image.
+
+        >>> site = tempfile.mkdtemp() + '/'
+        >>> assets = AssetPipeline(site)
+        >>> assets.addImage(__file__) is None
+        True
+        """
+        key = path, tuple(widths), quality
+        srcset = self.srcsets.get(key)
+        if srcset is None:
+            extension = SRCSET_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+            info = getImageInfo(path)
+            if flatBuilder is None or extension is None or info is None:
+                return None
+            url = self.add(path, publish=False)
+            name = os.path.splitext(url)[0]
+            srcset = []
+            derivatives = []
+            for w in getSrcsetWidths(info[0], widths):
+                if extension == '.jpg':
+                    derivativeUrl = '%s-%dw-q%d%s' % (name, w, quality, extension)
+                else: # PNG is lossless, keeping the alpha channel.
+                    derivativeUrl = '%s-%dw%s' % (name, w, extension)
+                self.sources[derivativeUrl] = self.sources[url] + (w,)
+                if not os.path.exists(self.sitePath + derivativeUrl):
+                    derivatives.append((w, self.sitePath + derivativeUrl))
+                srcset.append((derivativeUrl, w))
+            if derivatives:
+                derivatives.reverse() # Resize from large to small.
+                self.pending.append((path, derivatives, quality))
+            self.srcsets[key] = srcset
+        for url, _ in srcset:
+            self.used.add(url)
+        return srcset
+
+    def addPending(self, jobs):
+        u"""Add the (path, derivatives, quality) jobs to self.pending, e.g. the pending jobs of the
+        pipelines of worker processes. Derivatives that are already pending are skipped, so each
+        derivative is encoded once.
+
+        >>> assets = AssetPipeline(tempfile.mkdtemp())
+        >>> assets.addPending([('a.jpg', [(480, '/site/a-480w.jpg'), (240, '/site/a-240w.jpg')], 80)])
+        >>> assets.addPending([('a.jpg', [(480, '/site/a-480w.jpg'), (240, '/site/a-240w.jpg')], 80),
+        ...     ('a.jpg', [(160, '/site/a-160w.jpg')], 80)])
+        >>> assets.pending
+        [('a.jpg', [(480, '/site/a-480w.jpg'), (240, '/site/a-240w.jpg')], 80), ('a.jpg', [(160, '/site/a-160w.jpg')], 80)]
+        """
+        targetPaths = set([targetPath for _, derivatives, _ in self.pending for _, targetPath in derivatives])
+        for path, derivatives, quality in jobs:
+            derivatives = [(w, targetPath) for w, targetPath in derivatives if not targetPath in targetPaths]
+            if derivatives:
+                self.pending.append((path, derivatives, quality))
+                targetPaths.update([targetPath for _, targetPath in derivatives])
+
+    def encodeImages(self, processes=None):
+        u"""Encode the pending image derivatives of self.addImage( ), by a pool of processes
+        (default the amount of CPUs), one image per job. Answer the amount of encoded derivatives."""
+        jobs = self.pending
+        self.pending = []
+        processes = min(len(jobs), processes or multiprocessing.cpu_count())
+        if processes > 1:
+            pool = multiprocessing.Pool(processes)
+            try:
+                counts = pool.map(encodeImageDerivatives, jobs, 1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            counts = [encodeImageDerivatives(job) for job in jobs]
+        self.encoded += sum(counts)
+        return sum(counts)
+
+    def getSources(self, urls=None):
+        u"""Answer the dictionary with the (path, mtime, size) source of the urls, default all
+        published urls, to be stored with the site. Image derivatives have (path, mtime, size, w)
+        sources."""
+        if urls is None:
+            urls = self.sources.keys()
+        return dict([(url, self.sources[url]) for url in urls])
+
+    def _publish(self, path, target):
+        u"""Hard link or copy the file at path to target, if it does not exist already."""
+        if os.path.exists(target): # Same name is same content.
+            self.skipped += 1
+            return
+        folder = os.path.dirname(target)
+        if not os.path.exists(folder):
+            try:
+                os.makedirs(folder)
+            except OSError: # Created by another process of a parallel build.
+                pass
+        try:
+            os.link(path, target)
+        except OSError: # Other file system, or already published by another process.
+            if os.path.exists(target):
+                self.skipped += 1
+                return
+            # Copy through a temporary file, so a published asset is never incomplete.
+            fd, tmpPath = tempfile.mkstemp(dir=folder)
+            os.close(fd)
+            shutil.copy2(path, tmpPath) # Keep the mode, mkstemp files are only readable by the owner.
+            os.rename(tmpPath, target)
+        self.published += 1
+
+    def getUrl(self, reference):
+        u"""Answer the published url of the added file reference. Answer the reference unchanged
+        if it was not added."""
+        url = self.urls.get(reference)
+        if url is None:
+            return reference
+        self.used.add(url)
+        return url
+
+    def rewriteCss(self, css, path, prefix=None):
+        u"""Answer the css of the file at path, where the url(...) references to local files are
+        published and changed to their url, with prefix (default self.cssPrefix) as path from the
+        stylesheet to the site folder.
+
+        >>> site = tempfile.mkdtemp() + '/'
+        >>> assets = AssetPipeline(site)
+        >>> fileName = os.path.basename(__file__)
+        >>> css = assets.rewriteCss('body {background: url("%s")}' % fileName, __file__)
+        >>> css == 'body {background: url("../%s")}' % assets.urls[os.path.abspath(__file__)]
+        True
+        >>> assets.rewriteCss('a {background: url(https://pagebot.io/a.png)}', __file__)
+        'a {background: url(https://pagebot.io/a.png)}'
+        """
+        if prefix is None:
+            prefix = self.cssPrefix
+        folder = os.path.dirname(os.path.abspath(path))
+        def rewrite(match):
+            quote, reference = match.groups()
+            if isLocalReference(reference):
+                referencePath = os.path.join(folder, reference.split('?')[0].split('#')[0])
+                if os.path.isfile(referencePath):
+                    reference = prefix + self.add(referencePath)
+            return 'url(%s%s%s)' % (quote, reference, quote)
+        return CSS_URL.sub(rewrite, css)
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -11,6 +11,8 @@
 #     Supporting usage of Flat, https://github.com/xxyxyz/flat
 # -----------------------------------------------------------------------------
 #
+import copy
+
 class BuildInfo(object):
     u"""Container with builder flags and data, as stored in elements, to guide conditional 
     e.build( ) and e.buildCss( ) and e.buildFlat( ) calls.
@@ -46,3 +48,23 @@ class BuildInfo(object):
             assert hasattr(self, name) # Check only to set attributes that are supported by default value.
             setattr(self, name, value)
 
+    def __deepcopy__(self, memo):
+        u"""Answer a copy of self, only copying the values that can be changed in place, as 
+        Element.copy( ) copies the info of every element.
+
+        >>> info = BuildInfo(title='Title')
+        >>> info2 = copy.deepcopy(info)
+        >>> info2.title, info2.webFonts == info.webFonts, info2.webFonts is info.webFonts
+        ('Title', True, False)
+        """
+        info = self.__class__.__new__(self.__class__)
+        for name, value in self.__dict__.items():
+            if isinstance(value, (list, dict, set)):
+                value = copy.deepcopy(value, memo)
+            info.__dict__[name] = value
+        return info
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
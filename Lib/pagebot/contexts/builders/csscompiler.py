@@ -0,0 +1,390 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     csscompiler.py
+#
+#     Compile the CSS that is generated by the elements of a site into a single
+#     minified stylesheet. The CSS chunks of the whole build are parsed into
+#     rules. Declarations that are overridden by a later rule with the same
+#     selector are removed. Rules with identical declaration blocks are merged
+#     into one rule with a list of selectors, and rules with the same selectors
+#     are merged into one declaration block, as long as no rule between them
+#     sets the same properties, or a shorthand of them, so the cascade does not
+#     change. The output file is named by the hash of its content, for browser
+#     caching.
+#
+import os
+import re
+import hashlib
+
+WHITESPACE = re.compile(r'\s+')
+COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+
+ALL_FAMILIES = '*' # Family of the all property, that resets every other property.
+# Property family --> families of the other properties that a shorthand of the family also sets.
+SHORTHAND_FAMILIES = {
+    'all': (ALL_FAMILIES,),
+    'font': ('line',), # font resets line-height.
+    'inset': ('top', 'right', 'bottom', 'left'),
+    'place': ('align', 'justify'), # place-content, place-items, place-self
+    'gap': ('row', 'column', 'grid'), # row-gap, column-gap and the old grid-gap
+    'columns': ('column',),
+    'white': ('text',), # white-space sets text-wrap-mode.
+}
+
+def splitTopLevel(s, separator):
+    u"""Answer the list of parts of s, split by the separator character, outside parentheses
+    and quotes.
+
+    >>> splitTopLevel('a:not(.b, .c), d', ',')
+    ['a:not(.b, .c)', ' d']
+    >>> splitTopLevel('background: url("a;b.png"); color: red', ';')
+    ['background: url("a;b.png")', ' color: red']
+    """
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    for index, c in enumerate(s):
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth = max(0, depth - 1)
+        elif c == separator and not depth:
+            parts.append(s[start:index])
+            start = index + 1
+    parts.append(s[start:])
+    return parts
+
+def parseDeclarations(body):
+    u"""Answer the list of (property, value) tuples of the declaration block body. Whitespace
+    is collapsed. Declarations without a colon are kept as (declaration, None).
+
+    >>> parseDeclarations(' color : red;\\n\\tfont-size: 12px  !important; ')
+    [('color', 'red'), ('font-size', '12px !important')]
+    """
+    declarations = []
+    for declaration in splitTopLevel(body, ';'):
+        declaration = WHITESPACE.sub(' ', declaration).strip()
+        if not declaration:
+            continue
+        if ':' in declaration:
+            name, value = declaration.split(':', 1)
+            declarations.append((name.strip().lower(), value.strip()))
+        else:
+            declarations.append((declaration, None))
+    return declarations
+
+def isImportant(value):
+    u"""Answer the boolean flag if the declaration value ends with !important."""
+    return value is not None and value.replace(' ', '').lower().endswith('!important')
+
+def getPropertyFamily(name):
+    u"""Answer the family of the property name, that is used to test if rules can be moved.
+    Shorthand properties and their longhands share the family, e.g. margin and margin-top.
+
+    >>> getPropertyFamily('margin-top'), getPropertyFamily('-webkit-transition')
+    ('margin', 'webkit')
+    """
+    return name.lstrip('-').split('-')[0]
+
+def getPropertyFamilies(name):
+    u"""Answer the set of families of the properties that are set by the property name. For most
+    properties this is only its own family, but some shorthands also set properties of other
+    families, e.g. font sets line-height and inset sets top.
+
+    >>> sorted(getPropertyFamilies('margin-top')), sorted(getPropertyFamilies('font'))
+    (['margin'], ['font', 'line'])
+    >>> sorted(getPropertyFamilies('inset-inline'))
+    ['bottom', 'inset', 'left', 'right', 'top']
+    """
+    family = getPropertyFamily(name)
+    return set((family,) + SHORTHAND_FAMILIES.get(family, ()))
+
+class CssRule(object):
+    u"""Rule of a stylesheet, with the tuple of selectors and the list of (property, value)
+    declarations. Context is the prelude of the enclosing @media block, or None."""
+    def __init__(self, selectors, declarations, context=None):
+        self.selectors = selectors
+        self.declarations = declarations
+        self.context = context
+
+    def __repr__(self):
+        return '[%s %s%s]' % (self.__class__.__name__, ','.join(self.selectors), self.getBody())
+
+    def getBody(self):
+        u"""Answer the minified declaration block."""
+        declarations = []
+        for name, value in self.declarations:
+            if value is None:
+                declarations.append(name)
+            else:
+                declarations.append('%s:%s' % (name, value))
+        return '{%s}' % ';'.join(declarations)
+
+class CssAtBlock(object):
+    u"""At-rule with a block, such as @font-face or @keyframes, that is written as it is."""
+    def __init__(self, prelude, body):
+        self.prelude = prelude
+        self.body = body
+        self.context = None
+
+    def getBody(self):
+        return '{%s}' % self.body
+
+class CssCompiler(object):
+    u"""Collects the CSS of a whole site build, and compiles it to a single minified stylesheet.
+    The compiler has a write method, so it can be used as CSS output sink of the HtmlBuilder.
+
+    >>> compiler = CssCompiler()
+    >>> compiler.addCss('body {\\n\\tfont-size: 12px;\\n\\tcolor: #000;} /* Root */')
+    >>> compiler.addCss('.page {\\n\\tcolor: #222;} .textBox {\\n\\tcolor: #222;}')
+    >>> compiler.addCss('body {\\n\\tfont-size: 14px;} .page {color: #222;}')
+    >>> compiler.compile()
+    u'body{color:#000;font-size:14px}.textBox,.page{color:#222}'
+    >>> compiler
+    [CssCompiler rules:5->2 declarations:6->3 bytes:144->57]
+    >>> compiler.getFileName('css/pagebot.css')
+    'css/pagebot.3a4260ba.css'
+    """
+    def __init__(self):
+        self.imports = [] # @charset and @import statements, that are written first.
+        self.rules = [] # Parsed rules, in order of the CSS.
+        self._pending = u'' # CSS that is written, but not parsed, because the last rule is not complete.
+        self._compiled = None
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.rulesOut = 0
+        self.declarationsOut = 0
+
+    def __repr__(self):
+        return '[%s rules:%d->%d declarations:%d->%d bytes:%d->%d]' % (self.__class__.__name__,
+            self.rulesIn, self.rulesOut, self.declarationsIn, self.declarationsOut, self.bytesIn, self.bytesOut)
+
+    def _get_rulesIn(self):
+        return len(self.rules)
+    rulesIn = property(_get_rulesIn)
+
+    def _get_declarationsIn(self):
+        return sum([len(rule.declarations) for rule in self.rules if isinstance(rule, CssRule)])
+    declarationsIn = property(_get_declarationsIn)
+
+    def write(self, data):
+        u"""Add the UTF-8 CSS data, as written to the output sink of the HtmlBuilder. The data
+        can end in the middle of a rule."""
+        self.addCss(data.decode('utf-8'))
+
+    def addCss(self, css):
+        u"""Parse the complete rules of the css and add them. An incomplete last rule is kept
+        until the rest of it is added."""
+        self._compiled = None
+        self.bytesIn += len(css)
+        css = COMMENT.sub('', self._pending + css)
+        if '/*' in css: # Comment is not closed yet.
+            index = css.index('/*')
+            css, self._pending = css[:index], css[index:]
+        else:
+            self._pending = u''
+        index = self._parse(css)
+        self._pending = css[index:] + self._pending
+
+    def _parse(self, css, context=None):
+        u"""Parse the rules in css. Answer the index after the last complete rule."""
+        index = 0
+        while True:
+            start = css.find('{', index)
+            statement = css.find(';', index)
+            if 0 <= statement and (start < 0 or statement < start) and css[index:statement].strip().startswith('@'):
+                self.imports.append(WHITESPACE.sub(' ', css[index:statement]).strip() + ';')
+                index = statement + 1
+                continue
+            if start < 0:
+                break
+            # Find the end of the block, that can contain nested blocks for @media.
+            depth = 0
+            end = start
+            while end < len(css):
+                if css[end] == '{':
+                    depth += 1
+                elif css[end] == '}':
+                    depth -= 1
+                    if not depth:
+                        break
+                end += 1
+            if depth: # Incomplete block, wait for the rest.
+                break
+            prelude = WHITESPACE.sub(' ', css[index:start]).strip()
+            body = css[start+1:end]
+            if prelude.startswith('@media'):
+                self._parse(body, prelude)
+            elif prelude.startswith('@'):
+                self.rules.append(CssAtBlock(prelude, WHITESPACE.sub(' ', body).strip()))
+            elif prelude:
+                selectors = []
+                for selector in splitTopLevel(prelude, ','):
+                    selector = selector.strip()
+                    if selector and not selector in selectors:
+                        selectors.append(selector)
+                self.rules.append(CssRule(tuple(selectors), parseDeclarations(body), context))
+            index = end + 1
+        return index
+
+    def _removeOverridden(self, rules):
+        u"""Answer the rules without the declarations that are overridden by a later declaration of
+        the same property, for all selectors of the rule, in the same @media context. Rules that
+        get empty are removed."""
+        later = {} # (context, selector) --> set of properties that are declared later.
+        laterImportant = {} # (context, selector) --> same for !important declarations.
+        result = []
+        for rule in reversed(rules):
+            if not isinstance(rule, CssRule):
+                result.append(rule)
+                continue
+            keys = [(rule.context, selector) for selector in rule.selectors]
+            declarations = []
+            for name, value in reversed(rule.declarations):
+                important = isImportant(value)
+                if value is not None and keys and all([name in laterImportant.get(key, ()) or \
+                        (not important and name in later.get(key, ())) for key in keys]):
+                    continue # Overridden for all selectors.
+                declarations.append((name, value))
+                for key in keys:
+                    later.setdefault(key, set()).add(name)
+                    if important:
+                        laterImportant.setdefault(key, set()).add(name)
+            if declarations:
+                declarations.reverse()
+                result.append(CssRule(rule.selectors, declarations, rule.context))
+        result.reverse()
+        return result
+
+    def _mergeRules(self, rules):
+        u"""Answer the rules, where rules with the same declaration block or with the same selectors
+        in the same context are merged into the first one, if no rule after that one sets
+        properties of the same family. Otherwise the merge could change the cascade.
+
+        >>> compiler = CssCompiler()
+        >>> compiler.addCss('.a{line-height:2} .b{font:12px serif} .c{line-height:2}')
+        >>> compiler.compile()
+        u'.a{line-height:2}.b{font:12px serif}.c{line-height:2}'
+        >>> compiler = CssCompiler()
+        >>> compiler.addCss('.a{top:0} .b{inset:1px} .c{top:0} .d{all:unset} .a{color:red} .e{color:red}')
+        >>> compiler.compile()
+        u'.a{top:0}.b{inset:1px}.c{top:0}.d{all:unset}.a,.e{color:red}'
+        >>> compiler = CssCompiler()
+        >>> compiler.addCss('.a{color:red} .b{all:unset} .c{color:red} .d{margin:0} .e{margin:0}')
+        >>> compiler.compile()
+        u'.a{color:red}.b{all:unset}.c{color:red}.d,.e{margin:0}'
+        """
+        result = []
+        bodies = {} # (context, body) --> index of the rule in result.
+        selectors = {} # (context, selectors) --> index of the rule in result.
+        lastRules = {} # Property family --> index of the last rule in result that sets it.
+
+        def isMovable(families, index):
+            # Answer the boolean flag if no rule after index sets properties of the families.
+            if ALL_FAMILIES in families:
+                families = lastRules.keys()
+            else:
+                families = list(families) + [ALL_FAMILIES]
+            return all([lastRules.get(family, -1) <= index for family in families])
+
+        for rule in rules:
+            if not isinstance(rule, CssRule):
+                result.append(rule)
+                continue
+            body = rule.getBody()
+            families = set()
+            for name, _ in rule.declarations:
+                families.update(getPropertyFamilies(name))
+            index = bodies.get((rule.context, body))
+            if index is not None and isMovable(families, index):
+                merged = result[index]
+                del selectors[(merged.context, merged.selectors)]
+                merged.selectors += tuple([selector for selector in rule.selectors if not selector in merged.selectors])
+                selectors[(merged.context, merged.selectors)] = index
+                continue
+            index = selectors.get((rule.context, rule.selectors))
+            if index is not None and isMovable(families, index):
+                merged = result[index]
+                del bodies[(merged.context, merged.getBody())]
+                merged.declarations = merged.declarations + rule.declarations
+                bodies[(merged.context, merged.getBody())] = index
+            else:
+                index = len(result)
+                result.append(CssRule(rule.selectors, rule.declarations, rule.context))
+                bodies[(rule.context, body)] = index
+                selectors[(rule.context, rule.selectors)] = index
+            for family in families:
+                lastRules[family] = index
+        return result
+
+    def compile(self):
+        u"""Answer the compiled, minified CSS of all added rules."""
+        if self._compiled is None:
+            rules = self._mergeRules(self._removeOverridden(self.rules))
+            atBlocks = set()
+            output = []
+            self.rulesOut = 0
+            context = None
+            for rule in rules:
+                if isinstance(rule, CssAtBlock):
+                    css = rule.prelude + rule.getBody()
+                    if css in atBlocks: # Same @font-face imported twice.
+                        continue
+                    atBlocks.add(css)
+                else:
+                    css = ','.join(rule.selectors) + rule.getBody()
+                if rule.context != context:
+                    if context is not None:
+                        output.append('}')
+                    if rule.context is not None:
+                        output.append(rule.context + '{')
+                    context = rule.context
+                output.append(css)
+                self.rulesOut += 1
+            if context is not None:
+                output.append('}')
+            imports = []
+            for statement in self.imports:
+                if not statement in imports:
+                    imports.append(statement)
+            self._compiled = ''.join(imports + output)
+            self.declarationsOut = sum([len(rule.declarations) for rule in rules if isinstance(rule, CssRule)])
+            self.bytesOut = len(self._compiled)
+        return self._compiled
+
+    def getFileName(self, path):
+        u"""Answer the path, with the hash of the compiled CSS inserted before the extension."""
+        name, extension = os.path.splitext(path)
+        return '%s.%s%s' % (name, hashlib.sha1(self.compile().encode('utf-8')).hexdigest()[:8], extension)
+
+    def save(self, path):
+        u"""Write the compiled CSS to the fingerprinted file name of path. Answer the path of the
+        written file."""
+        path = self.getFileName(path)
+        f = open(path, 'wb')
+        f.write(self.compile().encode('utf-8'))
+        f.close()
+        return path
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -0,0 +1,163 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     flatpdfwriter.py
+#
+#     Write Flat pages to a PDF file one at a time, as soon as they are drawn,
+#     with the objects of the PDF serializer of Flat. Fonts and images are
+#     written once, when the first page uses them, and are shared by the next
+#     pages through the object table. Only the page tree and the cross-reference
+#     offsets are kept until the file is closed.
+#
+import os
+import hashlib
+try:
+    from flat import pdf as flatPdf
+except ImportError:
+    flatPdf = None
+
+HEADER = b'%PDF-1.3\n'
+
+# Reserved object numbers of the objects that are written when the file is closed.
+ROOT_TAG, INFO_TAG, PAGES_TAG = 1, 2, 3
+
+if flatPdf is not None:
+
+    class StreamingResources(flatPdf._document_resources):
+        u"""Resources of the Flat PDF serializer, where images are keyed by the hash of their
+        data instead of the data, so the data can be released after it is written."""
+
+        def image(self, image):
+            if isinstance(image.source, flatPdf.png):
+                data = image.source.idat()
+                flate = True
+            else:
+                data = image.jpeg()
+                flate = False
+            key = hashlib.sha1(data).digest()
+            if key not in self.images:
+                if key not in self.cache:
+                    setup = {
+                        b'Type': flatPdf.name(b'XObject'),
+                        b'Subtype': flatPdf.name(b'Image'),
+                        b'Width': flatPdf.number(image.width),
+                        b'Height': flatPdf.number(image.height),
+                        b'ColorSpace': flatPdf.name(
+                            b'DeviceGray' if image.kind == 'g' else \
+                            b'DeviceRGB' if image.kind == 'rgb' else b'DeviceCMYK'),
+                        b'BitsPerComponent': flatPdf.number(8),
+                        b'Filter': flatPdf.name(b'FlateDecode' if flate else b'DCTDecode'),
+                        b'Length': flatPdf.number(len(data))}
+                    if image.kind == 'cmyk':
+                        setup[b'Decode'] = flatPdf.array(map(flatPdf.number, [1, 0, 1, 0, 1, 0, 1, 0]))
+                    if flate:
+                        setup[b'DecodeParms'] = flatPdf.dictionary({
+                            b'Predictor': flatPdf.number(15),
+                            b'Colors': flatPdf.number(image.n),
+                            b'BitsPerComponent': flatPdf.number(8),
+                            b'Columns': flatPdf.number(image.width)})
+                    self.cache[key] = flatPdf._named_resource(
+                        b'I%d' % len(self.images), flatPdf.stream(0, setup, data))
+                self.images[key] = self.cache[key]
+            return self.images[key]
+
+class ObjectTag(object):
+    u"""Written object of the PDF, of which only the number is kept, to be referenced."""
+    def __init__(self, tag):
+        self.tag = tag
+
+class FlatPdfWriter(object):
+    u"""Writes the pages of a Flat document to the PDF file at path, page by page. Call addPage
+    for each page, when it is finished, and close( ) to write the page tree and the cross
+    reference table. The output is the same as the PDF of the complete Flat document, except
+    for the order of the objects in the file."""
+
+    def __init__(self, path, title='Untitled', bleed=False, cropmarks=False):
+        self.path = path
+        self.title = title
+        self.bleed = bleed
+        self.cropmarks = cropmarks
+        self.state = flatPdf._graphic_state()
+        self.resources = StreamingResources()
+        self.pagesReference = flatPdf.reference(ObjectTag(PAGES_TAG))
+        self.kids = [] # References to the written pages.
+        self.offsets = {} # File offset by object number.
+        self.nextTag = PAGES_TAG + 1
+        self.f = open(path, 'wb')
+        self.f.write(HEADER)
+        self.position = len(HEADER)
+
+    def __len__(self):
+        return len(self.kids)
+
+    def _write(self, o):
+        data = o.pdf() + b'\n'
+        self.offsets[o.tag] = self.position
+        self.f.write(data)
+        self.position += len(data)
+
+    def addPage(self, page):
+        u"""Write the Flat page, with the fonts and images it uses for the first time."""
+        self.state.reset()
+        self.resources.reset()
+        code = b'\n'.join(item.pdf(page.height, self.state, self.resources) for item in page.items)
+        if self.bleed or self.cropmarks:
+            prefix, postfix = flatPdf._page_fixes(self.bleed, self.cropmarks, page)
+            code = b'%s\n%s\n%s' % (prefix, code, postfix)
+        mediabox, bleedbox, trimbox = flatPdf._page_boxes(self.bleed, self.cropmarks, page)
+        content = flatPdf.stream(0, {b'Length': flatPdf.number(len(code))}, code)
+        kid = flatPdf.obj(0, flatPdf.dictionary({
+            b'Type': flatPdf.name(b'Page'),
+            b'Parent': self.pagesReference,
+            b'MediaBox': mediabox,
+            b'BleedBox': bleedbox,
+            b'TrimBox': trimbox,
+            b'Resources': self.resources.references(),
+            b'Contents': flatPdf.reference(content)}))
+        # New resources still have number 0. Number all objects before writing, as they refer to each other.
+        objects = [o for o in self.resources.objects() if not o.tag] + [content, kid]
+        for o in objects:
+            o.tag = self.nextTag
+            self.nextTag += 1
+        for o in objects:
+            self._write(o)
+            if isinstance(o, flatPdf.stream):
+                o.stream = b'' # Release the written data, the object is kept only to be referenced.
+        self.kids.append(flatPdf.reference(ObjectTag(kid.tag)))
+
+    def close(self):
+        u"""Write the catalog, the page tree and the cross reference table, and close the file."""
+        root = flatPdf.obj(ROOT_TAG, flatPdf.dictionary({
+            b'Type': flatPdf.name(b'Catalog'),
+            b'Pages': self.pagesReference}))
+        info = flatPdf.obj(INFO_TAG, flatPdf.dictionary({
+            b'Title': flatPdf.string(self.title.encode('utf-8')),
+            b'Producer': flatPdf.string(b'Flat')}))
+        pages = flatPdf.obj(PAGES_TAG, flatPdf.dictionary({
+            b'Type': flatPdf.name(b'Pages'),
+            b'Kids': flatPdf.array(self.kids),
+            b'Count': flatPdf.number(len(self.kids))}))
+        for o in (root, info, pages):
+            self._write(o)
+        offsets = [b'0000000000 65535 f \n']
+        for tag in range(1, self.nextTag):
+            offsets.append(b'%010d 00000 n \n' % self.offsets[tag])
+        self.f.write(b'xref\n0 %d\n%s' % (len(offsets), b''.join(offsets)))
+        self.f.write(b'trailer %s\nstartxref\n%d\n%%%%EOF' % (
+            flatPdf.dictionary({
+                b'ID': flatPdf.array([flatPdf.hexstring(os.urandom(16))] * 2),
+                b'Root': flatPdf.reference(root),
+                b'Info': flatPdf.reference(info),
+                b'Size': flatPdf.number(len(offsets))}).pdf(),
+            self.position))
+        self.f.close()
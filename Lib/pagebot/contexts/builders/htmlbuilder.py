@@ -19,6 +19,7 @@ from pagebot.toolbox.transformer import value2Bool
 from xmlbuilder import XmlBuilder
 from pagebot.toolbox.dating import now
 from pagebot.contexts.strings.htmlstring import HtmlString
+from pagebot.contexts.builders.assetpipeline import readCachedFile
 from pagebot.toolbox.transformer import dataAttribute2Html5Attribute, color2Hex, object2SpacedString
 
 class HtmlBuilder(XmlBuilder):
@@ -156,8 +157,8 @@ class HtmlBuilder(XmlBuilder):
         'width_html', 'contenteditable'])
 
     IMG_ATTRIBUTES = set([
-        'src', 'name', 'width_html', 'height_html', 'onmouseover', 'onmousedown', 'onmouseup', 'onmouseout',
-        'alt', 'border', 'hspace',
+        'src', 'srcset', 'sizes', 'name', 'width_html', 'height_html', 'onmouseover', 'onmousedown', 'onmouseup',
+        'onmouseout', 'alt', 'border', 'hspace',
         'vspace', 'align', 'relation', 'usemap',
         'itemid', 'itemprop', 'itemref', 'itemscope', 'itemtype'])
 
@@ -274,30 +275,72 @@ table {
 }
 """
 
-    def __init__(self):
+    # Number of characters that are collected before they are written to an open output sink.
+    SINK_BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, compact=False):
         self.resetHtml() # Initialize the HTML output stream.
         self._cssOut = []  
+        self._cssSize = 0
         self._jsOut = []  
         self._copyPaths = []
+        self.assets = None # Optional AssetPipeline, to publish the copied files of the website.
+        self._htmlSink = self._cssSink = None # Optional open output, instead of collecting all in memory.
+        self._htmlSinkPath = self._cssSinkPath = None # Set if the sink was opened by the builder.
         self._initialize()
-        
+        self.compact = compact
+
+    def _get_compact(self):
+        u"""Boolean flag, if True no newlines and indenting tabs are written between the tags.
+
+        >>> b = HtmlBuilder(compact=True)
+        >>> b.img(src='image.png')
+        >>> b.getHtml()
+        u'<img src="image.png"/>'
+        >>> b.compact = False
+        >>> b.resetHtml()
+        >>> b.img(src='image.png')
+        >>> b.getHtml()
+        u'\\n<img src="image.png"/>'
+        """
+        return not self._verbose
+    def _set_compact(self, compact):
+        self._verbose = not compact
+    compact = property(_get_compact, _set_compact)
+
+    def _openSink(self, sink):
+        u"""Answer the (sink, path) for the path or object with a write method. If sink is a path,
+        the file is opened here and the path is answered, so it is closed by the builder."""
+        if isinstance(sink, basestring):
+            return open(sink, 'wb'), sink
+        return sink, None
+
+    def _writeSink(self, sink, chunks):
+        u"""Write the chunks as UTF-8 to the sink."""
+        if chunks:
+            sink.write(u''.join(chunks).encode('utf-8'))
+
     def addHtml(self, html):
         u"""Add the html chunk to self.html, the ordered list of html for output. Test if the html
         is a plain string or of type HtmlString(BabelString). Otherwise raise an error, because
         we don't want to support BabelString conversion. They should have been created of the right
-        type in the context from the start."""
+        type in the context from the start. If an output sink is open, the chunks are written
+        to it as soon as they exceed self.SINK_BUFFER_SIZE characters."""
         if not isinstance(html, basestring): # It's something else, test on the kind of BabelString.
             assert isinstance(html, HtmlString)
             html = html.s # Get the collected html from the BabelString.
         self._htmlOut.append(html)
+        if self._htmlSink is not None:
+            self._htmlSize += len(html)
+            if self._htmlSize >= self.SINK_BUFFER_SIZE:
+                self.flushHtml()
 
     write = addHtml
 
     def importHtml(self, path):
-        u"""Import a chunk of UTF-8 HTML code from the path."""
-        f = codecs.open(path, 'r', 'utf-8')
-        self.addHtml(f.read())
-        f.close()
+        u"""Import a chunk of UTF-8 HTML code from the path. The content of the file is cached
+        until it changes."""
+        self.addHtml(readCachedFile(path))
 
     def writeHtml(self, path):
         u"""Write the collected set of html chunks to path."""
@@ -306,7 +349,8 @@ table {
         f.close()
 
     def getHtml(self):
-        u"""Answer the cumulated html as single string."""
+        u"""Answer the cumulated html as single string. If an output sink is open, this is only
+        the html that is not written to the sink yet."""
         return ''.join(self._htmlOut)
 
     def resetHtml(self):
@@ -314,16 +358,63 @@ table {
         It is likely not to reset the CSS, because we want to collect all and 
         write to the single CSS file for the entire site."""
         self._htmlOut = []
+        self._htmlSize = 0
+
+    def openHtml(self, sink):
+        u"""Stream the html, that is added from now on, to sink instead of collecting it in memory.
+        The sink is a file path or an open object with a write method, such as a file or the
+        file of a socket. The html is written as UTF-8, in buffers of self.SINK_BUFFER_SIZE
+        characters. Call self.closeHtml() to write the rest of the html.
+
+        >>> from StringIO import StringIO
+        >>> f = StringIO()
+        >>> b = HtmlBuilder(compact=True)
+        >>> b.SINK_BUFFER_SIZE = 18
+        >>> b.openHtml(f)
+        >>> b.div(class_='page')
+        >>> f.getvalue(), b.getHtml() # Buffer was full, written to the sink.
+        ('<div class="page">', '')
+        >>> b._div()
+        >>> f.getvalue(), b.getHtml()
+        ('<div class="page">', u'</div>')
+        >>> b.closeHtml()
+        >>> f.getvalue()
+        '<div class="page"></div>'
+        """
+        self.closeHtml()
+        self.resetHtml()
+        self._htmlSink, self._htmlSinkPath = self._openSink(sink)
+
+    def flushHtml(self):
+        u"""Write the collected html chunks to the open sink."""
+        self._writeSink(self._htmlSink, self._htmlOut)
+        self.resetHtml()
+
+    def closeHtml(self):
+        u"""Write the remaining html to the open sink. Close the sink if it was opened from a path."""
+        if self._htmlSink is not None:
+            self.flushHtml()
+            if self._htmlSinkPath is not None:
+                self._htmlSink.close()
+            self._htmlSink = self._htmlSinkPath = None
 
     def addCss(self, css):
-        u"""Add the css chunk to self.css, the ordered list of css for output."""
+        u"""Add the css chunk to self.css, the ordered list of css for output. If an output sink is
+        open, the chunks are written to it as soon as they exceed self.SINK_BUFFER_SIZE characters."""
         self._cssOut.append(css)
+        if self._cssSink is not None:
+            self._cssSize += len(css)
+            if self._cssSize >= self.SINK_BUFFER_SIZE:
+                self.flushCss()
 
     def importCss(self, path):
-        u"""Import a chunk of UTF-8 CSS code from the path."""
-        f = codecs.open(path, 'r', 'utf-8')
-        self.addCss(f.read())
-        f.close()
+        u"""Import a chunk of UTF-8 CSS code from the path. The content of the file is cached
+        until it changes. If self.assets is defined, the files that are referenced by url(...)
+        are published and the references are changed to their published names."""
+        css = readCachedFile(path)
+        if self.assets is not None:
+            css = self.assets.rewriteCss(css, path)
+        self.addCss(css)
 
     def writeCss(self, path):
         u"""Write the collected set of css chunks to path."""
@@ -331,18 +422,69 @@ table {
         f.write(''.join(self._cssOut))
         f.close()
 
+    def openCss(self, sink):
+        u"""Stream the css, that is added from now on, to sink instead of collecting it in memory.
+        The sink is a file path or an open object with a write method. Call self.closeCss()
+        to write the rest of the css.
+
+        >>> from StringIO import StringIO
+        >>> f = StringIO()
+        >>> b = HtmlBuilder()
+        >>> b.openCss(f)
+        >>> b.addCss('body {color: red;}')
+        >>> f.getvalue() # Still in the buffer.
+        ''
+        >>> b.closeCss()
+        >>> f.getvalue()
+        'body {color: red;}'
+        """
+        self.closeCss()
+        self._cssOut = []
+        self._cssSize = 0
+        self._cssSink, self._cssSinkPath = self._openSink(sink)
+
+    def flushCss(self):
+        u"""Write the collected css chunks to the open sink."""
+        self._writeSink(self._cssSink, self._cssOut)
+        self._cssOut = []
+        self._cssSize = 0
+
+    def closeCss(self):
+        u"""Write the remaining css to the open sink. Close the sink if it was opened from a path."""
+        if self._cssSink is not None:
+            self.flushCss()
+            if self._cssSinkPath is not None:
+                self._cssSink.close()
+            self._cssSink = self._cssSinkPath = None
+
     def addJs(self, js):
         self._jsOut.append(js)
 
     def importJs(self, path):
-        u"""Import a chunk of UTF-8 CSS code from the path."""
-        f = codecs.open(path, 'r', 'utf-8')
-        self.addJs(f.read())
-        f.close()
+        u"""Import a chunk of UTF-8 JS code from the path. The content of the file is cached
+        until it changes."""
+        self.addJs(readCachedFile(path))
 
     def copyPath(self, path):
-        u"""Collect path of files to copy to the output website."""
+        u"""Collect path of files to copy to the output website. If self.assets is defined, the
+        file is published in the website under the hash of its content, and src and href attributes
+        with path are written with the published url. Answer the url of the file.
+
+        >>> import tempfile
+        >>> from pagebot.contexts.builders.assetpipeline import AssetPipeline
+        >>> b = HtmlBuilder(compact=True)
+        >>> b.copyPath(__file__) == __file__ # No pipeline, the path is only collected.
+        True
+        >>> b.assets = AssetPipeline(tempfile.mkdtemp())
+        >>> url = b.copyPath(__file__)
+        >>> b.img(src=__file__)
+        >>> b.getHtml() == u'<img src="%s"/>' % url
+        True
+        """
         self._copyPaths.append(path)
+        if self.assets is not None:
+            return self.assets.add(path)
+        return path
 
     #   C S S
 
@@ -457,6 +599,8 @@ table {
             elif key == 'usemap':
                 if not value.startswith(u'#'):
                     value = u'#' + value
+            elif key in ('src', 'href') and self.assets is not None:
+                value = self.assets.getUrl(value) # Published name of a copied file.
 
             # Handle Angular.org attributes that contain underscores, translate them to hyphens
             elif key.startswith('ng_'):
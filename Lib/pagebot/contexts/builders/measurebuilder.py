@@ -0,0 +1,101 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     measurebuilder.py
+#
+from pagebot.contexts.platform import getFontPaths
+from pagebot.contexts.strings.measurestring import MeasureString
+from pagebot.toolbox.imagesize import getImageSize
+
+class MeasurePath(object):
+    u"""Path of the MeasureBuilder, ignoring all drawing."""
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _noDrawing
+
+def _noDrawing(*args, **kwargs):
+    pass
+
+class MeasureBuilder(object):
+    u"""Builder of the MeasureContext. All drawing calls are ignored, so elements can be
+    built without output, e.g. to test the layout. Queries that elements make to the
+    builder, as they do to DrawBot, answer from the font tables and image file headers.
+    Plain strings are measured in the font and fontSize that are set on the builder.
+
+    >>> b = MeasureBuilder()
+    >>> b.PB_ID
+    'measure'
+    >>> b.rect(0, 0, 100, 100)
+    >>> path = b.BezierPath()
+    >>> path.moveTo((0, 0))
+    >>> b.font('Roboto-Regular.ttf', 10)
+    >>> w, h = b.textSize(u'ABC')
+    >>> round(w, 2), round(h, 2)
+    (19.26, 11.72)
+    >>> b.fontSize(20)
+    >>> round(b.textSize(u'ABC')[0], 2)
+    38.52
+    >>> bs = MeasureString.newString(u'ABC ' * 10, None, style=dict(font='Roboto-Regular.ttf', fontSize=10, leading=12))
+    >>> b.textSize(bs, width=100)[1]
+    36
+    """
+    # Id to make builder hook name. Views will be calling e.build_measure()
+    PB_ID = 'measure'
+
+    BezierPath = MeasurePath
+
+    def __init__(self):
+        self._font = MeasureString.DEFAULT_FONT
+        self._fontSize = 10 # Default fontSize of DrawBot
+        self._lineHeight = None
+
+    def font(self, fontName, fontSize=None):
+        self._font = fontName
+        if fontSize is not None:
+            self._fontSize = fontSize
+
+    def fontSize(self, fontSize):
+        self._fontSize = fontSize
+
+    def lineHeight(self, lineHeight):
+        self._lineHeight = lineHeight
+
+    def textSize(self, s, align=None, width=None, height=None):
+        u"""Answer the (w, h) size of s, that is a MeasureString or a plain string in the current
+        font and fontSize. Lines are wrapped if width is defined."""
+        if not isinstance(s, MeasureString):
+            s = MeasureString.newString(s, None, style=dict(font=self._font, fontSize=self._fontSize,
+                leading=self._lineHeight))
+        return s.textSize(width, height)
+
+    def imageSize(self, path):
+        u"""Answer the (w, h) size of the image file at path, from its header."""
+        return getImageSize(path) or (0, 0)
+
+    def installedFonts(self):
+        return getFontPaths().keys()
+
+    def listOpenTypeFeatures(self, fontName=None):
+        return []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _noDrawing
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -37,6 +37,7 @@ except (ImportError, AttributeError):
 
 from basecontext import BaseContext
 from pagebot.style import NO_COLOR, LEFT, CENTER, RIGHT
+from pagebot.toolbox.imagesize import getImageSize
 
 
 class DrawBotContext(BaseContext):
@@ -475,8 +476,9 @@ class DrawBotContext(BaseContext):
         return self.b.imagePixelColor(path, p)
 
     def imageSize(self, path):
-        u"""Answer the (w, h) image size of the image file at path."""
-        return self.b.imageSize(path)
+        u"""Answer the (w, h) image size of the image file at path, from the shared image info
+        cache, that reads the file header. Other formats (e.g. PDF) are measured by DrawBot."""
+        return getImageSize(path) or self.b.imageSize(path)
 
     def image(self, path, p, alpha=1, pageNumber=None, w=None, h=None):
         u"""Draw the image. If w or h is defined, then scale the image to fit."""
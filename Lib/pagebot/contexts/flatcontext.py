@@ -15,18 +15,46 @@
 #
 #     http://xxyxyz.org/flat
 #
+import os
+import multiprocessing
+from time import time
 #import imageio
 from basecontext import BaseContext
 from pagebot.contexts.platform import getFontPaths
 from pagebot.style import NO_COLOR
 from pagebot.contexts.builders.flatbuilder import flatBuilder
+from pagebot.contexts.builders.flatpdfwriter import FlatPdfWriter
 from pagebot.contexts.strings.flatstring import FlatString
 from pagebot.toolbox.transformer import path2Name
+from pagebot.toolbox.imagesize import getImageSize, getImageInfo
+from pagebot.toolbox.imagecache import IMAGE_DERIVATIVE_CACHE, getPixelSize
 from pagebot.style import NO_COLOR, LEFT
 
 def iround(value):
     return min(255, max(0, int(round(value*255.0))))
 
+# Pages to export by the worker processes. Set before the pool is created, so forked workers
+# inherit the pages in memory, instead of pickling them.
+_exportPages = []
+
+def savePage(page, path, resolution=72, quality=95, optimized=False):
+    u"""Rasterize and encode the Flat page to the PNG, JPEG or SVG file at path, with resolution
+    in pixels per inch and the JPEG quality or the optimized PNG compression."""
+    extension = path.split('.')[-1]
+    if extension == 'png':
+        page.image(ppi=resolution, kind='rgba').png(path, optimized)
+    elif extension == 'jpg':
+        page.image(ppi=resolution, kind='rgb').jpeg(path, quality)
+    else: # svg
+        page.svg(path)
+
+def _savePageWorker(args):
+    u"""Save the page with index in the worker process. Answer the (path, seconds) timing."""
+    index, path, resolution, quality, optimized = args
+    t = time()
+    savePage(_exportPages[index], path, resolution, quality, optimized)
+    return path, time() - t
+
 class FlatContext(BaseContext):
     u"""A FlatContext instance combines the specific functions of the Flat
     library, and offers a PageBot “standard” API, so it can be swapped with the
@@ -65,6 +93,18 @@ class FlatContext(BaseContext):
     # Used by the generic BaseContext.newString( )
     STRING_CLASS = FlatString
 
+    # Export formats that save a file per page.
+    PAGE_FORMATS = ('png', 'jpg', 'svg')
+
+    # Default resolution in dots per inch, that placed images are downsampled to.
+    IMAGE_RESOLUTION = 300
+    # Default quality of JPEG image derivatives.
+    IMAGE_QUALITY = 90
+    # Default resolution in pixels per inch, quality of JPEG pages and compression of PNG pages.
+    EXPORT_RESOLUTION = 72
+    EXPORT_QUALITY = 95
+    EXPORT_OPTIMIZED = False
+
     def __init__(self):
         u"""Constructor of Flat context.
 
@@ -93,6 +133,19 @@ class FlatContext(BaseContext):
         self.flatString = None
 
         self._pathCommands = None # Collect path commnands here before drawing the path.
+        self.pdfWriter = None # Optional FlatPdfWriter, if pages are streamed to a PDF file.
+
+        self.imageResolution = self.IMAGE_RESOLUTION
+        self.imageQuality = self.IMAGE_QUALITY
+        # Image derivatives, shared by default with other contexts. Set to an ImageDerivativeCache
+        # with a folder path, to keep the derivatives for the next run.
+        self.imageCache = IMAGE_DERIVATIVE_CACHE
+
+        self.exportResolution = self.EXPORT_RESOLUTION
+        self.exportQuality = self.EXPORT_QUALITY
+        self.exportOptimized = self.EXPORT_OPTIMIZED # Smaller PNG files, slower to encode.
+        self.exportProcesses = None # Amount of worker processes of page exports, default the amount of CPUs.
+        self.exportTimings = [] # List of (path, seconds) of the saved pages of the last export.
 
     #   V A R I A B L E
 
@@ -113,9 +166,15 @@ class FlatContext(BaseContext):
         (100, 100)
         """
         self.doc = self.b.document(w, h, units)
+        self.pages = [] # Pages of a previous document are not saved with the new one.
+        self.page = None
 
-    def saveDocument(self, path, multiPage=True):
-        u"""Save the current document to file(s)
+    def saveDocument(self, path, multiPage=True, resolution=None, quality=None, optimized=None,
+            processes=None):
+        u"""Save the current document to file(s). PNG, JPEG and SVG pages are saved as a file per
+        page, rasterized and encoded by a pool of worker processes. The optional resolution,
+        quality, optimized and processes overwrite the self.export... settings of the context.
+        The (path, seconds) timing of each page is kept in self.exportTimings.
 
         >>> import os
         >>> from pagebot.contexts.platform import getRootPath
@@ -135,27 +194,10 @@ class FlatContext(BaseContext):
         """
         self.checkExportPath(path) # In case path starts with "_export", make sure that the directories exist.
         extension = path.split('.')[-1]
-        if extension == 'png':
-            if len(self.pages) == 1 or not multiPage:
-                self.pages[0].image(kind='rgba').png(path)
-            else:
-                for n, p in enumerate(self.pages):
-                    pagePath = path.replace('.png', '%03d.png' % n)
-                    p.image(kind='rgba').png(pagePath)
-        elif extension == 'jpg':
-            if len(self.pages) == 1 or not multiPage:
-                self.pages[0].image(kind='rgb').jpeg(path)
-            else:
-                for n, p in enumerate(self.pages):
-                    pagePath = path.replace('.png', '%03d.png' % n)
-                    p.image(kind='rgb').jpeg(pagePath)
-        elif extension == 'svg':
-            if len(self.pages) == 1 or not multiPage:
-                self.pages[0].svg(path)
-            else:
-                for n, p in enumerate(self.pages):
-                    pagePath = path.replace('.png', '%03d.png' % n)
-                    p.svg(pagePath)
+        if extension in self.PAGE_FORMATS:
+            self.exportTimings = []
+            self.savePages(path, self.pages, 0, len(self.pages), multiPage, resolution, quality,
+                optimized, processes)
         elif extension == 'pdf':
             self.doc.pdf(path)
         elif extension == 'gif':
@@ -165,6 +207,106 @@ class FlatContext(BaseContext):
 
     saveImage = saveDocument # Compatible API with DrawBot
 
+    def openStream(self, path):
+        u"""Start streaming the pages of the current document to the PDF file at path. Pages are
+        written by streamPage as soon as they are finished and then released, so the memory use
+        does not grow with the amount of pages. Call closeStream( ) to finish the file."""
+        self.checkExportPath(path)
+        self.pdfWriter = FlatPdfWriter(path, title=self.doc.title)
+
+    def streamPage(self, page=None):
+        u"""Write the page (default the current page) to the open PDF stream and release it."""
+        if page is None:
+            page = self.page
+        self.pdfWriter.addPage(page)
+        for pages in (self.pages, self.doc.pages):
+            if page in pages:
+                pages.remove(page)
+        if page is self.page:
+            self.page = None
+
+    def closeStream(self):
+        u"""Finish the PDF file of the stream, with its page tree and cross reference table."""
+        self.pdfWriter.close()
+        self.pdfWriter = None
+
+    def getPagePath(self, path, index, pageCount, multiPage=True):
+        u"""Answer the path to save the page with index, in a document of pageCount pages, for
+        formats that save a file per page. Answer None if the page is not saved, as only the
+        first page is saved for single page documents or if multiPage is False.
+
+        >>> context = FlatContext()
+        >>> context.getPagePath('_export/Doc.png', 0, 1)
+        '_export/Doc.png'
+        >>> context.getPagePath('_export/Doc.svg', 2, 4)
+        '_export/Doc002.svg'
+        >>> context.getPagePath('_export/Doc.png', 2, 4, multiPage=False) is None
+        True
+        """
+        if pageCount == 1 or not multiPage:
+            if index == 0:
+                return path
+            return None
+        base, extension = path.rsplit('.', 1)
+        return '%s%03d.%s' % (base, index, extension)
+
+    def savePages(self, path, pages, index=0, pageCount=None, multiPage=True, resolution=None,
+            quality=None, optimized=None, processes=None, indices=None):
+        u"""Save the pages to a file per page, in the format of the path extension, where the
+        first page has document index, or where the pages have the document indices in the
+        optional list indices. This way separate contexts can save a range or a selection of
+        pages of the same document, under the same names as saveDocument. If there is more than
+        one page to save, the pages are saved by a pool of worker processes. The timings of the
+        pages are added to self.exportTimings."""
+        global _exportPages
+        if pageCount is None:
+            pageCount = len(pages)
+        if resolution is None:
+            resolution = self.exportResolution
+        if quality is None:
+            quality = self.exportQuality
+        if optimized is None:
+            optimized = self.exportOptimized
+        processes = processes or self.exportProcesses or multiprocessing.cpu_count()
+        if indices is None:
+            indices = range(index, index + len(pages))
+        jobs = []
+        for n, pageIndex in enumerate(indices):
+            pagePath = self.getPagePath(path, pageIndex, pageCount, multiPage)
+            if pagePath is not None:
+                jobs.append((n, pagePath, resolution, quality, optimized))
+        _exportPages = pages
+        try:
+            if len(jobs) > 1 and processes > 1:
+                pool = multiprocessing.Pool(min(processes, len(jobs)))
+                try:
+                    timings = pool.map(_savePageWorker, jobs, 1)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                timings = [_savePageWorker(job) for job in jobs]
+        finally:
+            _exportPages = []
+        self.exportTimings.extend(timings)
+
+    def getExportReport(self):
+        u"""Answer the report of the page timings of the last export.
+
+        >>> context = FlatContext()
+        >>> context.exportTimings = [('_export/Doc000.png', 0.25), ('_export/Doc001.png', 0.5)]
+        >>> print context.getExportReport()
+        _export/Doc000.png 0.250s
+        _export/Doc001.png 0.500s
+        2 pages, total 0.750s, average 0.375s
+        """
+        lines = ['%s %0.3fs' % (pagePath, seconds) for pagePath, seconds in self.exportTimings]
+        total = sum([seconds for _, seconds in self.exportTimings])
+        if self.exportTimings:
+            lines.append('%d pages, total %0.3fs, average %0.3fs' % (len(self.exportTimings), total,
+                total / len(self.exportTimings)))
+        return '\n'.join(lines)
+
     def newPage(self, w, h, units='pt'):
         u"""Other page sizes than default in self.doc, are ignored in Flat."""
         if self.doc is None:
@@ -257,48 +399,49 @@ class FlatContext(BaseContext):
 
     def textSize(self, bs, w=None, h=None):
         u"""Answer the size tuple (w, h) of the current text. Answer (0, 0) if there is no text defined.
-        Answer the height of the string if the width w is given.
+        Answer the height of the string if the width w is given. The string is measured by the
+        cached metrics of its fonts, in the same way as by the MeasureContext.
 
-        >>> w = h = 500
+        >>> from pagebot.contexts.platform import getFontPaths
         >>> context = FlatContext()
-        >>> context.newDocument(w, h)
-        >>> context.newPage(w, h)
-        >>> bs = context.newString('ABC ' * 100)
-        >>> t = context.page.place(bs.s)
-        >>> t = t.frame(0, 0, w, h)
-        >>> t.overflow()
-        False
-        >>> bs = context.newString('ABC ' * 100000)
-        >>> t = context.page.place(bs.s)
-        >>> t = t.frame(0, 0, w, h)
-        >>> t.overflow()
-        True
-        >>> lines = t.lines()
-        >>> len(lines)
-        35
-        
-        for line in t.lines():
-             print line.__class__.__name__
-
-
+        >>> fontPath = getFontPaths()['Roboto-Regular.ttf']
+        >>> bs = FlatString(u'ABC ' * 10, context, runs=[(u'ABC ' * 10, fontPath, 10, 12, 0)])
+        >>> w, h = context.textSize(bs)
+        >>> int(w), h
+        (214, 12)
+        >>> w, h = context.textSize(bs, w=100)
+        >>> int(w), h
+        (84, 36)
         """
-        # FIXME! This is a totally wrong boilerplate for now!
-
-        #t = placedtext(bs.s)
-        if not bs.s:
-            return (0, 0)
-        elif w is None:
-            return (100, 100)
-        else:
-            return (w, w/len(bs))
+        return bs.textSize(w, h)
 
     def textOverflow(self, bs, bounds, align=LEFT):
-        u"""Answer the overflowing of from the box (0, 0, w, h) as new FlatString
-        in the current context."""
-        return FlatString(self.b.textOverflow(bs.s, bounds, align), self)
+        u"""Answer the overflowing of from the box (0, 0, w, h) or (x, y, w, h) as new FlatString
+        in the current context.
+
+        >>> from pagebot.contexts.platform import getFontPaths
+        >>> context = FlatContext()
+        >>> fontPath = getFontPaths()['Roboto-Regular.ttf']
+        >>> bs = FlatString(u'ABC ' * 10, context, runs=[(u'ABC ' * 10, fontPath, 10, 12, 0)])
+        >>> len(context.textOverflow(bs, (0, 0, 100, 25)))
+        8
+        """
+        w, h = bounds[-2:]
+        return bs.textOverflow(w, h, align)
 
     def textBoxBaseLines(self, txt, box):
-        raise NotImplementedError()
+        u"""Answer the list of (x, y) baseline positions of the lines of txt in box (x, y, w, h),
+        as broken by the metrics of the fonts.
+
+        >>> from pagebot.contexts.platform import getFontPaths
+        >>> context = FlatContext()
+        >>> fontPath = getFontPaths()['Roboto-Regular.ttf']
+        >>> bs = FlatString(u'ABC ' * 10, context, runs=[(u'ABC ' * 10, fontPath, 10, 12, 0)])
+        >>> context.textBoxBaseLines(bs, (0, 0, 100, 30))
+        [(0, 20.44140625), (0, 8.44140625)]
+        """
+        x, y, w, h = box
+        return [(x + textLine.x, y + textLine.y) for textLine in txt.getTextLines(w, h)]
 
     #   I M A G E
 
@@ -306,7 +449,8 @@ class FlatContext(BaseContext):
         return self.b.imagePixelColor(path, p)
 
     def imageSize(self, path):
-        u"""Answer the (w, h) image size of the image file at path.
+        u"""Answer the (w, h) image size of the image file at path, from the shared image info
+        cache, that reads the file header. Other formats are opened by Flat.
 
         >>> from pagebot.contexts.platform import getRootPath
         >>> rootPath = getRootPath()
@@ -315,22 +459,71 @@ class FlatContext(BaseContext):
         >>> context.imageSize(imagePath)
         (3024, 4032)
         """ 
-        img = self.b.image.open(path)
-        return img.width, img.height
+        size = getImageSize(path)
+        if size is None:
+            img = self.b.image.open(path)
+            size = img.width, img.height
+        return size
 
     def image(self, path, p, alpha=1, pageNumber=None, w=None, h=None):
-        u"""Draw the image. If w or h is defined, then scale the image to fit."""
-        if w is None or h is None:
-            w, h = self.imageSize(path)
+        u"""Draw the image. If w or h is defined, then scale the image to fit, proportional if
+        only one of them is defined. The placed bitmap is the derivative of the image with the
+        pixels needed at self.imageResolution."""
+        iw, ih = self.imageSize(path)
+        if w and not h: # Scale proportional
+            h = ih * float(w) / iw
+        elif h and not w:
+            w = iw * float(h) / ih
+        elif not w and not h:
+            w, h = iw, ih
 
         x, y, = p[0], p[1]
         self.save()
-        img = self.b.image(path)
-        img.resize(width=w, height=h)
-        placed = self.page.place(img)
-        placed.position(x, y)
+        placed = self.page.place(self.getImageDerivative(path, w, h))
+        placed.frame(x, y, w, h)
         self.restore()
 
+    def getImageDerivative(self, path, w, h):
+        u"""Answer the Flat image of path, downsampled to the pixel size that (w, h) points need
+        at self.imageResolution. The source is decoded and resampled once. Then the derivative
+        is answered from self.imageCache, for other placements, pages and export formats. If the
+        cache has a folder, the derivative is also saved as file, to be reused in the next run."""
+        cache = self.imageCache
+        info = getImageInfo(path) or self.imageSize(path) + (None, None)
+        iw, ih, _, colorMode = info
+        pw, ph = getPixelSize(w, h, (iw, ih), self.imageResolution)
+        key = cache.getKey(path, pw, ph, colorMode, self.imageQuality)
+        img = cache.get(key)
+        if img is None:
+            if (pw, ph) == (iw, ih):
+                return self._getSourceImage(path, iw, ih, colorMode)
+            # Derivatives of JPEG sources stay JPEG, others are saved lossless.
+            if colorMode in ('L', 'RGB', 'CMYK') and path.lower().endswith(('.jpg', '.jpeg')):
+                extension = 'jpg'
+            else:
+                extension = 'png'
+            filePath = cache.getFilePath(key, extension)
+            if filePath is not None and os.path.exists(filePath):
+                img = self.b.image.open(filePath).decompress() # Derivative of a previous run.
+            else:
+                img = self._getSourceImage(path, iw, ih, colorMode).copy().resize(pw, ph)
+                if filePath is not None and extension == 'jpg':
+                    img.jpeg(filePath, self.imageQuality)
+                elif filePath is not None:
+                    img.png(filePath)
+            cache.put(key, img, len(img.data))
+        return img
+
+    def _getSourceImage(self, path, iw, ih, colorMode):
+        u"""Answer the decoded Flat image of path, from self.imageCache."""
+        cache = self.imageCache
+        key = cache.getKey(path, iw, ih, colorMode)
+        img = cache.get(key)
+        if img is None:
+            img = self.b.image.open(path).decompress()
+            cache.put(key, img, len(img.data))
+        return img
+
     #   D R A W I N G
 
     def _getShape(self):
@@ -16,6 +16,7 @@
 from basecontext import BaseContext
 from pagebot.contexts.builders.webbuilder import WebBuilder
 from pagebot.contexts.strings.htmlstring import HtmlString
+from pagebot.toolbox.imagesize import getImageSize
 
 class HtmlContext(BaseContext):
     u"""A HtmlContext instance combines the specific functions of the Flat library
@@ -55,9 +56,9 @@ class HtmlContext(BaseContext):
         #return cls.b.imagePixelColor(path, p)
 
     def imageSize(self, path):
-        u"""Answer the (w, h) image size of the image file at path."""
-        return (0, 0)
-        #return cls.b.imageSize(path)
+        u"""Answer the (w, h) image size of the image file at path, from the shared image info
+        cache. Answer (0, 0) if the size cannot be read."""
+        return getImageSize(path) or (0, 0)
 
     #   C O L O R
 
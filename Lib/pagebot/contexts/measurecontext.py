@@ -0,0 +1,161 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     measurecontext.py
+#
+#     The MeasureContext answers the size of text and images, as needed to solve
+#     the layout of a document, from font tables and image file headers. It does
+#     not draw, so documents can be composed and solved fast, without DrawBot or
+#     Flat, e.g. on servers or to test layouts.
+#
+from basecontext import BaseContext
+from pagebot.contexts.platform import getFontPaths
+from pagebot.contexts.builders.measurebuilder import MeasureBuilder
+from pagebot.contexts.strings.measurestring import MeasureString
+from pagebot.fonttoolbox.fontmetrics import getFontMetrics
+from pagebot.toolbox.imagesize import getImageSize
+from pagebot.toolbox.transformer import path2Name
+from pagebot.style import LEFT
+
+# Methods of the context API that draw. They are ignored by the MeasureContext.
+DRAWING_METHODS = ('newPage', 'newDrawing', 'rect', 'oval', 'circle', 'line', 'newPath',
+    'moveTo', 'lineTo', 'quadTo', 'curveTo', 'closePath', 'drawPath', 'scale', 'translate',
+    'transform', 'setShadow', 'setGradient', 'lineDash', 'saveGraphicState', 'restoreGraphicState',
+    'save', 'restore', 'font', 'fontSize', 'text', 'textBox', 'openTypeFeatures', 'hyphenation',
+    'image', 'frameDuration', 'setFillColor', 'fill', 'setStrokeColor', 'stroke', 'strokeWidth',
+    'drawGlyphPath')
+
+class MeasureContext(BaseContext):
+    u"""A MeasureContext instance measures text with the cached tables of the font files (see
+    pagebot.fonttoolbox.fontmetrics) and images with the size in their file headers. All drawing
+    methods are ignored. Set it as context of a Document, to solve the layout without drawing.
+
+    >>> context = MeasureContext()
+    >>> context.isMeasure, context.b.PB_ID
+    (True, 'measure')
+    >>> bs = context.newString('ABC', style=dict(font='Roboto-Regular.ttf', fontSize=10, leading=12))
+    >>> bs.__class__.__name__
+    'MeasureString'
+    >>> w, h = context.textSize(bs)
+    >>> round(w, 2), h
+    (19.26, 12)
+    >>> context.newDocument(100, 100)
+    >>> context.newPage(100, 100)
+    >>> context.rect(10, 10, 80, 80)
+    >>> context.saveDocument('_export/Measure.pdf')
+    >>> from pagebot.document import Document
+    >>> from pagebot.elements import newTextBox
+    >>> doc = Document(w=300, h=300, autoPages=1, context=context)
+    >>> tb = newTextBox(context.newString('ABC ' * 200, style=dict(font='Roboto-Regular.ttf', fontSize=10)), parent=doc[0], w=100, h=50)
+    >>> doc.view.showTextOverflowMarker, len(tb.getOverflow()) > 0
+    (True, True)
+    >>> doc.view.showElementDimensions = True
+    >>> doc.build() # Overflow markers and dimensions are measured by the MeasureBuilder.
+    """
+    # In case of specific builder addressing, callers can check here.
+    isMeasure = True
+
+    # Used by the generic BaseContext.newString( )
+    STRING_CLASS = MeasureString
+
+    def __init__(self):
+        self.name = self.__class__.__name__
+        self.b = MeasureBuilder()
+
+    #   D O C U M E N T
+
+    def newDocument(self, w, h, *args, **kwargs):
+        pass
+
+    def saveDocument(self, path, multiPage=True):
+        u"""Nothing is drawn, so nothing is saved."""
+        pass
+
+    saveImage = saveDocument # Compatible API with DrawBot
+
+    #   F O N T S
+
+    def installedFonts(self):
+        u"""Answer the list with names of all fonts that can be measured."""
+        return getFontPaths().keys()
+
+    def installFont(self, fontPath):
+        return path2Name(fontPath)
+
+    def getFontPathOfFont(self, fontName):
+        u"""Answer the path that is source of the given font name. Answer None if the font cannot be found."""
+        return getFontPaths().get(fontName)
+
+    def listOpenTypeFeatures(self, fontName):
+        return []
+
+    def fontMetrics(self, fontName):
+        u"""Answer the FontMetrics of the font name or path, with its vertical metrics in units.
+
+        >>> metrics = MeasureContext().fontMetrics('Roboto-Regular.ttf')
+        >>> metrics.unitsPerEm, metrics.ascender, metrics.descender, metrics.capHeight
+        (2048, 1900, -500, 1456)
+        """
+        return getFontMetrics(fontName)
+
+    #   T E X T
+
+    def newBulletString(self, bullet, e=None, style=None):
+        return self.newString(bullet, e=e, style=style)
+
+    def textSize(self, bs, w=None, h=None):
+        u"""Answer the size tuple (w, h) of the string. Lines are wrapped if w is defined."""
+        return bs.textSize(w, h)
+
+    def textOverflow(self, bs, bounds, align=LEFT):
+        u"""Answer the MeasureString that overflows bounds (x, y, w, h) or (w, h)."""
+        w, h = bounds[-2:]
+        return bs.textOverflow(w, h, align)
+
+    def textBoxBaseLines(self, txt, box):
+        u"""Answer the list of (x, y) baseline positions of the lines of txt in box (x, y, w, h).
+
+        >>> context = MeasureContext()
+        >>> bs = context.newString('ABC ' * 10, style=dict(font='Roboto-Regular.ttf', fontSize=10, leading=12))
+        >>> context.textBoxBaseLines(bs, (0, 0, 100, 100))
+        [(0, 90.44140625), (0, 78.44140625), (0, 66.44140625)]
+        """
+        x, y, w, h = box
+        return [(x + textLine.x, y + textLine.y) for textLine in txt.getTextLines(w, h)]
+
+    #   I M A G E
+
+    def imagePixelColor(self, path, p):
+        return None
+
+    def imageSize(self, path):
+        u"""Answer the (w, h) image size of the image file at path, from its header. Answer
+        (0, 0) if the size cannot be read.
+
+        >>> from pagebot.contexts.platform import getRootPath
+        >>> MeasureContext().imageSize(getRootPath() + '/Examples/Magazines/Fashion/images/IMG_8914.jpg')
+        (3024, 4032)
+        """
+        return getImageSize(path) or (0, 0)
+
+def _noDrawing(self, *args, **kwargs):
+    pass
+
+for _name in DRAWING_METHODS:
+    if _name not in MeasureContext.__dict__:
+        setattr(MeasureContext, _name, _noDrawing)
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -19,7 +19,7 @@ import os
 
 def getRootPath():
     u"""Answer the root path of the pagebot module."""
-    return '/'.join(__file__.split('/')[:-4]) # Path of this file with pagebot/__init__.py(c) removed.
+    return '/'.join(os.path.abspath(__file__).split('/')[:-4]) # Path of this file with pagebot/__init__.py(c) removed.
 
 def getRootFontPath():
     u"""Answer the standard font path of the pagebot module."""
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     recordingcontext.py
+#
+#     The RecordingContext records the drawing calls of a document build into a
+#     display list, that can be replayed into any other context, e.g. to export
+#     PDF, PNG and SVG from a single traversal of the element tree, and that can
+#     be saved to disk, to be replayed later without building the document again.
+#
+import cPickle
+
+from basecontext import BaseContext
+from pagebot.contexts.strings.recordedstring import RecordedString
+
+# Version of the saved display list format.
+DISPLAY_LIST_VERSION = 1
+
+# Methods of the context API that draw, recorded in the display list as (name, args, kwargs).
+RECORDED_METHODS = ('newDocument', 'newPage', 'newDrawing', 'installFont',
+    'rect', 'oval', 'circle', 'line', 'newPath', 'moveTo', 'lineTo', 'quadTo', 'curveTo',
+    'closePath', 'drawPath', 'scale', 'translate', 'transform', 'setShadow', 'setGradient',
+    'lineDash', 'saveGraphicState', 'restoreGraphicState', 'font', 'fontSize', 'text', 'textBox',
+    'openTypeFeatures', 'hyphenation', 'image', 'frameDuration', 'setFillColor', 'setStrokeColor',
+    'strokeWidth', 'drawGlyphPath')
+
+# Calls of the builder (context.b) that draw. Other builder calls are queries, answered by the
+# builder of the reference context.
+RECORDED_BUILDER_CALLS = set(('newPage', 'rect', 'oval', 'line', 'polygon', 'newPath', 'moveTo',
+    'lineTo', 'curveTo', 'qCurveTo', 'arc', 'arcTo', 'closePath', 'drawPath', 'clipPath', 'fill',
+    'stroke', 'strokeWidth', 'lineCap', 'lineJoin', 'lineDash', 'miterLimit', 'shadow',
+    'linearGradient', 'radialGradient', 'cmykFill', 'cmykStroke', 'cmykShadow', 'save', 'restore',
+    'translate', 'rotate', 'scale', 'skew', 'transform', 'font', 'fontSize', 'lineHeight', 'tracking',
+    'text', 'textBox', 'image', 'openTypeFeatures', 'hyphenation', 'blendMode', 'frameDuration'))
+
+class RecordingPath(object):
+    u"""Path answered by the builder of the RecordingContext for b.BezierPath( ). It keeps its
+    drawing calls, to make the equivalent path in the context where it is replayed."""
+
+    def __init__(self):
+        self.commands = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        def record(*args):
+            self.commands.append((name, args))
+        return record
+
+    def getPath(self, context):
+        u"""Answer the path in context. If the builder of the context has no BezierPath, the
+        path is drawn as current path of the context, and None is answered."""
+        if hasattr(context.b, 'BezierPath'):
+            path = context.b.BezierPath()
+            for name, args in self.commands:
+                getattr(path, name)(*args)
+            return path
+        context.newPath()
+        for name, args in self.commands:
+            getattr(context, name)(*args)
+        return None
+
+class RecordingBuilder(object):
+    u"""Builder of the RecordingContext. Drawing calls are recorded in the display list of the
+    context, as "b.<name>" commands. Other calls are answered by the builder of the reference
+    context, which also defines the PB_ID, so elements use their build hooks for that context."""
+
+    def __init__(self, context):
+        self._context = context
+        self.PB_ID = context.context.b.PB_ID
+
+    def BezierPath(self):
+        return RecordingPath()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name not in RECORDED_BUILDER_CALLS:
+            return getattr(self._context.context.b, name)
+        commands = self._context.commands
+        def record(*args, **kwargs):
+            commands.append(('b.' + name, args, kwargs))
+        return record
+
+def _newRecorder(name):
+    def record(self, *args, **kwargs):
+        self.commands.append((name, args, kwargs))
+    record.__name__ = name
+    record.__doc__ = u"""Record the call of %s in the display list.""" % name
+    return record
+
+def _replayValue(value, context):
+    u"""Answer the value of a recorded argument for context."""
+    if isinstance(value, RecordedString):
+        return value.getString(context)
+    if isinstance(value, RecordingPath):
+        return value.getPath(context)
+    return value
+
+class RecordingContext(BaseContext):
+    u"""A RecordingContext records all drawing calls made through the context API and through
+    its builder in a display list, as compact (name, args, kwargs) tuples. Queries, such as the
+    size of text and images, are answered by the reference context, default the current
+    defaultContext. The display list can be replayed into any context, saved to file and loaded
+    again. Saving the document replays it into the reference context, so the same recording can
+    be exported to several formats.
+
+    >>> from pagebot.contexts.drawbotcontext import DrawBotContext
+    >>> context = RecordingContext(DrawBotContext())
+    >>> context.newDocument(100, 100)
+    >>> context.newPage(100, 100)
+    >>> context.setFillColor((1, 0, 0))
+    >>> context.rect(10, 10, 80, 80)
+    >>> context.b.oval(20, 20, 60, 60)
+    >>> bs = context.newString('ABC', style=dict(fontSize=12))
+    >>> context.text(bs, (10, 10))
+    >>> len(context.commands), context.commands[3]
+    (6, ('rect', (10, 10, 80, 80), {}))
+    >>> context.b.PB_ID
+    'drawBot'
+    >>> other = RecordingContext(DrawBotContext())
+    >>> context.replay(other)
+    0
+    >>> other.commands[:4] == context.commands[:4], other.commands[4][0], other.commands[5][1][0].s
+    (True, 'oval', u'ABC')
+    >>> import tempfile
+    >>> path = tempfile.mkstemp(suffix='.pbdl')[1]
+    >>> context.saveDisplayList(path)
+    >>> loaded = RecordingContext.loadDisplayList(path, DrawBotContext())
+    >>> len(loaded.commands), loaded.commands[5][1][0].runs == bs.runs
+    (6, True)
+    """
+    STRING_CLASS = RecordedString
+
+    def __init__(self, context=None):
+        if context is None:
+            from pagebot.contexts import defaultContext as context
+        self.name = self.__class__.__name__
+        self.context = context # Reference context, answering queries and saving documents.
+        self.isDrawBot = context.isDrawBot
+        self.isFlat = context.isFlat
+        self.b = RecordingBuilder(self)
+        self.commands = [] # Display list of (name, args, kwargs) tuples.
+
+    def __repr__(self):
+        return '<%s %s %d commands>' % (self.__class__.__name__, self.context, len(self.commands))
+
+    def __getattr__(self, name):
+        u"""Answer the other (query) methods and attributes from the reference context."""
+        if name.startswith('_') or name in ('context', 'commands'):
+            raise AttributeError(name)
+        return getattr(self.context, name)
+
+    def screenSize(self):
+        return self.context.screenSize()
+
+    #   D O C U M E N T
+
+    def newDocument(self, w, h, *args, **kwargs):
+        u"""Start a new recording of a document."""
+        self.commands = [('newDocument', (w, h) + args, kwargs)]
+
+    def saveDocument(self, path, multiPage=True):
+        u"""Replay the display list into the reference context and save the document as path.
+        This can be done for multiple paths, without building the document again."""
+        self.replay(self.context)
+        self.context.saveDocument(path, multiPage=multiPage)
+
+    saveImage = saveDocument # Compatible API with DrawBot
+
+    def replay(self, context):
+        u"""Replay the display list into context. Builder calls are replayed by the context API if
+        it has a method with the same name, otherwise by the builder of the context. Answer the
+        amount of builder calls that were skipped, because the context cannot draw them."""
+        if hasattr(context, 'newDrawing'): # Clear pages of previous replays, e.g. in DrawBot.
+            context.newDrawing()
+        skipped = 0
+        for name, args, kwargs in self.commands:
+            if name.startswith('b.'):
+                name = name[2:]
+                method = getattr(context, name, None)
+                if method is None:
+                    method = getattr(context.b, name, None)
+                if method is None:
+                    skipped += 1
+                    continue
+            else:
+                method = getattr(context, name)
+            method(*[_replayValue(arg, context) for arg in args], **kwargs)
+        return skipped
+
+    def saveDisplayList(self, path):
+        u"""Save the display list as path, to be loaded by loadDisplayList."""
+        f = open(path, 'wb')
+        cPickle.dump((DISPLAY_LIST_VERSION, self.commands), f, cPickle.HIGHEST_PROTOCOL)
+        f.close()
+
+    @classmethod
+    def loadDisplayList(cls, path, context=None):
+        u"""Answer a new RecordingContext with the display list saved as path."""
+        f = open(path, 'rb')
+        version, commands = cPickle.load(f)
+        f.close()
+        assert version == DISPLAY_LIST_VERSION, '[%s] Cannot load display list version %s' % (cls.__name__, version)
+        recording = cls(context)
+        recording.commands = commands
+        return recording
+
+    #   T E X T
+
+    def textSize(self, bs, w=None, h=None):
+        u"""Answer the size of the string, as measured by the reference context."""
+        return self.context.textSize(bs.getString(self.context), w=w, h=h)
+
+    def textOverflow(self, bs, bounds, align=None):
+        u"""Answer the overflow of the string in bounds, as measured by the reference context."""
+        if align is None:
+            return self.context.textOverflow(bs.getString(self.context), bounds)
+        return self.context.textOverflow(bs.getString(self.context), bounds, align)
+
+    def textBoxBaseLines(self, txt, box):
+        return self.context.textBoxBaseLines(_replayValue(txt, self.context), box)
+
+    def newBulletString(self, bullet, e=None, style=None):
+        return self.newString(bullet, e=e, style=style)
+
+for _name in RECORDED_METHODS:
+    if _name not in RecordingContext.__dict__:
+        setattr(RecordingContext, _name, _newRecorder(_name))
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
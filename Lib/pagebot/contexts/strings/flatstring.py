@@ -16,6 +16,7 @@
 #     http://xxyxyz.org/flat
 
 from pagebot.contexts.strings.babelstring import BabelString
+from pagebot.contexts.strings.measurestring import MeasureString
 from pagebot.style import css, LEFT
 
 class FlatString(BabelString):
@@ -25,7 +26,27 @@ class FlatString(BabelString):
     DEFAULT_FONTSIZE = 12
     DEFAULT_LEADING = 0
 
-    u"""FlatString is a wrapper around the Flat string."""
+    u"""FlatString is a wrapper around the Flat string. It keeps the runs of (text, fontPath,
+    fontSize, lineHeight, tracking, paragraph) of the text, to measure the string and break its
+    lines by the metrics of the font files, with MeasureString.
+
+    >>> from pagebot.contexts.platform import getFontPaths
+    >>> fontPath = getFontPaths()['Roboto-Regular.ttf']
+    >>> fs = FlatString(u'ABC ' * 10, None, runs=[(u'ABC ' * 10, fontPath, 10, 12, 0)])
+    >>> w, h = fs.textSize(w=100)
+    >>> int(w), h
+    (84, 36)
+    >>> overflow = fs.textOverflow(100, 25)
+    >>> overflow.__class__.__name__, len(overflow), overflow.runs[0][2:]
+    ('FlatString', 8, (10, 12, 0))
+    """
+
+    def __init__(self, s, context, runs=None):
+        BabelString.__init__(self, s, context)
+        if runs is None:
+            runs = [(u'%s' % s, self.DEFAULT_FONT, self.DEFAULT_FONTSIZE, None, 0)]
+        self.runs = runs
+        self._measureString = None
 
     def _get_s(self):
         u"""Answer the embedded Flat equivalent of a OSX FormattedString by property, to enforce checking type of the string."""
@@ -46,7 +67,7 @@ class FlatString(BabelString):
         >>> len(fs)
         3
         """
-        return len(str(self.s))
+        return len(self.asText())
   
     def asText(self):
         u"""Answer as unicode string.
@@ -56,28 +77,91 @@ class FlatString(BabelString):
         >>> fs.s
         'ABC'
         >>> fs.asText()
-        'ABC'
+        u'ABC'
         """
-        return str(self.s) # TODO: To be changed to Flat string behavior.
+        return u''.join([run[0] for run in self.runs])
+
+    def _getMeasureString(self):
+        u"""Answer the MeasureString of the runs, that keeps the measured lines."""
+        if self._measureString is None:
+            self._measureString = MeasureString(self.runs, self.context)
+        return self._measureString
 
     def textSize(self, w=None, h=None):
         u"""Answer the (w, h) size for a given width, with the current text."""
-        return 100, 20
-        # TODO: Make this work in Flat same as in DrawBot
-        #return self.b.textSize(s)
+        return self._getMeasureString().textSize(w, h)
  
     def textOverflow(self, w, h, align=LEFT):
-        # TODO: Make this work in Flat same as in DrawBot
-        # TODO: Some stuff needs to get here.
-        return ''
+        u"""Answer the FlatString with the text that does not fit in a box of (w, h)."""
+        overflow = self._getMeasureString().textOverflow(w, h, align)
+        return self.__class__.fromRuns(overflow.runs, self.context)
+
+    def getLines(self, w=None):
+        u"""Answer the list of (offset, width, height) lines of the string, wrapped in width w."""
+        return self._getMeasureString().getLines(w)
+
+    def getTextLines(self, w=None, h=None):
+        u"""Answer the list of TextLine instances of the string, wrapped in width w, that fit in h."""
+        return self._getMeasureString().getTextLines(w, h)
+
+    def __eq__(self, s):
+        u"""Compare as plain text, e.g. to test for empty overflow."""
+        if isinstance(s, BabelString):
+            s = s.asText()
+        return self.asText() == s
+
+    def __ne__(self, s):
+        return not self.__eq__(s)
 
     def append(self, s):
-        u"""Append string or FlatString to self."""
-        # TODO: Make this to work.
-        #try:
-        #    self.s += s.s
-        #except TypeError:
-        #    self.s += `s` # Convert to babel string, whatever it is.
+        u"""Append string or FlatString to self. A plain string gets the style of the last run."""
+        if isinstance(s, FlatString):
+            runs = s.runs
+        elif self.runs:
+            runs = [(u'%s' % s,) + self.runs[-1][1:]]
+        else:
+            return
+        self.runs = self.runs + runs
+        self._measureString = None
+        if self.context is not None and self.context.b is not None:
+            self.s = self.getFlatText(self.context, self.runs)
+
+    @classmethod
+    def getFlatText(cls, context, runs):
+        u"""Answer the Flat text with the paragraphs and spans of the runs."""
+        b = context.b
+        strikes = {}
+        paragraphs = []
+        spans = []
+        for run in runs:
+            text, fontPath, fontSize, lineHeight = run[:4]
+            key = fontPath, fontSize, lineHeight
+            strike = strikes.get(key)
+            if strike is None:
+                try:
+                    font = b.font.open(fontPath)
+                except ValueError:
+                    font = b.font.open(context.getFontPathOfFont(cls.DEFAULT_FONT))
+                strike = strikes[key] = b.strike(font)
+                strike.size(fontSize, lineHeight, units='pt')
+            for index, line in enumerate(text.split(u'\n')):
+                if index:
+                    paragraphs.append(b.paragraph(spans or [strike.span(u'')]))
+                    spans = []
+                if line:
+                    spans.append(strike.span(line))
+        if spans or not paragraphs:
+            paragraphs.append(b.paragraph(spans or [strike.span(u'')]))
+        return b.text(paragraphs)
+
+    @classmethod
+    def fromRuns(cls, runs, context):
+        u"""Answer a new FlatString with the runs."""
+        if context is not None and context.b is not None and runs:
+            s = cls.getFlatText(context, runs)
+        else:
+            s = u''.join([run[0] for run in runs])
+        return cls(s, context, runs)
 
     @classmethod
     def newString(cls, s, context, e=None, style=None, w=None, h=None, fontSize=None, styleName=None, tagName=None):
@@ -90,37 +174,20 @@ class FlatString(BabelString):
         >>> bs = FlatString.newString('AAA', context, style=dict(font='Verdana', fontSize=30))
         >>> #bs.s.lines()
         """
-        if style is None:
-            style = {}
-            
-        sUpperCase = css('uppercase', e, style)
-        sLowercase = css('lowercase', e, style)
-        sCapitalized = css('capitalized', e, style)
-        if sUpperCase:
-            s = s.upper()
-        elif sLowercase:
-            s = s.lower()
-        elif sCapitalized:
-            s = s.capitalize()
-
         # Since Flat does not do font GSUB feature compile, we'll make the transformed string here,
         # using Tal's https://github.com/typesupply/compositor
         # This needs to be installed, in case PageBot is running outside of DrawBot.
 
-        fontPath = context.getFontPathOfFont(style.get('font'))
-        if fontPath is None:
-            fontPath = context.getFontPathOfFont(cls.DEFAULT_FONT)
-        try:
-            font = context.b.font.open(fontPath)
-        except ValueError:
-            fontPath = context.getFontPathOfFont(cls.DEFAULT_FONT)
-            font = context.b.font.open(fontPath)
-        strike = context.b.strike(font)
-        strike.size(fontSize or style.get('fontSize', cls.DEFAULT_FONTSIZE), 
-            style.get('leading', cls.DEFAULT_LEADING), units='pt')
-        #if w is not None:
-        #    strike.width = w
-        return cls(strike.text(s), context) # Make real Flat flavor BabelString here.
+        # The font, size, leading and tracking of the style are resolved as for the MeasureString,
+        # which also scales the fontSize to fit w or h, if defined.
+        measureString = MeasureString.newString(s, context, e=e, style=style, w=w, h=h,
+            fontSize=fontSize or css('fontSize', e, style) or cls.DEFAULT_FONTSIZE)
+        runs = []
+        for text, fontPath, runFontSize, lineHeight, tracking, paragraph in measureString.runs:
+            if lineHeight is None: # Default leading of Flat.
+                lineHeight = 1.1 * runFontSize + 1
+            runs.append((text, fontPath, runFontSize, lineHeight, tracking, paragraph))
+        return cls.fromRuns(runs, context) # Make real Flat flavor BabelString here.
         
         
 if __name__ == '__main__':
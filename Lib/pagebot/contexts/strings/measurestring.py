@@ -0,0 +1,453 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     measurestring.py
+#
+from __future__ import division
+import re
+
+from pagebot.contexts.strings.babelstring import BabelString
+from pagebot.fonttoolbox.fontmetrics import getFontMetrics, numpy # numpy is None if not installed.
+from pagebot.toolbox.linebreaking import breakLines, getLayout
+from pagebot.style import css, LEFT, GREEDY
+
+NEWLINES = re.compile(r'\n')
+
+# Code points of the white space between words, as matched by \s in pagebot.toolbox.linebreaking.WORDS.
+WHITE_SPACE_CODES = (9, 10, 11, 12, 13, 32)
+
+# Paragraph style of runs without one: (firstLineIndent, indent, tailIndent, language, lineBreaking)
+DEFAULT_PARAGRAPH = (0, 0, 0, None, GREEDY)
+
+class MeasureString(BabelString):
+    u"""MeasureString keeps the text of a string in runs with the font metrics, size, line height
+    and tracking of their style, to measure text size and overflow without making the string of
+    a drawing context. Runs are (text, fontPath, fontSize, lineHeight, tracking, paragraph) tuples,
+    where lineHeight is None if the line height of the font is used and the optional paragraph is
+    the (firstLineIndent, indent, tailIndent, language, lineBreaking) tuple of the paragraph style.
+    Paragraphs take the style of their first run. Lines are broken by pagebot.toolbox.linebreaking,
+    hyphenated if language is not None, and cached by the runs of the paragraph and the width.
+
+    >>> bs = MeasureString.newString(u'ABC ' * 10, None, style=dict(font='Roboto-Regular.ttf', fontSize=10, leading=12))
+    >>> len(bs), bs.runs[0][1].split('/')[-1], bs.runs[0][2:]
+    (40, 'Roboto-Regular.ttf', (10, 12, 0, (0, 0, 0, None, 'greedy')))
+    >>> w, h = bs.textSize()
+    >>> int(w), h
+    (214, 12)
+    >>> w, h = bs.textSize(w=100)
+    >>> int(w), h
+    (84, 36)
+    >>> overflow = bs.textOverflow(100, 25)
+    >>> len(overflow), overflow.asText().startswith('ABC')
+    (8, True)
+    >>> bs += MeasureString.newString(u'\\nDEF', None, style=dict(font='Roboto-Regular.ttf', fontSize=20, leading=24))
+    >>> bs.textSize()[1]
+    36
+    >>> bs = MeasureString.newString(u'ABC', None, style=dict(font='Roboto-Regular.ttf', fontSize=10), w=100)
+    >>> round(bs.textSize()[0], 2), round(bs.runs[0][2], 2)
+    (100.0, 51.93)
+    >>> style = dict(font='Roboto-Regular.ttf', fontSize=10, leading=12, indent=20, firstLineIndent=10)
+    >>> bs = MeasureString.newString(u'ABC ' * 10, None, style=style)
+    >>> [(offset, int(w), h) for offset, w, h in bs.getLines(100)]
+    [(0, 92, 12), (12, 82, 12), (24, 82, 12), (36, 39, 12)]
+    """
+    BABEL_STRING_TYPE = 'measure'
+
+    DEFAULT_FONT = 'AmstelvarAlpha-VF.ttf' # Part of PageBot, we can assume it is there.
+    DEFAULT_FONTSIZE = 16
+
+    def __init__(self, runs, context):
+        BabelString.__init__(self, u''.join([run[0] for run in runs]), context)
+        self.runs = runs
+        self._charMetrics = None
+
+    def append(self, s):
+        u"""Append MeasureString or plain string, in the style of the last run, to self."""
+        if isinstance(s, MeasureString):
+            runs = s.runs
+        elif self.runs:
+            runs = [(u'%s' % s,) + self.runs[-1][1:]]
+        else:
+            return
+        self.runs = self.runs + runs
+        self.s += u''.join([run[0] for run in runs])
+        self._charMetrics = None
+
+    def asText(self):
+        return self.s
+
+    def __eq__(self, s):
+        u"""Compare as plain text, e.g. to test for empty overflow."""
+        return self.s == getattr(s, 's', s)
+
+    def __ne__(self, s):
+        return not self.__eq__(s)
+
+    def _getCharMetrics(self):
+        u"""Answer the (cumulated, heights, newlines, runStarts) lists of the string, cached
+        until the string changes. cumulated has the x-position after each character (starting
+        with 0), heights has the line height of each character, newlines are the indices of the
+        line endings and runStarts are the indices of the first character of each run."""
+        if self._charMetrics is None:
+            widths = []
+            heights = []
+            runStarts = []
+            for run in self.runs:
+                text, fontPath, fontSize, lineHeight, tracking = run[:5]
+                runStarts.append(len(heights))
+                metrics = getFontMetrics(fontPath)
+                if lineHeight is None:
+                    lineHeight = (metrics.ascender - metrics.descender + metrics.lineGap) * fontSize / metrics.unitsPerEm
+                scale = fontSize / metrics.unitsPerEm
+                runWidths = metrics.getCharWidths(text)
+                if numpy is not None:
+                    widths.append(runWidths * scale + tracking)
+                else:
+                    widths.extend([width * scale + tracking for width in runWidths])
+                heights.extend([lineHeight] * len(text))
+            if numpy is not None and widths:
+                cumulated = numpy.concatenate([[0]] + widths).cumsum().tolist()
+            else:
+                cumulated = [0]
+                for width in widths:
+                    cumulated.append(cumulated[-1] + width)
+            newlines = [match.start() for match in NEWLINES.finditer(self.s)]
+            self._charMetrics = cumulated, heights, newlines, runStarts
+        return self._charMetrics
+
+    def getLines(self, w=None):
+        u"""Answer the list of (offset, width, height) lines of the string, where offset is the
+        index of the first character and width includes the indents. If w is not None, lines break
+        to fit in width w. Words that are wider than w get a line of their own."""
+        cumulated, heights, newlines, _ = self._getCharMetrics()
+        lines = []
+        paragraphStart = 0
+        for paragraphEnd in newlines + [len(self)]:
+            paragraphLines = self._getParagraphLines(paragraphStart, paragraphEnd, w)
+            if paragraphLines:
+                lines.extend(paragraphLines)
+            elif paragraphEnd < len(self): # Paragraph without words
+                lines.append((paragraphStart, 0, heights[paragraphEnd]))
+            elif paragraphStart < paragraphEnd:
+                lines.append((paragraphStart, 0, heights[paragraphStart]))
+            paragraphStart = paragraphEnd + 1
+        return lines
+
+    def _getParagraphLines(self, start, end, w):
+        u"""Answer the (offset, width, height) lines of the paragraph from index start to end,
+        in the style of its first run. The layout is cached by the runs of the paragraph and w,
+        so solving the same paragraph again does not break its lines again."""
+        cumulated, heights, _, runStarts = self._getCharMetrics()
+        pieces = []
+        paragraph = None
+        for run, runStart in zip(self.runs, runStarts):
+            runEnd = runStart + len(run[0])
+            if runEnd <= start or runEnd == runStart:
+                continue
+            if runStart >= end:
+                break
+            if paragraph is None:
+                _, fontPath, fontSize = run[:3]
+                paragraph = self._getParagraph(run)
+            pieces.append((run[0][max(0, start - runStart):end - runStart],) + run[1:])
+        if paragraph is None:
+            return []
+        firstLineIndent, indent, tailIndent, language, lineBreaking = paragraph
+        text = self.s[start:end]
+        hyphenWidth = 0
+        if language is not None:
+            metrics = getFontMetrics(fontPath)
+            hyphenWidth = metrics.getCharWidths(u'-')[0] * fontSize / metrics.unitsPerEm
+        layout = getLayout((tuple(pieces), w), breakLines, text, cumulated[start:end+1], w,
+            firstLineIndent, indent, tailIndent, hyphenWidth, language, lineBreaking)
+        lines = []
+        for index, (lineStart, lineEnd, width, _) in enumerate(layout):
+            width += indent
+            if not index:
+                width += firstLineIndent
+            lines.append((start + lineStart, width, max(heights[start + lineStart:start + lineEnd])))
+        return lines
+
+    def getTextLines(self, w=None, h=None):
+        u"""Answer the list of TextLine instances of the string, broken to fit in width w, that fit
+        in a box of height h. The y of each line is the position of its baseline, up from the bottom
+        of the box, as with the lines of DrawBot. If h is None, the box fits all lines.
+
+        >>> bs = MeasureString.newString(u'ABC ' * 10, None, style=dict(font='Roboto-Regular.ttf', fontSize=10, leading=12))
+        >>> textLines = bs.getTextLines(100, 30)
+        >>> textLines
+        [<TextLine #0 y=20.44 ABC ABC ABC ABC >, <TextLine #1 y=8.44 ABC ABC ABC ABC >]
+        >>> bs.getTextLines(100)[-1]
+        <TextLine #2 y=2.44 ABC ABC >
+        >>> textLines[1].string, int(textLines[1].w)
+        (u'ABC ABC ABC ABC ', 84)
+        """
+        textLines = []
+        lines = self.getLines(w)
+        if h is None:
+            h = sum([lineHeight for _, _, lineHeight in lines])
+        top = 0
+        for lineIndex, (offset, width, lineHeight) in enumerate(lines):
+            if lineIndex < len(lines) - 1:
+                end = lines[lineIndex + 1][0]
+            else:
+                end = len(self)
+            bs = self[offset:end]
+            if h is not None and top + lineHeight > h:
+                break
+            firstLineIndent, indent, _, _, _ = self._getParagraph(bs.runs[0])
+            x = indent
+            if not offset or self.s[offset-1] == u'\n':
+                x += firstLineIndent
+            y = h - top - lineHeight - bs.fontDescender() # Descender is negative.
+            textLines.append(TextLine(bs, (x, y), lineIndex, width - x, lineHeight))
+            top += lineHeight
+        return textLines
+
+    def textSize(self, w=None, h=None):
+        u"""Answer the (w, h) size of the string. If w is defined, the lines are wrapped in
+        that width."""
+        width = height = 0
+        for _, lineWidth, lineHeight in self.getLines(w):
+            width = max(width, lineWidth)
+            height += lineHeight
+        return width, height
+
+    def textOverflow(self, w, h, align=LEFT):
+        u"""Answer the MeasureString with the text that does not fit in a box of (w, h)."""
+        height = 0
+        for offset, _, lineHeight in self.getLines(w):
+            height += lineHeight
+            if height > h:
+                return self[offset:]
+        return self[len(self):]
+
+    def __getitem__(self, index):
+        u"""Answer the MeasureString of the slice of characters, keeping the runs."""
+        start, stop, _ = index.indices(len(self))
+        runs = []
+        offset = 0
+        for run in self.runs:
+            text = run[0][max(0, start - offset):max(0, stop - offset)]
+            if text:
+                runs.append((text,) + run[1:])
+            offset += len(run[0])
+        return self.__class__(runs, self.context)
+
+    def _getParagraph(self, run):
+        u"""Answer the paragraph style tuple of run."""
+        if len(run) > 5:
+            return run[5]
+        return DEFAULT_PARAGRAPH
+
+    def _getFontValue(self, name):
+        u"""Answer the metrics value of the font of the first run, scaled to its fontSize."""
+        if not self.runs:
+            return 0
+        _, fontPath, fontSize = self.runs[0][:3]
+        metrics = getFontMetrics(fontPath)
+        return (getattr(metrics, name) or 0) * fontSize / metrics.unitsPerEm
+
+    def fontFilePath(self):
+        if self.runs:
+            return self.runs[0][1]
+        return None
+
+    def fontAscender(self):
+        return self._getFontValue('ascender')
+
+    def fontDescender(self):
+        return self._getFontValue('descender')
+
+    def fontXHeight(self):
+        return self._getFontValue('xHeight')
+
+    def fontCapHeight(self):
+        return self._getFontValue('capHeight')
+
+    def fontLeading(self):
+        return self._getFontValue('lineGap')
+
+    def fontLineHeight(self):
+        if not self.runs:
+            return 0
+        lineHeight = self.runs[0][3]
+        if lineHeight is None:
+            lineHeight = self.fontAscender() - self.fontDescender() + self.fontLeading()
+        return lineHeight
+
+    @classmethod
+    def newString(cls, s, context, e=None, style=None, w=None, h=None, fontSize=None, styleName=None, tagName=None):
+        u"""Answer a MeasureString instance from the font, size, leading and tracking in style and
+        the parent tree of e. If target width w or height h is defined, then fontSize is scaled
+        to make the string fit w or h."""
+        if s is None:
+            s = u''
+        if css('uppercase', e, style):
+            s = s.upper()
+        elif css('lowercase', e, style):
+            s = s.lower()
+        elif css('capitalized', e, style):
+            s = s.capitalize()
+        metrics = getFontMetrics(css('font', e, style)) or getFontMetrics(cls.DEFAULT_FONT)
+        sFontSize = fontSize or css('fontSize', e, style) or cls.DEFAULT_FONTSIZE
+        sLeading = css('leading', e, style)
+        rLeading = css('rLeading', e, style)
+        lineHeight = (sLeading or 0) + (rLeading or 0) * sFontSize or None
+        tracking = (css('tracking', e, style) or 0) + (css('rTracking', e, style) or 0) * sFontSize
+        firstLineIndent = (css('firstLineIndent', e, style) or 0) + (css('rFirstLineIndent', e, style) or 0) * sFontSize
+        indent = (css('indent', e, style) or 0) + (css('rIndent', e, style) or 0) * sFontSize
+        tailIndent = (css('tailIndent', e, style) or 0) + (css('rTailIndent', e, style) or 0) * sFontSize
+        if css('hyphenation', e, style):
+            language = css('language', e, style) or 'en'
+        else:
+            language = None
+        paragraph = (firstLineIndent, indent, tailIndent, language, css('lineBreaking', e, style) or GREEDY)
+        bs = cls([(s, metrics.path, sFontSize, lineHeight, tracking, paragraph)], context)
+        if w is not None or h is not None:
+            tw, th = bs.textSize()
+            if w is not None and tw:
+                fontSize = w / tw * sFontSize
+            elif h is not None and th:
+                fontSize = h / th * sFontSize
+            else:
+                return bs
+            # Note that this assumes a linear relation between size and width, which may not be the the case
+            # with tracking and with [opsz] optical size axes of Variable Fonts.
+            bs = cls.newString(s, context, e, style, fontSize=fontSize, styleName=styleName, tagName=tagName)
+        return bs
+
+class TextLine(object):
+    u"""Line of a MeasureString, as answered by MeasureString.getTextLines. (x, y) is the position
+    of the start of its baseline, relative to the bottom-left of the text box."""
+    def __init__(self, bs, p, lineIndex, w, h):
+        self.bs = bs # MeasureString with the text of the line.
+        self.x, self.y = p
+        self.lineIndex = lineIndex # Vertical line index in TextBox.
+        self.w = w # Width of the text on the line, without indents.
+        self.h = h # Line height
+
+    def __repr__(self):
+        return '<TextLine #%d y=%s %s>' % (self.lineIndex, round(self.y, 2), self.string.encode('utf-8'))
+
+    def __len__(self):
+        return len(self.bs)
+
+    def _get_string(self):
+        return self.bs.asText()
+    string = property(_get_string)
+
+    def _get_runs(self):
+        u"""Answer the list of TextRun instances of the line."""
+        return [TextRun(run, runIndex) for runIndex, run in enumerate(self.bs.runs)]
+    runs = property(_get_runs)
+
+class TextRun(object):
+    u"""Run of a TextLine, with the text and the style values of a MeasureString run."""
+    def __init__(self, run, runIndex):
+        self.runIndex = runIndex # Index of the run in the TextLine
+        self.string, self.fontPath, self.fontSize, self.lineHeight, self.tracking = run[:5]
+
+    def __repr__(self):
+        return '[TextRun #%d "%s"]' % (self.runIndex, self.string.encode('utf-8'))
+
+    def _get_style(self):
+        u"""Answer the style dictionary of the run, with names that fit the standard PageBot style."""
+        return dict(font=self.fontPath, fontSize=self.fontSize, leading=self.lineHeight,
+            tracking=self.tracking)
+    style = property(_get_style)
+
+def getTextSizes(strings, fontPath, fontSize, lineHeight=None, tracking=0, w=None):
+    u"""Answer the list of (w, h) sizes of the strings in the same font, fontSize, lineHeight
+    and tracking, as MeasureString.textSize answers them for strings without paragraph style.
+    If w is defined, the lines are wrapped in that width. The widths and kerning of all strings
+    are looked up together, and the greedy line breaks of all paragraphs are found together,
+    a line of every paragraph at a time, so measuring many strings does not need Python code
+    per string or per line.
+
+    >>> from pagebot.contexts.platform import getFontPaths
+    >>> fontPath = getFontPaths()['Roboto-Regular.ttf']
+    >>> strings = [u'ABC ' * 10, u'', u'AVA\\n\\nVAV  ', u'  Hamburgefonstiv\\n', u'A' * 30 + u' B', u' ']
+    >>> for w in (None, 50):
+    ...     sizes = getTextSizes(strings, fontPath, 10, 12, 0.5, w)
+    ...     for s, (w1, h1) in zip(strings, sizes):
+    ...         w2, h2 = MeasureString([(s, fontPath, 10, 12, 0.5)], None).textSize(w)
+    ...         if abs(w1 - w2) > 0.001 or h1 != h2:
+    ...             print repr(s), (w1, h1), (w2, h2)
+    >>> getTextSizes([u'ABC ' * 10], fontPath, 10, 12, w=100)[0][1]
+    36
+    """
+    if numpy is None or not strings:
+        return [MeasureString([(s, fontPath, fontSize, lineHeight, tracking)], None).textSize(w) for s in strings]
+    metrics = getFontMetrics(fontPath)
+    if lineHeight is None:
+        lineHeight = (metrics.ascender - metrics.descender + metrics.lineGap) * fontSize / metrics.unitsPerEm
+    widths = metrics.getJoinedCharWidths(strings) * (fontSize / metrics.unitsPerEm) + tracking
+    cumulated = numpy.concatenate(([0], numpy.cumsum(widths)))
+    stringEnds = numpy.cumsum([len(s) for s in strings])
+    stringStarts = numpy.concatenate(([0], stringEnds[:-1]))
+    codes = numpy.fromstring(u''.join(strings).encode('utf-32-le'), dtype='<u4')
+    # Paragraphs end at the newlines and at the end of each string, in order of position.
+    newlines = numpy.flatnonzero(codes == 10)
+    paragraphEnds = numpy.concatenate((newlines, stringEnds))
+    paragraphStrings = numpy.concatenate((numpy.searchsorted(stringEnds, newlines, 'right'), numpy.arange(len(strings))))
+    order = numpy.lexsort((paragraphEnds, paragraphStrings))
+    paragraphEnds = paragraphEnds[order]
+    paragraphStrings = paragraphStrings[order]
+    firstParagraphs = numpy.searchsorted(paragraphStrings, numpy.arange(len(strings)))
+    paragraphStarts = numpy.concatenate(([0], paragraphEnds[:-1] + 1))
+    paragraphStarts[firstParagraphs] = stringStarts
+    # Words, that don't continue over the start or end of a string.
+    boundaries = numpy.zeros(len(codes) + 1, dtype=bool)
+    boundaries[stringStarts] = boundaries[stringEnds] = True
+    isSpace = numpy.in1d(codes, WHITE_SPACE_CODES)
+    wordStarts = numpy.flatnonzero(~isSpace & (numpy.concatenate(([True], isSpace[:-1])) | boundaries[:-1]))
+    wordEnds = numpy.flatnonzero(~isSpace & (numpy.concatenate((isSpace[1:], [True])) | boundaries[1:])) + 1
+    wordParagraphs = numpy.searchsorted(paragraphEnds, wordStarts, 'right')
+    paragraphs = numpy.arange(len(paragraphEnds))
+    firstWords = numpy.searchsorted(wordParagraphs, paragraphs)
+    lastWords = numpy.searchsorted(wordParagraphs, paragraphs, 'right') - 1
+    hasWords = lastWords >= firstWords
+    breakX = cumulated[wordEnds]
+    # Paragraphs without words get an empty line, except an empty last paragraph of a string.
+    lineCounts = ((paragraphStarts < paragraphEnds) | (paragraphEnds < stringEnds[paragraphStrings])).astype(int)
+    lineWidths = numpy.zeros(len(paragraphEnds))
+    lineCounts[hasWords] = 0
+    if w is None:
+        lineCounts[hasWords] = 1
+        lineWidths[hasWords] = breakX[lastWords[hasWords]] - cumulated[paragraphStarts[hasWords]]
+    else:
+        # The start of the next line after each word is the start of the next word in the paragraph.
+        nextStarts = numpy.concatenate((wordStarts[1:], [0]))
+        nextStarts[lastWords[hasWords]] = paragraphEnds[hasWords]
+        active = numpy.flatnonzero(hasWords)
+        index = firstWords[active]
+        lineStart = paragraphStarts[active]
+        while len(active):
+            x = cumulated[lineStart]
+            last = numpy.searchsorted(breakX, x + w, 'right') - 1
+            last = numpy.maximum(numpy.minimum(last, lastWords[active]), index) # Nothing fits: first word.
+            lineWidths[active] = numpy.maximum(lineWidths[active], breakX[last] - x)
+            lineCounts[active] += 1
+            index = last + 1
+            lineStart = nextStarts[last]
+            more = index <= lastWords[active]
+            active, index, lineStart = active[more], index[more], lineStart[more]
+    sizeWidths = numpy.maximum.reduceat(lineWidths, firstParagraphs).tolist()
+    sizeLines = numpy.add.reduceat(lineCounts, firstParagraphs).tolist()
+    return [(width, lines * lineHeight) for width, lines in zip(sizeWidths, sizeLines)]
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -0,0 +1,114 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     recordedstring.py
+#
+from pagebot.contexts.strings.babelstring import BabelString
+from pagebot.style import css, getRootStyle
+
+ROOT_STYLE_NAMES = [] # Names of all root style values, initialized on first use.
+
+def getResolvedStyle(e, style):
+    u"""Answer the dictionary with the values of all root style names, as they cascade from
+    style and the parent tree of element e, so a string can be made from the style without e.
+
+    >>> from pagebot.elements import Element
+    >>> e = Element(style=dict(fontSize=20, leading=24))
+    >>> style = getResolvedStyle(e, dict(fontSize=12))
+    >>> style['fontSize'], style['leading']
+    (12, 24)
+    """
+    if not ROOT_STYLE_NAMES:
+        ROOT_STYLE_NAMES.extend(getRootStyle().keys())
+    resolved = dict(style or {})
+    if e is not None:
+        for name in ROOT_STYLE_NAMES:
+            if name not in resolved:
+                value = e.css(name)
+                if value is not None:
+                    resolved[name] = value
+    return resolved
+
+class RecordedString(BabelString):
+    u"""RecordedString keeps the text and the resolved style of the parts of a string, as they
+    were created in a RecordingContext. It creates the equivalent native string (DrawBotString,
+    FlatString, ...) for any other context, by getString(context).
+
+    >>> from pagebot.contexts.drawbotcontext import DrawBotContext
+    >>> bs = RecordedString.newString(u'ABC', None, style=dict(fontSize=12))
+    >>> bs += RecordedString.newString(u'DEF', None, style=dict(fontSize=14))
+    >>> bs
+    ABCDEF
+    >>> len(bs), bs.runs[1]
+    (6, (u'DEF', {'fontSize': 14}, None, None, None))
+    >>> bs = RecordedString.newString(u'ABC', None)
+    >>> bs.getString(DrawBotContext()).__class__.__name__
+    'NoneDrawBotString'
+    """
+    BABEL_STRING_TYPE = 'recorded'
+
+    def __init__(self, runs, context):
+        BabelString.__init__(self, u''.join([run[0] for run in runs]), context)
+        self.runs = runs # List of (text, style, w, h, fontSize) tuples.
+        self._strings = {} # Native strings by context class.
+
+    def __getstate__(self):
+        u"""Pickle the text and styles only, without context and created native strings."""
+        return dict(s=self.s, runs=self.runs)
+
+    def __setstate__(self, state):
+        self.__init__(state['runs'], None)
+
+    def append(self, s):
+        u"""Append RecordedString or plain string to self."""
+        if isinstance(s, RecordedString):
+            runs = s.runs
+        else:
+            runs = [(u'%s' % s, {}, None, None, None)]
+        self.runs = self.runs + runs
+        self.s += u''.join([run[0] for run in runs])
+        self._strings = {}
+
+    def __getattr__(self, name):
+        u"""Answer the other methods (e.g. textSize, textOverflow, fontAscender) from the native
+        string of the reference context of the RecordingContext."""
+        if name.startswith('_') or name in ('runs', 'context'):
+            raise AttributeError(name)
+        context = self.context
+        return getattr(self.getString(getattr(context, 'context', context)), name)
+
+    def asText(self):
+        return self.s
+
+    def getString(self, context):
+        u"""Answer the native string of context, made from the recorded runs."""
+        bs = self._strings.get(context.__class__)
+        if bs is None:
+            for text, style, w, h, fontSize in self.runs:
+                runString = context.newString(text, style=style, w=w, h=h, fontSize=fontSize)
+                if bs is None:
+                    bs = runString
+                else:
+                    bs += runString
+            self._strings[context.__class__] = bs
+        return bs
+
+    @classmethod
+    def newString(cls, s, context, e=None, style=None, w=None, h=None, fontSize=None, styleName=None, tagName=None):
+        u"""Answer a RecordedString with the text s and the style resolved from style and e."""
+        return cls([(s, getResolvedStyle(e, style), w, h, fontSize)], context)
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -18,9 +18,11 @@ import copy
 from pagebot.contexts import defaultContext # Default context for this document if undefined.
 from pagebot.stylelib import styleLib # Library with named, predefined style dicts.
 from pagebot.conditions.score import Score
+from pagebot.conditions.solver import solveIterative, solvePagesParallel, DEFAULT_SOLVE_TOLERANCE
 from pagebot.elements.pbpage import Page, Template
 from pagebot.elements.views import viewClasses, defaultViewClass
-from pagebot.style import getRootStyle, TOP, BOTTOM
+from pagebot.elements.elementindex import ElementIndex
+from pagebot.style import getRootStyle, Style, NO_VALUE, TOP, BOTTOM
 from pagebot.toolbox.transformer import obj2StyleId
 from pagebot.contexts.builders.buildinfo import BuildInfo # Container with Builder flags and data/parametets
 
@@ -59,6 +61,12 @@ class Document(object):
         # Set the context. Initialize from default if not defined.
         self.context = context or self.DEFAULT_CONTEXT
 
+        # Preset the containers of child elements, so root style changes can invalidate their css cache.
+        self._elementIndex = None # ElementIndex on all elements by eId and name, created by self.getElementIndex()
+        self.pages = {}
+        self.templates = {}
+        self.view = None
+
         # Apply the theme if defined or create default styles, to make sure they are there.
         self.rootStyle = rs = self.makeRootStyle(rootStyle, **kwargs)
         self.class_ = class_ or self.__class__.__name__ # Optional class name, e.g. to group elements together in HTML/CSS export.
@@ -245,11 +253,94 @@ class Document(object):
                 rootStyle[name] = v 
         return rootStyle
 
+    def _get_rootStyle(self):
+        u"""Property get/set for the root style of the document, which is the end of the chain of
+        cascading css lookups by elements. The style is stored as Style instance, so changes 
+        can invalidate the css values that pages, templates and views cached from it.
+
+        >>> from pagebot.elements import Element
+        >>> doc = Document(w=300, h=400, autoPages=1)
+        >>> e = Element(parent=doc[0])
+        >>> e.css('fill') is None
+        True
+        >>> doc.rootStyle['fill'] = 0.5
+        >>> e.css('fill')
+        0.5
+        """
+        return self._rootStyle
+    def _set_rootStyle(self, rootStyle):
+        self._rootStyle = Style(self, rootStyle)
+        for e in self._getStyleChildren():
+            e.clearCssCache()
+    rootStyle = property(_get_rootStyle, _set_rootStyle)
+
+    def _getStyleChildren(self):
+        u"""Answer the list of elements that inherit their css values directly from self.rootStyle."""
+        children = []
+        for pnPages in self.pages.values():
+            children += pnPages
+        children += self.templates.values()
+        if self.view is not None:
+            children.append(self.view)
+        return children
+
+    def _styleChanged(self, name):
+        u"""Called by self.rootStyle if the value of name changed."""
+        for e in self._getStyleChildren():
+            e._invalidateCss(name)
+
+    def _getCss(self, name):
+        u"""Answer the root style value of name, or NO_VALUE if it is not defined.
+        Used by pages, templates and views to fill their css cache."""
+        return self.rootStyle.get(name, NO_VALUE)
+
     def applyStyle(self, style):
         u"""Apply the key-value of the style onto the self.rootStyle."""
         for key, value in style.items():
             self.rootStyle[key] = value
 
+    #   E L E M E N T S
+
+    def getElementIndex(self):
+        u"""Answer the ElementIndex with all elements of the document by eId and by name. The index is
+        created on the first query. Then appendElement, removeElement, setParent and changing names
+        keep it current.
+
+        >>> from pagebot.elements import newRect
+        >>> doc = Document(w=300, h=400, autoPages=2)
+        >>> r = newRect(parent=doc[0], name='Logo')
+        >>> index = doc.getElementIndex()
+        >>> index.getElementsByName('Logo') == [r]
+        True
+        >>> r2 = newRect(parent=doc[1], name='Logo2') # Added after the index was created.
+        >>> index.getNames(prefix='Logo')
+        ['Logo', 'Logo2']
+        """
+        if self._elementIndex is None:
+            self._elementIndex = ElementIndex(self._getStyleChildren())
+        return self._elementIndex
+
+    def findElements(self, name=None, pattern=None, prefix=None, pageSelection=None):
+        u"""Answer the list of elements on the pages of the document, with a name equal to name, 
+        containing pattern or starting with prefix, in page order and depth-first order on the pages.
+
+        >>> from pagebot.elements import newRect
+        >>> doc = Document(w=300, h=400, autoPages=2)
+        >>> r1 = newRect(parent=doc[1], name='Image1')
+        >>> r2 = newRect(parent=doc[0], name='Image2', elements=[newRect(name='Caption')])
+        >>> doc.findElements(prefix='Image') == [r2, r1]
+        True
+        >>> doc.findElements(pattern='ion')[0].parent is r2
+        True
+        >>> doc.findElements(name='Image1', pageSelection=[0])
+        []
+        """
+        pages = []
+        for pn, pnPages in sorted(self.pages.items()):
+            if pageSelection is None or pn in pageSelection:
+                pages += pnPages
+        return self.getElementIndex().findElements(pages, name=name, pattern=pattern, prefix=prefix)
+
     def getMaxPageSizes(self, pageSelection=None):
         u"""Answer the (w, h, d) size of all pages together. If the optional pageSelection is defined (set of y-values),
         then only evaluate the selected pages."""
@@ -597,21 +688,76 @@ class Document(object):
                 d = max(page.d, d)
             return w, h, d
 
-    def solve(self, score=None):
+    def solve(self, score=None, maxIterations=1, tolerance=DEFAULT_SOLVE_TOLERANCE, parallel=False, processes=None,
+            profile=False):
         u"""Evaluate the content of all pages to return the total sum of conditions solving.
         If necessary, the builder for solving specific text conditions, such as
         run length of text and overflow of text boxes, is found by the current self.view.b.
+        If maxIterations > 1, all pages are solved again until no element moves more than
+        tolerance, until maxIterations passes are done, or until the layout oscillates.
+        If parallel is True, pages without nextPage/prevPage flows are solved in a pool of 
+        processes (default the amount of CPUs). Pages with flows are solved first, in page order.
+        If profile is True, the calls and times of the conditions are collected in the score.
 
         >>> doc = Document(name='TestDoc', w=300, h=400, autoPages=2, padding=(30, 40, 50, 60))
         >>> score = doc.solve()
         >>> score
         Score: 0 Fails: 0
+        >>> from pagebot.elements import newRect
+        >>> from pagebot.conditions import Left2Left, Top2Top
+        >>> page = doc[0]
+        >>> r1 = newRect(parent=page, w=50, h=50, conditions=[Left2Left(), Top2Top()])
+        >>> r2 = newRect(parent=page, w=50, h=50, conditions=[Left2Left(), Top2Top()])
+        >>> score = doc.solve()
+        >>> score.skipped
+        0
+        >>> r1.x = 200 # Second solve only visits the changed element.
+        >>> score = doc.solve()
+        >>> score.skipped, r1.x
+        (1, 0)
+        >>> r1.x = 200
+        >>> score = doc.solve(maxIterations=5, profile=True) # Score of the last pass, that only confirms the layout.
+        >>> score
+        Score: 1 Fails: 0 Skipped: 2 Iterations: 2 Converged
+        >>> sorted(score.conditionCalls.items())
+        [('Left2Left', 1), ('Top2Top', 1)]
+        >>> from pagebot.conditions import Float2Left, Float2Top
+        >>> from pagebot.conditions.solver import getSolveState
+        >>> def makeDoc():
+        ...     doc = Document(w=300, h=400, autoPages=6, padding=20)
+        ...     for pn in range(5):
+        ...         for n in range(pn * 3 + 2):
+        ...             newRect(parent=doc[pn], w=40+n, h=30, conditions=[Left2Left(), Top2Top(), Float2Left(), Float2Top()])
+        ...     newRect(parent=doc[5], w=50, h=50, nextPage=1, conditions=[Left2Left()]) # Flows: solved serially
+        ...     return doc
+        >>> serialDoc, parallelDoc = makeDoc(), makeDoc()
+        >>> serialScore = serialDoc.solve(profile=True)
+        >>> parallelScore = parallelDoc.solve(parallel=True, processes=2, profile=True)
+        >>> pages = lambda doc: [doc[pn] for pn in sorted(doc.pages)]
+        >>> getSolveState(pages(serialDoc)) == getSolveState(pages(parallelDoc))
+        True
+        >>> serialScore.result == parallelScore.result, len(serialScore.fails) == len(parallelScore.fails)
+        (True, True)
+        >>> serialScore.conditionCalls == parallelScore.conditionCalls
+        True
         """
-        score = Score()
+        if score is None:
+            score = Score()
+        pages = [page for pn, pnPages in sorted(self.pages.items()) for page in pnPages]
+        if parallel:
+            solvePass = lambda score: self._solveParallelPass(score, processes)
+        else:
+            solvePass = self._solvePass
+        return solveIterative(pages, solvePass, score, maxIterations, tolerance, profile)
+
+    def _solvePass(self, score):
         for pn, pnPages in sorted(self.pages.items()):
             for page in pnPages: # List of pages with identical pn, step through the pages.
-                page.solve(score)
-        return score
+                page._solvePass(score)
+
+    def _solveParallelPass(self, score, processes):
+        pages = [page for pn, pnPages in sorted(self.pages.items()) for page in pnPages]
+        solvePagesParallel(pages, score, processes)
 
     #   V I E W S
 
@@ -25,6 +25,8 @@ from pagebot.elements.pbline import Line
 from pagebot.elements.pbruler import Ruler
 from pagebot.elements.pbpolygon import Polygon
 from pagebot.elements.pboval import Oval
+# Lightweight elements, for large amounts of simple elements
+from pagebot.elements.lightelement import LightElement, LightRect, LightOval, newLightStyle
 # Page elements
 from pagebot.elements.pbimage import Image
 from pagebot.elements.pbgalley import Galley
@@ -116,6 +118,15 @@ def newColOval(cx=None, cy=None, cw=None, ch=None, **kwargs):
     e.cx, e.cy, e.cw, e.ch = cx, cy, cw, ch, # Correct position from column index.
     return e
 
+def newLightRect(point=None, **kwargs):
+    u"""Draw the rectangle as lightweight element, that only stores its own style values.
+    Use for large amounts of rectangles, e.g. in data visualizations."""
+    return LightRect(point=point, **kwargs)
+
+def newLightOval(point=None, **kwargs):
+    u"""Draw the oval as lightweight element, that only stores its own style values."""
+    return LightOval(point=point, **kwargs)
+
 def newLine(point=None, **kwargs):
     return Line(point=point, **kwargs)
             
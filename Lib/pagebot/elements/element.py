@@ -18,11 +18,16 @@ from __future__ import division
 
 import weakref
 import copy
+from abc import ABCMeta
+from itertools import count
+from time import time
 from pagebot.contexts import defaultContext
 from pagebot.conditions.score import Score
+from pagebot.conditions.solver import solveIterative, DEFAULT_SOLVE_TOLERANCE
 from pagebot import x2cx, cx2x, y2cy, cy2y, z2cz, cz2z  
 from pagebot.toolbox.transformer import point3D, pointOffset, uniqueID
-from pagebot.style import (makeStyle, MIDDLE, CENTER, RIGHT, TOP, BOTTOM,
+from pagebot.toolbox.mathematics import snapValues
+from pagebot.style import (makeStyle, BaseStyle, Style, LayeredStyle, NO_VALUE, MIDDLE, CENTER, RIGHT, TOP, BOTTOM,
                            LEFT, FRONT, BACK, XALIGNS, YALIGNS, ZALIGNS,
                            MIN_WIDTH, MAX_WIDTH, MIN_HEIGHT, MAX_HEIGHT,
                            MIN_DEPTH, MAX_DEPTH, DEFAULT_WIDTH,
@@ -30,11 +35,34 @@ from pagebot.style import (makeStyle, MIDDLE, CENTER, RIGHT, TOP, BOTTOM,
                            INTERPOLATING_TIME_KEYS, ONLINE, INLINE,
                            OUTLINE)
 from pagebot.toolbox.transformer import asFormatted, uniqueID
+from pagebot.elements.floatindex import FloatIndex, getFloatBox, FLOAT_KEYS, FLOAT_INDEX_MIN
 from pagebot.toolbox.timemark import TimeMark
 from pagebot.contexts.builders.buildinfo import BuildInfo # Container with Builder flags and data/parametets
 
+# Global counter of changes. Elements store the stamp of their last change and the stamp of their
+# last solve, so Element.solve can find out which elements need to be solved again.
+changeStamps = count(1)
+
+# Dependencies of the conditions of an element, as recorded during solving.
+SOLVE_PARENT = 'parent' # Conditions read the parent (size, padding, grid, css).
+SOLVE_PREVIOUS = 'previous' # Conditions read the previous sibling elements (e.g. float conditions).
+SOLVE_SIBLINGS = 'siblings' # Conditions read all sibling elements.
+SOLVE_CHILDREN = 'children' # Conditions read the child elements (e.g. the block around them).
+SOLVE_ALWAYS = 'always' # Conditions read other parts of the document, always solve again.
+
+# Style values that the grid of an element depends on. Changing them, locally or in the ancestors
+# that self inherits them from, removes the grid values that self cached.
+GRID_COLUMN_KEYS = frozenset(('w', 'minW', 'maxW', 'pl', 'pr', 'cw', 'gw', 'gridX', 'gridL', 'gridR'))
+GRID_ROW_KEYS = frozenset(('h', 'minH', 'maxH', 'pt', 'pb', 'ch', 'gh', 'gridY'))
+GRID_UNIT_KEYS = frozenset(('cw', 'gw', 'ch', 'gh', 'cd', 'gd'))
+GRID_KEYS = GRID_COLUMN_KEYS | GRID_ROW_KEYS | GRID_UNIT_KEYS
+
 class Element(object):
 
+    # The light element classes (pagebot.elements.lightelement) are registered as virtual subclasses,
+    # so isinstance(e, Element) answers True for them too.
+    __metaclass__ = ABCMeta
+
     # Initialize the default Element behavior flags.
     # These flags can be overwritten by inheriting classes, or dynamically in instances,
     # e.g. where the settings of TextBox.nextBox and TextBox.nextPage define if a TextBox
@@ -109,7 +137,19 @@ class Element(object):
         # Set the property for elements that need their own context. If None the property will query parent and root.
         self.context = context 
 
-        self.style = makeStyle(style, **kwargs) # Make default style for t == 0
+        self._parent = None # Preset, so it exists for checking when appending parent.
+        self._name = None
+        self._changeStamp = next(changeStamps) # Stamp of the last change of style, content or conditions.
+        self._solvedStamp = None # Stamp of the last time the conditions were solved. None if never solved.
+        self._solvedResult = 0 # Score result of the last solve, added to the score if solving is skipped.
+        self._solveDependencies = set() # What the conditions did read during the last solve.
+        self._gridColumns = self._gridRows = self._gridUnits = None # Cached grid, see self.getGridColumns( )
+        self._gridColumnsSide = None
+        self.clearElements() # Preset, so css cache invalidation can run while the style is initialized.
+        # Make default style for t == 0. The initial values are set in the plain dictionary or 
+        # ownerless style answered by makeStyle, so self is not notified for every key. 
+        # The style is adopted as self.style at the end of the initialization.
+        initStyle = self._style = makeStyle(style, **kwargs)
         # Initialize style values that are not supposed to inherite from parent styles.
         # Always store point in style as separate (x, y, z) values. Missing values are 0
         self.point3D = point or (x, y, z)
@@ -137,8 +177,6 @@ class Element(object):
         self.gradient = gradient
         self.framePath = framePath # Optiona frame path to draw instead of bounding box element rectangle.
 
-        # Set timer of this element.
-        self.timeMarks = [TimeMark(0, self.style), TimeMark(XXXL, self.style)] # Default TimeMarks from t == 0 until infinite of time.
         self._tm0 = self._tm1 = None # Boundary timemarks, where self._tm0.t <= t <= self._tm1.t, with expanded styles.
         self.t = t # Initialize self.style from t = 0
         self.timeKeys = INTERPOLATING_TIME_KEYS # List of names of style entries that can interpolate in time.
@@ -148,11 +186,10 @@ class Element(object):
         if margin is not None:
             self.margin = margin
 
-        self.name = name # Optional name of an element. Used as base for # id in case of HTML/CSS export.
+        self._name = name # Optional name of an element. No parent yet, so no element index to update.
         self.class_ = class_ # Optional class name. Ignored if None, not to overwrite CSS of parents.
         self.title = title or name # Optional to make difference between title name, style property
         self._eId = uniqueID(self) # Direct set property with guaranteed unique persistent value. 
-        self._parent = None # Preset, so it exists for checking when appending parent.
         if parent is not None:
             # Add and set weakref to parent element or None, if it is the root. Caller must add self to its elements separately.
             self.parent = parent # Set referecnes in both directions. Remove any previous parent links
@@ -174,6 +211,12 @@ class Element(object):
         # Copy relevant info from template: w, h, elements, style, conditions, next, prev, nextPage
         # Initialze self.elements, add template elements and values, copy elements if defined.
         self.applyTemplate(template, elements) 
+        if self._style is initStyle: # Not replaced during initialization.
+            self.style = initStyle # Adopt the filled style, clearing the css cache once.
+        else:
+            self.clearCssCache()
+        # Set timer of this element.
+        self.timeMarks = [TimeMark(0, self.style), TimeMark(XXXL, self.style)] # Default TimeMarks from t == 0 until infinite of time.
         # Initialize the default Element behavior tags, in case this is a flow.
         self.isFlow = not None in (prevElement, nextElement, nextPage)
         # Instance to hold details flags and data to direct the builder of this element.
@@ -261,9 +304,14 @@ class Element(object):
             self.nextElement = template.nextElement
             self.nextPage = template.nextPage
             self.info = copy.copy(template.info)
-            # Copy style items
-            for  name, value in template.style.items():
-                self.style[name] = value
+            # Layer the style on the template style, only keeping the local values that the template
+            # does not define, so copying the style costs the amount of local values.
+            base = template.style.getSnapshot()
+            style = LayeredStyle(None, base)
+            for name, value in self.style.items():
+                if not name in base:
+                    style[name] = value
+            self.style = style
             # Copy condition list. Does not have to be deepCopy, condition instances are multi-purpose.
             self.conditions = copy.copy(template.conditions)
             for e in template.elements:
@@ -289,7 +337,38 @@ class Element(object):
     def __setitem__(self, eId, e):
         if not e in self.elements:
             self.elements.append(e)
+            self._floatIndex = None
+            self._geometryTable = None
         self._eIds[eId] = e
+        if e.parent is not self:
+            e.setParent(self)
+
+    def _get_name(self):
+        u"""Answer the optional name of the element. Changing the name updates the element index of
+        the document, if the element is in a document.
+
+        >>> from pagebot.document import Document
+        >>> doc = Document(w=300, h=400, autoPages=1)
+        >>> page = doc[0]
+        >>> e = Element(name='Old', parent=page)
+        >>> page.getElementByName('Old') is e
+        True
+        >>> e.name = 'New'
+        >>> page.getElementByName('Old') is None, page.getElementByName('New') is e
+        (True, True)
+        """
+        return self._name
+    def _set_name(self, name):
+        elementIndex = self._getElementIndex()
+        if elementIndex is not None:
+            elementIndex.rename(self, self._name, name)
+        self._name = name
+    name = property(_get_name, _set_name)
+
+    def _getElementIndex(self):
+        u"""Answer the ElementIndex of the document of self, or None if self is not in a document
+        or if the document did not create its index yet."""
+        return getattr(self.doc, '_elementIndex', None)
 
     def _get_eId(self):
         u"""Answer the unique element Id. Cannot set self._eId through self.eId property. 
@@ -407,9 +486,22 @@ class Element(object):
         True
         >>> e.get('Deeper') is e1, e.get('Deeper') is e2 # Find first down the list
         (True, False)
+        >>> from pagebot.document import Document
+        >>> doc = Document(w=300, h=400, autoPages=1)
+        >>> page = doc[0]
+        >>> e = page.appendElement(e) # In a document, the element index answers the same
+        >>> page.getElementByName('Deeper') is e1
+        True
+        >>> e3.removeElement(e1) is e1
+        True
+        >>> page.getElementByName('Deeper') is e2
+        True
         """
         if self.name == name:
             return self
+        doc = self.doc
+        if doc is not None: # Elements in a document use its index, instead of searching the tree.
+            return doc.getElementIndex().getFirstByName(name, self)
         for e in self.elements:
             found = e.getElementByName(name) # Don't search on next page yet.
             if found is not None:
@@ -428,8 +520,78 @@ class Element(object):
         >>> len(e)
         0
         """
+        elementIndex = None
+        if getattr(self, '_elements', None):
+            elementIndex = self._getElementIndex()
+        if elementIndex is not None:
+            for e in self._elements:
+                elementIndex.remove(e)
         self._elements = [] 
         self._eIds = {}
+        self._floatIndex = None # Optional FloatIndex on the child elements, created by self.getFloatIndex()
+        self._geometryTable = None # Optional GeometryTable on the child elements, created by self.getGeometryTable()
+        self._elementsStamp = next(changeStamps) # Stamp of the last removal or reordering of child elements.
+
+    def getFloatIndex(self):
+        u"""Answer the FloatIndex on the child elements, as used by the float queries of the children.
+        The index is created on the first query and then kept current by the children, as long as 
+        elements are added and removed with self.appendElement and self.removeElement.
+
+        >>> e = Element(elements=[Element(x=n*100) for n in range(5)])
+        >>> len(e.getFloatIndex())
+        5
+        >>> i = e.appendElement(Element())
+        >>> len(e.getFloatIndex())
+        6
+        """
+        floatIndex = self._floatIndex
+        if floatIndex is None or len(floatIndex) != len(self._elements): # Elements list altered directly?
+            floatIndex = self._floatIndex = FloatIndex(self._elements)
+        return floatIndex
+
+    def getGeometryTable(self):
+        u"""Answer the GeometryTable on the child elements for vectorized bulk queries. Only pages
+        own a geometry table, so other elements answer None and their queries loop over the elements.
+
+        >>> Element(elements=[Element() for n in range(100)]).getGeometryTable() is None
+        True
+        """
+        return None
+
+    def _get_hasStyleGeometry(self):
+        u"""Answer the boolean flag if the margin box of self is fully defined by its style values.
+        This is not the case if the inheriting class calculates the width or height, e.g. from its 
+        content. Then the FloatIndex of the parent cannot keep the margin box of self.
+
+        >>> class SizedByContent(Element):
+        ...     w = property(lambda self: 123, lambda self, w: None)
+        >>> Element().hasStyleGeometry, SizedByContent().hasStyleGeometry
+        (True, False)
+        """
+        cls = self.__class__
+        return cls.w is Element.w and cls.h is Element.h
+    hasStyleGeometry = property(_get_hasStyleGeometry)
+
+    def clearFloatIndex(self):
+        u"""Remove the FloatIndex and the GeometryTable of self and of all descendants. Called if the
+        size of self changed, as the default maximum size of child elements is the size of their parent."""
+        self._floatIndex = None
+        self._geometryTable = None
+        for e in self.elements:
+            e.clearFloatIndex()
+
+    def _geometryChanged(self):
+        u"""Called if the margin box or the z-layer of self may have changed. Tell the float index
+        of the parent, if it exists, to move self to other buckets, and tell the geometry table
+        of the parent, if it exists, to read the row of self again."""
+        parent = self.parent
+        if parent is not None:
+            floatIndex = getattr(parent, '_floatIndex', None) # Parent can be a Document
+            if floatIndex is not None:
+                floatIndex.changed(self)
+            geometryTable = getattr(parent, '_geometryTable', None)
+            if geometryTable is not None:
+                geometryTable.changed(self)
 
     def copy(self, parent=None):
         u"""Answer a full copy of self, where the "unique" fields are set to default. 
@@ -444,6 +606,11 @@ class Element(object):
         (False, False)
         >>> copyE.name == e.name, copyE.w == e.w == 200, copyE['Child'].w == e['Child'].w == 100 # Values are copied
         (True, True, True)
+        >>> e = Element(style=dict(tags=['a'], fill=0.5))
+        >>> copyE = e.copy()
+        >>> e.style['tags'].append('b') # Changed in place, after the style was copied.
+        >>> e.copy().style['tags'], copyE.style['tags'], dict(e.copy().style)['tags']
+        (['a', 'b'], ['a'], ['a', 'b'])
         """
         # This also initializes the child element tree as empty list.
         # Style is supposed to be a deep-copyable dictionary.
@@ -455,7 +622,7 @@ class Element(object):
             parent=parent, # Allow to keep reference to current parent context and style.
             context=self._context, # Copy local context, None most cases, where reference to parent->doc context is required.
             name=self.name, class_=self.class_, title=self.title, description=self.description, language=self.language,
-            style=copy.deepcopy(self.style), # Style is supposed to be a deep-copyable dictionary.
+            style=self.style, # Copy on write, the new style is layered on a snapshot of self.style.
             conditions=copy.deepcopy(self.conditions), # Conditions may be modified by the element of ascestors.
             info=copy.deepcopy(self.info), # Info may be modified by the element of ascestors.
             framePath=self.framePath, 
@@ -494,7 +661,15 @@ class Element(object):
         if index < 0:
             return None # Don't accept.
         if index < len(self.elements):
+            replaced = self.elements[index]
+            if replaced is not e and self._eIds.get(replaced.eId) is replaced:
+                del self._eIds[replaced.eId] # No longer a child of self.
             self.elements[index] = e
+            if e.parent is not self:
+                e.setParent(self)
+            self._floatIndex = None # Order of the elements changed, index needs to be rebuilt.
+            self._geometryTable = None
+            self._elementsStamp = next(changeStamps)
             if self.eId:
                 self._eIds[e.eId] = e
             return index
@@ -523,6 +698,9 @@ class Element(object):
         e.setParent(self) # Set parent of element without calling this method again.
         if e.eId: # Store the element by unique element id, if it is defined.
             self._eIds[e.eId] = e
+        if self._floatIndex is not None:
+            self._floatIndex.append(e)
+        self._geometryTable = None # Rows of the table are fixed, rebuild on the next query.
         return len(self._elements)-1 # Answer the element index for e.
 
     def removeElement(self, e):
@@ -542,6 +720,10 @@ class Element(object):
             del self._eIds[e.eId]
         if e in self._elements:
             self._elements.remove(e)
+        if self._floatIndex is not None:
+            self._floatIndex.remove(e)
+        self._geometryTable = None
+        self._elementsStamp = next(changeStamps) # Siblings of e that followed it have other previous elements now.
         return e # Answer the unlinked elements for convenience of the caller.
 
     def _get_show(self):
@@ -565,7 +747,7 @@ class Element(object):
         """
         return self.css('show', True)
     def _set_show(self, showFlag):
-        self.style['show'] = showFlag # Hiding rest of css for this value.
+        self._style['show'] = showFlag # Hiding rest of css for this value.
     show = property(_get_show, _set_show)
 
     #   C H I L D  E L E M E N T  P O S I T I O N S
@@ -584,6 +766,9 @@ class Element(object):
         >>> e.getElementsAtPoint((20, None)) == [e1, e2] # Find both on wildcard y
         True
         """
+        geometryTable = self.getGeometryTable()
+        if geometryTable is not None:
+            return geometryTable.getElementsAtPoint(point)
         elements = []
         px, py, pz = point3D(point) 
         for e in self.elements:
@@ -623,6 +808,11 @@ class Element(object):
         >>> d[(20, 30)] == [e1], d[(20, 40)] == [e2]
         (True, True)
         """
+        geometryTable = self.getGeometryTable()
+        if geometryTable is not None:
+            positions = geometryTable.getPositions()
+            if positions is not None:
+                return positions
         positions = {}
         for e in self.elements:
             point = tuple(e.point) # Point needs to be tuple to be used a key.
@@ -631,6 +821,32 @@ class Element(object):
             positions[point].append(e)
         return positions
 
+    def getOverlappingElements(self, box):
+        u"""Answer the list of child elements which (left, top, right, bottom) box overlaps or touches
+        the (x1, y1, x2, y2) box, independent of the direction of the y-axis.
+
+        >>> e1 = Element(x=20, y=30, w=100, h=100, xAlign=LEFT, yAlign=TOP)
+        >>> e2 = Element(x=200, y=40, w=100, h=100, xAlign=LEFT, yAlign=TOP)
+        >>> e = Element(elements=[e1, e2])
+        >>> e.getOverlappingElements((0, 0, 150, 150)) == [e1]
+        True
+        >>> len(e.getOverlappingElements((0, 0, 200, 100)))
+        2
+        """
+        geometryTable = self.getGeometryTable()
+        if geometryTable is not None:
+            return geometryTable.getOverlappingElements(box)
+        x1, y1, x2, y2 = box
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        elements = []
+        for e in self.elements:
+            left, right, top, bottom = e.left, e.right, e.top, e.bottom
+            if min(left, right) <= x2 and max(left, right) >= x1 and \
+                    min(top, bottom) <= y2 and max(top, bottom) >= y1:
+                elements.append(e)
+        return elements
+
 
     #   F L O W
 
@@ -709,7 +925,7 @@ class Element(object):
         """
         return self.css('baselineGrid')
     def _set_baselineGrid(self, baselineGrid):
-        self.style['baselineGrid'] = baselineGrid
+        self._style['baselineGrid'] = baselineGrid
     baselineGrid = property(_get_baselineGrid, _set_baselineGrid)
 
     def _get_baselineGridStart(self):
@@ -727,7 +943,7 @@ class Element(object):
         """
         return self.css('baselineGridStart')
     def _set_baselineGridStart(self, baselineGridStart):
-        self.style['baselineGridStart'] = baselineGridStart
+        self._style['baselineGridStart'] = baselineGridStart
     baselineGridStart = property(_get_baselineGridStart, _set_baselineGridStart)
 
     # Text conditions, always True for non-text elements.
@@ -752,17 +968,142 @@ class Element(object):
 
     #   S T Y L E
 
+    def _get_style(self):
+        u"""Property get/set for the local style dictionary of the element. 
+        The style is stored as Style instance, which reports changed keys, so the
+        cached cascading css values can be invalidated.
+
+        >>> e = Element(style=dict(fill=0.5))
+        >>> e.style['fill']
+        0.5
+        >>> e.style = dict(fill=0.2)
+        >>> e.style['fill'], isinstance(e.style, Style)
+        (0.2, True)
+        >>> e2 = Element(style=e.style) # Layered on e.style, changes don't propagate
+        >>> e.style['fill'] = 0.3
+        >>> e2.style['fill'], e2.style is e.style
+        (0.2, False)
+        """
+        return self._style
+    def _set_style(self, style):
+        if isinstance(style, BaseStyle) and style.owner is None: # New style, e.g. from makeStyle.
+            style.owner = self
+        elif isinstance(style, BaseStyle): # Style of another element, copy on write.
+            style = LayeredStyle(self, style.getSnapshot())
+        else:
+            style = Style(self, style)
+        self._style = style
+        self.clearCssCache() # All local values may have changed.
+    style = property(_get_style, _set_style)
+
     # Answer the cascaded style value, looking up the chain of ancestors, until style value is defined.
 
     def css(self, name, default=None):
         u"""In case we are looking for a plain css value, cascading from the main ancestor styles
         of self, then follow the parent links until document or root, if self does not contain
-        the requested value."""
-        if name in self.style:
-            return self.style[name]
-        if self.parent is not None:
-            return self.parent.css(name, default)
-        return default
+        the requested value. Values found in the ancestors are cached in self._cssCache, 
+        until they are invalidated by a style change of self or the ancestors, or by moving
+        self into another parent.
+
+        >>> e1 = Element(name='Child')
+        >>> e2 = Element(name='Parent', elements=[e1], style=dict(fill=0.5))
+        >>> e3 = Element(name='Root', elements=[e2], style=dict(textFill=0.1))
+        >>> e1.css('fill'), e1.css('textFill'), e1.css('stroke', 'Undefined')
+        (0.5, 0.1, 'Undefined')
+        >>> e2.style['fill'] = 0.6 # Change invalidates the cached value in e1.
+        >>> e1.css('fill')
+        0.6
+        >>> e3.style['textFill'] = 0.2 # Change propagates through e2 into e1.
+        >>> e1.css('textFill')
+        0.2
+        >>> del e2.style['fill'] # Deleted value falls back to the default.
+        >>> e1.css('fill', 'Undefined')
+        'Undefined'
+        >>> e4 = Element(name='OtherRoot', style=dict(textFill=0.3))
+        >>> i = e4.appendElement(e2) # Moving e2 invalidates the cache of the whole subtree.
+        >>> e1.css('textFill')
+        0.3
+        """
+        style = self._style
+        if name in style:
+            return style[name]
+        value = self._getInheritedCss(name)
+        if value is NO_VALUE:
+            return default
+        return value
+
+    def _getCss(self, name):
+        u"""Answer the cascaded value of name, or NO_VALUE if it is not defined in self or 
+        any of the ancestors. Used by child elements to fill their css cache."""
+        style = self._style
+        if name in style:
+            return style[name]
+        return self._getInheritedCss(name)
+
+    def _getInheritedCss(self, name):
+        u"""Answer the value of name as defined by the ancestors, using the cache if possible.
+        Missing values are cached as NO_VALUE, so the default of the caller does not get stored."""
+        cssCache = self._cssCache
+        if name in cssCache:
+            return cssCache[name]
+        parent = self.parent
+        if parent is None:
+            value = NO_VALUE
+        else:
+            value = parent._getCss(name)
+        cssCache[name] = value
+        return value
+
+    def _styleChanged(self, name):
+        u"""Called by self.style if the value of name changed. Child elements that inherited
+        the value through self need to forget their cached value."""
+        self._changeStamp = next(changeStamps)
+        cssCache = self._cssCache
+        if name in cssCache:
+            del cssCache[name]
+        for e in self.elements:
+            e._invalidateCss(name)
+        if name in FLOAT_KEYS:
+            self._geometryChanged()
+            if name in ('w', 'h') and self._elements:
+                self.clearFloatIndex()
+        if name in GRID_KEYS:
+            self._gridChanged(name)
+
+    def _invalidateCss(self, name):
+        u"""Remove the cached value of name from self and from the descendants that 
+        inherited it through self. Descendants can only have the value cached if self has,
+        so the recursion stops where the cache does not contain the name."""
+        cssCache = self._cssCache
+        if name in cssCache:
+            del cssCache[name]
+            self._changeStamp = next(changeStamps)
+            for e in self.elements:
+                e._invalidateCss(name)
+            if name in FLOAT_KEYS:
+                self._geometryChanged()
+            if name in GRID_KEYS:
+                self._gridChanged(name)
+
+    def clearCssCache(self):
+        u"""Clear all cached css values of self and of all descendants, e.g. when self gets
+        another parent or when the local style is replaced."""
+        self._cssCache = {}
+        self._gridColumns = self._gridRows = self._gridUnits = None
+        self._changeStamp = next(changeStamps)
+        for e in self.elements:
+            e.clearCssCache()
+        self._geometryChanged()
+
+    def _gridChanged(self, name):
+        u"""Called if the style value name of self changed, or the inherited value. Remove the cached
+        grid values that depend on it."""
+        if name in GRID_COLUMN_KEYS:
+            self._gridColumns = None
+        if name in GRID_ROW_KEYS:
+            self._gridRows = None
+        if name in GRID_UNIT_KEYS:
+            self._gridUnits = None
 
     def getNamedStyle(self, styleName):
         u"""In case we are looking for a named style (e.g. used by the Typesetter to build a stack
@@ -847,9 +1188,19 @@ class Element(object):
         Calling setParent is not the main way to add an element to a parent, because the original
         parent would not know that the element disappeared. Call self.appendElement(e), which will
         call this method. """
+        elementIndex = self._getElementIndex()
         if parent is not None:
             parent = weakref.ref(parent)
         self._parent = parent # Can be None if self needs to be unlinked from a parent tree. E.g. when moving it.
+        newElementIndex = self._getElementIndex()
+        if newElementIndex is not elementIndex: # Moved to another document, or in/out of a document.
+            if elementIndex is not None:
+                elementIndex.remove(self)
+            if newElementIndex is not None:
+                newElementIndex.add(self)
+        elif elementIndex is not None: # Moved in the document, maybe to another page.
+            elementIndex.move(self)
+        self.clearCssCache() # Cached css values were inherited from the previous ancestors.
 
     def _get_parent(self):
         u"""Answer the parent of the element, if it exists, by weakref reference. Answer None of there
@@ -863,7 +1214,7 @@ class Element(object):
             #assert not self in parent.ancestors, '[%s.%s] Cannot set one of the children "%s" as parent.' % (self.__class__.__name__, self.name, parent)
             parent.appendElement(self)
         else:
-            self._parent = None
+            self.setParent(None)
     parent = property(_get_parent, _set_parent)
 
     def _get_siblings(self):
@@ -943,11 +1294,11 @@ class Element(object):
         return self.css('gridX')
     def _set_gridX(self, gridX):
         if self.isLeftPage():
-            self.style['gridL'] = gridX  # Save locally, blocking CSS parent scope for this param.
+            self._style['gridL'] = gridX  # Save locally, blocking CSS parent scope for this param.
         elif self.isRightPage():
-            self.style['gridR'] = gridX
+            self._style['gridR'] = gridX
         else:
-            self.style['gridX'] = gridX
+            self._style['gridX'] = gridX
     gridX = property(_get_gridX, _set_gridX)
 
     def _get_gridY(self):
@@ -962,7 +1313,7 @@ class Element(object):
         """
         return self.css('gridY')
     def _set_gridY(self, gridY):
-        self.style['gridY'] = gridY  # Save locally, blocking CSS parent scope for this param.
+        self._style['gridY'] = gridY  # Save locally, blocking CSS parent scope for this param.
     gridY = property(_get_gridY, _set_gridY)
 
     def _get_gridZ(self):
@@ -977,7 +1328,7 @@ class Element(object):
         """
         return self.css('gridZ')
     def _set_gridZ(self, gridZ):
-        self.style['gridZ'] = gridZ  # Save locally, blocking CSS parent scope for this param.
+        self._style['gridZ'] = gridZ  # Save locally, blocking CSS parent scope for this param.
     gridZ = property(_get_gridZ, _set_gridZ)
 
     def getGridColumns(self):
@@ -997,7 +1348,22 @@ class Element(object):
         >>> e.gridX = (30, 40, 50, 60) 
         >>> e.getGridColumns() # Columns from value list
         [(0, 30), (42, 40), (94, 50), (156, 60)]
+        >>> e.getGridColumns() is not e.getGridColumns() # Cached, but answered as new list.
+        True
         """
+        gridColumns = self._gridColumns
+        side = self._gridColumnsSide
+        if gridColumns is None or (side is not None and side != (self.isLeftPage(), self.isRightPage())):
+            gridColumns = tuple(self._makeGridColumns())
+            if self.hasStyleGeometry: # Otherwise the width can change without changing the style.
+                self._gridColumns = gridColumns
+                if self.css('gridL') is None and self.css('gridR') is None:
+                    self._gridColumnsSide = None
+                else: # Grid depends on the left/right orientation of the page.
+                    self._gridColumnsSide = self.isLeftPage(), self.isRightPage()
+        return list(gridColumns)
+
+    def _makeGridColumns(self):
         gridColumns = []
         gridX = self.gridX 
         pw = self.pw # Padded with, available space for columns.
@@ -1060,6 +1426,14 @@ class Element(object):
         >>> e.getGridRows() # Columns from value list
         [(0, 30), (42, 40), (94, 50), (156, 60)]
         """
+        gridRows = self._gridRows
+        if gridRows is None:
+            gridRows = tuple(self._makeGridRows())
+            if self.hasStyleGeometry:
+                self._gridRows = gridRows
+        return list(gridRows)
+
+    def _makeGridRows(self):
         gridRows = []
         gridY = self.gridY 
         ph = self.ph # Padded height, available space for vertical columns.
@@ -1104,6 +1478,82 @@ class Element(object):
                 y += ch + gh # Next column start position.
         return gridRows
 
+    def getGridUnits(self):
+        u"""Answer the cached (cw, gw, ch, gh, cd, gd) tuple with the column width, row height and
+        column depth and their gutters, as used by the column conversions such as pagebot.x2cx.
+        Column sizes are None if undefined, gutters are 0.
+
+        >>> e = Element(cw=48, gw=8)
+        >>> e.getGridUnits()
+        (48, 8, None, 0, None, 0)
+        >>> parent = Element(ch=20, gh=4, elements=[e])
+        >>> e.getGridUnits()
+        (48, 8, 20, 4, None, 0)
+        >>> parent.gh = 6 # Changing the inherited gutter removes the cached units.
+        >>> e.getGridUnits()[3]
+        6
+        """
+        gridUnits = self._gridUnits
+        if gridUnits is None:
+            gridUnits = self._gridUnits = (self.cw, self.gw, self.ch, self.gh, self.cd, self.gd)
+        return gridUnits
+
+    def getGridPositions(self):
+        u"""Answer the (xs, ys) tuple with the sorted lists of column and row start positions in the
+        coordinates of self, as used by self.left2Col and self.top2Row: the columns start at the left
+        padding, the rows at the bottom padding.
+
+        >>> e = Element(w=300, h=200, pl=10, pb=20, cw=48, gw=8, ch=40, gh=10)
+        >>> e.getGridPositions()
+        ([10, 66, 122, 178, 234], [20, 70, 120])
+        """
+        pl = self.pl
+        pb = self.pb
+        xs = sorted([pl + cx for cx, _ in self.getGridColumns()])
+        ys = sorted([pb + cy for cy, _ in self.getGridRows()])
+        return xs, ys
+
+    def snapToGrid(self, elements=None, columns=True, rows=True):
+        u"""Move the left side of each of the elements (default all child elements of self) to the 
+        nearest column of the grid of self, and the top side to the nearest row, as self.left2Col and 
+        self.top2Row do for a single column and row index. The nearest positions of all elements 
+        are found at once, vectorized if NumPy is installed, using the geometry table of self if it has 
+        one. Answer the list of elements that moved.
+
+        >>> from pagebot.style import LEFT, TOP
+        >>> parent = Element(w=300, h=200, pl=10, pb=20, cw=48, gw=8, ch=40, gh=10)
+        >>> elements = [Element(parent=parent, x=x, y=y, w=20, h=20, xAlign=LEFT, yAlign=TOP, originTop=True) 
+        ...     for x, y in ((0, 0), (70, 30), (150, 90), (400, 500))]
+        >>> len(parent.snapToGrid())
+        4
+        >>> [(e.left, e.top) for e in parent.elements]
+        [(10, 20), (66, 20), (122, 70), (234, 120)]
+        >>> parent.snapToGrid()
+        []
+        """
+        xs, ys = self.getGridPositions()
+        geometryTable = None
+        if elements is None:
+            elements = self.elements
+            geometryTable = self.getGeometryTable()
+        if geometryTable is not None: # Read the sides as arrays, instead of asking each element.
+            left, top = geometryTable.update()[:2]
+        else:
+            left = [e.left for e in elements] if columns else None
+            top = [e.top for e in elements] if rows else None
+        moved = set()
+        if columns and xs:
+            for e, value, snapped in zip(elements, left, snapValues(left, xs)):
+                if value != snapped:
+                    e.left = snapped
+                    moved.add(id(e))
+        if rows and ys:
+            for e, value, snapped in zip(elements, top, snapValues(top, ys)):
+                if value != snapped:
+                    e.top = snapped
+                    moved.add(id(e))
+        return [e for e in elements if id(e) in moved]
+
     # No getGrid in Z-direction for now.
 
     # Plain coordinates
@@ -1118,9 +1568,9 @@ class Element(object):
         >>> e.x, e.y, e.z
         (101, 0, 0)
         """
-        return self.style['x'] # Direct from style. Not CSS lookup.
+        return self._style['x'] # Direct from style. Not CSS lookup.
     def _set_x(self, x):
-        self.style['x'] = x
+        self._style['x'] = x
     x = property(_get_x, _set_x)
     
     def _get_y(self):
@@ -1133,9 +1583,9 @@ class Element(object):
         >>> e.x, e.y, e.z
         (0, 101, 0)
         """
-        return self.style['y'] # Direct from style. Not CSS lookup.
+        return self._style['y'] # Direct from style. Not CSS lookup.
     def _set_y(self, y):
-        self.style['y'] = y
+        self._style['y'] = y
     y = property(_get_y, _set_y)
     
     def _get_z(self):
@@ -1148,9 +1598,9 @@ class Element(object):
         >>> e.x, e.y, e.z
         (0, 0, 101)
         """
-        return self.style['z'] # Direct from style. Not CSS lookup.
+        return self._style['z'] # Direct from style. Not CSS lookup.
     def _set_z(self, z):
-        self.style['z'] = z
+        self._style['z'] = z
     z = property(_get_z, _set_z)
     
     def _get_xy(self):
@@ -1594,25 +2044,25 @@ class Element(object):
     def _get_borderTop(self):
         return self.css('borderTop')
     def _set_borderTop(self, border):
-        self.style['borderTop'] = self._borderDict(border)
+        self._style['borderTop'] = self._borderDict(border)
     borderTop = property(_get_borderTop, _set_borderTop)
 
     def _get_borderRight(self):
         return self.css('borderRight')
     def _set_borderRight(self, border):
-        self.style['borderRight'] = self._borderDict(border)
+        self._style['borderRight'] = self._borderDict(border)
     borderRight = property(_get_borderRight, _set_borderRight)
 
     def _get_borderBottom(self):
         return self.css('borderBottom')
     def _set_borderBottom(self, border):
-        self.style['borderBottom'] = self._borderDict(border)
+        self._style['borderBottom'] = self._borderDict(border)
     borderBottom = property(_get_borderBottom, _set_borderBottom)
 
     def _get_borderLeft(self):
         return self.css('borderLeft')
     def _set_borderLeft(self, border):
-        self.style['borderLeft'] = self._borderDict(border)
+        self._style['borderLeft'] = self._borderDict(border)
     borderLeft = property(_get_borderLeft, _set_borderLeft)
 
     # Alignment types, defines where the origin of the element is located.
@@ -1630,19 +2080,19 @@ class Element(object):
     def _get_xAlign(self): # Answer the type of x-alignment. For compatibility allow align and xAlign as equivalents.
         return self._validateXAlign(self.css('xAlign'))
     def _set_xAlign(self, xAlign):
-        self.style['xAlign'] = self._validateXAlign(xAlign) # Save locally, blocking CSS parent scope for this param.
+        self._style['xAlign'] = self._validateXAlign(xAlign) # Save locally, blocking CSS parent scope for this param.
     xAlign = property(_get_xAlign, _set_xAlign)
      
     def _get_yAlign(self): # Answer the type of x-alignment.
         return self._validateYAlign(self.css('yAlign'))
     def _set_yAlign(self, yAlign):
-        self.style['yAlign'] = self._validateYAlign(yAlign) # Save locally, blocking CSS parent scope for this param.
+        self._style['yAlign'] = self._validateYAlign(yAlign) # Save locally, blocking CSS parent scope for this param.
     yAlign = property(_get_yAlign, _set_yAlign)
      
     def _get_zAlign(self): # Answer the type of x-alignment.
         return self._validateZAlign(self.css('zAlign'))
     def _set_zAlign(self, zAlign):
-        self.style['zAlign'] = self._validateZAlign(zAlign) # Save locally, blocking CSS parent scope for this param.
+        self._style['zAlign'] = self._validateZAlign(zAlign) # Save locally, blocking CSS parent scope for this param.
     zAlign = property(_get_zAlign, _set_zAlign)
      
     # Position by column + gutter size index.
@@ -1701,38 +2151,38 @@ class Element(object):
     def _get_cw(self): # Column width
         return self.css('cw')
     def _set_cw(self, cw):
-        self.style['cw'] = cw
+        self._style['cw'] = cw
     cw = property(_get_cw, _set_cw)
 
     def _get_ch(self): # Column height (row height)
         return self.css('ch')
     def _set_ch(self, ch):
-        self.style['ch'] = ch
+        self._style['ch'] = ch
     ch = property(_get_ch, _set_ch)
 
     def _get_cd(self): # Column depth (slice?)
         return self.css('cd')
     def _set_cd(self, cd):
-        self.style['cd'] = cd
+        self._style['cd'] = cd
     cd = property(_get_cd, _set_cd)
 
 
     def _get_gw(self): # Gutter width
         return self.css('gw', 0)
     def _set_gw(self, gw):
-        self.style['gw'] = gw # Set local.
+        self._style['gw'] = gw # Set local.
     gw = property(_get_gw, _set_gw)
 
     def _get_gh(self): # Gutter height
         return self.css('gh', 0)
     def _set_gh(self, gh):
-        self.style['gh'] = gh # Set local
+        self._style['gh'] = gh # Set local
     gh = property(_get_gh, _set_gh)
 
     def _get_gd(self): # Gutter depth
         return self.css('gd', 0)
     def _set_gd(self, gd):
-        self.style['gd'] = gd
+        self._style['gd'] = gd
     gd = property(_get_gd, _set_gd)
 
     def _get_gutter(self): # Tuple of (w, h) gutters
@@ -1819,7 +2269,7 @@ class Element(object):
         return self.css('bleedTop', 0)
     def _set_bleedTop(self, bleed):
         assert isinstance(bleed, (int, float))
-        self.style['bleedTop'] = bleed
+        self._style['bleedTop'] = bleed
     bleedTop = property(_get_bleedTop, _set_bleedTop)
 
     def _get_bleedBottom(self):
@@ -1828,7 +2278,7 @@ class Element(object):
         return self.css('bleedBottom', 0)
     def _set_bleedBottom(self, bleed):
         assert isinstance(bleed, (int, float))
-        self.style['bleedBottom'] = bleed
+        self._style['bleedBottom'] = bleed
     bleedBottom = property(_get_bleedBottom, _set_bleedBottom)
 
     def _get_bleedLeft(self):
@@ -1837,7 +2287,7 @@ class Element(object):
         return self.css('bleedLeft', 0)
     def _set_bleedLeft(self, bleed):
         assert isinstance(bleed, (int, float))
-        self.style['bleedLeft'] = bleed
+        self._style['bleedLeft'] = bleed
     bleedLeft = property(_get_bleedLeft, _set_bleedLeft)
 
     def _get_bleedRight(self):
@@ -1846,7 +2296,7 @@ class Element(object):
         return self.css('bleedRight', 0)
     def _set_bleedRight(self, bleed):
         assert isinstance(bleed, (int, float))
-        self.style['bleedRight'] = bleed
+        self._style['bleedRight'] = bleed
     bleedRight = property(_get_bleedRight, _set_bleedRight)
 
     # Absolute positions
@@ -1917,9 +2367,9 @@ class Element(object):
         >>> e.w, e.w == DEFAULT_WIDTH
         (100, True)
         """ 
-        return min(self.maxW, max(self.minW, self.style['w'], MIN_WIDTH)) # From self.style, don't inherit.
+        return min(self.maxW, max(self.minW, self._style['w'], MIN_WIDTH)) # From self.style, don't inherit.
     def _set_w(self, w):
-        self.style['w'] = w or DEFAULT_WIDTH # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['w'] = w or DEFAULT_WIDTH # Overwrite element local style from here, parent css becomes inaccessable.
     w = property(_get_w, _set_w)
 
     def _get_mw(self): # Width, including margins
@@ -1937,7 +2387,7 @@ class Element(object):
         """
         return self.w + self.ml + self.mr # Add margins to width
     def _set_mw(self, w):
-        self.style['w'] = max(0, w - self.ml - self.mr) # Cannot become < 0
+        self._style['w'] = max(0, w - self.ml - self.mr) # Cannot become < 0
     mw = property(_get_mw, _set_mw)
 
     def _get_h(self):
@@ -1956,9 +2406,9 @@ class Element(object):
         >>> e.h, e.h == DEFAULT_HEIGHT
         (100, True)
         """ 
-        return min(self.maxH, max(self.minH, self.style['h'], MIN_HEIGHT)) # From self.style, don't inherit.
+        return min(self.maxH, max(self.minH, self._style['h'], MIN_HEIGHT)) # From self.style, don't inherit.
     def _set_h(self, h):
-        self.style['h'] = h or DEFAULT_HEIGHT # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['h'] = h or DEFAULT_HEIGHT # Overwrite element local style from here, parent css becomes inaccessable.
     h = property(_get_h, _set_h)
 
     def _get_mh(self): # Height, including margins
@@ -1976,7 +2426,7 @@ class Element(object):
         """
         return self.h + self.mt + self.mb # Add margins to height
     def _set_mh(self, h):
-        self.style['h'] = max(0, h - self.mt - self.mb) # Cannot become < 0
+        self._style['h'] = max(0, h - self.mt - self.mb) # Cannot become < 0
     mh = property(_get_mh, _set_mh)
 
     def _get_d(self): 
@@ -1995,9 +2445,9 @@ class Element(object):
         >>> e.d, e.d == MIN_DEPTH
         (1, True)
         """ 
-        return min(self.maxD, max(self.minD, self.style['d'], MIN_DEPTH)) # From self.style, don't inherit.
+        return min(self.maxD, max(self.minD, self._style['d'], MIN_DEPTH)) # From self.style, don't inherit.
     def _set_d(self, d):
-        self.style['d'] = d or MIN_DEPTH # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['d'] = d or MIN_DEPTH # Overwrite element local style from here, parent css becomes inaccessable.
     d = property(_get_d, _set_d)
 
     def _get_md(self): # Depth, including margin front and margin back in z-axis.
@@ -2015,7 +2465,7 @@ class Element(object):
         """
         return self.d + self.mzb + self.mzf # Add front and back margins to depth
     def _set_md(self, d):
-        self.style['d'] = max(0, d - self.mzf - self.mzb) # Cannot become < 0, behind viewer?
+        self._style['d'] = max(0, d - self.mzf - self.mzb) # Cannot become < 0, behind viewer?
     md = property(_get_md, _set_md)
 
     # Margin properties
@@ -2108,9 +2558,9 @@ class Element(object):
         >>> e.mt
         14
         """
-        return self.style['mt'] # Don't inherit
+        return self._style['mt'] # Don't inherit
     def _set_mt(self, mt):
-        self.style['mt'] = mt  # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['mt'] = mt  # Overwrite element local style from here, parent css becomes inaccessable.
     mt = property(_get_mt, _set_mt)
     
     def _get_mb(self): # Margin bottom
@@ -2126,9 +2576,9 @@ class Element(object):
         >>> e.mb
         14
         """
-        return self.style['mb'] # Don't inherit
+        return self._style['mb'] # Don't inherit
     def _set_mb(self, mb):
-        self.style['mb'] = mb  # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['mb'] = mb  # Overwrite element local style from here, parent css becomes inaccessable.
     mb = property(_get_mb, _set_mb)
     
     def _get_ml(self): # Margin left
@@ -2144,9 +2594,9 @@ class Element(object):
         >>> e.ml
         14
         """
-        return self.style['ml'] # Don't inherit
+        return self._style['ml'] # Don't inherit
     def _set_ml(self, ml):
-        self.style['ml'] = ml # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['ml'] = ml # Overwrite element local style from here, parent css becomes inaccessable.
     ml = property(_get_ml, _set_ml)
     
     def _get_mr(self): # Margin right
@@ -2162,9 +2612,9 @@ class Element(object):
         >>> e.mr
         14
         """
-        return self.style['mr'] # Don't inherit
+        return self._style['mr'] # Don't inherit
     def _set_mr(self, mr):
-        self.style['mr'] = mr  # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['mr'] = mr  # Overwrite element local style from here, parent css becomes inaccessable.
     mr = property(_get_mr, _set_mr)
 
     def _get_mzf(self): # Margin z-axis front
@@ -2180,9 +2630,9 @@ class Element(object):
         >>> e.mzf
         14
         """
-        return self.style['mzf'] # Don't inherit
+        return self._style['mzf'] # Don't inherit
     def _set_mzf(self, mzf):
-        self.style['mzf'] = mzf  # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['mzf'] = mzf  # Overwrite element local style from here, parent css becomes inaccessable.
     mzf = property(_get_mzf, _set_mzf)
     
     def _get_mzb(self): # Margin z-axis back
@@ -2198,9 +2648,9 @@ class Element(object):
         >>> e.mzb
         14
         """
-        return self.style['mzb'] # Don't inherit
+        return self._style['mzb'] # Don't inherit
     def _set_mzb(self, mzb):
-        self.style['mzb'] = mzb  # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['mzb'] = mzb  # Overwrite element local style from here, parent css becomes inaccessable.
     mzb = property(_get_mzb, _set_mzb)
         
     # Padding properties
@@ -2296,7 +2746,7 @@ class Element(object):
         """
         return self.css('pt', 0)
     def _set_pt(self, pt):
-        self.style['pt'] = pt  # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['pt'] = pt  # Overwrite element local style from here, parent css becomes inaccessable.
     pt = property(_get_pt, _set_pt)
 
     def _get_pb(self): # Padding bottom
@@ -2317,7 +2767,7 @@ class Element(object):
         """
         return self.css('pb', 0)
     def _set_pb(self, pb):
-        self.style['pb'] = pb  # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['pb'] = pb  # Overwrite element local style from here, parent css becomes inaccessable.
     pb = property(_get_pb, _set_pb)
     
     def _get_pl(self): 
@@ -2338,7 +2788,7 @@ class Element(object):
         """
         return self.css('pl', 0)
     def _set_pl(self, pl):
-        self.style['pl'] = pl # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['pl'] = pl # Overwrite element local style from here, parent css becomes inaccessable.
     pl = property(_get_pl, _set_pl)
     
     def _get_pr(self): # Margin right
@@ -2359,7 +2809,7 @@ class Element(object):
         """
         return self.css('pr', 0)
     def _set_pr(self, pr):
-        self.style['pr'] = pr  # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['pr'] = pr  # Overwrite element local style from here, parent css becomes inaccessable.
     pr = property(_get_pr, _set_pr)
 
     def _get_pzf(self): 
@@ -2377,7 +2827,7 @@ class Element(object):
         """
         return self.css('pzf', 0)
     def _set_pzf(self, pzf):
-        self.style['pzf'] = pzf  # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['pzf'] = pzf  # Overwrite element local style from here, parent css becomes inaccessable.
     pzf = property(_get_pzf, _set_pzf)
     
     def _get_pzb(self): 
@@ -2395,7 +2845,7 @@ class Element(object):
         """
         return self.css('pzb', 0)
     def _set_pzb(self, pzb):
-        self.style['pzb'] = pzb  # Overwrite element local style from here, parent css becomes inaccessable.
+        self._style['pzb'] = pzb  # Overwrite element local style from here, parent css becomes inaccessable.
     pzb = property(_get_pzb, _set_pzb)
 
     def _get_pw(self): 
@@ -2446,11 +2896,11 @@ class Element(object):
         return self.css('originTop')
     def _set_originTop(self, flag):
         if flag:
-            self.style['originTop'] = True # Overwrite element local style from here, parent css becomes inaccessable.
-            self.style['yAlign'] = TOP
+            self._style['originTop'] = True # Overwrite element local style from here, parent css becomes inaccessable.
+            self._style['yAlign'] = TOP
         else:
-            self.style['originTop'] = False
-            self.style['yAlign'] = BOTTOM
+            self._style['originTop'] = False
+            self._style['yAlign'] = BOTTOM
     originTop = property(_get_originTop, _set_originTop)
 
     def _get_size(self):
@@ -2531,25 +2981,25 @@ class Element(object):
     def _get_shadow(self):
         return self.css('shadow')
     def _set_shadow(self, shadow):
-        self.style['shadow'] = shadow
+        self._style['shadow'] = shadow
     shadow = property(_get_shadow, _set_shadow)
 
     def _get_textShadow(self):
         return self.css('textShadow')
     def _set_textShadow(self, textShadow):
-        self.style['textShadow'] = textShadow
+        self._style['textShadow'] = textShadow
     textShadow = property(_get_textShadow, _set_textShadow)
 
     def _get_gradient(self):
         return self.css('gradient')
     def _set_gradient(self, gradient):
-        self.style['gradient'] = gradient
+        self._style['gradient'] = gradient
     gradient = property(_get_gradient, _set_gradient)
 
     def _get_textGradient(self):
         return self.css('textGradient')
     def _set_textGradient(self, textGradient):
-        self.style['textGradient'] = textGradient
+        self._style['textGradient'] = textGradient
     textGradient = property(_get_textGradient, _set_textGradient)
 
     def _get_box3D(self):
@@ -2618,6 +3068,7 @@ class Element(object):
 
         >>> #e.block3D
         """
+        self.addSolveDependency(SOLVE_CHILDREN)
         x1 = y1 = z1 = XXXL
         x2 = y2 = z2 = -XXXL
         if not self.elements:
@@ -2647,12 +3098,18 @@ class Element(object):
         >>> #e.block
         (10, 10, 871, 150)
         """
+        geometryTable = self.getGeometryTable()
+        if geometryTable is not None:
+            self.addSolveDependency(SOLVE_CHILDREN)
+            x1, y1, x2, y2 = geometryTable.getBoundingBox()
+            return x1, y1, x2 - x1, y2 - y1
         x, y, _, w, h, _ = self._get_block3D()
         return x, y, w, h
     block = property(_get_block)
 
     def _get_marginBlock3D(self):
         u"""Answer the vacuum 3D bounding box around all child elements."""
+        self.addSolveDependency(SOLVE_CHILDREN)
         x1 = y1 = z1 = XXXL
         x2 = y2 = z2 = -XXXL
         if not self.elements:
@@ -2681,6 +3138,7 @@ class Element(object):
     def _get_paddedBlock3D(self):
         u"""Answer the vacuum 3D bounding box around all child elements, 
         subtracting their paddings. Sizes cannot become nextive."""
+        self.addSolveDependency(SOLVE_CHILDREN)
         x1 = y1 = z1 = XXXL
         x2 = y2 = z2 = -XXXL
         if not self.elements:
@@ -2715,6 +3173,7 @@ class Element(object):
 
     def _get_originsBlock3D(self):
         u"""Answer (minX, minY, maxX, maxY, minZ, maxZ) for all element origins."""
+        self.addSolveDependency(SOLVE_CHILDREN)
         minX = minY = XXXL
         maxX = maxY = -XXXL
         for e in self.elements:
@@ -2737,19 +3196,19 @@ class Element(object):
     def _get_minW(self):
         return self.css('minW') or MIN_WIDTH
     def _set_minW(self, minW): # Clip values
-        self.style['minW'] = max(MIN_WIDTH, min(MAX_WIDTH, minW)) # Set on local style, shielding parent self.css value.
+        self._style['minW'] = max(MIN_WIDTH, min(MAX_WIDTH, minW)) # Set on local style, shielding parent self.css value.
     minW = property(_get_minW, _set_minW)
 
     def _get_minH(self):
         return self.css('minH') or MIN_HEIGHT
     def _set_minH(self, minH):
-        self.style['minH'] = max(MIN_HEIGHT, min(MAX_HEIGHT, minH)) # Set on local style, shielding parent self.css value.
+        self._style['minH'] = max(MIN_HEIGHT, min(MAX_HEIGHT, minH)) # Set on local style, shielding parent self.css value.
     minH = property(_get_minH, _set_minH)
 
     def _get_minD(self): # Set/get the minimal depth, in case the element has 3D dimensions.
         return self.css('minD') or MIN_DEPTH
     def _set_minD(self, minD):
-        self.style['minD'] = max(MIN_DEPTH, min(MAX_DEPTH, minD)) # Set on local style, shielding parent self.css value.
+        self._style['minD'] = max(MIN_DEPTH, min(MAX_DEPTH, minD)) # Set on local style, shielding parent self.css value.
     minD = property(_get_minD, _set_minD)
 
     def getMinSize(self):
@@ -2804,7 +3263,7 @@ class Element(object):
             maxW = maxW or self.parent.w
         return maxW or MAX_WIDTH # Unless defined local, take current parent.w as maxW
     def _set_maxW(self, maxW):
-        self.style['maxW'] = max(MIN_WIDTH, min(MAX_WIDTH, maxW)) # Set on local style, shielding parent self.css value.
+        self._style['maxW'] = max(MIN_WIDTH, min(MAX_WIDTH, maxW)) # Set on local style, shielding parent self.css value.
     maxW = property(_get_maxW, _set_maxW)
 
     def _get_maxH(self):
@@ -2813,7 +3272,7 @@ class Element(object):
             maxH = maxH or self.parent.h
         return maxH or MAX_HEIGHT # Unless defined local, take current parent.w as maxW
     def _set_maxH(self, maxH):
-        self.style['maxH'] = max(MIN_HEIGHT, min(MAX_HEIGHT, maxH)) # Set on local style, shielding parent self.css value.
+        self._style['maxH'] = max(MIN_HEIGHT, min(MAX_HEIGHT, maxH)) # Set on local style, shielding parent self.css value.
     maxH = property(_get_maxH, _set_maxH)
 
     def _get_maxD(self):
@@ -2822,7 +3281,7 @@ class Element(object):
             maxD = maxD or self.parent.d
         return maxD or MAX_DEPTH # Unless defined local, take current parent.w as maxW
     def _set_maxD(self, maxD):
-        self.style['maxD'] = max(MIN_DEPTH, min(MAX_DEPTH, maxD)) # Set on local style, shielding parent self.css value.
+        self._style['maxD'] = max(MIN_DEPTH, min(MAX_DEPTH, maxD)) # Set on local style, shielding parent self.css value.
     maxD = property(_get_maxD, _set_maxD)
 
     def getMaxSize(self):
@@ -2849,41 +3308,99 @@ class Element(object):
         return self.css('scaleX', 1)
     def _set_scaleX(self, scaleX):
         assert scaleX != 0
-        self.style['scaleX'] = scaleX # Set on local style, shielding parent self.css value.
+        self._style['scaleX'] = scaleX # Set on local style, shielding parent self.css value.
     scaleX = property(_get_scaleX, _set_scaleX)
 
     def _get_scaleY(self):
         return self.css('scaleX', 1)
     def _set_scaleY(self, scaleY):
         assert scaleY != 0
-        self.style['scaleY'] = scaleY # Set on local style, shielding parent self.css value.
+        self._style['scaleY'] = scaleY # Set on local style, shielding parent self.css value.
     scaleY = property(_get_scaleY, _set_scaleY)
 
     def _get_scaleZ(self):
         return self.css('scaleZ', 1)
     def _set_scaleZ(self, scaleZ):
         assert scaleZ != 0
-        self.style['scaleZ'] = scaleZ # Set on local style, shielding parent self.css value.
+        self._style['scaleZ'] = scaleZ # Set on local style, shielding parent self.css value.
     scaleZ = property(_get_scaleZ, _set_scaleZ)
 
+    def _getFloatBoxes(self, previousOnly, tolerance, vertical):
+        u"""Answer the list of (mLeft, mTop, mRight, mBottom, z) margin boxes of the sibling elements, 
+        that need to be checked by the float queries. Small parents answer the boxes of all elements
+        (until self, if previousOnly is True). Otherwise the FloatIndex of the parent answers the boxes
+        of the elements in the vertical projection (self.mLeft, self.mRight) or in the horizontal 
+        projection (self.mTop, self.mBottom), so the caller does not need to scan all elements.
+
+        >>> parent = Element(w=1000, h=1000, xAlign=LEFT, yAlign=TOP, originTop=True)
+        >>> for n in range(100):
+        ...     e = Element(parent=parent, x=(n % 10)*100, y=(n // 10)*100, w=100, h=100)
+        >>> e = parent.elements[55]
+        >>> len(e._getFloatBoxes(False, 0, True)) < len(parent.elements)
+        True
+        >>> sorted(set([mLeft for mLeft, mTop, mRight, mBottom, z in e._getFloatBoxes(False, 0, True)]))
+        [400, 500, 600]
+        >>> sorted(set([mTop for mLeft, mTop, mRight, mBottom, z in e._getFloatBoxes(True, 0, False)])) # Previous rows, touching or overlapping
+        [400, 500]
+        """
+        if previousOnly:
+            self.addSolveDependency(SOLVE_PREVIOUS)
+        else:
+            self.addSolveDependency(SOLVE_SIBLINGS)
+        parent = self.parent
+        geometryTable = parent.getGeometryTable()
+        if geometryTable is not None:
+            if vertical:
+                lo, hi = self.mLeft, self.mRight
+            else:
+                lo, hi = self.mTop, self.mBottom
+            return geometryTable.getFloatBoxes(self, lo, hi, vertical=vertical,
+                previousOnly=previousOnly, tolerance=tolerance)
+        elements = parent.elements
+        if len(elements) < FLOAT_INDEX_MIN:
+            boxes = []
+            for e in elements:
+                if previousOnly and e is self: # Only look at siblings that are previous in the list.
+                    break
+                boxes.append(getFloatBox(e))
+            return boxes
+        if vertical:
+            lo, hi = self.mLeft, self.mRight
+        else:
+            lo, hi = self.mTop, self.mBottom
+        return self.parent.getFloatIndex().getBoxes(self, lo, hi, vertical=vertical, 
+            previousOnly=previousOnly, tolerance=tolerance)
+
     def getFloatTopSide(self, previousOnly=True, tolerance=0):
         u"""Answer the max y that can float to top, without overlapping previous sibling elements.
         This means we are just looking at the vertical projection between (self.left, self.right).
         Note that the y may be outside the parent box. Only elements with identical z-value are compared.
-        Comparison of available spave, includes the margins of the elements."""
+        Comparison of available spave, includes the margins of the elements.
+
+        >>> parent = Element(w=500, h=500, xAlign=LEFT, yAlign=TOP, originTop=True)
+        >>> for n in range(50): # Enough elements to make the parent use its FloatIndex
+        ...     e = Element(parent=parent, x=n*100, y=n*10, w=100, h=100)
+        >>> e = Element(parent=parent, x=150, y=400, w=100, h=100)
+        >>> e.getFloatTopSide() # Bottom of element at x=200
+        120
+        >>> e.x = 9000 # No sibling is in the vertical projection
+        >>> e.getFloatTopSide()
+        0
+        """
         if self.originTop:
             y = 0
         else:
             y = self.parent.h
-        for e in self.parent.elements: 
-            if previousOnly and e is self: # Only look at siblings that are previous in the list.
-                break 
-            if abs(e.z - self.z) > tolerance or e.mRight < self.mLeft or self.mRight < e.mLeft:
+        z = self.z
+        mLeft = self.mLeft
+        mRight = self.mRight
+        for eLeft, eTop, eRight, eBottom, eZ in self._getFloatBoxes(previousOnly, tolerance, True): 
+            if abs(eZ - z) > tolerance or eRight < mLeft or mRight < eLeft:
                 continue # Not equal z-layer or not in window of vertical projection.
             if self.originTop:
-                y = max(y, e.mBottom)
+                y = max(y, eBottom)
             else:
-                y = min(y, e.mBottom)
+                y = min(y, eBottom)
         return y
 
     def getFloatBottomSide(self, previousOnly=True, tolerance=0):
@@ -2895,15 +3412,16 @@ class Element(object):
             y = self.parent.h
         else:
             y = 0
-        for e in self.parent.elements: # All elements that share self.parent, except self.
-            if previousOnly and e is self: # Only look at siblings that are previous in the list.
-                break 
-            if abs(e.z - self.z) > tolerance or e.mRight < self.mLeft or self.mRight < e.mLeft:
+        z = self.z
+        mLeft = self.mLeft
+        mRight = self.mRight
+        for eLeft, eTop, eRight, eBottom, eZ in self._getFloatBoxes(previousOnly, tolerance, True): # All elements that share self.parent, except self.
+            if abs(eZ - z) > tolerance or eRight < mLeft or mRight < eLeft:
                 continue # Not equal z-layer or not in window of vertical projection.
             if self.originTop:
-                y = min(y, e.mTop)
+                y = min(y, eTop)
             else:
-                y = max(y, e.mTop)
+                y = max(y, eTop)
         return y
 
     def getFloatLeftSide(self, previousOnly=True, tolerance=0):
@@ -2912,18 +3430,20 @@ class Element(object):
         Note that the x may be outside the parent box. Only elements with identical z-value are compared.
         Comparison of available spave, includes the margins of the elements."""
         x = 0
-        for e in self.parent.elements: # All elements that share self.parent, except self.
-            if previousOnly and e is self: # Only look at siblings that are previous in the list.
-                break 
-            if abs(e.z - self.z) > tolerance:
+        z = self.z
+        mTop = self.mTop
+        mBottom = self.mBottom
+        originTop = self.originTop
+        for eLeft, eTop, eRight, eBottom, eZ in self._getFloatBoxes(previousOnly, tolerance, False): # All elements that share self.parent, except self.
+            if abs(eZ - z) > tolerance:
                 continue # Not equal z-layer
-            if self.originTop: # not in window of horizontal projection.
-                if e.mBottom <= self.mTop or self.mBottom <= e.mTop:
+            if originTop: # not in window of horizontal projection.
+                if eBottom <= mTop or mBottom <= eTop:
                     continue
             else:
-                if e.mBottom >= self.mTop or self.mBottom >= e.mTop:
+                if eBottom >= mTop or mBottom >= eTop:
                     continue 
-            x = max(e.mRight, x)
+            x = max(eRight, x)
         return x
 
     def getFloatRightSide(self, previousOnly=True, tolerance=0):
@@ -2932,12 +3452,13 @@ class Element(object):
         Note that the y may be outside the parent box. Only elements with identical z-value are compared.
         Comparison of available spave, includes the margins of the elements."""
         x = self.parent.w
-        for e in self.parent.elements: # All elements that share self.parent, except self.
-            if previousOnly and e is self: # Only look at siblings that are previous in the list.
-                break 
-            if abs(e.z - self.z) > tolerance or e.mBottom < self.mTop or self.mBottom < e.mTop:
+        z = self.z
+        mTop = self.mTop
+        mBottom = self.mBottom
+        for eLeft, eTop, eRight, eBottom, eZ in self._getFloatBoxes(previousOnly, tolerance, False): # All elements that share self.parent, except self.
+            if abs(eZ - z) > tolerance or eBottom < mTop or mBottom < eTop:
                 continue # Not equal z-layer or not in window of horizontal projection.
-            x = min(e.mLeft, x)
+            x = min(eLeft, x)
         return x
 
     def _applyAlignment(self, p):
@@ -3298,20 +3819,163 @@ class Element(object):
                 e.evaluate(score)
         return score
          
-    def solve(self, score=None):
+    def _get_conditions(self):
+        u"""Property for the list of conditions of self. Can be None. Setting the conditions makes
+        the element be solved again by the next self.solve( ). Note that changing the list in place
+        is not noticed, then call self.contentChanged( ) too.
+
+        >>> from pagebot.conditions import Left2Left
+        >>> e = Element(conditions=[Left2Left()])
+        >>> e.conditions
+        [Left2Left]
+        """
+        return self._conditions
+    def _set_conditions(self, conditions):
+        self._conditions = conditions
+        self.contentChanged()
+    conditions = property(_get_conditions, _set_conditions)
+
+    def contentChanged(self):
+        u"""Mark self as changed, so the next self.solve( ) of the parent tree visits self and the 
+        elements that depend on self. Changes of the style of self are noticed automatically. This 
+        method needs to be called for changes that cannot be noticed, e.g. editing content in place."""
+        self._changeStamp = next(changeStamps)
+
+    def addSolveDependency(self, dependency):
+        u"""Record what the conditions of self read while they are solved. Dependency is one of
+        SOLVE_PARENT, SOLVE_PREVIOUS, SOLVE_SIBLINGS, SOLVE_CHILDREN or SOLVE_ALWAYS. Also called by queries such
+        as self.getFloatTopSide, that read the sibling elements."""
+        self._solveDependencies.add(dependency)
+
+    def needsSolve(self, previousStamp=0, siblingsStamp=0):
+        u"""Answer the boolean flag if the conditions of self need to be solved again. This is the case
+        if self never was solved or if self or any of the elements that its conditions did read, 
+        changed after the last solve. PreviousStamp is the latest change stamp of the previous 
+        siblings, siblingsStamp the latest of all siblings.
+
+        >>> from pagebot.conditions import Left2Left
+        >>> parent = Element(w=500, h=500)
+        >>> e = Element(parent=parent, conditions=[Left2Left()])
+        >>> e.needsSolve()
+        True
+        >>> score = parent.solve()
+        >>> e.needsSolve()
+        False
+        >>> parent.pl = 20 # Conditions of e did read the parent
+        >>> e.needsSolve()
+        True
+        """
+        solvedStamp = self._solvedStamp
+        if solvedStamp is None or self._changeStamp > solvedStamp:
+            return True
+        dependencies = self._solveDependencies
+        if not dependencies:
+            return False
+        if SOLVE_ALWAYS in dependencies:
+            return True
+        parent = self.parent
+        if SOLVE_PARENT in dependencies and getattr(parent, '_changeStamp', 0) > solvedStamp:
+            return True
+        if SOLVE_SIBLINGS in dependencies:
+            if siblingsStamp > solvedStamp or getattr(parent, '_elementsStamp', 0) > solvedStamp:
+                return True
+        elif SOLVE_PREVIOUS in dependencies:
+            if previousStamp > solvedStamp or getattr(parent, '_elementsStamp', 0) > solvedStamp:
+                return True
+        if SOLVE_CHILDREN in dependencies:
+            if self._elementsStamp > solvedStamp:
+                return True
+            for e in self.elements:
+                if e._changeStamp > solvedStamp:
+                    return True
+        return False
+
+    def solve(self, score=None, maxIterations=1, tolerance=DEFAULT_SOLVE_TOLERANCE, profile=False):
         u"""Evaluate the content of element e with the total sum of conditions.
         The view is passed, as it (or its builder) may be needed to solve specific text 
-        conditions, such as run length of text and overflow of text boxes."""
+        conditions, such as run length of text and overflow of text boxes.
+        Elements that did not change since their last solve, and which conditions did not read 
+        any changed element, are skipped. Their amount is reported in score.skipped, the result
+        of their last solve is added to the score.
+        If maxIterations > 1, solving is repeated until no element moves more than tolerance,
+        or until the layout oscillates between previous states.
+        If profile is True, the calls and times of the conditions are collected in the score.
+
+        >>> from pagebot.conditions import Left2Left, Float2Left
+        >>> parent = Element(w=500, h=500, pl=10)
+        >>> e1 = Element(parent=parent, w=100, conditions=[Left2Left()])
+        >>> e2 = Element(parent=parent, w=100, conditions=[Float2Left()])
+        >>> e3 = Element(parent=parent, w=100, conditions=[Left2Left()])
+        >>> parent.solve()
+        Score: 3 Fails: 0
+        >>> parent.solve() # Nothing changed, all elements are skipped, their result is carried forward.
+        Score: 3 Fails: 0 Skipped: 3
+        >>> e1.w = 200 # Change e1, e2 floats against it, e3 only reads the parent.
+        >>> parent.solve().skipped
+        1
+        >>> parent.pl = 20 # All conditions read the parent.
+        >>> parent.solve().skipped
+        0
+        >>> from pagebot.conditions import Right2Right
+        >>> e4 = Element(parent=parent, w=100, conditions=[Right2Right(), Float2Left()])
+        >>> score = parent.solve(maxIterations=10, profile=True)
+        >>> score.converged, score.iterations, score.conditionCalls['Float2Left']
+        (True, 2, 1)
+        """
         if score is None:
             score = Score()
-        if self.conditions: # Can be None or empty
-            for condition in self.conditions: # Skip in case there are no conditions in the style.
-                condition.solve(self, score)
-        for e in self.elements: # Also works if showing element is not a container.
+        return solveIterative([self], self._solvePass, score, maxIterations, tolerance, profile)
+
+    def _solvePass(self, score):
+        previousStamp = siblingsStamp = 0
+        parent = self.parent
+        if self._solveDependencies and hasattr(parent, '_elementsStamp'): # Parent is an element, not the document.
+            for e in parent.elements: # Calculate the stamps as the parent would have done.
+                if e is self:
+                    previousStamp = siblingsStamp
+                siblingsStamp = max(siblingsStamp, e._changeStamp)
+        self._solve(score, previousStamp, siblingsStamp)
+
+    def _solve(self, score, previousStamp, siblingsStamp):
+        u"""Solve the conditions of self if needed, then solve the child elements. The latest change 
+        stamps of the child elements are passed on, so they can check on their dependencies.
+        Elements with conditions that are not all valid after solving stay unsolved, as solving
+        them again could move them further."""
+        conditions = self.conditions
+        if conditions: # Can be None or empty
+            if self.needsSolve(previousStamp, siblingsStamp):
+                self._solveDependencies = set([SOLVE_PARENT]) # Conditions can always read the parent.
+                result = score.result
+                fails = len(score.fails)
+                for condition in conditions: # Skip in case there are no conditions in the style.
+                    if not condition.isIncremental:
+                        self.addSolveDependency(SOLVE_ALWAYS)
+                    if score.profile:
+                        t = time()
+                        condition.solve(self, score)
+                        score.addConditionCall(condition, time() - t)
+                    else:
+                        condition.solve(self, score)
+                # Only skip the next time if no condition failed to solve, otherwise solving again 
+                # could still move self. The result is carried forward to the score of skipped solves.
+                if len(score.fails) == fails:
+                    self._solvedStamp = next(changeStamps)
+                    self._solvedResult = score.result - result
+                else:
+                    self._solvedStamp = None
+            else:
+                score.result += self._solvedResult
+                score.skipped += 1
+        elements = self.elements
+        siblingsStamp = 0
+        for e in elements:
+            siblingsStamp = max(siblingsStamp, e._changeStamp)
+        previousStamp = 0
+        for e in elements: # Also works if showing element is not a container.
             if e.show:
-                e.solve(score)
-        return score
-         
+                e._solve(score, previousStamp, siblingsStamp)
+            previousStamp = max(previousStamp, e._changeStamp) # Including changes by solving e.
+
     #   C O N D I T I O N S
 
     def isBottomOnBottom(self, view, tolerance=0):
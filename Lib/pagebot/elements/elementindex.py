@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     elementindex.py
+#
+#     Index on all elements of a document by eId and by name, so finding
+#     elements by name does not need to walk the element tree. The names are
+#     also indexed per tree root (the pages and templates of the document),
+#     as templated documents repeat the same names on every page.
+#     The document creates the index on the first query, after that
+#     appendElement, removeElement, setParent (and therefore copy) and
+#     changing e.name keep it current.
+#
+from bisect import bisect_left
+
+def isInTree(e, root):
+    u"""Answer True if e is root or if e is still a child element of root, through the chain
+    of parents. Elements that were removed or replaced are no longer in the _eIds of their parent,
+    so answer False for them, even if they still refer to the parent.
+
+    >>> from pagebot.elements.element import Element
+    >>> child = Element()
+    >>> root = Element(elements=[Element(elements=[child])])
+    >>> isInTree(child, root), isInTree(root, child)
+    (True, False)
+    >>> root.elements[0].clearElements() # Child still refers to its parent
+    >>> isInTree(child, root)
+    False
+    """
+    while e is not None:
+        if e is root:
+            return True
+        parent = e.parent
+        if parent is None:
+            return False
+        eIds = getattr(parent, '_eIds', None) # Parent can be the Document.
+        if eIds is not None and eIds.get(e.eId) is not e:
+            return False
+        e = parent
+    return False
+
+def getTreeRoot(e):
+    u"""Answer the top element of the tree of e, which parent is not an element (e.g. a page
+    of a document) or which has no parent.
+
+    >>> from pagebot.elements.element import Element
+    >>> child = Element()
+    >>> root = Element(elements=[Element(elements=[child])])
+    >>> getTreeRoot(child) is root, getTreeRoot(root) is root
+    (True, True)
+    """
+    while True:
+        parent = e.parent
+        if parent is None or getattr(parent, '_eIds', None) is None: # Parent can be the Document.
+            return e
+        e = parent
+
+def getTreePath(e, root, positions=None):
+    u"""Answer the tuple of indices of e and its ancestors in their parent element lists, up to root.
+    Sorting on the paths answers the elements in the order of a depth-first search from root.
+    The optional positions dictionary keeps the indices of the children of each parent, to be
+    reused for the paths of many elements.
+
+    >>> from pagebot.elements.element import Element
+    >>> child = Element()
+    >>> root = Element(elements=[Element(), Element(elements=[Element(), child])])
+    >>> getTreePath(child, root), getTreePath(child, root, {})
+    ((1, 1), (1, 1))
+    """
+    path = []
+    while e is not root:
+        parent = e.parent
+        if positions is None:
+            path.append(parent.elements.index(e))
+        else:
+            indices = positions.get(id(parent))
+            if indices is None:
+                indices = positions[id(parent)] = dict([(id(child), index) for index, child in enumerate(parent.elements)])
+            path.append(indices[id(e)])
+        e = parent
+    path.reverse()
+    return tuple(path)
+
+class ElementIndex(object):
+    u"""The ElementIndex keeps the elements of a tree by their eId and by their name.
+    Lookups answer candidates only: the caller checks with isInTree that they are still in the
+    (sub)tree that is searched, as elements can be dropped without the index being told, e.g. by
+    parent.clearElements().
+
+    >>> from pagebot.elements.element import Element
+    >>> root = Element(name='Root', elements=[Element(name='Title'), Element(name='Body',
+    ...     elements=[Element(name='Column1'), Element(name='Column2'), Element(name='Title')])])
+    >>> index = ElementIndex([root])
+    >>> len(index)
+    6
+    >>> index.getElementById(root.eId) is root
+    True
+    >>> len(index.getElementsByName('Title'))
+    2
+    >>> index.getNames(prefix='Col')
+    ['Column1', 'Column2']
+    >>> index.getNames(pattern='o')
+    ['Body', 'Column1', 'Column2', 'Root']
+    >>> e = root.elements[1].elements[0]
+    >>> e.name = 'Footnote' # Root is not in a document, so tell the index.
+    >>> index.rename(e, 'Column1', 'Footnote')
+    >>> index.getNames(prefix='Col'), index.getNames(prefix='F')
+    (['Column2'], ['Footnote'])
+    >>> index.remove(root.elements[1])
+    >>> len(index), index.getNames()
+    (2, ['Root', 'Title'])
+    >>> len(index.treeNames[(id(root), 'Title')])
+    1
+    """
+    def __init__(self, elements=None):
+        self.eIds = {} # eId --> element
+        self.names = {} # name --> {id(e): e}
+        self.treeNames = {} # (id(tree root), name) --> {id(e): e}, see getTreeRoot
+        self.treeRoots = {} # id(e) --> id(tree root) of the named elements.
+        self._sortedNames = None # Sorted list of names for prefix search, created when needed.
+        for e in elements or []:
+            self.add(e)
+
+    def __len__(self):
+        return len(self.eIds)
+
+    def __repr__(self):
+        return '[%s %d elements %d names]' % (self.__class__.__name__, len(self), len(self.names))
+
+    def add(self, e, treeRoot=None):
+        u"""Add e and all its descendants to the index."""
+        if treeRoot is None:
+            treeRoot = getTreeRoot(e)
+        self.eIds[e.eId] = e
+        if e.name is not None:
+            self.treeRoots[id(e)] = id(treeRoot)
+            self._addName(e, e.name)
+        for child in e.elements:
+            self.add(child, treeRoot)
+
+    def move(self, e):
+        u"""Index e and its descendants again, after e moved to another parent in the same
+        document, as its tree root may have changed."""
+        self.remove(e)
+        self.add(e)
+
+    def remove(self, e):
+        u"""Remove e and all its descendants from the index."""
+        if self.eIds.get(e.eId) is e:
+            del self.eIds[e.eId]
+        self._removeName(e, e.name)
+        for child in e.elements:
+            self.remove(child)
+
+    def rename(self, e, oldName, newName):
+        u"""Move e from oldName to newName, if e is in the index."""
+        if self.eIds.get(e.eId) is not e:
+            return
+        treeRootId = self.treeRoots.get(id(e))
+        self._removeName(e, oldName)
+        if newName is not None:
+            if treeRootId is None:
+                treeRootId = id(getTreeRoot(e))
+            self.treeRoots[id(e)] = treeRootId
+            self._addName(e, newName)
+
+    def _addName(self, e, name):
+        named = self.names.get(name)
+        if named is None:
+            named = self.names[name] = {}
+            self._sortedNames = None
+        named[id(e)] = e
+        key = self.treeRoots[id(e)], name
+        treeNamed = self.treeNames.get(key)
+        if treeNamed is None:
+            treeNamed = self.treeNames[key] = {}
+        treeNamed[id(e)] = e
+
+    def _removeName(self, e, name):
+        named = self.names.get(name)
+        if named is not None:
+            named.pop(id(e), None)
+            if not named:
+                del self.names[name]
+                self._sortedNames = None
+        treeRootId = self.treeRoots.pop(id(e), None)
+        key = treeRootId, name
+        treeNamed = self.treeNames.get(key)
+        if treeNamed is not None:
+            treeNamed.pop(id(e), None)
+            if not treeNamed:
+                del self.treeNames[key]
+
+    def getElementById(self, eId):
+        u"""Answer the element with eId, or None if it is not in the index."""
+        return self.eIds.get(eId)
+
+    def getElementsByName(self, name):
+        u"""Answer the unordered list of elements with this name."""
+        return self.names.get(name, {}).values()
+
+    def getNames(self, prefix=None, pattern=None):
+        u"""Answer the sorted list of names that start with prefix and contain pattern, if defined."""
+        names = self._sortedNames
+        if names is None: # Only string names can be searched on prefix and pattern.
+            names = self._sortedNames = sorted([name for name in self.names if isinstance(name, basestring)])
+        if prefix:
+            start = bisect_left(names, prefix)
+            end = start
+            while end < len(names) and names[end].startswith(prefix):
+                end += 1
+            names = names[start:end]
+        if pattern:
+            names = [name for name in names if pattern in name]
+        return list(names)
+
+    def findElements(self, roots, name=None, pattern=None, prefix=None):
+        u"""Answer the list of elements in the trees of roots, with a name equal to name or containing
+        pattern, or starting with prefix, in depth-first order of the roots, as pagebot.deepFind does.
+        """
+        names = set()
+        if name is not None and name in self.names:
+            names.add(name)
+        if pattern or prefix:
+            names.update(self.getNames(prefix=prefix, pattern=pattern))
+        found = []
+        positions = {} # Indices of the children of parents, shared by the tree paths.
+        for rootIndex, root in enumerate(roots):
+            for n in names:
+                for e in self.names.get(n, {}).values():
+                    if isInTree(e, root):
+                        found.append(((rootIndex,) + getTreePath(e, root, positions), e))
+        found.sort(key=lambda item: item[0])
+        return [e for _, e in found]
+
+    def getFirstByName(self, name, root):
+        u"""Answer the first element with this name in the tree of root, in depth-first order
+        as Element.getElementByName searches. Answer None if there is no such element.
+        If there are more elements with the name, only the candidates in the tree root of root 
+        (e.g. the same page) are checked, and ordered if there is more than one.
+
+        >>> from pagebot.elements.element import Element
+        >>> root = Element(elements=[Element(name='Tile') for _ in range(3)] + [Element(name='Title')])
+        >>> pages = [Element(elements=[Element(name='Tile')]) for _ in range(3)]
+        >>> index = ElementIndex([root] + pages)
+        >>> index.getFirstByName('Tile', root) is root.elements[0]
+        True
+        >>> index.getFirstByName('Title', root) is root.elements[-1], index.getFirstByName('None', root)
+        (True, None)
+        >>> index.getFirstByName('Tile', pages[1]) is pages[1].elements[0]
+        True
+        >>> e = pages[1].elements[0]
+        >>> e.parent = pages[2] # Not in a document, so tell the index.
+        >>> index.move(e)
+        >>> index.getFirstByName('Tile', pages[1]), index.getFirstByName('Tile', pages[2]) is pages[2].elements[0]
+        (None, True)
+        """
+        named = self.names.get(name)
+        if not named:
+            return None
+        if len(named) > 1:
+            named = self.treeNames.get((id(getTreeRoot(root)), name), {})
+        found = [e for e in named.values() if isInTree(e, root)]
+        if len(found) > 1:
+            positions = {} # Indices of the children of parents, shared by the tree paths.
+            found.sort(key=lambda e: getTreePath(e, root, positions))
+        if found:
+            return found[0]
+        return None
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     floatindex.py
+#
+#     Grid bucket index on the child elements of a container, used by the
+#     Element.getFloat<Side>Side methods to find the siblings in a projection
+#     window, instead of scanning all elements of the parent.
+#
+from __future__ import division
+
+from math import floor
+
+# Style keys that change the margin box or the z-layer of an element. If one of these
+# changes, the element needs to be moved to other buckets in the index of its parent.
+FLOAT_KEYS = set(('x', 'y', 'z', 'w', 'h', 'minW', 'maxW', 'minH', 'maxH',
+    'ml', 'mr', 'mt', 'mb', 'xAlign', 'yAlign', 'originTop'))
+
+# Containers with less elements than this are scanned linearly, as building buckets is not worth it.
+FLOAT_INDEX_MIN = 32
+# Elements that span more buckets than this are kept in a separate list, checked for every query.
+MAX_BUCKETS = 64
+
+def bucketRange(lo, hi, size):
+    u"""Answer the range of bucket indices that the closed interval (lo, hi) overlaps.
+
+    >>> list(bucketRange(0, 100, 50))
+    [0, 1, 2]
+    >>> list(bucketRange(-10, 10, 50))
+    [-1, 0]
+    """
+    return range(int(floor(lo/size)), int(floor(hi/size))+1)
+
+def getFloatBox(e):
+    u"""Answer the (mLeft, mTop, mRight, mBottom, z) tuple of the element, as used by the float queries.
+
+    >>> from pagebot.style import LEFT, TOP
+    >>> from pagebot.elements.element import Element
+    >>> getFloatBox(Element(x=10, y=20, w=30, h=40, ml=5, xAlign=LEFT, yAlign=TOP, originTop=True))
+    (5, 20, 40, 60, 0)
+    """
+    return e.mLeft, e.mTop, e.mRight, e.mBottom, e.z
+
+class FloatIndex(object):
+    u"""The FloatIndex keeps the child elements of a container in buckets of fixed size, separate
+    for the horizontal and the vertical projection and separate for every z-layer.
+    Querying the siblings of an element inside a projection window then only needs to look at the
+    buckets that overlap the window. Elements get a growing ordinal number in order of the parent
+    element list, so the query can select the elements that are previous in the list.
+    The container calls self.changed(e) if the geometry of a child changed. The changed elements
+    are moved to their new buckets before the next query.
+    The margin box of elements with e.hasStyleGeometry is stored in the index. Other elements 
+    (e.g. sized by their content) are not bucketed and their box is measured on every query.
+    The index answers the boxes of the candidates, including all elements which closed intervals 
+    overlap the window. The caller still has to test on the exact condition.
+
+    >>> from pagebot.style import LEFT, TOP
+    >>> from pagebot.elements.element import Element
+    >>> container = Element(w=1000, h=1000, xAlign=LEFT, yAlign=TOP) # Children inherit the alignment.
+    >>> for n in range(10):
+    ...     e = Element(parent=container, x=n*100, y=0, w=100, h=100)
+    >>> index = FloatIndex(container.elements)
+    >>> len(index)
+    10
+    >>> e = container.elements[5]
+    >>> sorted([box[0] for box in index.getBoxes(e, 250, 450, vertical=True)]) # Touching x=100 element is a candidate too.
+    [100, 200, 300, 400]
+    >>> sorted([box[0] for box in index.getBoxes(e, 250, 750, vertical=True, previousOnly=True)])
+    [100, 200, 300, 400]
+    >>> e.x = 2000 # Move the element outside the window.
+    >>> index.changed(e)
+    >>> sorted([box[0] for box in index.getBoxes(container.elements[6], 550, 650, vertical=True)])
+    [400, 600]
+    >>> e.z = 10 # Other z-layer is not a candidate, unless the tolerance allows it.
+    >>> e.x = 500
+    >>> index.changed(e)
+    >>> sorted([box[0] for box in index.getBoxes(container.elements[6], 550, 650, vertical=True)])
+    [400, 600]
+    >>> sorted([box[0] for box in index.getBoxes(container.elements[6], 550, 650, vertical=True, tolerance=10)])
+    [400, 500, 600]
+    >>> index.remove(container.elements[4])
+    >>> sorted([box[0] for box in index.getBoxes(container.elements[6], 550, 650, vertical=True)])
+    [600]
+    """
+    def __init__(self, elements):
+        self.entries = {} # id(e) --> (e, ordinal, box, xKeys, yKeys)
+        self.layers = {} # z --> [xBuckets, yBuckets, wideEntries]
+        self.live = {} # id(e) --> entry of elements that are measured on every query.
+        self.dirty = {} # id(e) --> e, elements that changed geometry since the last query.
+        self.nextOrdinal = 0
+        # Bucket size is the average size of the elements, so most elements are in 1 or 2 buckets.
+        if elements:
+            self.xSize = max(1, sum([abs(e.mRight - e.mLeft) for e in elements])/len(elements))
+            self.ySize = max(1, sum([abs(e.mTop - e.mBottom) for e in elements])/len(elements))
+        else:
+            self.xSize = self.ySize = 100
+        for e in elements:
+            self.append(e)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return '[%s %d elements in %d layers]' % (self.__class__.__name__, len(self), len(self.layers))
+
+    def append(self, e):
+        u"""Add the element after the elements that are already in the index."""
+        self.remove(e)
+        self._insert(e, self.nextOrdinal)
+        self.nextOrdinal += 1
+
+    def remove(self, e):
+        u"""Remove the element from the index. Ordinals of the other elements don't change."""
+        entry = self.entries.pop(id(e), None)
+        if entry is not None:
+            self._unbucket(entry)
+        self.dirty.pop(id(e), None)
+
+    def changed(self, e):
+        u"""Mark the element to be moved to its new buckets on the next query."""
+        if id(e) in self.entries:
+            self.dirty[id(e)] = e
+
+    def getOrdinal(self, e):
+        u"""Answer the ordinal of e, or None if e is not in the index."""
+        entry = self.entries.get(id(e))
+        if entry is None:
+            return None
+        return entry[1]
+
+    def getBoxes(self, e, lo, hi, vertical=True, previousOnly=False, tolerance=0):
+        u"""Answer the list of (mLeft, mTop, mRight, mBottom, z) boxes of the elements in z-layers 
+        within tolerance of e.z that may overlap with the (lo, hi) window. If vertical is True, the
+        window is on the x-axis (vertical projection), otherwise on the y-axis. If previousOnly is 
+        True, then only answer the elements that are before e in the parent list."""
+        self.update()
+        maxOrdinal = None
+        if previousOnly:
+            maxOrdinal = self.getOrdinal(e)
+        if lo > hi:
+            lo, hi = hi, lo
+        axis = 0 if vertical else 1
+        size = self.xSize if vertical else self.ySize
+        keys = bucketRange(lo, hi, size)
+        z = e.z
+        found = {}
+        for layerZ, layer in self.layers.items():
+            if abs(layerZ - z) > tolerance:
+                continue
+            buckets = layer[axis]
+            for key in keys:
+                bucket = buckets.get(key)
+                if bucket:
+                    found.update(bucket)
+            found.update(layer[2])
+        boxes = []
+        for entry in found.values():
+            if maxOrdinal is None or entry[1] < maxOrdinal:
+                boxes.append(entry[2])
+        for entry in self.live.values():
+            if maxOrdinal is None or entry[1] < maxOrdinal:
+                boxes.append(getFloatBox(entry[0]))
+        return boxes
+
+    def update(self):
+        u"""Move all changed elements to their new buckets."""
+        if self.dirty:
+            dirty = self.dirty
+            self.dirty = {}
+            for eId, e in dirty.items():
+                entry = self.entries.pop(eId, None)
+                if entry is not None:
+                    self._unbucket(entry)
+                    self._insert(e, entry[1])
+
+    def _insert(self, e, ordinal):
+        eId = id(e)
+        if not e.hasStyleGeometry:
+            entry = self.entries[eId] = self.live[eId] = (e, ordinal, None, None, None)
+            return
+        box = getFloatBox(e)
+        mLeft, mTop, mRight, mBottom, z = box
+        xKeys = bucketRange(min(mLeft, mRight), max(mLeft, mRight), self.xSize)
+        yKeys = bucketRange(min(mTop, mBottom), max(mTop, mBottom), self.ySize)
+        layer = self.layers.get(z)
+        if layer is None:
+            layer = self.layers[z] = [{}, {}, {}]
+        if len(xKeys) > MAX_BUCKETS or len(yKeys) > MAX_BUCKETS:
+            entry = (e, ordinal, box, None, None)
+            layer[2][eId] = entry
+        else:
+            entry = (e, ordinal, box, xKeys, yKeys)
+            for buckets, keys in ((layer[0], xKeys), (layer[1], yKeys)):
+                for key in keys:
+                    bucket = buckets.get(key)
+                    if bucket is None:
+                        bucket = buckets[key] = {}
+                    bucket[eId] = entry
+        self.entries[eId] = entry
+
+    def _unbucket(self, entry):
+        e, ordinal, box, xKeys, yKeys = entry
+        eId = id(e)
+        if box is None:
+            del self.live[eId]
+            return
+        z = box[4]
+        layer = self.layers[z]
+        if xKeys is None:
+            del layer[2][eId]
+        else:
+            for buckets, keys in ((layer[0], xKeys), (layer[1], yKeys)):
+                for key in keys:
+                    bucket = buckets[key]
+                    del bucket[eId]
+                    if not bucket:
+                        del buckets[key]
+        if not layer[0] and not layer[2]:
+            del self.layers[z]
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
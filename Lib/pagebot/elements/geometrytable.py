@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     geometrytable.py
+#
+#     Structure of arrays with the geometry of the child elements of a page,
+#     one row per element, so bulk queries (elements at a point, overlap,
+#     bounding box, float projections) run vectorized over all children.
+#     The style of the elements stays the source of the values. Changing
+#     the geometry of an element marks its row to be read again.
+#     NumPy is optional. Without it, pages answer None as geometry table and
+#     the queries run over the elements.
+#
+from __future__ import division
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pagebot.style import CENTER, RIGHT, MIDDLE, TOP, BOTTOM
+from pagebot.elements.floatindex import getFloatBox
+
+# Columns of the table, in order of the rows in GeometryTable.data
+GEOMETRY_COLUMNS = ('x', 'y', 'z', 'w', 'h', 'ml', 'mr', 'mt', 'mb', 'xAlign', 'yAlign', 'originTop')
+
+# Pages with less elements than this don't create a table, as the overhead is not worth it.
+GEOMETRY_TABLE_MIN = 32
+
+# Alignments are stored as codes, other values (LEFT, None) are code 0.
+X_ALIGN_CODES = {CENTER: 1, RIGHT: 2}
+Y_ALIGN_CODES = {MIDDLE: 1, BOTTOM: 2, TOP: 3}
+
+def getGeometryRow(e):
+    u"""Answer the list of column values of the element, with alignments as codes. Values that
+    are not a number (e.g. undefined height) become NaN, which does not compare equal to anything.
+
+    >>> from pagebot.elements.element import Element
+    >>> getGeometryRow(Element(x=10, y=20, w=30, h=40, xAlign=CENTER, yAlign=TOP, originTop=True))
+    [10, 20, 0, 30, 40, 0, 0, 0, 0, 1, 3, 1]
+    """
+    row = []
+    for value in (e.x, e.y, e.z, e.w, e.h, e.ml, e.mr, e.mt, e.mb):
+        if not isinstance(value, (int, long, float)):
+            value = float('nan')
+        row.append(value)
+    row.append(X_ALIGN_CODES.get(e.xAlign, 0))
+    row.append(Y_ALIGN_CODES.get(e.yAlign, 0))
+    row.append(int(bool(e.originTop)))
+    return row
+
+class GeometryTable(object):
+    u"""The GeometryTable holds the geometry of a list of elements as NumPy arrays, one column
+    for each of GEOMETRY_COLUMNS and one row per element, in the order of the elements.
+    The boxes (left, top, right, bottom and their margin versions) are calculated vectorized,
+    with the same alignment rules as the Element properties.
+    The owner calls self.changed(e) if the geometry of e may have changed. Elements that
+    calculate their size from their content (not e.hasStyleGeometry) are read on every update.
+    Queries select the rows vectorized, the answered values are read from the selected elements,
+    so they have the same type as the Element properties.
+
+    >>> from pagebot.style import LEFT
+    >>> from pagebot.elements.element import Element
+    >>> container = Element(w=1000, h=1000, xAlign=LEFT, yAlign=TOP, originTop=True)
+    >>> for n in range(10):
+    ...     e = Element(parent=container, x=n*100, y=n*10, w=100, h=50, mr=5)
+    >>> table = GeometryTable(container.elements)
+    >>> len(table)
+    10
+    >>> [e.x for e in table.getElementsAtPoint((None, 50))]
+    [500]
+    >>> [e.x for e in table.getOverlappingElements((250, 0, 420, 1000))]
+    [200, 300, 400]
+    >>> table.getBoundingBox() == (0, 0, 1000, 140)
+    True
+    >>> e = container.elements[9]
+    >>> e.x = 2000
+    >>> table.changed(e)
+    >>> table.getBoundingBox() == (0, 0, 2100, 140)
+    True
+    >>> sorted(box[0] for box in table.getFloatBoxes(container.elements[5], 250, 450, vertical=True, previousOnly=True))
+    [200, 300, 400]
+    """
+    def __init__(self, elements):
+        assert numpy is not None, '[GeometryTable] NumPy is needed for a geometry table.'
+        self.elements = list(elements)
+        self.rows = dict([(id(e), row) for row, e in enumerate(self.elements)]) # id(e) --> row
+        self.data = numpy.zeros((len(GEOMETRY_COLUMNS), len(self.elements)))
+        for name, column in zip(GEOMETRY_COLUMNS, self.data):
+            setattr(self, name, column) # Columns are views on self.data
+        self.dirty = set(range(len(self.elements))) # Rows that need to be read from their element.
+        self.live = [row for row, e in enumerate(self.elements) if not e.hasStyleGeometry]
+        self.boxes = None # Cached (left, top, right, bottom, mLeft, mTop, mRight, mBottom) arrays.
+        self.floatBoxes = {} # row --> cached float box of the element
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __repr__(self):
+        return '[%s %d elements]' % (self.__class__.__name__, len(self))
+
+    def changed(self, e):
+        u"""Mark the row of e to be read again on the next query."""
+        row = self.rows.get(id(e))
+        if row is not None:
+            self.dirty.add(row)
+            self.floatBoxes.pop(row, None)
+            self.boxes = None
+
+    def update(self):
+        u"""Read the dirty and the live rows from their elements. Answer the cached tuple of
+        (left, top, right, bottom, mLeft, mTop, mRight, mBottom) arrays."""
+        if self.live:
+            self.dirty.update(self.live)
+            self.boxes = None
+        if self.dirty:
+            data = self.data
+            elements = self.elements
+            for row in self.dirty:
+                data[:, row] = getGeometryRow(elements[row])
+            self.dirty = set()
+        if self.boxes is None:
+            self.boxes = self._getBoxes()
+        return self.boxes
+
+    def _getBoxes(self):
+        where = numpy.where
+        x, y, w, h = self.x, self.y, self.w, self.h
+        xAlign, yAlign, originTop = self.xAlign, self.yAlign, self.originTop != 0
+        left = where(xAlign == 1, x - w/2, where(xAlign == 2, x - w, x))
+        right = where(xAlign == 0, x + w, where(xAlign == 1, x + w/2, x))
+        top = where(yAlign == 1, y - h/2, where(yAlign == 2, where(originTop, y - h, y + h), y))
+        bottom = where(yAlign == 3, where(originTop, y + h, y - h), where(yAlign == 1, y + h/2, y))
+        mLeft = left - self.ml
+        mRight = right - self.mr # Same as Element.mRight
+        mTop = where(originTop, top - self.mt, top + self.mt)
+        mBottom = where(originTop, bottom + self.mb, bottom - self.mb)
+        return left, top, right, bottom, mLeft, mTop, mRight, mBottom
+
+    def getElementsAtPoint(self, point):
+        u"""Answer the list of elements with a position equal to point. None in point matches any
+        value. As in Element.getElementsAtPoint, the z of elements is compared as 0."""
+        mask = numpy.ones(len(self.elements), dtype=bool)
+        self.update()
+        px, py = point[0], point[1]
+        pz = point[2] if len(point) > 2 else 0
+        if pz not in (None, 0):
+            return []
+        if px is not None:
+            mask &= self.x == px
+        if py is not None:
+            mask &= self.y == py
+        return self._getElements(mask)
+
+    def getPositions(self):
+        u"""Answer the dictionary with (x, y) point as key and the list of elements on that point
+        as value, as Element.getPositions does. Answer None if there are undefined positions, so
+        the caller needs to group the elements itself."""
+        self.update()
+        x, y = self.x, self.y
+        if numpy.isnan(x).any() or numpy.isnan(y).any():
+            return None
+        elements = self.elements
+        positions = {}
+        if not elements:
+            return positions
+        order = numpy.lexsort((y, x)) # Stable, elements on the same point keep their order.
+        sortedX, sortedY = x[order], y[order]
+        starts = numpy.flatnonzero(numpy.concatenate(([True], 
+            (sortedX[1:] != sortedX[:-1]) | (sortedY[1:] != sortedY[:-1]))))
+        order = order.tolist()
+        ends = starts.tolist()[1:] + [len(order)]
+        for start, end in zip(starts.tolist(), ends):
+            group = [elements[row] for row in order[start:end]]
+            positions[tuple(group[0].point)] = group
+        return positions
+
+    def getOverlappingElements(self, box):
+        u"""Answer the list of elements which (left, top, right, bottom) box overlaps or touches
+        the (x1, y1, x2, y2) box, independent of the direction of the y-axis."""
+        left, top, right, bottom = self.update()[:4]
+        x1, y1, x2, y2 = box
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        mask = ((numpy.minimum(left, right) <= x2) & (numpy.maximum(left, right) >= x1) &
+            (numpy.minimum(top, bottom) <= y2) & (numpy.maximum(top, bottom) >= y1))
+        return self._getElements(mask)
+
+    def getBoundingBox(self):
+        u"""Answer the (x1, y1, x2, y2) bounding box of all elements, as used by Element.block.
+        Answer None if there are no elements."""
+        if not self.elements:
+            return None
+        left, top, right, bottom = self.update()[:4]
+        originTop = self.originTop != 0
+        elements = self.elements
+        e1 = elements[numpy.where(originTop, top, bottom).argmin()]
+        e2 = elements[numpy.where(originTop, bottom, top).argmax()]
+        y1 = e1.top if e1.originTop else e1.bottom
+        y2 = e2.bottom if e2.originTop else e2.top
+        return elements[left.argmin()].left, y1, elements[right.argmax()].right, y2
+
+    def getFloatBoxes(self, e, lo, hi, vertical=True, previousOnly=False, tolerance=0):
+        u"""Answer the list of (mLeft, mTop, mRight, mBottom, z) margin boxes of the elements in
+        z-layers within tolerance of e.z, which closed interval overlaps the (lo, hi) window.
+        If vertical is True, the window is on the x-axis, otherwise on the y-axis. If previousOnly
+        is True, only answer the elements before e. Boxes with undefined values are always answered,
+        the caller still has to test on the exact condition."""
+        mLeft, mTop, mRight, mBottom = self.update()[4:]
+        if lo > hi:
+            lo, hi = hi, lo
+        if vertical:
+            v1, v2 = mLeft, mRight
+        else:
+            v1, v2 = mTop, mBottom
+        mask = (numpy.minimum(v1, v2) <= hi) & (numpy.maximum(v1, v2) >= lo)
+        mask |= numpy.isnan(v1) | numpy.isnan(v2)
+        mask &= numpy.abs(self.z - e.z) <= tolerance
+        if previousOnly:
+            row = self.rows.get(id(e))
+            if row is not None:
+                mask[row:] = False
+        elements = self.elements
+        floatBoxes = self.floatBoxes
+        boxes = []
+        for row in numpy.flatnonzero(mask).tolist():
+            box = floatBoxes.get(row)
+            if box is None:
+                box = getFloatBox(elements[row])
+                if elements[row].hasStyleGeometry: # Live elements are measured on every query.
+                    floatBoxes[row] = box
+            boxes.append(box)
+        return boxes
+
+    def _getElements(self, mask):
+        elements = self.elements
+        return [elements[row] for row in numpy.flatnonzero(mask).tolist()]
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
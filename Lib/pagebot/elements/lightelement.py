@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     lightelement.py
+#
+#     Lightweight elements, for documents with many thousands of simple elements,
+#     such as data visualizations. They have __slots__ instead of an attribute
+#     dictionary, they create their time marks, build info, report and child
+#     element list only when they are used, and their style is layered on a
+#     default style that is shared by all of them, so they only store the values
+#     that differ, typically x, y, w and h.
+#     The methods and properties are adopted from the Element classes, so light
+#     elements build, solve and answer queries in the same way.
+#     Light element classes are not real subclasses of the Element classes, as
+#     those have an attribute dictionary. They are registered as virtual
+#     subclasses, so isinstance(e, Element) and isinstance(e, Rect) answer True.
+#     Code that depends on the real class hierarchy does not work for them:
+#     super(Rect, self) in adopted methods, checks on e.__class__ or type(e), and
+#     changes to the methods of Element classes after the light classes are made.
+#
+import copy
+
+from pagebot.style import (LayeredStyle, BaseStyle, Style, NO_VALUE, DEFAULT_WIDTH, DEFAULT_HEIGHT, MIN_DEPTH,
+    INTERPOLATING_TIME_KEYS, XXXL)
+from pagebot.elements.element import Element, changeStamps, GRID_KEYS
+from pagebot.elements.pbrect import Rect
+from pagebot.elements.pboval import Oval
+from pagebot.elements.floatindex import FLOAT_KEYS
+from pagebot.toolbox.transformer import point3D, uniqueID
+from pagebot.toolbox.timemark import TimeMark
+from pagebot.contexts.builders.buildinfo import BuildInfo
+
+# Default style of light elements, with the same values that Element.__init__ stores in the style
+# of every element. Shared as read-only base of the layered styles of all light elements.
+LIGHT_ELEMENT_STYLE = dict(x=0, y=0, z=0, w=DEFAULT_WIDTH, h=DEFAULT_HEIGHT, d=MIN_DEPTH,
+    pt=0, pr=0, pb=0, pl=0, pzf=0, pzb=0, mt=0, mr=0, mb=0, ml=0, mzf=0, mzb=0,
+    borderTop=None, borderRight=None, borderBottom=None, borderLeft=None, shadow=None, gradient=None)
+
+# Shared empty child list, element ids and css cache of light elements without children. Read-only.
+NO_ELEMENTS = ()
+NO_ELEMENT_IDS = {}
+NO_CSS_CACHE = {}
+
+# Attributes of the Element classes that are not adopted by the light element classes.
+# The ABCMeta attributes belong to the Element classes, the light classes are registered there.
+NOT_ADOPTED = ('__init__', '__dict__', '__weakref__', '__module__', '__doc__', '__slots__', '__metaclass__',
+    '__abstractmethods__', '_abc_registry', '_abc_cache', '_abc_negative_cache', '_abc_negative_cache_version')
+
+def newLightStyle(**kwargs):
+    u"""Answer a new Style with the default values of light elements and the values of kwargs.
+    Light elements that are created with the same unchanged style share its values as base.
+
+    >>> style = newLightStyle(fill=0.5)
+    >>> style['fill'], style['pl']
+    (0.5, 0)
+    >>> e1, e2 = LightRect(x=10, style=style), LightRect(x=20, style=style)
+    >>> e1.style.base is e2.style.base
+    True
+    """
+    style = dict(LIGHT_ELEMENT_STYLE)
+    style.update(kwargs)
+    return Style(None, style)
+
+def getAdoptedClass(elementClass, base=object, adoptedClass=object):
+    u"""Answer a new class that inherits from base, with copies of the methods and properties that
+    elementClass defines or inherits, except the ones that it inherits from adoptedClass, as base
+    already has them. In Python 2 the methods are plain functions in the class dictionary, so they
+    work for any instance that has the attributes that they use. The answered class has no attribute
+    dictionary of its own, so the light element classes can have __slots__. The answered class is
+    not a subclass of elementClass, the light element classes are registered to it instead.
+
+    >>> AdoptedElement = getAdoptedClass(Element)
+    >>> AdoptedElement.x is Element.x, AdoptedElement.__slots__
+    (True, ())
+    """
+    namespace = {}
+    for cls in reversed(elementClass.__mro__):
+        if cls in adoptedClass.__mro__:
+            continue
+        for name, value in cls.__dict__.items():
+            if not name in NOT_ADOPTED:
+                namespace[name] = value
+    namespace['__slots__'] = ()
+    return type('Adopted' + elementClass.__name__, (base,), namespace)
+
+class LightElement(getAdoptedClass(Element)):
+    u"""Lightweight version of Element. It behaves as Element, but it cannot have attributes that
+    are not defined in its __slots__. The time marks, build info, report and child elements
+    are created when they are used. The style is a LayeredStyle on the shared LIGHT_ELEMENT_STYLE,
+    or on the snapshot of style, if that is a Style, so it only stores x, y, w, h, the values
+    of style if it is a dictionary, and the values of kwargs.
+    Light elements do not cache inherited css values, they ask their parent for them.
+
+    >>> from pagebot.elements.pbpage import Page
+    >>> page = Page(w=1000, h=1000, padding=50)
+    >>> e = LightElement(parent=page, x=10, y=20, w=30, h=40, fill=0.5)
+    >>> e.x, e.y, e.w, e.h, e.pl, e.css('fill')
+    (10, 20, 30, 40, 0, 0.5)
+    >>> hasattr(e, '__dict__'), len(e.style.local) # Only the local values are stored.
+    (False, 5)
+    >>> isinstance(e, Element), issubclass(LightElement, Element) # Registered as virtual subclass.
+    (True, True)
+    >>> e.parent is page, page.elements[0] is e, len(e.elements)
+    (True, True, 0)
+    >>> page.style['textFill'] = 0.2 # Light elements ask the parent for inherited values.
+    >>> e.css('textFill')
+    0.2
+    >>> e.report, e.info.htmlPath # Created when used.
+    ([], None)
+    >>> child = LightElement(parent=e, name='Child')
+    >>> e['Child'] is child, e.get(child.eId) is child, e.getElementByName('Child') is child
+    (True, True, True)
+    >>> copied = e.copy()
+    >>> copied.w, copied['Child'] is not None, copied['Child'] is child
+    (30, True, False)
+    """
+    __slots__ = ('_parent', '_name', '_eId', '_style', '_context', '_changeStamp', '_solvedStamp',
+        '_solvedResult', '_solveDependencies', '_conditions', '_children', '_childIds', '_floatIndex', '_geometryTable',
+        '_elementsStamp', '_gridColumns', '_gridColumnsSide', '_gridRows', '_gridUnits', '_t', '_template', '_tm0', '_tm1', '_timeMarks', '_info', '_report',
+        'timeKeys', 'class_', 'title', 'description', 'language', 'drawBefore', 'drawAfter', 'framePath',
+        'prevElement', 'nextElement', 'prevPage', 'nextPage', '_isLeftPage', '_isRightPage', 'isFlow',
+        '__weakref__')
+
+    # Read-only base of the style of elements that are not created with a Style.
+    defaultStyle = LIGHT_ELEMENT_STYLE
+
+    def __init__(self, point=None, x=0, y=0, z=0, w=DEFAULT_WIDTH, h=DEFAULT_HEIGHT, parent=None,
+            context=None, name=None, style=None, conditions=None, info=None, elements=None,
+            padding=None, margin=None, drawBefore=None, drawAfter=None, **kwargs):
+        if point is not None:
+            x, y, z = point3D(point)
+        self._parent = self._template = self._tm0 = self._tm1 = self._solvedStamp = None
+        self._solveDependencies = self._conditions = self._children = self._childIds = None
+        self._floatIndex = self._geometryTable = self._timeMarks = self._report = None
+        self._gridColumns = self._gridColumnsSide = self._gridRows = self._gridUnits = None
+        self.class_ = self.title = self.description = self.language = self.framePath = None
+        self.prevElement = self.nextElement = self.prevPage = self.nextPage = None
+        self._isLeftPage = self._isRightPage = None
+        self.isFlow = False
+        self._solvedResult = 0
+        self.timeKeys = INTERPOLATING_TIME_KEYS
+        self._t = 0
+        self._context = context
+        self._name = name
+        self._info = info
+        self.drawBefore = drawBefore
+        self.drawAfter = drawAfter
+        self._changeStamp = self._elementsStamp = next(changeStamps)
+        self._eId = uniqueID(self)
+        # Local values of the style. Values equal to the base are stored too, as they are set explicitly.
+        values = dict(x=x, y=y, w=w or DEFAULT_WIDTH, h=h or DEFAULT_HEIGHT)
+        if z:
+            values['z'] = z
+        if isinstance(style, LayeredStyle): # E.g. the style of another light element, share its base.
+            base = style.base
+            values = dict(style.local, **values)
+        elif isinstance(style, BaseStyle):
+            base = style.getSnapshot()
+        else:
+            base = self.defaultStyle
+            if style:
+                values = dict(style, **values)
+        values.update(kwargs)
+        self._style = LayeredStyle(self, base, values)
+        if padding is not None:
+            self.padding = padding
+        if margin is not None:
+            self.margin = margin
+        if parent is not None:
+            parent.appendElement(self)
+        if conditions is not None:
+            if not isinstance(conditions, (list, tuple)): # Allow singles
+                conditions = [conditions]
+            self._conditions = conditions
+        for e in elements or ():
+            self.appendElement(e)
+
+    #   O P T I O N A L  P A R T S
+
+    def _get_timeMarks(self):
+        u"""Answer the list of time marks of self, created on first use.
+
+        >>> len(LightElement().timeMarks)
+        2
+        """
+        if self._timeMarks is None:
+            self._timeMarks = [TimeMark(0, self.style), TimeMark(XXXL, self.style)]
+        return self._timeMarks
+    def _set_timeMarks(self, timeMarks):
+        self._timeMarks = timeMarks
+    timeMarks = property(_get_timeMarks, _set_timeMarks)
+
+    def _get_info(self):
+        u"""Answer the BuildInfo of self, created on first use."""
+        if self._info is None:
+            self._info = BuildInfo()
+        return self._info
+    def _set_info(self, info):
+        self._info = info
+    info = property(_get_info, _set_info)
+
+    def _get_report(self):
+        u"""Answer the report list of self, created on first use."""
+        if self._report is None:
+            self._report = []
+        return self._report
+    def _set_report(self, report):
+        self._report = report
+    report = property(_get_report, _set_report)
+
+    #   E L E M E N T S
+
+    # Element methods use self._elements and self._eIds. Without child elements, they answer the
+    # shared empty NO_ELEMENTS and NO_ELEMENT_IDS. Setting an empty list or dictionary (as done by
+    # self.clearElements) stores None, the lists are created by adding elements.
+
+    def _get_childElements(self):
+        children = self._children
+        if children is None:
+            return NO_ELEMENTS
+        return children
+    def _set_childElements(self, elements):
+        self._children = elements or None
+    _elements = property(_get_childElements, _set_childElements)
+
+    def _get_childIds(self):
+        childIds = self._childIds
+        if childIds is None:
+            return NO_ELEMENT_IDS
+        return childIds
+    def _set_childIds(self, eIds):
+        self._childIds = eIds or None
+    _eIds = property(_get_childIds, _set_childIds)
+
+    def _makeChildren(self):
+        if self._children is None:
+            self._children = []
+            self._childIds = {}
+
+    def appendElement(self, e):
+        self._makeChildren()
+        return Element.appendElement.im_func(self, e)
+
+    def __setitem__(self, eId, e):
+        self._makeChildren()
+        Element.__setitem__.im_func(self, eId, e)
+
+    def copy(self, parent=None):
+        u"""Answer a copy of self and its child elements. The copy shares the style base of self,
+        it only copies the local values."""
+        e = self.__class__(x=self.x, y=self.y, z=self.z, w=self.w, h=self.h, parent=parent, context=self._context, name=self.name, style=self._style,
+            conditions=copy.copy(self.conditions), drawBefore=self.drawBefore, drawAfter=self.drawAfter)
+        if self._info is not None:
+            e.info = copy.deepcopy(self._info)
+        for name in ('class_', 'title', 'description', 'language', 'framePath', 'prevElement',
+                'nextElement', 'prevPage', 'nextPage'):
+            setattr(e, name, getattr(self, name))
+        for child in self.elements:
+            e.appendElement(child.copy())
+        return e
+
+    #   C S S
+
+    # Light elements don't cache inherited values, so the cache is always empty.
+
+    def _get_cssCache(self):
+        return NO_CSS_CACHE
+    def _set_cssCache(self, cssCache):
+        pass
+    _cssCache = property(_get_cssCache, _set_cssCache)
+
+    def _getInheritedCss(self, name):
+        parent = self.parent
+        if parent is None:
+            return NO_VALUE
+        return parent._getCss(name)
+
+    def _invalidateCss(self, name):
+        u"""Called if the value of name changed in an ancestor. If self does not define it,
+        self and its child elements may have used the inherited value."""
+        if name in self._style:
+            return
+        self._changeStamp = next(changeStamps)
+        for e in self.elements:
+            e._invalidateCss(name)
+        if name in FLOAT_KEYS:
+            self._geometryChanged()
+        if name in GRID_KEYS:
+            self._gridChanged(name)
+
+class LightRect(getAdoptedClass(Rect, LightElement, Element)):
+    u"""Lightweight version of Rect, drawing the frame of the element.
+
+    >>> from pagebot.conditions import Right2Right
+    >>> from pagebot.elements.pbpage import Page
+    >>> page = Page(w=1000, h=1000, padding=50)
+    >>> e = LightRect(parent=page, w=100, h=100, conditions=[Right2Right()])
+    >>> score = page.solve()
+    >>> e.right, score.result
+    (950, 1)
+    >>> page.solve().skipped # Nothing changed, so nothing needs to be solved again.
+    1
+
+    >>> from pagebot.contexts.drawbotcontext import DrawBotContext
+    >>> from pagebot.document import Document
+    >>> doc = Document(w=300, h=400, autoPages=1, padding=30, originTop=False, context=DrawBotContext())
+    >>> page = doc[0]
+    >>> e = LightRect(parent=page, x=0, y=20, w=page.w, h=3, fill=0.5)
+    >>> e.build(doc.getView(), (0, 0))
+    >>> e.xy, e.size
+    ((0, 20), (300, 3, 1))
+    >>> isinstance(e, Rect), isinstance(e, Element), isinstance(e, Oval)
+    (True, True, False)
+    """
+    __slots__ = ()
+
+class LightOval(getAdoptedClass(Oval, LightElement, Element)):
+    u"""Lightweight version of Oval.
+
+    >>> from pagebot.contexts.drawbotcontext import DrawBotContext
+    >>> from pagebot.document import Document
+    >>> doc = Document(w=300, h=400, autoPages=1, padding=30, originTop=False, context=DrawBotContext())
+    >>> page = doc[0]
+    >>> e = LightOval(parent=page, x=0, y=20, w=page.w, h=3, fill=0.5)
+    >>> e.build(doc.getView(), (0, 0))
+    >>> e.xy, e.size
+    ((0, 20), (300, 3, 1))
+    """
+    __slots__ = ()
+
+Element.register(LightElement)
+Rect.register(LightRect)
+Oval.register(LightOval)
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -66,6 +66,8 @@ class Galley(Element):
         e.setParent(self) # Set parent of element without calling this method again.
         if e.eId: # Store the element by unique element id, if it is defined.
             self._eIds[e.eId] = e
+        if self._floatIndex is not None:
+            self._floatIndex.append(e)
         # If this is a text box, then set self.lastTextBox
         if e.isTextBox:
             self.lastTextBox = e
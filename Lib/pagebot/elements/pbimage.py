@@ -21,6 +21,8 @@ from pagebot.elements.pbtextbox import TextBox
 from pagebot.elements.element import Element
 from pagebot.style import DEFAULT_WIDTH, DEFAULT_HEIGHT, NO_COLOR, ORIGIN # In case no image is defined.
 from pagebot.toolbox.transformer import pointOffset, point2D
+from pagebot.toolbox.imagesize import getImageInfo
+from pagebot.contexts.builders.assetpipeline import SRCSET_WIDTHS, SRCSET_QUALITY
 from pagebot.conditions import Float2TopSide, Top2TopSide, Fit2Width
 
 class Image(Element):
@@ -161,10 +163,16 @@ class Image(Element):
     exists = property(_get_exists)
 
 class PixelMap(Element):
-    u"""The PixelMap contains the reference to the actual binary image data. eId can be (unique) file path or eId."""
+    u"""The PixelMap contains the reference to the actual binary image data. eId can be (unique) file path or eId.
+    In html the image is published as resized derivatives for the srcsetWidths, of which the browser
+    loads the smallest that fits the sizes media condition of the img tag."""
    
+    # Default widths in pixels and JPEG quality of the responsive image derivatives in html.
+    SRCSET_WIDTHS = SRCSET_WIDTHS
+    SRCSET_QUALITY = SRCSET_QUALITY
+
     def __init__(self, path, name=None, w=None, h=None, z=0, clipRect=None, clipPath=None, mask=None, 
-        imo=None, **kwargs):
+        imo=None, srcsetWidths=None, sizes=None, **kwargs):
         Element.__init__(self, **kwargs)
 
         # One of the two needs to be defined, the other can be None.
@@ -178,6 +186,8 @@ class PixelMap(Element):
         self.clipRect = clipRect # Optional clip rectangle
         self.clipPath = clipPath # Optional clip path.
         self.imo = imo # Optional ImageObject with filters defined. See http://www.drawbot.com/content/image/imageObject.html
+        self.srcsetWidths = srcsetWidths or self.SRCSET_WIDTHS # Widths of the derivatives in html.
+        self.sizes = sizes # Optional sizes of the img tag, default the width of the element.
         self.setPath(path) # If path is omitted, a gray/crossed rectangle will be drawn.
         
     def __repr__(self):
@@ -191,7 +201,8 @@ class PixelMap(Element):
 
     def initImageSize(self):
         u"""Initialize the image size. Note that this is done with the default/current 
-        Context, as there may not be a view availabe yet."""
+        Context, as there may not be a view availabe yet. Contexts answer the size from the
+        shared image info cache, so the image file is not opened again for every PixelMap."""
         if self.path is not None and os.path.exists(self.path):
             self.iw, self.ih = self.context.imageSize(self.path)
         else:
@@ -202,6 +213,18 @@ class PixelMap(Element):
         return self.iw, self.ih
     imageSize = property(_get_imageSize)
 
+    def _get_imageInfo(self):
+        u"""Answer the (w, h, dpi, colorMode) info of the image file, from the shared image info
+        cache. dpi is None if the file does not define it. Answer None if there is no image file.
+
+        >>> from pagebot.contexts.platform import getRootPath
+        >>> e = PixelMap(getRootPath() + '/Examples/Magazines/Fashion/images/IMG_8914.jpg')
+        >>> e.imageInfo
+        (3024, 4032, (72, 72), 'RGB')
+        """
+        return getImageInfo(self.path)
+    imageInfo = property(_get_imageInfo)
+
     def getPixelColor(self, p, scaled=True):
         u"""Answer the color in either the scaled point (x, y) or original image size point."""
         assert self.path is not None
@@ -245,7 +268,33 @@ class PixelMap(Element):
         return alpha
 
     def build_html(self, view, origin=ORIGIN, drawElements=True):
-        print '[build_html] Not implemented yet'
+        u"""Build the img tag of the image. If the builder publishes the assets of a site, the image
+        is published as derivatives for self.srcsetWidths, written in the srcset of the tag. The src
+        is the smallest derivative that is at least as wide as the element, for browsers without
+        srcset. Otherwise src is the path of the image."""
+        b = self.context.b
+        self.build_css(view)
+        if self.path is None or not os.path.exists(self.path):
+            print 'Cannot display pixelMap', self
+            return
+        srcset = None
+        if b.assets is not None:
+            srcset = b.assets.addImage(self.path, self.srcsetWidths, self.SRCSET_QUALITY)
+        if srcset:
+            src = srcset[-1][0]
+            for url, w in srcset:
+                if w >= self.w:
+                    src = url
+                    break
+            sizes = self.sizes or '(max-width: %dpx) 100vw, %dpx' % (self.w, self.w)
+            b.img(src=src, srcset=', '.join(['%s %dw' % (url, w) for url, w in srcset]), sizes=sizes,
+                class_=self.class_)
+        else:
+            if b.assets is not None:
+                src = b.assets.add(self.path)
+            else:
+                src = self.path
+            b.img(src=src, class_=self.class_)
 
     def build_flat(self, view, origin=ORIGIN, drawElements=True):
         print '[build_flat] Not implemented yet'
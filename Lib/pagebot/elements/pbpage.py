@@ -14,8 +14,8 @@
 #
 #     page.py
 #
-import weakref
 from pagebot.elements.element import Element
+from pagebot.elements.geometrytable import GeometryTable, GEOMETRY_TABLE_MIN, numpy
 from pagebot.toolbox.transformer import pointOffset
 from pagebot.style import ORIGIN
 
@@ -45,6 +45,37 @@ class Page(Element):
             return self._isRightPage 
         return self.doc.isRightPage(self) # If undefined, query parent document to decide.
 
+    def getGeometryTable(self):
+        u"""Answer the GeometryTable on the child elements of the page, that is used for vectorized
+        bulk queries. Answer None if NumPy is not installed or if there are too few elements for 
+        a table to be faster. The table is created on the first query and kept current by the
+        child elements.
+
+        >>> from pagebot.style import LEFT, TOP
+        >>> page = Page(w=1000, h=1000, xAlign=LEFT, yAlign=TOP, originTop=True)
+        >>> for n in range(100):
+        ...     e = Element(parent=page, x=(n % 10)*100, y=(n // 10)*100, w=100, h=100)
+        >>> page.getGeometryTable() is None or len(page.getGeometryTable()) == 100
+        True
+        >>> page.getElementsAtPoint((300, 200)) == [page.elements[23]]
+        True
+        >>> page.elements[23].x = 310
+        >>> page.getElementsAtPoint((300, 200))
+        []
+        >>> page.getOverlappingElements((250, 250, 260, 260)) == [page.elements[22]]
+        True
+        >>> page.block
+        (0, 0, 1000, 1000)
+        >>> sorted(page.getPositions().keys())[:3]
+        [(0, 0), (0, 100), (0, 200)]
+        """
+        if numpy is None or len(self._elements) < GEOMETRY_TABLE_MIN:
+            return None
+        geometryTable = self._geometryTable
+        if geometryTable is None or len(geometryTable) != len(self._elements): # Elements list altered directly?
+            geometryTable = self._geometryTable = GeometryTable(self._elements)
+        return geometryTable
+
     #   D R A W B O T  S U P P O R T
 
     def build(self, view, origin=ORIGIN, drawElements=True):
@@ -139,11 +170,14 @@ class Template(Page):
     def _set_parent(self, parent):
         u"""Set the parent of the template. Don't call self.appendParent here, as we don't want the 
         parent to add self to the page/element list. Just a simple reference, to connect to styles, etc."""
-        if parent is not None:
-            parent = weakref.ref(parent)
-        self._parent = parent
+        self.setParent(parent)
     parent = property(_get_parent, _set_parent)
 
  
     def draw(self, origin, view):
         raise ValueError('Templates cannot draw themselves in a view. Apply the template to a page first.')
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
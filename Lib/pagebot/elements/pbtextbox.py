@@ -18,7 +18,7 @@ from pagebot import getMarker
 from pagebot.style import (LEFT, RIGHT, CENTER, MIN_WIDTH, MIDDLE,
                            BOTTOM, DEFAULT_WIDTH)
 from pagebot.elements.element import Element
-from pagebot.toolbox.transformer import pointOffset
+from pagebot.toolbox.transformer import pointOffset, path2Name
 
 class TextBox(Element):
 
@@ -44,6 +44,16 @@ class TextBox(Element):
         self.bs = self.newString(bs) # Source can be any type: BabelString instance or plain unicode string.
         self.showBaselines = showBaselines # Force showing of baseline if view.showBaselines is False.
 
+    def _get_bs(self):
+        u"""Property for the BabelString content of the textbox. Setting the string marks the
+        element as changed, so its conditions are solved again."""
+        return self._bs
+    def _set_bs(self, bs):
+        self._bs = bs
+        self._textLines = None # Force reset if being called
+        self.contentChanged()
+    bs = property(_get_bs, _set_bs)
+
     def _get_w(self): # Width
         u"""Property for self.w, holding the width of the textbox.
 
@@ -89,12 +99,36 @@ class TextBox(Element):
     def _set_h(self, h):
         # Overwrite style from here, unless self.style['elasticH'] is True
         self.style['h'] = h # If None, then self.h is elastic defined by content
+        self._textLines = None # Force reset if being called
     h = property(_get_h, _set_h)
 
     def _get_textLines(self):
-        if self._textLines is None:
+        u"""Answer the list of TextLine instances of the lines that fit in the box, if the
+        string of the context can break its lines. The lines are cached by the size of the
+        box inside the padding, so changing the width, height or padding breaks them again.
+
+        >>> from pagebot.contexts import MeasureContext
+        >>> context = MeasureContext()
+        >>> bs = context.newString('ABC ' * 10, style=dict(font='Roboto-Regular.ttf', fontSize=10, leading=12))
+        >>> tb = TextBox(bs, w=100, h=30, context=context)
+        >>> len(tb), tb[0].string, round(tb[0].y, 2)
+        (2, u'ABC ABC ABC ABC ', 20.44)
+        >>> tb.w = 200
+        >>> len(tb), tb[0].string
+        (2, u'ABC ABC ABC ABC ABC ABC ABC ABC ABC ')
+        >>> tb.pl = 120
+        >>> len(tb), tb[0].string
+        (2, u'ABC ABC ABC ')
+        >>> tb.pt = 12
+        >>> len(tb)
+        1
+        """
+        if not hasattr(self.bs, 'getTextLines'):
             return []
-        return self._textLines
+        box = self.w - self.pl - self.pr, self.h - self.pt - self.pb
+        if self._textLines is None or self._textLines[0] != box:
+            self._textLines = box, self.bs.getTextLines(*box)
+        return self._textLines[1]
     textLines = property(_get_textLines)
     
     def __getitem__(self, lineIndex):
@@ -190,8 +224,17 @@ class TextBox(Element):
         >>> c = FlatContext()
         >>> bs = c.newString('ABC', style=dict(font='Verdana', fontSize=124))
         >>> tb = TextBox(bs, w=100, h=None)
-        >>> tb.getTextSize()[1] # ???
-        73.0
+        >>> tb.getTextSize()[1] # Single line, default Flat leading 1.1 * fontSize + 1
+        137.4
+        >>> from pagebot.contexts.measurecontext import MeasureContext
+        >>> c = MeasureContext()
+        >>> bs = c.newString('ABC ' * 20, style=dict(font='Roboto-Regular.ttf', fontSize=10, leading=12))
+        >>> tb = TextBox(bs, w=100, h=None, context=c)
+        >>> tb.getTextSize()[1], tb.h
+        (60, 60)
+        >>> tb.h = 30
+        >>> len(tb.getOverflow()), tb.isOverflow()
+        (48, True)
         """
         if bs is None:
             bs = self.bs
@@ -222,9 +265,12 @@ class TextBox(Element):
         u"""Answer the name and style that desctibes this run best. If there is a doc
         style, then answer that one with its name. Otherwise answer a new unique style name
         and the style dict with its parameters."""
-        print run.attrs
-        print '#++@+', run.style
-        return 'ZZZ', run.style
+        style = run.style
+        if self.doc is not None:
+            for styleName, docStyle in sorted(self.doc.styles.items()):
+                if docStyle and all([docStyle.get(name) == value for name, value in style.items()]):
+                    return styleName, docStyle
+        return 'style-%s-%s' % (path2Name(style['font'] or ''), style['fontSize']), style
 
     def getStyledLines(self):
         u"""Answer the list with (styleName, style, textRun) tuples, reversed engeneered
@@ -379,7 +425,7 @@ class TextBox(Element):
 
         c.stroke((0, 0, 1), 0.5)
         prevY = 0
-        for textLine in []: #self.textLines: TODO: not implemented yet.
+        for textLine in self.textLines:
             y = textLine.y
             # TODO: Why measures not showing?
             c.line((px, py+y), (px + self.w, py+y))
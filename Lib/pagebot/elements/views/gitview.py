@@ -15,7 +15,6 @@
 #     gitview.py
 #
 from pagebot.elements.views.htmlview import HtmlView
-from pagebot.style import ORIGIN
 
 class GitView(HtmlView):
     viewId = 'Git'
@@ -27,32 +26,18 @@ class GitView(HtmlView):
     
     #   B U I L D  H T M L  /  C S S
 
-    def build(self, path=None, pageSelection=None, multiPage=True):
-
-        doc = self.doc
+    def build(self, path=None, pageSelection=None, multiPage=True, parallel=False, processes=None,
+            incremental=False):
+        u"""Build the pages of the document as html files and the compiled css in the site folder.
+        If parallel is True, the pages are built by a pool of processes. If incremental is True,
+        only the pages that changed since the previous build are built again. Use it only if the
+        pages don't depend on other pages, e.g. for navigation."""
 
         sitePath = self.GIT_PATH
         if not sitePath.endswith('/'):
             sitePath += '/'
             
-        b = self.b # Get builder from self.doc.context of this view.
-        doc.build_css(self) # Make doc build the main/overall CSS.
-        for pn, pages in doc.pages.items():
-            for page in pages:
-                b.resetHtml()
-
-                hook = 'build_' + b.PB_ID
-                getattr(page, hook)(self, ORIGIN) # Typically calling page.build_drawBot or page.build_flat
-
-                fileName = page.name
-                if not fileName:
-                    fileName = self.DEFAULT_HTML_FILE
-                if not fileName.lower().endswith('.html'):
-                    fileName += '.html'
- 
-                b.writeHtml(sitePath + fileName)
-        # Write all collected CSS into one file
-        b.writeCss(self.DEFAULT_CSS_PATH)
+        self.buildSite(sitePath, self.DEFAULT_CSS_PATH, parallel, processes, incremental)
 
     def getUrl(self, name):
         return 'http://%s/%s' % (name, self.DEFAULT_HTML_FILE)
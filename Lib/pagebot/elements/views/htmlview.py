@@ -14,9 +14,251 @@
 #
 #     htmlview.py
 #
+import os
+import json
+import hashlib
+import multiprocessing
+from StringIO import StringIO
+
 from pagebot.elements.views.baseview import BaseView
+from pagebot.elements.views.pageview import getPageRanges
+from pagebot.contexts.builders.csscompiler import CssCompiler
+from pagebot.contexts.builders.assetpipeline import AssetPipeline
+from pagebot.toolbox.buildcache import getPageKey, getViewKeyValues
+from pagebot.style import ORIGIN
 #from pagebot.contexts import HtmlContext
 
+# Change the version to ignore the manifests of previous builds, e.g. if the html output changed.
+SITE_MANIFEST_VERSION = 3
+
+# View, pages and previous page hashes for the worker processes. Set before the pool is created,
+# so forked workers inherit the document in memory, instead of pickling the element trees.
+_siteView = None
+_sitePages = []
+_siteHashes = {}
+
+def _buildSitePagesWorker(args):
+    u"""Build the html of the pages with indices. Write the html file of a page only if its hash
+    differs from the previous build. Answer the list of (index, htmlHash, css, assets, written)
+    tuples, where assets is the dictionary with the sources of the assets that the page uses,
+    and the list of pending jobs of the image derivatives that the pages need, to be encoded
+    by the main process."""
+    indices, sitePath, cssUrl, siteCssUrl = args
+    view = _siteView
+    b = view.b
+    results = []
+    for index in indices:
+        fileName, page = _sitePages[index]
+        html = StringIO()
+        css = StringIO()
+        b.assets.used.clear()
+        b.openHtml(html)
+        b.openCss(css)
+        hook = 'build_' + b.PB_ID
+        getattr(page, hook)(view, ORIGIN) # Typically calling page.build_drawBot or page.build_flat
+        b.closeHtml()
+        b.closeCss()
+        html = html.getvalue()
+        htmlHash = hashlib.sha1(html).hexdigest()
+        path = sitePath + fileName
+        written = htmlHash != _siteHashes.get(fileName) or not os.path.exists(path)
+        if written:
+            # Link the stylesheet of the previous build, which is most likely unchanged.
+            f = open(path, 'wb')
+            f.write(html.replace(cssUrl, siteCssUrl, 1))
+            f.close()
+        results.append((index, htmlHash, css.getvalue(), b.assets.getSources(b.assets.used), written))
+    pending = b.assets.pending
+    b.assets.pending = []
+    return results, pending
+
 class HtmlView(BaseView):
     u"""Abstract class for HTML/CSS generating views."""
- 
+
+    DEFAULT_HTML_FILE = 'index.html'
+    # Manifest with the hashes of the pages of the previous build, in the site folder.
+    MANIFEST_FILE = '.pagebot-manifest.json'
+
+    # If True, the CSS of the document and all pages is compiled into one minified stylesheet,
+    # that is named by the hash of its content. Otherwise the CSS is written as generated.
+    COMPILE_CSS = True
+
+    def getPageFileName(self, page):
+        u"""Answer the html file name of the page."""
+        fileName = page.name
+        if not fileName:
+            fileName = self.DEFAULT_HTML_FILE
+        if not fileName.lower().endswith('.html'):
+            fileName += '.html'
+        return fileName
+
+    def readManifest(self, sitePath):
+        u"""Answer the manifest of the previous build in sitePath. Answer an empty manifest if
+        there is none, or if it was written by another version."""
+        manifest = dict(version=SITE_MANIFEST_VERSION, css=None, assets={}, pages={}, pageCss={})
+        path = sitePath + self.MANIFEST_FILE
+        if os.path.exists(path):
+            f = open(path, 'rb')
+            try:
+                previous = json.load(f)
+            except ValueError:
+                previous = {}
+            f.close()
+            if previous.get('version') == SITE_MANIFEST_VERSION:
+                manifest = previous
+        return manifest
+
+    def writeManifest(self, sitePath, manifest):
+        u"""Write the manifest of the build in sitePath."""
+        f = open(sitePath + self.MANIFEST_FILE, 'wb')
+        json.dump(manifest, f)
+        f.close()
+
+    def buildSite(self, sitePath, cssPath, parallel=False, processes=None, incremental=False):
+        u"""Build the html files of all pages of the document in the sitePath folder, and the css of
+        the document and the pages in cssPath. If self.COMPILE_CSS is True, the css is compiled into
+        the fingerprinted file name of cssPath, and the stylesheet links of the pages are changed
+        to that name. Answer the path of the written css file. The CssCompiler with the statistics
+        of the compilation is kept as self.cssCompiler.
+        If parallel is True, the pages are built by a pool of worker processes (default the amount
+        of CPUs). Html files are only written if their content changed. A manifest of the page
+        hashes is kept in the site folder, and pages of the previous build that no longer exist
+        are deleted. If incremental is True, pages of which the element tree, the build info and the
+        imported files did not change since the previous build are not built again. It is off by
+        default, as the key of a page does not include other pages, e.g. for navigation. The amounts of (built, written, deleted) pages are
+        kept as self.siteStats.
+        Files of b.copyPath( ) and files referenced by url(...) in imported CSS are published in
+        the site folder under the hash of their content by the AssetPipeline self.assets. Images
+        are published as resized derivatives for the srcset of their img tag, which are only
+        encoded if they don't exist in the site yet. After all pages are built, the derivatives
+        are encoded once each, by a pool of processes (default the amount of CPUs), also if the
+        pages are not built in parallel. Assets of the previous build that are no longer used
+        are deleted."""
+        global _siteView, _sitePages, _siteHashes
+        doc = self.doc
+        b = self.b # Get builder from self.doc.context of this view.
+        previous = self.readManifest(sitePath)
+        manifest = dict(version=SITE_MANIFEST_VERSION, css=None, assets={}, pages={}, pageCss={})
+        # Publish the copied files and the files referenced by imported CSS under their content hash.
+        assets = b.assets
+        cssPrefix = os.path.relpath(sitePath, os.path.dirname(cssPath) or '.') + '/'
+        b.assets = self.assets = AssetPipeline(sitePath, cssPrefix=cssPrefix, sources=previous['assets'])
+
+        # Pages in order, where later pages with the same file name replace earlier ones.
+        pages = []
+        indices = {}
+        for pn, pnPages in doc.pages.items():
+            for page in pnPages:
+                fileName = self.getPageFileName(page)
+                if fileName in indices:
+                    pages[indices[fileName]] = None
+                indices[fileName] = len(pages)
+                pages.append((fileName, page))
+        pages = [filePage for filePage in pages if filePage is not None]
+
+        # Pages link to the plain name of the stylesheet, before the hash of the CSS is known.
+        cssUrl = 'href="%s"' % os.path.relpath(cssPath, sitePath)
+        siteCssUrl = cssUrl
+        if self.COMPILE_CSS and previous['css']:
+            siteCssUrl = 'href="%s"' % previous['css']
+
+        keys = {}
+        viewKeyValues = getViewKeyValues(self)
+        results = {} # Index --> (htmlHash, css, assets)
+        changed = []
+        for index, (fileName, page) in enumerate(pages):
+            keys[index] = key = getPageKey(self, page, index, len(pages), self.w, self.h, viewKeyValues)
+            entry = previous['pages'].get(fileName)
+            if incremental and entry is not None and entry['key'] == key and \
+                    entry['css'] in previous['pageCss'] and os.path.exists(sitePath + fileName):
+                results[index] = entry['hash'], previous['pageCss'][entry['css']].encode('utf-8'), entry['assets']
+            else:
+                changed.append(index)
+
+        _siteView = self
+        _sitePages = pages
+        _siteHashes = dict([(fileName, entry['hash']) for fileName, entry in previous['pages'].items()])
+        try:
+            if parallel and len(changed) > 1 and processes != 1:
+                ranges = getPageRanges(changed, processes or multiprocessing.cpu_count())
+                pool = multiprocessing.Pool(len(ranges))
+                try:
+                    rangeResults = pool.map(_buildSitePagesWorker,
+                        [(rangeIndices, sitePath, cssUrl, siteCssUrl) for rangeIndices in ranges], 1)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                rangeResults = [_buildSitePagesWorker((changed, sitePath, cssUrl, siteCssUrl))]
+        finally:
+            _siteView = None
+            _sitePages = []
+            _siteHashes = {}
+        written = set() # Indices of the pages of which the file is written.
+        for rangeResult, pending in rangeResults:
+            self.assets.addPending(pending) # Image derivatives that more pages need are encoded once.
+            for index, htmlHash, css, pageAssets, pageWritten in rangeResult:
+                results[index] = htmlHash, css, pageAssets
+                if pageWritten:
+                    written.add(index)
+
+        # Write the CSS of the document and the pages in page order.
+        css = StringIO()
+        b.assets.used.clear()
+        b.openCss(css)
+        doc.build_css(self) # Make doc build the main/overall CSS.
+        b.closeCss()
+        usedAssets = b.assets.getSources(b.assets.used)
+        b.assets = assets
+        # Encode the image derivatives of all pages and the document together, by a pool of processes.
+        self.assets.encodeImages(processes)
+        if self.COMPILE_CSS:
+            self.cssCompiler = cssOut = CssCompiler()
+        else:
+            self.cssCompiler = None
+            cssOut = open(cssPath, 'wb')
+        cssOut.write(css.getvalue())
+        for index, (fileName, page) in enumerate(pages):
+            htmlHash, css, pageAssets = results[index]
+            cssOut.write(css)
+            cssHash = hashlib.sha1(css).hexdigest()
+            manifest['pages'][fileName] = dict(key=keys[index], hash=htmlHash, css=cssHash, assets=pageAssets)
+            usedAssets.update(pageAssets)
+            manifest['pageCss'][cssHash] = css.decode('utf-8')
+        if self.cssCompiler is None:
+            cssOut.close()
+        else:
+            compiledPath = self.cssCompiler.getFileName(cssPath)
+            if not os.path.exists(compiledPath):
+                self.cssCompiler.save(cssPath)
+            manifest['css'] = os.path.relpath(compiledPath, sitePath)
+            compiledUrl = 'href="%s"' % manifest['css']
+            if compiledUrl != siteCssUrl: # Changed CSS, link all pages to the new stylesheet.
+                for index, (fileName, page) in enumerate(pages):
+                    f = open(sitePath + fileName, 'rb')
+                    html = f.read()
+                    f.close()
+                    if siteCssUrl in html:
+                        f = open(sitePath + fileName, 'wb')
+                        f.write(html.replace(siteCssUrl, compiledUrl, 1))
+                        f.close()
+                        written.add(index)
+            cssPath = compiledPath
+
+        manifest['assets'] = usedAssets
+
+        # Delete the pages, assets and the stylesheet of the previous build that are not used anymore.
+        deleted = 0
+        for url in set(previous['assets']).difference(usedAssets.keys()):
+            if os.path.exists(sitePath + url):
+                os.remove(sitePath + url)
+        for fileName in previous['pages']:
+            if not fileName in manifest['pages'] and os.path.exists(sitePath + fileName):
+                os.remove(sitePath + fileName)
+                deleted += 1
+        if previous['css'] and previous['css'] != manifest['css'] and os.path.exists(sitePath + previous['css']):
+            os.remove(sitePath + previous['css'])
+        self.writeManifest(sitePath, manifest)
+        self.siteStats = len(changed), len(written), deleted
+        return cssPath
+
@@ -14,11 +14,8 @@
 #
 #     mampview.py
 #
-import os
-import shutil
-
 from pagebot.elements.views.htmlview import HtmlView
-from pagebot.style import ORIGIN
+from pagebot.contexts.builders.assetpipeline import syncFolder
 
 class MampView(HtmlView):
     viewId = 'Mamp'
@@ -36,36 +33,21 @@ class MampView(HtmlView):
 
     #   B U I L D  H T M L  /  C S S
 
-    def build(self, path=None, pageSelection=None, multiPage=True):
-
-        doc = self.doc 
+    def build(self, path=None, pageSelection=None, multiPage=True, parallel=False, processes=None,
+            incremental=False):
+        u"""Build the pages of the document as html files and the compiled css in the site folder.
+        If parallel is True, the pages are built by a pool of processes. If incremental is True,
+        only the pages that changed since the previous build are built again. Use it only if the
+        pages don't depend on other pages, e.g. for navigation."""
 
         sitePath = self.SITE_PATH
         if not sitePath.endswith('/'):
             sitePath += '/'
             
-        b = self.b # Get builder from self.doc.context of this view.
-        doc.build_css(self) # Make doc build the main/overall CSS.
-        for pn, pages in doc.pages.items():
-            for page in pages:
-                b.resetHtml()
-
-                hook = 'build_' + b.PB_ID
-                getattr(page, hook)(self, ORIGIN) # Typically calling page.build_drawBot or page.build_flat
-
-                fileName = page.name
-                if not fileName:
-                    fileName = self.DEFAULT_HTML_FILE
-                if not fileName.lower().endswith('.html'):
-                    fileName += '.html'
-                b.writeHtml(sitePath + fileName)
-        # Write all collected CSS into one file
-        b.writeCss(self.DEFAULT_CSS_PATH)
+        self.buildSite(sitePath, self.DEFAULT_CSS_PATH, parallel, processes, incremental)
 
-        mampPath = self.MAMP_PATH + (path or '')
-        if os.path.exists(mampPath):
-            shutil.rmtree(mampPath)
-        shutil.copytree(self.SITE_PATH, mampPath)
+        # Only copy the files that changed since the previous build to the MAMP folder.
+        syncFolder(self.SITE_PATH, self.MAMP_PATH + (path or ''))
 
     def getUrl(self, name):
         return 'http://localhost:8888/%s/%s' % (name, self.DEFAULT_HTML_FILE)
@@ -17,12 +17,69 @@
 from __future__ import division
 
 import os
+import multiprocessing
+import tempfile
 from datetime import datetime
 from math import atan2, radians, degrees, cos, sin
 
 from pagebot.elements.views.baseview import BaseView
 from pagebot.style import NO_COLOR, RIGHT
 from pagebot.toolbox.transformer import *
+from pagebot.toolbox.buildcache import BuildCache, getPageKey
+
+# View and pages to build by the worker processes. Set before the pool is created, so forked
+# workers inherit the document in memory, instead of pickling the element trees.
+_parallelView = None
+_parallelPages = []
+
+# Settings of the view context that are copied to the contexts of the worker processes.
+CONTEXT_SETTINGS = ('exportResolution', 'exportQuality', 'exportOptimized', 'imageResolution',
+    'imageQuality', 'imageCache')
+
+def _buildPagesWorker(args):
+    u"""Build the pages with indices in the worker process, each worker with its own context of
+    the same class and settings as the view context. Pages of formats that export a file per
+    page are saved by the worker itself, under the same path as in a serial build. Otherwise
+    the drawn pages of the context are stored as files in the BuildCache folder pagesPath,
+    under their index, to be merged by the main process in page order. Answer the list with
+    the export timings of the saved pages."""
+    indices, w, h, path, multiPage, pagesPath = args
+    view = _parallelView
+    context = view.context.__class__()
+    for name in CONTEXT_SETTINGS:
+        if hasattr(view.context, name):
+            setattr(context, name, getattr(view.context, name))
+    view.doc.context = context # Forked copy, elements find their context through the document.
+    view.context = context
+    context.newDocument(w, h)
+    for index in indices:
+        view.buildPage(_parallelPages[index], w, h)
+    if pagesPath is None:
+        # Already in a worker process of the pool, so the pages are saved by this process.
+        context.savePages(path, context.pages, pageCount=len(_parallelPages), multiPage=multiPage,
+            processes=1, indices=indices)
+        return context.exportTimings
+    pagesCache = BuildCache(pagesPath)
+    for index, contextPage in zip(indices, context.pages):
+        pagesCache.putPage(index, contextPage)
+    return []
+
+def getPageRanges(indices, processes):
+    u"""Answer the list of indices, divided in lists of consecutive indices for the processes.
+
+    >>> getPageRanges(range(10), 4)
+    [[0, 1, 2], [3, 4, 5], [6, 7], [8, 9]]
+    >>> getPageRanges([3, 5], 4)
+    [[3], [5]]
+    """
+    processes = min(processes, len(indices))
+    ranges = []
+    start = 0
+    for n in range(processes):
+        end = start + len(indices) // processes + (n < len(indices) % processes)
+        ranges.append(indices[start:end])
+        start = end
+    return ranges
 
 class PageView(BaseView):
     u"""A View is just another kind of container, kept by document to make a certain presentation 
@@ -31,9 +88,22 @@ class PageView(BaseView):
 
     MIN_PADDING = 20 # Minimum padding needed to show meta info. Otherwise truncated to 0 and not showing meta info.
     EXPORT_PATH = '_export/' # Default path for local document export, that does not commit documents to Github.
+    CACHE_PATH = EXPORT_PATH + '_cache/' # Default path of the cache with previously built pages.
 
-    def build(self, path=None, pageSelection=None, multiPage=True):
+    def build(self, path=None, pageSelection=None, multiPage=True, parallel=False, processes=None,
+            cache=None, stream=False):
         u"""Draw the selected pages. pageSelection is an optional set of y-pageNumbers to draw.
+        If parallel is True and the context can draw independent documents (as FlatContext), the
+        pages are divided in consecutive ranges, each built by a worker process (default the amount
+        of CPUs) with its own context. The outputs are merged in page order, so the exported files
+        are the same as in a serial build, apart from the random /ID that Flat writes in a PDF. Pages of formats with a file per page (as PNG) are
+        saved by a pool of processes and their timings are kept in context.exportTimings.
+        If cache is a BuildCache, a folder path or True (to use self.CACHE_PATH), pages of such
+        contexts are only drawn if they changed since a previous build with the same cache. The
+        other pages are taken from the cache.
+        If stream is True and the context can stream pages (as FlatContext), a PDF is written page
+        by page, as soon as each page is drawn, so large documents don't need to fit in memory.
+        Streamed pages are built in order by this process, parallel is ignored.
 
         >>> e = PageView(name='MyPageView')
         >>> e.w, e.h, e.name
@@ -50,63 +120,210 @@ class PageView(BaseView):
         # Find the maximum document page size to this in all pages sizes of the document.
         w, h, _ = self.doc.getMaxPageSizes(pageSelection)
 
+        # TODO: make this work for pages that share the same page number
+        pages = [pnPages[0] for pn, pnPages in self.doc.getSortedPages(pageSelection)]
+
         context.newDocument(w, h) # Allow the context to create a new document and page canvas.
-        for pn, pages in self.doc.getSortedPages():
-            #if pageSelection is not None and not page.y in pageSelection:
-            #    continue
-            
-            # TODO: Some options here for layout of the combined pages, depending on the spread view option.
-            # self.showSpreadPages # Show even/odd pages as spread, as well as pages that share the same pagenumber.
-            # self.showSpreadMiddleAsGap # Show the spread with single crop marks. False glues pages togethers as in real spread.
-
-            # Create a new DrawBot viewport page to draw template + page, if not already done.
-            # In case the document is oversized, then make all pages the size of the document, so the
-            # pages can draw their crop-marks. Otherwise make DrawBot pages of the size of each page.
-            # Size depends on the size of the larges pages + optional decument padding.
-            page = pages[0] # TODO: make this work for pages that share the same page number
-            pw, ph = w, h  # Copy from main (w, h), since they may be altered.
-            
-            if self.pl > self.MIN_PADDING and \
-               self.pt > self.MIN_PADDING and \
-               self.pb > self.MIN_PADDING and \
-               self.pr > self.MIN_PADDING:
-                pw += self.pl + self.pr
-                ph += self.pt + self.pb
-                if self.originTop:
-                    origin = self.pl, self.pt, 0
+        if not getattr(context, 'isFlat', False):
+            for page in pages:
+                self.buildPage(page, w, h)
+            self.saveDocument(path, multiPage)
+            return
+
+        # The context can draw pages in independent documents and save them page by page.
+        folder = path2ParentPath(path)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        pageFormat = path.split('.')[-1] in context.PAGE_FORMATS
+        if pageFormat:
+            context.exportTimings = [] # Timings of the pages that are saved by this build.
+        indices = range(len(pages))
+        if pageFormat: # Only draw the pages that will be saved.
+            indices = [index for index in indices if context.getPagePath(path, index, len(pages), multiPage)]
+        contextPages = {} # Drawn or cached pages of the context by index, to merge into the document.
+        if cache is True:
+            cache = BuildCache(self.CACHE_PATH)
+        elif isinstance(cache, basestring):
+            cache = BuildCache(cache)
+        if stream and not pageFormat:
+            self._buildStream(pages, w, h, path, cache)
+            return
+        keys = {}
+        if cache is not None:
+            changed = []
+            for index in indices:
+                keys[index] = key = getPageKey(self, pages[index], index, len(pages), w, h)
+                if pageFormat:
+                    if cache.restoreFile(key, context.getPagePath(path, index, len(pages), multiPage)):
+                        continue
                 else:
-                    origin = self.pl, self.pb, 0
+                    contextPage = cache.getPage(key)
+                    if contextPage is not None:
+                        contextPages[index] = contextPage
+                        continue
+                changed.append(index)
+            indices = changed
+
+        if parallel and len(indices) > 1 and processes != 1:
+            contextPages.update(self._buildParallel(pages, indices, w, h, path, multiPage, processes))
+        else:
+            for index in indices:
+                self.buildPage(pages[index], w, h)
+                contextPages[index] = context.page
+            if pageFormat: # Save all drawn pages at once, so they are encoded by a pool of processes.
+                context.savePages(path, [contextPages[index] for index in indices], pageCount=len(pages),
+                    multiPage=multiPage, indices=indices)
+
+        if cache is not None:
+            for index in indices:
+                if pageFormat:
+                    cache.putFile(keys[index], context.getPagePath(path, index, len(pages), multiPage))
+                else:
+                    cache.putPage(keys[index], contextPages[index])
+        if not pageFormat: # Merge the pages in page order and save the document.
+            context.doc.pages = [contextPage for index, contextPage in sorted(contextPages.items())]
+            context.pages = context.doc.pages[:]
+            self.saveDocument(path, multiPage)
+
+    def _buildStream(self, pages, w, h, path, cache):
+        u"""Build the pages in order and write each page to the PDF at path, as soon as it is
+        drawn or taken from the cache."""
+        context = self.context
+        context.openStream(path)
+        try:
+            for index, page in enumerate(pages):
+                contextPage = None
+                if cache is not None:
+                    key = getPageKey(self, page, index, len(pages), w, h)
+                    contextPage = cache.getPage(key)
+                if contextPage is None:
+                    self.buildPage(page, w, h)
+                    contextPage = context.page
+                    if cache is not None:
+                        cache.putPage(key, contextPage)
+                context.streamPage(contextPage)
+        finally:
+            context.closeStream()
+
+    def _buildParallel(self, pages, indices, w, h, path, multiPage, processes):
+        u"""Build the pages with indices in a pool of processes. Answer the dictionary with the
+        drawn pages of the context by index, or an empty dictionary if the workers saved the
+        pages to file themselves. The workers don't send the drawn pages back, they store them
+        in a temporary folder, from where they are read in page order.
+        The PNG and SVG files of a parallel build are the same as those of a serial build. PDF
+        files only differ in the /ID of their trailer, as Flat writes a random /ID in every PDF,
+        so they are compared with the /ID masked. Flat is installed on Travis, so the files are
+        always compared there.
+
+        >>> import re, tempfile
+        >>> from pagebot.contexts.builders.flatbuilder import flatBuilder
+        >>> from pagebot.contexts.flatcontext import FlatContext
+        >>> from pagebot.document import Document
+        >>> from pagebot.elements import newRect
+        >>> def buildFiles(extension, parallel):
+        ...     doc = Document(w=100, h=100, autoPages=4, context=FlatContext())
+        ...     for pn in range(4):
+        ...         newRect(parent=doc[pn], x=10*pn, y=10, w=50, h=50, fill=(1, 0, 0))
+        ...     folder = tempfile.mkdtemp()
+        ...     doc.view.build(folder + '/Doc.' + extension, parallel=parallel, processes=2)
+        ...     return [open(folder + '/' + fileName, 'rb').read() for fileName in sorted(os.listdir(folder))]
+        >>> maskId = lambda data: re.sub(r'/ID\s*\[[^\]]*\]', '/ID []', data)
+        >>> flatBuilder is not None or not os.environ.get('TRAVIS') # Fail if Flat did not install on Travis.
+        True
+        >>> if flatBuilder is None: # Flat is not installed, nothing to compare.
+        ...     same = [True, True, True]
+        ... else:
+        ...     same = [buildFiles(extension, False) == buildFiles(extension, True) for extension in ('png', 'svg')]
+        ...     same.append(map(maskId, buildFiles('pdf', False)) == map(maskId, buildFiles('pdf', True)))
+        >>> same
+        [True, True, True]
+        >>> maskId('trailer << /ID [<0a1b> <0a1b>] /Size 9 >>')
+        'trailer << /ID [] /Size 9 >>'
+        """
+        global _parallelView, _parallelPages
+        _parallelView = self
+        _parallelPages = pages
+        pagesPath = None # Page formats are saved by the workers.
+        if not path.split('.')[-1] in self.context.PAGE_FORMATS:
+            pagesPath = tempfile.mkdtemp()
+        ranges = getPageRanges(indices, processes or multiprocessing.cpu_count())
+        pool = multiprocessing.Pool(len(ranges))
+        try:
+            results = pool.map(_buildPagesWorker,
+                [(rangeIndices, w, h, path, multiPage, pagesPath) for rangeIndices in ranges], 1)
+        finally:
+            pool.close()
+            pool.join()
+            _parallelView = None
+            _parallelPages = []
+        for timings in results:
+            self.context.exportTimings.extend(timings)
+        contextPages = {}
+        if pagesPath is not None:
+            pagesCache = BuildCache(pagesPath)
+            for index in indices:
+                contextPages[index] = pagesCache.getPage(index)
+            pagesCache.clear()
+            os.rmdir(pagesPath)
+        return contextPages
+
+    def buildPage(self, page, w, h):
+        u"""Draw the page in a new page of the context, where (w, h) is the maximum page size
+        of the document."""
+        context = self.context
+
+        # TODO: Some options here for layout of the combined pages, depending on the spread view option.
+        # self.showSpreadPages # Show even/odd pages as spread, as well as pages that share the same pagenumber.
+        # self.showSpreadMiddleAsGap # Show the spread with single crop marks. False glues pages togethers as in real spread.
+
+        # Create a new DrawBot viewport page to draw template + page, if not already done.
+        # In case the document is oversized, then make all pages the size of the document, so the
+        # pages can draw their crop-marks. Otherwise make DrawBot pages of the size of each page.
+        # Size depends on the size of the larges pages + optional decument padding.
+        pw, ph = w, h  # Copy from main (w, h), since they may be altered.
+        
+        if self.pl > self.MIN_PADDING and \
+           self.pt > self.MIN_PADDING and \
+           self.pb > self.MIN_PADDING and \
+           self.pr > self.MIN_PADDING:
+            pw += self.pl + self.pr
+            ph += self.pt + self.pb
+            if self.originTop:
+                origin = self.pl, self.pt, 0
             else:
-                pw = page.w # No padding defined, follow the size of the page.
-                ph = page.h
-                origin = (0, 0, 0)
-
-            context.newPage(pw, ph) #  Make page in context, actual page may be smaller if showing cropmarks.
-            # View may have defined a background
-            fillColor = self.style.get('fill')
-            if fillColor is not NO_COLOR:
-                context.setFillColor(fillColor)
-                context.rect(0, 0, pw, ph)
-
-            if self.drawBefore is not None: # Call if defined
-                self.drawBefore(page, self, origin)
-
-            # Use the (docW, docH) as offset, in case cropmarks need to be displayed.
-            # Recursively call all elements in the tree to build themselves.
-            # Note that is independent from the context. If there is a difference, the elements should 
-            # make the switch themselves.
-            page.buildChildElements(self, origin)
-
-            self.drawPageMetaInfo(page, origin)
-            
-            if self.drawAfter is not None: # Call if defined
-                self.drawAfter(page, self, origin)
-
-            # Self.infoElements now may have collected elements needed info to be drawn, after all drawing is done.
-            # So the info boxes don't get covered by regular page content.
-            for e in self.elementsNeedingInfo.values():
-                self._drawElementsNeedingInfo()
+                origin = self.pl, self.pb, 0
+        else:
+            pw = page.w # No padding defined, follow the size of the page.
+            ph = page.h
+            origin = (0, 0, 0)
+
+        context.newPage(pw, ph) #  Make page in context, actual page may be smaller if showing cropmarks.
+        # View may have defined a background
+        fillColor = self.style.get('fill')
+        if fillColor is not NO_COLOR:
+            context.setFillColor(fillColor)
+            context.rect(0, 0, pw, ph)
+
+        if self.drawBefore is not None: # Call if defined
+            self.drawBefore(page, self, origin)
+
+        # Use the (docW, docH) as offset, in case cropmarks need to be displayed.
+        # Recursively call all elements in the tree to build themselves.
+        # Note that is independent from the context. If there is a difference, the elements should 
+        # make the switch themselves.
+        page.buildChildElements(self, origin)
+
+        self.drawPageMetaInfo(page, origin)
+        
+        if self.drawAfter is not None: # Call if defined
+            self.drawAfter(page, self, origin)
+
+        # Self.infoElements now may have collected elements needed info to be drawn, after all drawing is done.
+        # So the info boxes don't get covered by regular page content.
+        for e in self.elementsNeedingInfo.values():
+            self._drawElementsNeedingInfo()
 
+    def saveDocument(self, path, multiPage=True):
         u"""Export the document to fileName for all pages in sequential order.
         If pageSelection is defined, it must be a list with page numbers to
         export. This allows the order to be changed and pages to be omitted.
@@ -135,7 +352,7 @@ class PageView(BaseView):
         #if frameDuration is not None and (fileName.endswith('.mov') or fileName.endswith('.gif')):
         #    frameDuration(frameDuration)
 
-        context.saveDocument(path, multiPage=multiPage)
+        self.context.saveDocument(path, multiPage=multiPage)
 
     #   D R A W I N G  P A G E  M E T A  I N F O
 
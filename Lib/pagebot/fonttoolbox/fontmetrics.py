@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     fontmetrics.py
+#
+#     FontMetrics reads the tables of a font file that are needed to measure text
+#     (cmap, hmtx, kern/GPOS kerning, vertical metrics) once, and keeps them in
+#     plain dictionaries, so measuring strings does not need a TTFont or a
+#     drawing context. If numpy is installed, the advance widths are kept in an
+#     array by code point, to measure long strings by array lookup.
+#
+from __future__ import division
+import os
+
+from fontTools.ttLib import TTFont
+
+try:
+    import numpy
+except (ImportError, AttributeError): # AttributeError if the platform module of PageBot shadows the standard library.
+    numpy = None
+
+
+# FontMetrics instances by font file path.
+FONT_METRICS = {}
+
+def getFontMetrics(font):
+    u"""Answer the cached FontMetrics of font, that is either a font file path or the file
+    name of a font in getFontPaths( ). Answer None if the font file cannot be found.
+
+    >>> from pagebot.contexts.platform import getRootFontPath
+    >>> path = getRootFontPath() + '/google/roboto/Roboto-Regular.ttf'
+    >>> metrics = getFontMetrics(path)
+    >>> metrics is getFontMetrics('Roboto-Regular.ttf'), metrics.unitsPerEm
+    (True, 2048)
+    >>> getFontMetrics('NotExistingFont.ttf') is None
+    True
+    """
+    from pagebot.contexts.platform import getFontPaths # Not on module level, as the strings of contexts use FontMetrics.
+    if not isinstance(font, basestring):
+        return None
+    path = getFontPaths().get(font, font)
+    metrics = FONT_METRICS.get(path)
+    if metrics is None:
+        if not os.path.isfile(path):
+            return None
+        for cachedPath, cachedMetrics in FONT_METRICS.items(): # Same file by name and by path.
+            if os.path.abspath(cachedPath) == os.path.abspath(path):
+                metrics = cachedMetrics
+                break
+        else:
+            metrics = FontMetrics(path)
+        FONT_METRICS[path] = metrics
+    return metrics
+
+class FontMetrics(object):
+    u"""Metrics of the font file at path, to measure strings.
+
+    >>> from pagebot.contexts.platform import getRootFontPath
+    >>> metrics = FontMetrics(getRootFontPath() + '/google/roboto/Roboto-Regular.ttf')
+    >>> metrics
+    <FontMetrics Roboto-Regular.ttf>
+    >>> metrics.getCharWidth(u'H'), metrics.getCharWidth(u'\\u2603') == metrics.getCharWidth(u'\\uffff')
+    (1460, True)
+    >>> metrics.getKerning(u'A', u'V'), metrics.getKerning(u'H', u'H')
+    (-87, 0)
+    >>> widthA, widthV = metrics.getCharWidth(u'A'), metrics.getCharWidth(u'V')
+    >>> metrics.getWidth(u'AVA') == 2*widthA + widthV + metrics.getKerning(u'A', u'V') + metrics.getKerning(u'V', u'A')
+    True
+    >>> round(metrics.getStringWidth(u'AVA', 12), 2), round(metrics.getStringWidth(u'AVA', 12, tracking=1), 2)
+    (22.34, 25.34)
+    >>> metrics.ascender, metrics.descender, metrics.capHeight, metrics.xHeight
+    (1900, -500, 1456, 1082)
+    """
+    def __init__(self, path):
+        self.path = path
+        ttFont = TTFont(path, lazy=True)
+        self.unitsPerEm = ttFont['head'].unitsPerEm
+        hhea = ttFont['hhea']
+        self.ascender = hhea.ascent
+        self.descender = hhea.descent
+        self.lineGap = hhea.lineGap
+        os2 = ttFont['OS/2'] if 'OS/2' in ttFont else None
+        if os2 is not None and os2.version >= 2:
+            self.capHeight = os2.sCapHeight
+            self.xHeight = os2.sxHeight
+        else:
+            self.capHeight = self.xHeight = None
+        self._glyphNames = ttFont.getBestCmap() or {} # Unicode --> glyph name
+        self._advances = dict([(glyphName, advance) for glyphName, (advance, _) in ttFont['hmtx'].metrics.items()])
+        self._missingWidth = self._advances.get(ttFont.getGlyphOrder()[0], 0) # Width of .notdef
+        self._pairs, self._classSubtables = self._readKerning(ttFont)
+        ttFont.close()
+        self._charWidths = {} # Character --> advance width in units
+        self._charKerning = {} # (char1, char2) --> kerning in units
+        self._widthArray = None # Advance widths by code point in the BMP, initialized on first use.
+        self._pairCodes = self._pairKerning = None # Sorted arrays of the pair codes and kerning looked up so far.
+        self._latinKerning = None # Kerning by pair code of the Latin-1 pairs looked up so far, NaN if not yet.
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.path.split('/')[-1])
+
+    def _readKerning(self, ttFont):
+        u"""Answer the dictionary with glyph pairs of the "kern" table and GPOS pair positioning
+        format 1, and the list of GPOS class kerning subtables, to be searched by getKerning."""
+        pairs = {}
+        classSubtables = []
+        if 'kern' in ttFont:
+            for kernTable in ttFont['kern'].kernTables:
+                if getattr(kernTable, 'format', None) == 0:
+                    for pair, value in kernTable.kernTable.items():
+                        pairs.setdefault(pair, value)
+        if 'GPOS' not in ttFont or ttFont['GPOS'].table.FeatureList is None:
+            return pairs, classSubtables
+        gpos = ttFont['GPOS'].table
+        lookupIndices = set()
+        for featureRecord in gpos.FeatureList.FeatureRecord:
+            if featureRecord.FeatureTag == 'kern':
+                lookupIndices.update(featureRecord.Feature.LookupListIndex)
+        for lookupIndex in sorted(lookupIndices):
+            lookup = gpos.LookupList.Lookup[lookupIndex]
+            for subtable in lookup.SubTable:
+                if lookup.LookupType == 9: # Extension lookup
+                    subtable = subtable.ExtSubTable
+                if subtable.LookupType != 2: # Pair adjustment only
+                    continue
+                if subtable.Format == 1:
+                    for firstGlyph, pairSet in zip(subtable.Coverage.glyphs, subtable.PairSet):
+                        for record in pairSet.PairValueRecord:
+                            value = getattr(record.Value1, 'XAdvance', None) or 0
+                            pairs.setdefault((firstGlyph, record.SecondGlyph), value)
+                elif subtable.Format == 2:
+                    classSubtables.append((set(subtable.Coverage.glyphs), subtable.ClassDef1.classDefs,
+                        subtable.ClassDef2.classDefs, subtable.Class1Record))
+        return pairs, classSubtables
+
+    def getGlyphName(self, c):
+        u"""Answer the glyph name of character c. Answer None if the font has no glyph for c."""
+        return self._glyphNames.get(ord(c))
+
+    def getCharWidth(self, c):
+        u"""Answer the advance width of character c in font units."""
+        width = self._charWidths.get(c)
+        if width is None:
+            glyphName = self._glyphNames.get(ord(c))
+            width = self._charWidths[c] = self._advances.get(glyphName, self._missingWidth)
+        return width
+
+    def getKerning(self, c1, c2):
+        u"""Answer the kerning in font units between the characters c1 and c2."""
+        kerning = self._charKerning.get((c1, c2))
+        if kerning is None:
+            kerning = 0
+            glyphName1 = self._glyphNames.get(ord(c1))
+            glyphName2 = self._glyphNames.get(ord(c2))
+            if (glyphName1, glyphName2) in self._pairs:
+                kerning = self._pairs[(glyphName1, glyphName2)]
+            else:
+                for coverage, classDefs1, classDefs2, class1Records in self._classSubtables:
+                    if glyphName1 in coverage:
+                        class2Record = class1Records[classDefs1.get(glyphName1, 0)].Class2Record[classDefs2.get(glyphName2, 0)]
+                        kerning = getattr(class2Record.Value1, 'XAdvance', None) or 0
+                        break
+            self._charKerning[(c1, c2)] = kerning
+        return kerning
+
+    def getWidth(self, s, kerning=True):
+        u"""Answer the advance width of string s in font units."""
+        getCharWidth = self.getCharWidth
+        width = 0
+        for c in s:
+            width += getCharWidth(c)
+        if kerning and (self._pairs or self._classSubtables):
+            getKerning = self.getKerning
+            for c1, c2 in zip(s, s[1:]):
+                width += getKerning(c1, c2)
+        return width
+
+    def _getWidthArray(self):
+        u"""Answer the numpy array with the advance widths by code point, for the Basic
+        Multilingual Plane."""
+        if self._widthArray is None:
+            widthArray = numpy.empty(0x10000)
+            widthArray.fill(self._missingWidth)
+            for code, glyphName in self._glyphNames.items():
+                if code < 0x10000:
+                    widthArray[code] = self._advances.get(glyphName, self._missingWidth)
+            self._widthArray = widthArray
+        return self._widthArray
+
+    def getCharWidths(self, s, kerning=True):
+        u"""Answer the advance widths of the characters of string s in font units, with the
+        kerning of each pair added to the first character of the pair. The answer is a numpy
+        array if numpy is installed, otherwise a list.
+
+        >>> from pagebot.contexts.platform import getRootFontPath
+        >>> metrics = getFontMetrics(getRootFontPath() + '/google/roboto/Roboto-Regular.ttf')
+        >>> list(metrics.getCharWidths(u'AVH'))
+        [1249.0, 1303.0, 1460.0]
+        >>> sum(metrics.getCharWidths(u'AVA ' * 100)) == metrics.getWidth(u'AVA ' * 100)
+        True
+        """
+        if not isinstance(s, unicode):
+            s = s.decode('utf-8')
+        if numpy is None:
+            widths = [self.getCharWidth(c) for c in s]
+            if kerning:
+                for index in range(len(s) - 1):
+                    widths[index] += self.getKerning(s[index], s[index+1])
+            return widths
+        if not s:
+            return numpy.zeros(0)
+        codes = numpy.fromstring(s.encode('utf-32-le'), dtype='<u4')
+        widths = self._getCodeWidths(s, codes)
+        if kerning and len(codes) > 1:
+            widths[:-1] += self._getPairKerning(s, codes)
+        return widths
+
+    def _getCodeWidths(self, s, codes):
+        u"""Answer the numpy array with the advance widths of the code points of string s."""
+        outside = codes >= 0x10000
+        if outside.any():
+            widths = self._getWidthArray()[numpy.where(outside, 0, codes)]
+            for index in numpy.flatnonzero(outside).tolist():
+                widths[index] = self.getCharWidth(s[index])
+            return widths
+        return self._getWidthArray()[codes]
+
+    def _getPairKerning(self, s, codes):
+        u"""Answer the numpy array with the kerning of each pair of code points of string s.
+        The kerning of the pairs is kept in sorted arrays by pair code, or in a table indexed by
+        pair code if all code points are Latin-1, so only the distinct pairs that were not
+        measured before are looked up by getKerning.
+
+        >>> from pagebot.contexts.platform import getRootFontPath
+        >>> metrics = getFontMetrics(getRootFontPath() + '/google/roboto/Roboto-Regular.ttf')
+        >>> s = u'AVAVA' + u''.join([unichr(0x4e00 + n) for n in range(2000)])
+        >>> codes = numpy.fromstring(s.encode('utf-32-le'), dtype='<u4')
+        >>> list(metrics._getPairKerning(s, codes)[:4]) == [metrics.getKerning(u'A', u'V'), metrics.getKerning(u'V', u'A')] * 2
+        True
+        >>> codes = numpy.fromstring(u'VAVH'.encode('utf-32-le'), dtype='<u4')
+        >>> list(metrics._getPairKerning(u'VAVH', codes)) == [metrics.getKerning(u'V', u'A'), metrics.getKerning(u'A', u'V'), 0]
+        True
+        >>> s = u'To Vo\\xe9 AVA Ty.' * 2
+        >>> codes = numpy.fromstring(s.encode('utf-32-le'), dtype='<u4')
+        >>> list(metrics._getPairKerning(s, codes)) == [metrics.getKerning(c1, c2) for c1, c2 in zip(s, s[1:])]
+        True
+        """
+        if not (self._pairs or self._classSubtables):
+            return numpy.zeros(len(codes) - 1)
+        if codes.max() < 0x100:
+            if self._latinKerning is None:
+                self._latinKerning = numpy.empty(0x10000)
+                self._latinKerning.fill(numpy.nan)
+            pairCodes = (codes[:-1] << 8) | codes[1:]
+            pairKerning = self._latinKerning[pairCodes]
+            unknown = numpy.isnan(pairKerning)
+            if unknown.any():
+                newCodes, firstIndices = numpy.unique(pairCodes[unknown], return_index=True)
+                getKerning = self.getKerning
+                self._latinKerning[newCodes] = [getKerning(s[index], s[index+1])
+                    for index in numpy.flatnonzero(unknown)[firstIndices].tolist()]
+                pairKerning = self._latinKerning[pairCodes]
+            return pairKerning
+        pairCodes = codes[:-1].astype(numpy.int64) * 0x110000 + codes[1:]
+        if self._pairCodes is None:
+            self._pairCodes = numpy.zeros(0, dtype=numpy.int64)
+            self._pairKerning = numpy.zeros(0)
+        indices = numpy.searchsorted(self._pairCodes, pairCodes)
+        known = indices < len(self._pairCodes)
+        known[known] = self._pairCodes[indices[known]] == pairCodes[known]
+        if not known.all():
+            unknown = numpy.flatnonzero(~known)
+            newCodes, firstIndices = numpy.unique(pairCodes[unknown], return_index=True)
+            getKerning = self.getKerning
+            newKerning = numpy.array([getKerning(s[index], s[index+1])
+                for index in unknown[firstIndices].tolist()], dtype=float)
+            allCodes = numpy.concatenate((self._pairCodes, newCodes))
+            order = allCodes.argsort(kind='mergesort')
+            self._pairCodes = allCodes[order]
+            self._pairKerning = numpy.concatenate((self._pairKerning, newKerning))[order]
+            indices = numpy.searchsorted(self._pairCodes, pairCodes)
+        return self._pairKerning[indices]
+
+    def getWidths(self, strings, kerning=True):
+        u"""Answer the list of advance widths of strings in font units, measured all together,
+        which is much faster than measuring many strings one by one.
+
+        >>> from pagebot.contexts.platform import getRootFontPath
+        >>> metrics = getFontMetrics(getRootFontPath() + '/google/roboto/Roboto-Regular.ttf')
+        >>> strings = [u'AVA', u'', u'VAV', u'Hamburgefonstiv']
+        >>> metrics.getWidths(strings) == [metrics.getWidth(s) for s in strings]
+        True
+        """
+        if numpy is None:
+            return [self.getWidth(s, kerning) for s in strings]
+        lengths = numpy.array([len(s) for s in strings], dtype=int)
+        ends = numpy.cumsum(lengths)
+        widths = self.getJoinedCharWidths(strings, kerning)
+        cumulated = numpy.concatenate(([0], numpy.cumsum(widths)))
+        return (cumulated[ends] - cumulated[ends - lengths]).tolist()
+
+    def getJoinedCharWidths(self, strings, kerning=True):
+        u"""Answer the numpy array with the advance widths of the characters of all strings
+        joined, in font units, with the kerning inside each string, not between the strings.
+        All widths are looked up together, so this is much faster than string by string.
+
+        >>> from pagebot.contexts.platform import getRootFontPath
+        >>> metrics = getFontMetrics(getRootFontPath() + '/google/roboto/Roboto-Regular.ttf')
+        >>> list(metrics.getJoinedCharWidths([u'AV', u'AV'])) == list(metrics.getCharWidths(u'AV')) * 2
+        True
+        """
+        strings = [s if isinstance(s, unicode) else s.decode('utf-8') for s in strings]
+        s = u''.join(strings)
+        if not s:
+            return numpy.zeros(0)
+        codes = numpy.fromstring(s.encode('utf-32-le'), dtype='<u4')
+        widths = self._getCodeWidths(s, codes)
+        if kerning and len(codes) > 1:
+            ends = numpy.cumsum([len(string) for string in strings])
+            pairKerning = self._getPairKerning(s, codes)
+            pairKerning[ends[(ends > 0) & (ends < len(s))] - 1] = 0 # No kerning between the strings.
+            widths[:-1] += pairKerning
+        return widths
+
+    def getStringWidth(self, s, fontSize, tracking=0, kerning=True):
+        u"""Answer the width of string s in points, for fontSize and tracking (in points, added
+        after each character)."""
+        return self.getWidth(s, kerning) * fontSize / self.unitsPerEm + tracking * len(s)
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
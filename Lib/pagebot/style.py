@@ -18,6 +18,7 @@
 #
 import sys
 import copy
+import weakref
 from pagebot.toolbox.units import MM, INCH 
 
 NO_COLOR = -1
@@ -130,6 +131,8 @@ FRONT = 'front' # Align in front, z-axis, nearest to view, perpendicular to the
 BACK = 'back' # Align in back, z-axis, nearest to view, perpendicular to the screen.
 DISPLAY_BLOCK = 'block' # Add \n to the end of a style block. Similar to CSS behavior of <div>
 DISPLAY_INLINE = 'inline' # Inline style, similar to CSS behavior of <span>
+GREEDY = 'greedy' # Line breaking that fills each line as much as possible.
+TOTAL_FIT = 'totalFit' # Line breaking with the least raggedness of the whole paragraph (Knuth-Plass).
 
 XALIGNS = set((None, LEFT, RIGHT, CENTER, JUSTIFIED))
 YALIGNS = set((None, TOP, BOTTOM, MIDDLE))
@@ -197,6 +200,348 @@ for d in (FONT_SIZE_MATCHES, FONT_WEIGHT_MATCHES, FONT_WIDTH_MATCHES, FONT_ITALI
         for item in items:
             d[item] = items
 
+# Value answered by cascading css lookups, if the name is not defined in any of the styles.
+# Different from None, as None is a valid style value.
+NO_VALUE = object()
+
+# Style values of these types are copied when they are shared between styles, so changing
+# them in place does not change the other styles.
+MUTABLE_STYLE_TYPES = (list, dict, set)
+
+NO_DELETED = frozenset() # Shared empty set of deleted names, until a layered style deletes a base value.
+
+class BaseStyle(object):
+    u"""Owner notification and snapshots, shared by Style and LayeredStyle. The owner is stored
+    as weakref, and gets owner._styleChanged(name) for every changed value. The snapshot is a
+    plain dictionary with a copy of the current values, that is used as read-only base by the
+    layered styles that are copied from self. It is cached until a value is set, deleted or
+    changed in place."""
+    __slots__ = () # Subclasses define the _owner and _snapshot slots, Style is a dict.
+
+    def _get_owner(self):
+        if self._owner is None:
+            return None
+        return self._owner()
+    def _set_owner(self, owner):
+        self._owner = weakref.ref(owner)
+    owner = property(_get_owner, _set_owner)
+
+    def _changed(self, name):
+        self._snapshot = None
+        if self._owner is not None:
+            owner = self._owner()
+            if owner is not None:
+                owner._styleChanged(name)
+
+    def _getCachedSnapshot(self):
+        u"""Answer the cached snapshot, if the mutable values of self did not change in place
+        since it was made. Otherwise answer None."""
+        if self._snapshot is None:
+            return None
+        snapshot, mutables = self._snapshot
+        for name, value in mutables:
+            if value != snapshot[name]: # Changed in place, e.g. by style['tags'].append(tag)
+                self._snapshot = None
+                return None
+        return snapshot
+
+    def _setSnapshot(self, snapshot, values):
+        u"""Add the values to the snapshot, with a copy of the mutable values, and cache it."""
+        mutables = []
+        for name, value in values:
+            if isinstance(value, MUTABLE_STYLE_TYPES):
+                mutables.append((name, value))
+                value = copy.deepcopy(value)
+            snapshot[name] = value
+        self._snapshot = snapshot, mutables
+        return snapshot
+
+    def setdefault(self, name, value=None):
+        if name not in self:
+            self[name] = value
+        return self[name]
+
+    def update(self, *args, **kwargs):
+        for name, value in dict(*args, **kwargs).items():
+            self[name] = value
+
+class Style(BaseStyle, dict):
+    u"""Dictionary of style values that reports every changed key to its owner, by calling
+    owner._styleChanged(name). This way elements and documents can keep a cache of cascaded
+    css values, and only invalidate the entries that actually changed.
+    The owner is stored as weakref. Copies of a Style are answered as plain dictionaries, as
+    they don't have an owner yet. Setting a simple value that is equal to the current value
+    does not notify the owner. A style without owner (e.g. made by makeStyle) is adopted
+    by the first element that gets it as style. Styles have slots instead of an attribute
+    dictionary, as every element owns one.
+
+    >>> style = Style(None, dict(fill=0.5, borders=[1, 2]))
+    >>> snapshot = style.getSnapshot()
+    >>> style.getSnapshot() is snapshot # Cached until the style changes.
+    True
+    >>> style['borders'].append(3) # Snapshot has its own copy of mutable values.
+    >>> snapshot['borders'], style.getSnapshot()['borders']
+    ([1, 2], [1, 2, 3])
+    >>> style['fill'] = 0.6
+    >>> style.getSnapshot() is snapshot, style.getSnapshot()['fill']
+    (False, 0.6)
+    """
+    __slots__ = ('_owner', '_snapshot')
+
+    def __init__(self, owner, style=None):
+        if isinstance(style, BaseStyle):
+            style = style.items()
+        dict.__init__(self, style or {})
+        self._owner = None
+        self._snapshot = None # Cached (snapshot, mutables), see self.getSnapshot()
+        if owner is not None:
+            self._owner = weakref.ref(owner)
+
+    def getSnapshot(self):
+        u"""Answer a plain dictionary with the current values of self, that is used as read-only
+        base by the layered styles that are copied from self. Mutable values are copied."""
+        snapshot = self._getCachedSnapshot()
+        if snapshot is None:
+            snapshot = self._setSnapshot({}, dict.items(self))
+        return snapshot
+
+    def __setitem__(self, name, value):
+        if name in self:
+            oldValue = self[name]
+            if oldValue is value or (isinstance(value, (int, long, float, basestring)) and 
+                    type(oldValue) is type(value) and oldValue == value):
+                return # Value did not change, no need to notify the owner.
+        dict.__setitem__(self, name, value)
+        self._changed(name)
+
+    def __delitem__(self, name):
+        dict.__delitem__(self, name)
+        self._changed(name)
+
+    def pop(self, name, *args):
+        value = dict.pop(self, name, *args)
+        self._changed(name)
+        return value
+
+    def popitem(self):
+        name, value = dict.popitem(self)
+        self._changed(name)
+        return name, value
+
+    def clear(self):
+        names = self.keys()
+        dict.clear(self)
+        for name in names:
+            self._changed(name)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+class LayeredStyle(BaseStyle):
+    u"""Copy-on-write style, that answers the values of a read-only base dictionary (the snapshot
+    of the style it was copied from), unless they are set or deleted locally. Only the local
+    values are stored, so copying a style costs the amount of changed values, not the total 
+    amount of values. Mutable base values are copied into the local values, when they are read.
+    A layered style is a mapping, not a dict, so dict(style), d.update(style) and f(**style)
+    read all values through its keys, instead of only the local values in the dict storage.
+    For the owner, the layered style behaves the same as a Style with all values.
+
+    >>> base = Style(None, dict(fill=0.5, stroke=0, borders=[1, 2]))
+    >>> style = LayeredStyle(None, base.getSnapshot(), dict(stroke=1))
+    >>> style['fill'], style['stroke'], 'fill' in style, len(style), len(style.local)
+    (0.5, 1, True, 3, 1)
+    >>> dict(style) == dict(fill=0.5, stroke=1, borders=[1, 2])
+    True
+    >>> d = dict(shadow=None)
+    >>> d.update(style)
+    >>> sorted(d.keys())
+    ['borders', 'fill', 'shadow', 'stroke']
+    >>> def f(**kwargs): return kwargs
+    >>> f(**style) == dict(style)
+    True
+    >>> snapshot = style.getSnapshot()
+    >>> style['borders'].append(3) # Copied on read, base does not change
+    >>> style['borders'], base['borders'], style.getSnapshot()['borders'], snapshot['borders']
+    ([1, 2, 3], [1, 2], [1, 2, 3], [1, 2])
+    >>> del style['fill']
+    >>> 'fill' in style, style.get('fill', 'Undefined'), sorted(style.keys())
+    (False, 'Undefined', ['borders', 'stroke'])
+    >>> style['fill'] = 0.2
+    >>> style == dict(fill=0.2, stroke=1, borders=[1, 2, 3])
+    True
+    >>> base['fill'] = 0.8 # Changing the original style does not change the copy.
+    >>> style['fill'], style.getSnapshot() is not base.getSnapshot()
+    (0.2, True)
+    >>> LayeredStyle(None, base.getSnapshot()).getSnapshot() is base.getSnapshot() # Nothing changed, answer the base.
+    True
+    """
+    __slots__ = ('_owner', '_snapshot', '_local', '_base', '_deleted')
+
+    __hash__ = None # Mutable, as dict.
+
+    def __init__(self, owner, base, style=None):
+        self._local = dict(style or {}) # Local values, that are set on top of the base.
+        self._base = base # Read-only dictionary, shared with other styles.
+        self._deleted = NO_DELETED # Names of base values that were deleted locally.
+        self._owner = None
+        self._snapshot = None # Cached (snapshot, mutables), see self.getSnapshot()
+        if owner is not None:
+            self._owner = weakref.ref(owner)
+
+    def _get_base(self):
+        u"""Answer the read-only base dictionary of self."""
+        return self._base
+    base = property(_get_base)
+
+    def _get_local(self):
+        u"""Answer the dictionary with the values that are stored by self, on top of the base.
+        It should not be changed, set the values of self instead."""
+        return self._local
+    local = property(_get_local)
+
+    def getSnapshot(self):
+        u"""Answer a plain dictionary with the current values of self. Answer the base if there
+        are no local values."""
+        if not self._local and not self._deleted:
+            return self._base
+        snapshot = self._getCachedSnapshot()
+        if snapshot is None:
+            snapshot = {} # Base values are already copies, only the local values need to be copied.
+            for name, value in self._base.items():
+                if not name in self._deleted:
+                    snapshot[name] = value
+            snapshot = self._setSnapshot(snapshot, self._local.items())
+        return snapshot
+
+    def __getitem__(self, name):
+        local = self._local
+        if name in local:
+            return local[name]
+        if name in self._base and not name in self._deleted:
+            value = self._base[name]
+            if isinstance(value, MUTABLE_STYLE_TYPES):
+                # Own copy, so changing it does not change the base. It can be changed in place,
+                # so the snapshot must be made again.
+                value = local[name] = copy.deepcopy(value)
+                self._snapshot = None
+            return value
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self._local or (name in self._base and not name in self._deleted)
+    has_key = __contains__
+
+    def get(self, name, default=None):
+        if name in self._local:
+            return self._local[name]
+        if name in self._base and not name in self._deleted:
+            return self[name]
+        return default
+
+    def keys(self):
+        local = self._local
+        keys = local.keys()
+        for name in self._base:
+            if not name in local and not name in self._deleted:
+                keys.append(name)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+    iterkeys = __iter__
+
+    def __len__(self):
+        return len(self.keys())
+
+    def values(self):
+        return [self[name] for name in self.keys()]
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def __setitem__(self, name, value):
+        if name in self._local:
+            oldValue = self._local[name]
+        elif name in self._base and not name in self._deleted:
+            oldValue = self._base[name]
+        else:
+            oldValue = NO_VALUE
+        if oldValue is not NO_VALUE and (oldValue is value or (isinstance(value, (int, long, float, basestring)) and 
+                type(oldValue) is type(value) and oldValue == value)):
+            return # Value did not change, no need to store it locally or to notify the owner.
+        if name in self._deleted:
+            self._deleted.discard(name)
+        self._local[name] = value
+        self._changed(name)
+
+    def __delitem__(self, name):
+        if not name in self:
+            raise KeyError(name)
+        if name in self._local:
+            del self._local[name]
+        if name in self._base:
+            if self._deleted is NO_DELETED:
+                self._deleted = set()
+            self._deleted.add(name)
+        self._changed(name)
+
+    def pop(self, name, *args):
+        if name in self:
+            value = self[name]
+            del self[name]
+            return value
+        if args:
+            return args[0]
+        raise KeyError(name)
+
+    def popitem(self):
+        keys = self.keys()
+        if not keys:
+            raise KeyError('popitem(): dictionary is empty')
+        return keys[0], self.pop(keys[0])
+
+    def clear(self):
+        names = self.keys()
+        self._local.clear()
+        self._deleted = set(self._base)
+        for name in names:
+            self._changed(name)
+
+    def copy(self):
+        return dict(self.items())
+
+    def __copy__(self):
+        return dict(self.items())
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self.items()), memo)
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+    def __eq__(self, other):
+        if isinstance(other, LayeredStyle):
+            other = dict(other.items())
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
 def newStyle(**kwargs):
     return dict(**kwargs)
 
@@ -206,9 +551,20 @@ def makeStyle(style=None, **kwargs):
     If style is None, then create a new style dict. In that case all the element style values need
     to be defined by argument. The calling element must test if its minimum set
     (such as self.w and self.h) are properly defined.
+    If style is a Style (e.g. of an element that is copied), then answer a LayeredStyle
+    on its snapshot, that only stores the arguments.
+
+    >>> original = Style(None, dict(fill=0.5, stroke=0))
+    >>> style = makeStyle(original, stroke=1)
+    >>> isinstance(style, LayeredStyle), style == dict(fill=0.5, stroke=1)
+    (True, True)
+    >>> len(style.local) # Only the argument is stored.
+    1
     """
     if style is None:
         style = newStyle(**kwargs)  # Copy arguments in new style.
+    elif isinstance(style, BaseStyle):
+        style = LayeredStyle(None, style.getSnapshot(), kwargs)
     else:
         style = copy.copy(style)  # As we are going to alter values, use a copy just to be sure.
         for name, v in kwargs.items():
@@ -426,6 +782,7 @@ def getRootStyle(u=U, w=W, h=H, **kwargs):
         language = 'en', # Language for hyphenation and spelling. Can be altered per style in FormattedString.
         encoding  = 'UTF-8',
         hyphenation = True,
+        lineBreaking = GREEDY, # Line breaking of paragraphs for contexts that don't have their own: GREEDY or TOTAL_FIT.
         # Strip pre/post white space from e.text and e.tail and substitute by respectively prefix and postfix
         # if they are not None. Set to e.g. newline(s) "\n" or empty string, if tags need to glue together.
         # Make None for no stripping
@@ -531,3 +888,8 @@ def css(name, e, styles=None, default=None):
 
 
   
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
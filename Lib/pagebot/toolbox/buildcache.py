@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     buildcache.py
+#
+#     On-disk cache of rendered pages, keyed by a stable hash of everything that
+#     is drawn on the page: the element tree with styles and content, the
+#     modification times of referenced image and font files, and the view and
+#     document settings. Building a document again only renders the pages that
+#     changed since the previous build.
+#
+import os
+import hashlib
+import cPickle
+import tempfile
+import types
+
+from pagebot.contexts.platform import getFontPaths
+from pagebot.contexts.strings.babelstring import BabelString
+
+# Change the version to invalidate all cached pages, e.g. if the drawing of elements changed.
+BUILD_CACHE_VERSION = 1
+
+# Element attributes, other than the style, that define what is drawn.
+CONTENT_ATTRIBUTES = ('bs', 'path', 'points', 'clipRect', 'clipPath', 'mask', 'imo',
+    'colSpan', 'rowSpan', 'drawBefore', 'drawAfter', 'class_', 'title', 'description', 'language')
+
+# Extensions of font files, that are keyed by their modification time where they are referenced,
+# e.g. in the runs of formatted strings.
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.dfont', '.woff', '.woff2')
+
+# Names of style values and attributes that refer to a font by name or path.
+FONT_NAMES = ('font', 'fontPath')
+
+# Prefixes of the view attributes that define what is drawn, e.g. showPageCropMarks, cssVerbose.
+VIEW_ATTRIBUTE_PREFIXES = ('show', 'css')
+
+# BuildInfo attributes with the paths of files that are imported into the output.
+INFO_FILE_ATTRIBUTES = ('cssPath', 'htmlPath', 'headPath', 'bodyPath')
+
+# Attributes that define what a string draws, by BabelString class name. The runs have the text,
+# font (path), font size, leading, tracking and paragraph style of each part. Strings of other
+# classes are keyed by their text. The context and the cached measurements of a string are never
+# added, as measuring and drawing the string change them.
+STRING_KEY_ATTRIBUTES = dict(FlatString=('runs',), RecordedString=('runs',))
+
+# Attributes of other objects that are not added to the key.
+NO_KEY_ATTRIBUTES = ('context',)
+
+# Depth of nested objects (e.g. paths) that is added to the key.
+MAX_KEY_DEPTH = 5
+
+def getFileKey(path):
+    u"""Answer the key of the file at path, changing when the file is changed. Answer None if
+    there is no such file.
+
+    >>> getFileKey('/not/existing/file.png') is None
+    True
+    >>> getFileKey(__file__)[0] == os.path.abspath(__file__)
+    True
+    """
+    if not isinstance(path, basestring) or not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime, stat.st_size
+
+def addKeyValue(keyValues, value, depth=0):
+    u"""Add the stable representation of value to the list keyValues. Unlike hash( ) and repr( ),
+    the representation does not depend on memory addresses, so it is the same in the next run.
+
+    >>> keyValues = []
+    >>> addKeyValue(keyValues, dict(b=(1, 2.5), a=[u'A', None]))
+    >>> keyValues
+    ['{', "'a'", '[', "u'A'", 'None', ']', "'b'", '(', '1', '2.5', ')', '}']
+    >>> keyValues = [] # Font files are keyed by their modification time.
+    >>> fontPath = getFontPaths()['Roboto-Regular.ttf']
+    >>> addKeyValue(keyValues, [(u'ABC', fontPath, 12)])
+    >>> repr(getFileKey(fontPath)) in keyValues
+    True
+    """
+    if isinstance(value, BabelString):
+        addStringKeyValues(keyValues, value)
+    elif value is None or isinstance(value, (bool, int, long, float, basestring)):
+        keyValues.append(repr(value))
+        if isinstance(value, basestring) and value.lower().endswith(FONT_EXTENSIONS):
+            keyValues.append(repr(getFileKey(value)))
+    elif isinstance(value, (tuple, list)):
+        keyValues.append('(' if isinstance(value, tuple) else '[')
+        for v in value:
+            addKeyValue(keyValues, v, depth+1)
+        keyValues.append(')' if isinstance(value, tuple) else ']')
+    elif isinstance(value, dict):
+        keyValues.append('{')
+        for name, v in sorted(value.items()):
+            addKeyValue(keyValues, name, depth+1)
+            addKeyValue(keyValues, v, depth+1)
+            if name in FONT_NAMES:
+                keyValues.append(repr(getFontKey(v)))
+        keyValues.append('}')
+    elif isinstance(value, (set, frozenset)):
+        keyValues.append(repr(sorted(value)))
+    elif isinstance(value, (types.FunctionType, types.MethodType)):
+        code = getattr(value, 'func_code', None) or value.im_func.func_code
+        keyValues.append('%s.%s:%s' % (value.__module__, value.__name__, hashlib.sha1(code.co_code).hexdigest()))
+    else:
+        keyValues.append(value.__class__.__name__)
+        if depth < MAX_KEY_DEPTH and not hasattr(value, '_elementsStamp'): # Elements are added by the tree.
+            attributes = {} # Public attributes only, others can be caches.
+            names = getattr(value, '__dict__', None) or getattr(value, '__slots__', ())
+            for name in names:
+                if not name.startswith('_') and not name in NO_KEY_ATTRIBUTES:
+                    attributes[name] = getattr(value, name, None)
+            addKeyValue(keyValues, attributes, depth+1)
+
+def addStringKeyValues(keyValues, bs):
+    u"""Add the key values of the BabelString bs to keyValues, from the attributes in
+    STRING_KEY_ATTRIBUTES, or its text. Measuring the string does not change the key.
+
+    >>> from pagebot.contexts.strings.flatstring import FlatString
+    >>> fontPath = getFontPaths()['Roboto-Regular.ttf']
+    >>> bs = FlatString(u'ABC', None, runs=[(u'ABC', fontPath, 10, 12, 0)])
+    >>> keyValues = []
+    >>> addStringKeyValues(keyValues, bs)
+    >>> w, h = bs.textSize(w=100) # Caches the measured lines in bs.
+    >>> keyValues2 = []
+    >>> addStringKeyValues(keyValues2, bs)
+    >>> keyValues == keyValues2, repr(getFileKey(fontPath)) in keyValues
+    (True, True)
+    >>> bs.append(u'D')
+    >>> keyValues3 = []
+    >>> addStringKeyValues(keyValues3, bs)
+    >>> keyValues == keyValues3
+    False
+    """
+    keyValues.append(bs.__class__.__name__)
+    names = STRING_KEY_ATTRIBUTES.get(bs.__class__.__name__)
+    if names is None:
+        addKeyValue(keyValues, bs.asText())
+    else:
+        for name in names:
+            addKeyValue(keyValues, getattr(bs, name))
+
+def getFontKey(font):
+    u"""Answer the file key of the font, that is either a font file path or the name of a
+    font in getFontPaths( ). Answer None if the font file cannot be found."""
+    if not isinstance(font, basestring):
+        return None
+    return getFileKey(getFontPaths().get(font, font))
+
+def addInfoKeyValues(keyValues, info):
+    u"""Add the key values of the BuildInfo info to keyValues, with the file keys of the files
+    that it imports.
+
+    >>> from pagebot.contexts.builders.buildinfo import BuildInfo
+    >>> info = BuildInfo(title='Title', headPath=__file__)
+    >>> keyValues = []
+    >>> addInfoKeyValues(keyValues, info)
+    >>> repr(getFileKey(__file__)) in keyValues, "u'Title'" in keyValues or "'Title'" in keyValues
+    (True, True)
+    """
+    if info is None:
+        return
+    addKeyValue(keyValues, info.__dict__)
+    for name in INFO_FILE_ATTRIBUTES:
+        keyValues.append(repr(getFileKey(getattr(info, name, None))))
+
+def addElementKeyValues(keyValues, e):
+    u"""Add the key values of e and its child elements to keyValues."""
+    keyValues.append(e.__class__.__name__)
+    # Light elements create their info when it is used, don't create it for the key.
+    addInfoKeyValues(keyValues, e._info if hasattr(e, '_info') else e.info)
+    addKeyValue(keyValues, e.name)
+    addKeyValue(keyValues, dict(e.style.items()))
+    keyValues.append(repr(getFontKey(e.css('font')))) # Inherited font.
+    for name in CONTENT_ATTRIBUTES:
+        value = getattr(e, name, None)
+        if value is not None:
+            keyValues.append(name)
+            addKeyValue(keyValues, value)
+    keyValues.append(repr(getFileKey(getattr(e, 'path', None))))
+    keyValues.append('<')
+    for child in e.elements:
+        addElementKeyValues(keyValues, child)
+    keyValues.append('>')
+
+def getViewKeyValues(view):
+    u"""Answer the list of key values of the view and document styles, that are the same for all
+    pages. Pass it to getPageKey, when getting the keys of many pages. These include the show and
+    css flags of the view, e.g. for crop marks and grids, and its drawBefore and drawAfter.
+
+    >>> from pagebot.document import Document
+    >>> doc = Document(w=300, h=400, autoPages=1)
+    >>> keyValues = getViewKeyValues(doc.view)
+    >>> doc.view.showPageCropMarks = True
+    >>> getViewKeyValues(doc.view) == keyValues
+    False
+    """
+    keyValues = []
+    for name, value in sorted(view.__dict__.items()):
+        if name.startswith(VIEW_ATTRIBUTE_PREFIXES) and isinstance(value, (bool, int, long, float, basestring)):
+            keyValues.append('%s=%r' % (name, value))
+    for name in ('drawBefore', 'drawAfter'):
+        keyValues.append(name)
+        addKeyValue(keyValues, getattr(view, name, None))
+    addKeyValue(keyValues, dict(view.style.items()))
+    addKeyValue(keyValues, dict(view.doc.rootStyle.items()))
+    addInfoKeyValues(keyValues, view.doc.info)
+    return keyValues
+
+def getPageKey(view, page, index, pageCount, w, h, viewKeyValues=None):
+    u"""Answer the hex key of the page with index in the pageCount pages, as drawn by the view,
+    in a document with maximum page size (w, h). The key changes if anything changes that
+    is drawn on the page. The optional viewKeyValues is the answer of getViewKeyValues(view).
+
+    >>> from pagebot.document import Document
+    >>> from pagebot.elements import newRect
+    >>> doc = Document(w=300, h=400, autoPages=2)
+    >>> page = doc[1]
+    >>> e = newRect(parent=page, x=10, y=20, w=30, h=40, fill=0.5)
+    >>> key = getPageKey(doc.view, page, 0, 2, 300, 400)
+    >>> key == getPageKey(doc.view, page, 0, 2, 300, 400)
+    True
+    >>> key == getPageKey(doc.view, page, 1, 2, 300, 400) # Other page number
+    False
+    >>> e.x = 11
+    >>> key == getPageKey(doc.view, page, 0, 2, 300, 400)
+    False
+    >>> e.x = 10
+    >>> key == getPageKey(doc.view, page, 0, 2, 300, 400)
+    True
+    >>> title = page.title
+    >>> page.title = 'Other title'
+    >>> key == getPageKey(doc.view, page, 0, 2, 300, 400)
+    False
+    >>> page.title = title
+    >>> page.info.headPath = __file__ # Imported files are keyed by their modification time.
+    >>> key == getPageKey(doc.view, page, 0, 2, 300, 400)
+    False
+    >>> page.info.headPath = None
+    >>> key == getPageKey(doc.view, page, 0, 2, 300, 400, getViewKeyValues(doc.view))
+    True
+    """
+    keyValues = [repr((BUILD_CACHE_VERSION, view.context.__class__.__name__, index, pageCount, w, h))]
+    if viewKeyValues is None:
+        viewKeyValues = getViewKeyValues(view)
+    keyValues.extend(viewKeyValues)
+    addElementKeyValues(keyValues, page)
+    return hashlib.sha1('\n'.join(keyValues)).hexdigest()
+
+class BuildCache(object):
+    u"""Folder with the rendered pages of previous builds. Pages are stored as files under their
+    page key, either as the exported file of a single page (e.g. PNG or SVG) or as the pickled
+    page of the context, to be merged into a document (e.g. PDF).
+
+    >>> cache = BuildCache(tempfile.mkdtemp())
+    >>> cache.getPage('abc') is None
+    True
+    >>> cache.putPage('abc', dict(items=[1, 2]))
+    >>> cache.getPage('abc')
+    {'items': [1, 2]}
+    >>> path = cache.path + '/Page.svg'
+    >>> f = open(path, 'w'); f.write('<svg/>'); f.close()
+    >>> cache.putFile('def', path)
+    >>> os.remove(path)
+    >>> cache.restoreFile('def', path), open(path).read()
+    (True, '<svg/>')
+    >>> cache.restoreFile('ghi', path)
+    False
+    >>> cache.hits, cache.misses
+    (2, 2)
+    >>> cache.clear()
+    >>> cache.getPage('abc') is None
+    True
+    """
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return '[%s %s hits:%d misses:%d]' % (self.__class__.__name__, self.path, self.hits, self.misses)
+
+    def _getPath(self, key, extension):
+        return '%s/%s.%s' % (self.path, key, extension)
+
+    def _write(self, path, data):
+        u"""Write data to path through a temporary file, so a cached file is never incomplete."""
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        fd, tmpPath = tempfile.mkstemp(dir=self.path)
+        f = os.fdopen(fd, 'wb')
+        f.write(data)
+        f.close()
+        os.rename(tmpPath, path)
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        f = open(path, 'rb')
+        data = f.read()
+        f.close()
+        return data
+
+    def getPage(self, key):
+        u"""Answer the cached context page of key. Answer None if the page is not cached."""
+        data = self._read(self._getPath(key, 'page'))
+        if data is None:
+            return None
+        return cPickle.loads(data)
+
+    def putPage(self, key, page):
+        u"""Store the context page under key."""
+        self._write(self._getPath(key, 'page'), cPickle.dumps(page, cPickle.HIGHEST_PROTOCOL))
+
+    def restoreFile(self, key, path):
+        u"""Copy the cached file of key to path. Answer False if the file is not cached."""
+        data = self._read(self._getPath(key, path.split('.')[-1]))
+        if data is None:
+            return False
+        f = open(path, 'wb')
+        f.write(data)
+        f.close()
+        return True
+
+    def putFile(self, key, path):
+        u"""Store the file at path under key."""
+        f = open(path, 'rb')
+        data = f.read()
+        f.close()
+        self._write(self._getPath(key, path.split('.')[-1]), data)
+
+    def clear(self):
+        u"""Remove all cached pages."""
+        if os.path.exists(self.path):
+            for fileName in os.listdir(self.path):
+                os.remove(self.path + '/' + fileName)
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
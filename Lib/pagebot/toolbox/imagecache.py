@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     imagecache.py
+#
+#     Cache of image derivatives, the bitmaps of source images resampled to the
+#     pixel size that a placement needs at the output resolution. Derivatives
+#     are keyed by the hash of the source file, the pixel size, color mode and
+#     quality, so the same image placed on several pages or exported in several
+#     formats is decoded and resampled once. Bitmaps are kept in memory up to a
+#     maximum of bytes, evicting the least recently used first. Optionally the
+#     derivatives are kept as files in a folder, to be reused in the next run.
+#
+import os
+import math
+import hashlib
+from collections import OrderedDict
+
+# Default maximum of bytes of the bitmaps in memory.
+MAX_DERIVATIVE_BYTES = 256 * 1024 * 1024
+
+# Content hashes of source files, by (path, mtime, size), so each file is read once.
+SOURCE_HASHES = {}
+
+def getSourceHash(path):
+    u"""Answer the SHA1 hex digest of the content of the file at path. The hash is cached
+    until the modification time or the size of the file changes, so moved or copied files
+    with the same content share their derivatives.
+
+    >>> getSourceHash(__file__) == getSourceHash(os.path.abspath(__file__))
+    True
+    >>> len(getSourceHash(__file__))
+    40
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = path, stat.st_mtime, stat.st_size
+    sourceHash = SOURCE_HASHES.get(key)
+    if sourceHash is None:
+        f = open(path, 'rb')
+        sourceHash = SOURCE_HASHES[key] = hashlib.sha1(f.read()).hexdigest()
+        f.close()
+    return sourceHash
+
+def getPixelSize(w, h, imageSize, resolution):
+    u"""Answer the (pw, ph) pixel size that an image of imageSize needs to be placed in (w, h)
+    points at resolution in dots per inch. Images are only downsampled, never enlarged.
+
+    >>> getPixelSize(200, 100, (3000, 1500), 300) # 200pt at 300dpi is 834 pixels.
+    (834, 417)
+    >>> getPixelSize(200, 100, (400, 200), 300) # Don't enlarge
+    (400, 200)
+    """
+    iw, ih = imageSize
+    pw = int(math.ceil(w * resolution / 72.0))
+    ph = int(math.ceil(h * resolution / 72.0))
+    if pw >= iw or ph >= ih:
+        return iw, ih
+    return pw, ph
+
+class ImageDerivativeCache(object):
+    u"""LRU cache of image derivatives, by (sourceHash, pw, ph, colorMode, quality) key. The size
+    of each bitmap is given when it is stored. If the total exceeds maxBytes, the least recently
+    used bitmaps are removed from memory. If path is defined, it is the folder where contexts
+    can store the derivatives as files, to reuse them in the next run (see getFilePath).
+
+    >>> cache = ImageDerivativeCache(maxBytes=100)
+    >>> key1 = cache.getKey(__file__, 10, 5, 'RGB', 90)
+    >>> cache.get(key1) is None
+    True
+    >>> cache.put(key1, 'Bitmap1', 60)
+    >>> cache.get(key1)
+    'Bitmap1'
+    >>> key2 = cache.getKey(__file__, 8, 4, 'RGB', 90)
+    >>> cache.put(key2, 'Bitmap2', 60) # Removes the least recently used bitmap.
+    >>> cache.get(key1) is None, cache.get(key2), cache.bytes
+    (True, 'Bitmap2', 60)
+    >>> cache.hits, cache.misses, cache.evictions
+    (2, 2, 1)
+    >>> cache.getFilePath(key2, 'png') is None # Not persistent
+    True
+    """
+    def __init__(self, path=None, maxBytes=MAX_DERIVATIVE_BYTES):
+        self.path = path
+        self.maxBytes = maxBytes
+        self.bytes = 0 # Total bytes of the bitmaps in memory.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._derivatives = OrderedDict() # Key to (bitmap, bytes), least recently used first.
+
+    def __repr__(self):
+        return '[%s bitmaps:%d bytes:%d hits:%d misses:%d evictions:%d]' % (self.__class__.__name__,
+            len(self._derivatives), self.bytes, self.hits, self.misses, self.evictions)
+
+    def __len__(self):
+        return len(self._derivatives)
+
+    def getKey(self, path, pw, ph, colorMode=None, quality=None):
+        u"""Answer the key of the derivative of the image at path, with pixel size (pw, ph)."""
+        return getSourceHash(path), pw, ph, colorMode, quality
+
+    def get(self, key):
+        u"""Answer the bitmap of key. Answer None if it is not in memory."""
+        derivative = self._derivatives.pop(key, None)
+        if derivative is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._derivatives[key] = derivative # Most recently used is last.
+        return derivative[0]
+
+    def put(self, key, bitmap, size):
+        u"""Store the bitmap of key, that uses size bytes. Remove the least recently used bitmaps
+        if the total size exceeds self.maxBytes."""
+        old = self._derivatives.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        self._derivatives[key] = bitmap, size
+        self.bytes += size
+        while self.bytes > self.maxBytes and len(self._derivatives) > 1:
+            _, (_, oldSize) = self._derivatives.popitem(last=False)
+            self.bytes -= oldSize
+            self.evictions += 1
+
+    def getFilePath(self, key, extension):
+        u"""Answer the path of the file of the derivative of key, in the folder of the cache.
+        Answer None if the cache is not persistent."""
+        if self.path is None:
+            return None
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        sourceHash, pw, ph, colorMode, quality = key
+        return '%s/%s-%dx%d-%s-%s.%s' % (self.path, sourceHash, pw, ph, colorMode, quality, extension)
+
+    def clear(self):
+        u"""Remove all bitmaps from memory."""
+        self._derivatives.clear()
+        self.bytes = 0
+
+# Derivative cache, shared by the contexts.
+IMAGE_DERIVATIVE_CACHE = ImageDerivativeCache()
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     imagesize.py
+#
+#     Read the pixel size, resolution and color mode of PNG, GIF, JPEG and TIFF
+#     images from the file header, without decoding the image data. The image
+#     info is kept in a persistent cache by path, modification time and file
+#     size, shared by PixelMap elements and all contexts.
+#
+import os
+import json
+import atexit
+import struct
+import tempfile
+from cStringIO import StringIO
+
+# Color modes, with the names of PIL.
+PNG_COLOR_MODES = {0: 'L', 2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+JPEG_COLOR_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+TIFF_COLOR_MODES = {0: 'L', 1: 'L', 2: 'RGB', 3: 'P', 5: 'CMYK', 6: 'YCbCr'}
+
+# Tags of TIFF image file directories.
+TIFF_WIDTH, TIFF_HEIGHT, TIFF_PHOTOMETRIC = 256, 257, 262
+TIFF_SAMPLES, TIFF_XRESOLUTION, TIFF_YRESOLUTION, TIFF_RESOLUTION_UNIT = 277, 282, 283, 296
+
+# Change the version to invalidate all cached image info, e.g. if a format is read differently.
+IMAGE_INFO_VERSION = 1
+
+# Default path of the persistent image info cache.
+IMAGE_INFO_CACHE_PATH = os.path.expanduser('~/.pagebot/imageInfo.json')
+
+def getImageSize(path):
+    u"""Answer the (w, h) pixel size of the PNG, GIF, JPEG or TIFF image file at path, from
+    the shared image info cache. Answer None if the format is not recognized.
+
+    >>> from pagebot.contexts.platform import getRootPath
+    >>> getImageSize(getRootPath() + '/Examples/Magazines/Fashion/images/IMG_8914.jpg')
+    (3024, 4032)
+    >>> getImageSize(getRootPath() + '/Docs/gallery/SierpinskiSquare.gif')
+    (500, 500)
+    >>> getImageSize(__file__) is None
+    True
+    """
+    info = getImageInfo(path)
+    if info is None:
+        return None
+    return info[:2]
+
+def getImageInfo(path):
+    u"""Answer the (w, h, dpi, colorMode) image info of the file at path, from the shared
+    image info cache. Answer None if the format is not recognized."""
+    return IMAGE_INFO_CACHE.get(path)
+
+def readImageInfo(path):
+    u"""Answer the (w, h, dpi, colorMode) info of the PNG, GIF, JPEG or TIFF image file at path,
+    read from its header. dpi is the (x, y) resolution in dots per inch, or None if the file
+    does not define it. colorMode is the name of the color mode, as in PIL, e.g. 'RGB' or 'CMYK'.
+    Answer None if the format is not recognized or if the header is truncated or broken.
+
+    >>> from pagebot.contexts.platform import getRootPath
+    >>> readImageInfo(getRootPath() + '/Examples/Magazines/Fashion/images/IMG_8914.jpg')
+    (3024, 4032, (72, 72), 'RGB')
+    >>> readImageInfo(getRootPath() + '/Docs/gallery/SierpinskiSquare.gif')
+    (500, 500, None, 'P')
+    >>> path = tempfile.mktemp(suffix='.tif')
+    >>> f = open(path, 'wb')
+    >>> f.write('II*\\x00\\x08\\x00\\x00\\x00') # Header with offset of the directory.
+    >>> f.write(struct.pack('<H', 4))
+    >>> f.write(struct.pack('<HHII', TIFF_WIDTH, 3, 1, 640) + struct.pack('<HHII', TIFF_HEIGHT, 4, 1, 480))
+    >>> f.write(struct.pack('<HHII', TIFF_PHOTOMETRIC, 3, 1, 5) + struct.pack('<HHII', TIFF_XRESOLUTION, 5, 1, 62))
+    >>> f.write(struct.pack('<III', 0, 300, 1)) # Next directory and the rational of the resolution.
+    >>> f.close()
+    >>> readImageInfo(path)
+    (640, 480, (300, 300), 'CMYK')
+    >>> f = open(path, 'wb')
+    >>> f.write('II*\\x00\\x08\\x00\\x00\\x00' + struct.pack('<H', 4) + struct.pack('<HH', TIFF_WIDTH, 3))
+    >>> f.close()
+    >>> readImageInfo(path) is None # Truncated directory
+    True
+    >>> os.remove(path)
+    >>> jpegPath = getRootPath() + '/Examples/Magazines/Fashion/images/IMG_8914.jpg'
+    >>> path = tempfile.mktemp(suffix='.jpg')
+    >>> f = open(path, 'wb')
+    >>> f.write(open(jpegPath, 'rb').read(5)) # Truncated in the length of the first marker segment.
+    >>> f.close()
+    >>> readImageInfo(path) is None
+    True
+    >>> os.remove(path)
+    >>> readImageInfo(__file__) is None
+    True
+    """
+    f = open(path, 'rb')
+    try:
+        return _readImageInfo(f)
+    except (struct.error, IndexError, IOError): # Short reads of a truncated file, or offsets outside it.
+        return None
+    finally:
+        f.close()
+
+def _readImageInfo(f):
+    u"""Answer the info of the image file f, by the format in its header."""
+    header = f.read(26)
+    if header.startswith('\x89PNG\r\n\x1a\n') and header[12:16] == 'IHDR':
+        return _readPngInfo(f, header)
+    if header[:6] in ('GIF87a', 'GIF89a'):
+        w, h = struct.unpack('<HH', header[6:10])
+        return w, h, None, 'P'
+    if header.startswith('\xff\xd8'):
+        return _readJpegInfo(f)
+    if header[:4] in ('II*\x00', 'MM\x00*'):
+        return _readTiffInfo(f, header)
+    return None
+
+def _readPngInfo(f, header):
+    u"""Answer the info from the IHDR chunk and the optional pHYs chunk of the PNG file f."""
+    w, h = struct.unpack('>II', header[16:24])
+    colorMode = PNG_COLOR_MODES.get(ord(header[25]))
+    dpi = None
+    f.seek(8)
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        length, chunkType = struct.unpack('>I4s', chunk)
+        if chunkType in ('IDAT', 'IEND'): # Resolution is before the image data.
+            break
+        if chunkType == 'pHYs':
+            x, y, unit = struct.unpack('>IIB', f.read(9))
+            if unit == 1: # Pixels per meter
+                dpi = int(round(x * 0.0254)), int(round(y * 0.0254))
+            break
+        f.seek(length + 4, 1) # Skip data and CRC.
+    return w, h, dpi, colorMode
+
+def _readJpegInfo(f):
+    u"""Answer the info from the JFIF header and the first start-of-frame marker of the JPEG file f."""
+    dpi = None
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        while marker and marker[0] == '\xff' and marker[1] == '\xff': # Fill bytes
+            marker = marker[1] + f.read(1)
+        if len(marker) < 2 or marker[0] != '\xff':
+            return None
+        code = ord(marker[1])
+        if code in (0xd8, 0x01) or 0xd0 <= code <= 0xd7: # Markers without length
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        if length < 2: # Broken segment, that would not move forward.
+            return None
+        if code == 0xe0 and length >= 14: # APP0 with the JFIF density.
+            data = f.read(12)
+            if data.startswith('JFIF\x00'):
+                unit, x, y = struct.unpack('>BHH', data[7:12])
+                if unit == 1: # Dots per inch
+                    dpi = x, y
+                elif unit == 2: # Dots per cm
+                    dpi = int(round(x * 2.54)), int(round(y * 2.54))
+            f.seek(length - 14, 1)
+        elif code == 0xe1 and dpi is None: # APP1 with the Exif resolution, as TIFF directory.
+            data = f.read(length - 2)
+            if data.startswith('Exif\x00\x00'):
+                exif = StringIO(data[6:])
+                try:
+                    dpi = _getTiffDpi(_readTiffTags(exif, exif.read(8)))
+                except struct.error: # Broken Exif data, the size can still be read.
+                    pass
+        elif 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc): # Start of frame
+            h, w, components = struct.unpack('>xHHB', f.read(6))
+            return w, h, dpi, JPEG_COLOR_MODES.get(components)
+        else:
+            f.seek(length - 2, 1)
+
+def _readTiffInfo(f, header):
+    u"""Answer the info from the first image file directory of the TIFF file f."""
+    tags = _readTiffTags(f, header)
+    if TIFF_WIDTH not in tags or TIFF_HEIGHT not in tags:
+        return None
+    colorMode = TIFF_COLOR_MODES.get(tags.get(TIFF_PHOTOMETRIC))
+    if colorMode == 'RGB' and tags.get(TIFF_SAMPLES) == 4:
+        colorMode = 'RGBA'
+    return tags[TIFF_WIDTH], tags[TIFF_HEIGHT], _getTiffDpi(tags), colorMode
+
+def _readTiffTags(f, header):
+    u"""Answer the dictionary with the integer and rational values of the tags in the first image
+    file directory of the TIFF file f, where header is its first 8 bytes."""
+    tags = {}
+    if header[:4] not in ('II*\x00', 'MM\x00*'):
+        return tags
+    order = '<' if header.startswith('II') else '>'
+    f.seek(struct.unpack(order + 'I', header[4:8])[0])
+    count = struct.unpack(order + 'H', f.read(2))[0]
+    rationals = {}
+    for _ in range(count):
+        tag, valueType, _, value = struct.unpack(order + 'HHI4s', f.read(12))
+        if valueType == 3: # Short values are left-aligned in the 4 bytes.
+            tags[tag] = struct.unpack(order + 'H', value[:2])[0]
+        elif valueType == 4:
+            tags[tag] = struct.unpack(order + 'I', value)[0]
+        elif valueType == 5: # Rational, the value is the offset of 2 longs.
+            rationals[tag] = struct.unpack(order + 'I', value)[0]
+    for tag, offset in rationals.items():
+        f.seek(offset)
+        numerator, denominator = struct.unpack(order + 'II', f.read(8))
+        tags[tag] = numerator / (denominator or 1.0)
+    return tags
+
+def _getTiffDpi(tags):
+    u"""Answer the (x, y) resolution in dots per inch of the TIFF tags. Answer None if undefined."""
+    unit = tags.get(TIFF_RESOLUTION_UNIT, 2)
+    if TIFF_XRESOLUTION not in tags or unit not in (2, 3): # Inch or centimeter
+        return None
+    dpi = []
+    for resolution in (tags[TIFF_XRESOLUTION], tags.get(TIFF_YRESOLUTION, tags[TIFF_XRESOLUTION])):
+        if unit == 3:
+            resolution *= 2.54
+        dpi.append(int(round(resolution)))
+    return tuple(dpi)
+
+class ImageInfoCache(object):
+    u"""Persistent cache of the (w, h, dpi, colorMode) info of image files, by their absolute path.
+    The info is read again if the modification time or the size of the file changed. The cache
+    is saved as JSON file at path, if it changed, by save( ) and on exit.
+
+    >>> from pagebot.contexts.platform import getRootPath
+    >>> imagePath = getRootPath() + '/Examples/Magazines/Fashion/images/IMG_8914.jpg'
+    >>> cachePath = tempfile.mktemp(suffix='.json')
+    >>> cache = ImageInfoCache(cachePath)
+    >>> cache.get(imagePath), cache.get(imagePath)
+    ((3024, 4032, (72, 72), 'RGB'), (3024, 4032, (72, 72), 'RGB'))
+    >>> cache.get('/not/existing/image.png') is None
+    True
+    >>> cache.hits, cache.misses
+    (1, 1)
+    >>> cache.save()
+    >>> cache = ImageInfoCache(cachePath) # Next run
+    >>> cache.get(imagePath), cache.hits, cache.misses
+    ((3024, 4032, (72, 72), 'RGB'), 1, 0)
+    >>> os.remove(cachePath)
+    """
+    def __init__(self, path=None):
+        self.path = path # If None, the cache is not persistent.
+        self.hits = 0
+        self.misses = 0
+        self._infos = None # Loaded upon first usage.
+        self._changed = False
+
+    def __repr__(self):
+        return '[%s %s hits:%d misses:%d]' % (self.__class__.__name__, self.path, self.hits, self.misses)
+
+    def _getInfos(self):
+        if self._infos is None:
+            self._infos = {}
+            if self.path is not None and os.path.exists(self.path):
+                try:
+                    f = open(self.path, 'rb')
+                    data = json.load(f)
+                    f.close()
+                    if data.get('version') == IMAGE_INFO_VERSION:
+                        self._infos = data['images']
+                except (IOError, ValueError, KeyError, AttributeError):
+                    pass # Broken cache file, start again.
+        return self._infos
+
+    def get(self, path):
+        u"""Answer the (w, h, dpi, colorMode) info of the image at path. Answer None if the file
+        does not exist or if the format is not recognized."""
+        if not isinstance(path, basestring) or not os.path.isfile(path):
+            return None
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        infos = self._getInfos()
+        cached = infos.get(path)
+        if cached is not None and cached[:2] == [stat.st_mtime, stat.st_size]:
+            self.hits += 1
+            info = cached[2]
+        else:
+            self.misses += 1
+            info = readImageInfo(path)
+            infos[path] = [stat.st_mtime, stat.st_size, info]
+            self._changed = True
+        if info is None:
+            return None
+        w, h, dpi, colorMode = info
+        if dpi is not None: # JSON answers lists and unicode.
+            dpi = tuple(dpi)
+        if colorMode is not None:
+            colorMode = str(colorMode)
+        return w, h, dpi, colorMode
+
+    def save(self):
+        u"""Save the cache, if it changed, through a temporary file, so it is never incomplete."""
+        if self.path is None or not self._changed:
+            return
+        try:
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            fd, tmpPath = tempfile.mkstemp(dir=folder or None)
+            f = os.fdopen(fd, 'wb')
+            json.dump(dict(version=IMAGE_INFO_VERSION, images=self._infos), f)
+            f.close()
+            os.rename(tmpPath, self.path)
+            self._changed = False
+        except (IOError, OSError):
+            pass # Cannot write the cache, e.g. in a read-only home folder.
+
+    def clear(self):
+        u"""Remove all cached info."""
+        self._infos = {}
+        self._changed = True
+
+# Image info cache, shared by PixelMap elements and the contexts.
+IMAGE_INFO_CACHE = ImageInfoCache(IMAGE_INFO_CACHE_PATH)
+atexit.register(IMAGE_INFO_CACHE.save)
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     P A G E B O T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens & Font Bureau
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting usage of DrawBot, www.drawbot.com
+#     Supporting usage of Flat, https://github.com/xxyxyz/flat
+# -----------------------------------------------------------------------------
+#
+#     linebreaking.py
+#
+#     Platform independent line breaking of paragraphs, from the advance widths
+#     of the characters. Lines break on white space and on the hyphenation points
+#     of the words in the pagebot.toolbox.hyphenation dictionaries, by first fit
+#     (GREEDY) or by the least total raggedness of the paragraph (TOTAL_FIT, as
+#     in the Knuth-Plass algorithm of TeX). Layouts are cached by their key.
+#
+from __future__ import division
+import re
+from bisect import bisect_left, bisect_right
+
+from pagebot.style import GREEDY, TOTAL_FIT
+
+WORDS = re.compile(r'[^\s]+') # Lines can break on the white space between words.
+WORD_CORE = re.compile(r'\w+', re.UNICODE) # Part of a word that can be hyphenated, without punctuation.
+
+# Line layouts by key, as made by the caller, e.g. the runs of a paragraph and the width.
+LINE_LAYOUTS = {}
+MAX_LINE_LAYOUTS = 10000 # Clear the cache if it gets larger.
+
+MIN_HYPHEN_PART = 2 # Minimal amount of characters before and after a hyphenation point.
+SPACE_STRETCH = 1/2 # Part of the width of a space that it can stretch for TOTAL_FIT.
+LINE_PENALTY = 10 # Demerits of every line, so TOTAL_FIT prefers less lines.
+HYPHEN_PENALTY = 50 # Demerits of a hyphenated line for TOTAL_FIT.
+OVERFULL_DEMERITS = 1e12 # Demerits of a line that does not fit, if there is no other choice.
+
+def getLayout(key, breakLines, *args, **kwargs):
+    u"""Answer the cached line layout for key. Otherwise answer and cache the result of
+    breakLines(*args, **kwargs).
+
+    >>> calls = []
+    >>> def compose(text):
+    ...     calls.append(text)
+    ...     return text.split()
+    >>> getLayout(('AB CD', 100), compose, 'AB CD'), getLayout(('AB CD', 100), compose, 'AB CD'), len(calls)
+    (['AB', 'CD'], ['AB', 'CD'], 1)
+    """
+    layout = LINE_LAYOUTS.get(key)
+    if layout is None:
+        if len(LINE_LAYOUTS) >= MAX_LINE_LAYOUTS:
+            LINE_LAYOUTS.clear()
+        layout = LINE_LAYOUTS[key] = breakLines(*args, **kwargs)
+    return layout
+
+def getHyphenPositions(word, language):
+    u"""Answer the list of indices in word where it can be hyphenated, according to the dictionary
+    of language. Punctuation around the word is ignored.
+
+    >>> getHyphenPositions(u'composition', 'en')
+    [3, 5, 7]
+    >>> getHyphenPositions(u'"Composition,"', 'en')
+    [4, 6, 8]
+    >>> getHyphenPositions(u'xyzzy', 'en')
+    []
+    """
+    # Import here, as the hyphenation dictionaries import the contexts, which use line breaking.
+    from pagebot.toolbox.hyphenation import hyphenate
+    positions = []
+    for match in WORD_CORE.finditer(word):
+        core = match.group()
+        if len(core) < 2 * MIN_HYPHEN_PART:
+            continue
+        hyphenated = hyphenate(core, language) or hyphenate(core.lower(), language)
+        if hyphenated is None:
+            continue
+        position = match.start()
+        for part in hyphenated.split('-')[:-1]:
+            position += len(part)
+            if MIN_HYPHEN_PART <= position - match.start() <= len(core) - MIN_HYPHEN_PART:
+                positions.append(position)
+    return positions
+
+def _getBreaks(text, language):
+    u"""Answer the lists of (position, hyphenated, nextStart) of all places where the text can
+    break, in order of position. nextStart is the start of the line after the break."""
+    words = list(WORDS.finditer(text))
+    if language is None: # No hyphenation, the lines break after each word.
+        nextStarts = [match.start() for match in words[1:]] + [len(text)]
+        return [match.end() for match in words], [False] * len(words), nextStarts
+    positions = []
+    hyphens = []
+    nextStarts = []
+    for index, match in enumerate(words):
+        for position in getHyphenPositions(match.group(), language):
+            positions.append(match.start() + position)
+            hyphens.append(True)
+            nextStarts.append(match.start() + position)
+        positions.append(match.end())
+        hyphens.append(False)
+        if index < len(words) - 1:
+            nextStarts.append(words[index+1].start())
+        else:
+            nextStarts.append(len(text))
+    return positions, hyphens, nextStarts
+
+def breakLines(text, cumulated, w=None, firstLineIndent=0, indent=0, tailIndent=0, hyphenWidth=0,
+        language=None, lineBreaking=GREEDY):
+    u"""Answer the list of (start, end, width, hyphenated) lines of the paragraph text, where
+    cumulated is the list of x-positions after each character, starting with 0. The width of a
+    line includes the hyphen, if hyphenated, not the indents. The first line also includes white
+    space at the start of the paragraph. If w is None, the paragraph is a single line. If language
+    is not None, the words are hyphenated with the dictionary of that language.
+
+    >>> text = u'aaa bbb ccc dd'
+    >>> cumulated = range(len(text) + 1) # All characters have width 1
+    >>> breakLines(text, cumulated, 8)
+    [(0, 7, 7, False), (8, 14, 6, False)]
+    >>> breakLines(text, cumulated, 8, indent=2)
+    [(0, 3, 3, False), (4, 7, 3, False), (8, 14, 6, False)]
+    >>> text = u'a b cccc dd'
+    >>> cumulated = range(len(text) + 1)
+    >>> breakLines(text, cumulated, 6) # Very loose second line.
+    [(0, 3, 3, False), (4, 8, 4, False), (9, 11, 2, False)]
+    >>> breakLines(text, cumulated, 6, lineBreaking=TOTAL_FIT)
+    [(0, 1, 1, False), (2, 8, 6, False), (9, 11, 2, False)]
+    >>> text = u'a composition'
+    >>> cumulated = range(len(text) + 1)
+    >>> breakLines(text, cumulated, 8, hyphenWidth=1, language='en')
+    [(0, 7, 8, True), (7, 13, 6, False)]
+    >>> breakLines(text, cumulated, 8)
+    [(0, 1, 1, False), (2, 13, 11, False)]
+    """
+    positions, hyphens, nextStarts = _getBreaks(text, language)
+    if not positions:
+        return []
+    if w is None:
+        return [(0, positions[-1], cumulated[positions[-1]] - cumulated[0], False)]
+    if lineBreaking == TOTAL_FIT:
+        breaks = _getTotalFitBreaks(text, cumulated, positions, hyphens, nextStarts, w,
+            firstLineIndent, indent, tailIndent, hyphenWidth)
+    else:
+        breaks = _getGreedyBreaks(cumulated, positions, hyphens, nextStarts, w,
+            firstLineIndent, indent, tailIndent, hyphenWidth)
+    lines = []
+    start = 0
+    for index in breaks:
+        end = positions[index]
+        width = cumulated[end] - cumulated[start]
+        if hyphens[index]:
+            width += hyphenWidth
+        lines.append((start, end, width, hyphens[index]))
+        start = nextStarts[index]
+    return lines
+
+def _getGreedyBreaks(cumulated, positions, hyphens, nextStarts, w, firstLineIndent, indent, tailIndent, hyphenWidth):
+    u"""Answer the indices of the breaks, filling each line as much as possible."""
+    breakX = [cumulated[position] for position in positions]
+    breaks = []
+    start = 0
+    index = 0 # First break after the start of the line.
+    while index < len(positions):
+        available = w - indent - tailIndent
+        if not breaks:
+            available -= firstLineIndent
+        x = cumulated[start]
+        last = bisect_right(breakX, x + available, index) - 1
+        while last >= index and hyphens[last] and breakX[last] + hyphenWidth - x > available:
+            last -= 1
+        if last < index: # Nothing fits, break at the first possible place.
+            last = index
+        breaks.append(last)
+        start = nextStarts[last]
+        index = last + 1
+    return breaks
+
+def _getTotalFitBreaks(text, cumulated, positions, hyphens, nextStarts, w, firstLineIndent, indent, tailIndent, hyphenWidth):
+    u"""Answer the indices of the breaks, with the least total demerits of the paragraph, where
+    the demerits of each line increase with the amount that its spaces need to stretch to make it
+    fit the width."""
+    space = text.find(u' ')
+    if space >= 0:
+        spaceWidth = cumulated[space+1] - cumulated[space]
+    else:
+        spaceWidth = 0
+    wordStarts = [match.start() for match in WORDS.finditer(text)]
+    lastIndex = len(positions) - 1
+    # Demerits and previous break of the best paragraph until each break. Index -1 is the start.
+    demerits = [None] * len(positions)
+    previous = [None] * len(positions)
+    for index in range(len(positions)):
+        end = positions[index]
+        best = bestPrevious = None
+        for prevIndex in range(index - 1, -2, -1):
+            if prevIndex == -1:
+                start, prevDemerits = 0, 0
+                available = w - indent - tailIndent - firstLineIndent
+            else:
+                start, prevDemerits = nextStarts[prevIndex], demerits[prevIndex]
+                available = w - indent - tailIndent
+            width = cumulated[end] - cumulated[start]
+            if hyphens[index]:
+                width += hyphenWidth
+            spaces = bisect_left(wordStarts, end) - bisect_right(wordStarts, start)
+            if width > available: # Does not fit. Spaces don't shrink, as lines are not justified.
+                if prevIndex == index - 1 and best is None:
+                    best, bestPrevious = prevDemerits + OVERFULL_DEMERITS, prevIndex
+                break
+            if index == lastIndex: # Last line does not need to be stretched.
+                ratio = 0
+            else:
+                stretch = spaces * spaceWidth * SPACE_STRETCH
+                if stretch:
+                    ratio = min(10, (available - width) / stretch)
+                else:
+                    ratio = 10
+            lineDemerits = (LINE_PENALTY + 100 * ratio ** 3) ** 2
+            if hyphens[index]:
+                lineDemerits += HYPHEN_PENALTY ** 2
+            if best is None or prevDemerits + lineDemerits < best:
+                best, bestPrevious = prevDemerits + lineDemerits, prevIndex
+        demerits[index] = best
+        previous[index] = bestPrevious
+    breaks = []
+    index = lastIndex
+    while index != -1:
+        breaks.append(index)
+        index = previous[index]
+    breaks.reverse()
+    return breaks
+
+if __name__ == '__main__':
+    import doctest
+    import sys
+    sys.exit(doctest.testmod()[0])
@@ -15,8 +15,14 @@
 #
 import math
 import operator
+from bisect import bisect_left
 from pagebot.toolbox.transformer import point2D
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 def lucasRange(a, z, n, minN=None, maxN=None):
     u"""Answers the range stem widths for interpolation, according to
     Lucas’ formula.
@@ -206,6 +212,38 @@ def normalize(p, length=1):
         return None
     return 1.0 * p[0] * length / w
 
+def snapValues(values, positions):
+    u"""Answer the list with the nearest of the sorted positions for each of the values. Values
+    halfway between two positions snap to the lower one. Values can be a list or a NumPy array.
+    With NumPy the positions are searched vectorized for all values at once, otherwise by bisect.
+    Answer the values unchanged if there are no positions.
+
+    >>> snapValues([0, 14, 16, 47, 100, -5], [0, 10, 20, 30])
+    [0, 10, 20, 30, 30, 0]
+    >>> snapValues([15], [10, 20])
+    [10]
+    """
+    if not positions:
+        return list(values)
+    if numpy is not None and len(positions) > 1:
+        grid = numpy.asarray(positions)
+        values = numpy.asarray(values)
+        upper = numpy.clip(numpy.searchsorted(grid, values), 1, len(positions) - 1)
+        lower = upper - 1
+        nearest = numpy.where(values - grid[lower] <= grid[upper] - values, lower, upper)
+        return [positions[index] for index in nearest.tolist()] # Answer the values as defined in positions.
+    snapped = []
+    for value in values:
+        index = bisect_left(positions, value)
+        if index == 0:
+            snapped.append(positions[0])
+        elif index == len(positions):
+            snapped.append(positions[-1])
+        else:
+            lower, upper = positions[index - 1], positions[index]
+            snapped.append(lower if value - lower <= upper - value else upper)
+    return snapped
+
 if __name__ == "__main__":
     import doctest
     import sys